@@ -5,6 +5,9 @@ echo "🔗 Deploying API Function..."
 # Create deployment package
 zip -r api-function.zip index.py
 
+# Bundle shared helpers at the package root
+(cd .. && zip -r api-function/api-function.zip shared -x "*/__pycache__/*")
+
 # Update Lambda function
 aws lambda update-function-code \
   --function-name anycompany-api-prod \
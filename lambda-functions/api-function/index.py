@@ -1,8 +1,11 @@
 import json
-import boto3
 import os
 from decimal import Decimal
 
+from shared.aws_clients import get_client, get_table
+from shared.batch_progress import summarize_batch
+from shared.metrics import add_bytes, add_count, flush_metrics, stage, start_metrics
+
 class DecimalEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, Decimal):
@@ -22,27 +25,38 @@ def lambda_handler(event, context):
     
     path = event.get('path', '')
     
+    start_metrics('api', path=path, method=event['httpMethod'])
     try:
-        if path == '/rules':
-            return get_rules(headers)
-        elif path == '/results':
-            return get_results(headers)
-        elif path == '/upload' or path == '/upload-url':
-            return get_upload_url(event, headers)
-        elif path == '/entity-metrics':
-            return get_entity_metrics(headers)
-        else:
-            return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'message': 'API working', 'path': path})}
+        response = route_request(event, path, headers)
     except Exception as e:
-        return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'error': str(e)})}
+        response = {'statusCode': 500, 'headers': headers, 'body': json.dumps({'error': str(e)})}
+    
+    add_bytes('response_bytes', len(response.get('body') or ''))
+    flush_metrics(status_code=response['statusCode'])
+    return response
+
+def route_request(event, path, headers):
+    if path == '/rules':
+        return get_rules(headers)
+    elif path == '/results':
+        return get_results(headers)
+    elif path == '/upload' or path == '/upload-url':
+        return get_upload_url(event, headers)
+    elif path == '/entity-metrics':
+        return get_entity_metrics(headers)
+    elif path.startswith('/batches/'):
+        return get_batch_progress(path[len('/batches/'):], headers)
+    else:
+        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'message': 'API working', 'path': path})}
 
 def get_results(headers):
-    dynamodb = boto3.resource('dynamodb')
-    s3_client = boto3.client('s3')
-    table = dynamodb.Table(os.environ['CALLS_TABLE_NAME'])
+    s3_client = get_client('s3')
+    table = get_table(os.environ['CALLS_TABLE_NAME'])
     
-    response = table.scan()
+    with stage('calls_scan'):
+        response = table.scan()
     calls = response.get('Items', [])
+    add_count('calls_returned', len(calls))
     
     # Add AI quality metrics to each call
     for call in calls:
@@ -52,7 +66,7 @@ def get_results(headers):
                     'get_object',
                     Params={
                         'Bucket': os.environ['INPUT_BUCKET_NAME'],
-                        'Key': f"audio/{call['filename']}"
+                        'Key': call.get('audio_key') or f"audio/{call['filename']}"
                     },
                     ExpiresIn=3600
                 )
@@ -108,7 +122,7 @@ def get_results(headers):
     }
 
 def get_upload_url(event, headers):
-    s3_client = boto3.client('s3')
+    s3_client = get_client('s3')
     
     body = json.loads(event.get('body', '{}'))
     filename = body.get('filename', 'audio.wav')
@@ -138,11 +152,11 @@ def get_upload_url(event, headers):
     }
 
 def get_entity_metrics(headers):
-    dynamodb = boto3.resource('dynamodb')
-    calls_table = dynamodb.Table(os.environ['CALLS_TABLE_NAME'])
+    calls_table = get_table(os.environ['CALLS_TABLE_NAME'])
     
     try:
-        response = calls_table.scan()
+        with stage('calls_scan'):
+            response = calls_table.scan()
         calls = response.get('Items', [])
         
         if not calls:
@@ -289,12 +303,38 @@ def get_entity_metrics(headers):
             'body': json.dumps({'error': f'Entity metrics error: {str(e)}'})
         }
 
+def get_batch_progress(batch_id, headers):
+    """Live batch progress from the per-batch counters (no calls table scan)"""
+    batches_table = get_table(os.environ.get('BATCHES_TABLE_NAME', 'anycompany-batches-prod'))
+    
+    if not batch_id:
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'batch_id is required'})}
+    
+    try:
+        with stage('batch_get'):
+            batch = batches_table.get_item(Key={'batch_id': batch_id}).get('Item')
+        if not batch:
+            return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': f'Batch {batch_id} not found'})}
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps(summarize_batch(batch), cls=DecimalEncoder)
+        }
+        
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': f'Batch progress error: {str(e)}'})
+        }
+
 def get_rules(headers):
-    dynamodb = boto3.resource('dynamodb')
-    rules_table = dynamodb.Table(os.environ['RULES_TABLE_NAME'])
+    rules_table = get_table(os.environ['RULES_TABLE_NAME'])
     
     try:
-        response = rules_table.scan()
+        with stage('rules_scan'):
+            response = rules_table.scan()
         rules = response.get('Items', [])
         
         # Group rules by category
@@ -1,8 +1,23 @@
 import json
-import boto3
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from shared.aws_clients import get_client, get_resource, get_table
+from shared.batch_progress import new_batch_id, start_batch
+from shared.call_log import bind, debug, error, info, start_call_log, warning
+from shared.checkpoints import REJECTED, checkpoint_key, load_checkpoints, mark_checkpoint, should_skip
+from shared.metrics import add_bytes, add_count, flush_metrics, set_properties, stage, start_metrics
+from shared.reference_data import compact_reference, get_references, load_reference_index, reference_table_name
+from shared.wav_header import WavHeaderError, assess_wav, read_wav_header
+
+# Parallel ranged GETs for WAV header pre-flight
+PREFLIGHT_WORKERS = int(os.environ.get('PREFLIGHT_WORKERS', '32'))
+
+# Transcribe standard batch price per audio minute (USD), for cost forecasting
+TRANSCRIBE_PRICE_PER_MINUTE = 0.024
+
 def lambda_handler(event, context):
     """
     Batch Preparation Lambda - Phase 1 Testing
@@ -10,13 +25,20 @@ def lambda_handler(event, context):
     Output: Array of call objects for Step Functions processing
     """
     
+    start_metrics('batch-prep')
+    start_call_log('batch-prep')
     try:
         # Get input parameters
         batch_folder = event.get('batch_folder', '')
         max_files = event.get('max_files', 15000)  # Production limit
+        # Passing a previous batch_id resumes that run from its checkpoints
+        resumed = bool(event.get('batch_id'))
+        batch_id = event.get('batch_id') or new_batch_id()
+        retry_in_flight = event.get('retry_in_flight', False)
         
-        print(f"🔍 Processing batch folder: {batch_folder}")
-        print(f"📊 Max files limit: {max_files} (production mode)")
+        set_properties(batch_id=batch_id, resumed=resumed)
+        bind(batch_id=batch_id)
+        info('🔍 Processing batch folder', batch_folder=batch_folder, resumed=resumed, max_files=max_files)
         
         # Parse S3 path
         if not batch_folder.startswith('s3://'):
@@ -30,75 +52,193 @@ def lambda_handler(event, context):
         bucket_name = s3_parts[0]
         prefix = s3_parts[1] if len(s3_parts) > 1 else ''
         
-        print(f"📁 Bucket: {bucket_name}, Prefix: {prefix}")
+        debug('📁 Listing', bucket=bucket_name, prefix=prefix)
+        
+        # Initialize AWS clients (connection pool sized for concurrent pre-flight reads)
+        s3 = get_client('s3', max_pool_connections=PREFLIGHT_WORKERS)
+        checkpoints_table = get_table(os.environ.get('CHECKPOINTS_TABLE', 'anycompany-batch-checkpoints-prod'))
         
-        # Initialize S3 client
-        s3 = boto3.client('s3')
+        # Load item states from the previous run so finished work is not re-billed
+        with stage('checkpoint_load'):
+            checkpoints = load_checkpoints(checkpoints_table, batch_id) if resumed else {}
+        if resumed:
+            info('♻️ Loaded checkpoints', checkpoints=len(checkpoints))
         
         # List audio files in the folder
         calls = []
+        skipped_files = 0
+        previously_rejected = 0
         paginator = s3.get_paginator('list_objects_v2')
         
-        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
-            if 'Contents' not in page:
-                continue
+        with stage('listing'):
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+                if 'Contents' not in page:
+                    continue
                 
-            for obj in page['Contents']:
-                key = obj['Key']
+                for obj in page['Contents']:
+                    key = obj['Key']
                 
-                # Only process .wav files
-                if not key.lower().endswith('.wav'):
-                    continue
+                    # Only process .wav files
+                    if not key.lower().endswith('.wav'):
+                        continue
                 
-                # Stop if we hit max files limit (for testing)
-                if len(calls) >= max_files:
-                    break
+                    # Stop if we hit max files limit (for testing)
+                    if len(calls) >= max_files:
+                        break
+                
+                    # Skip items a previous run of this batch already handled
+                    item_key = checkpoint_key(key, obj.get('ETag'))
+                    if should_skip(checkpoints.get(item_key), retry_in_flight):
+                        skipped_files += 1
+                        if checkpoints.get(item_key) == REJECTED:
+                            previously_rejected += 1
+                        continue
                 
-                # Extract filename
-                filename = key.split('/')[-1]
+                    # Extract filename
+                    filename = key.split('/')[-1]
                 
-                # Extract Genesys ID from filename
-                genesys_id = extract_genesys_id_from_filename(filename)
+                    # Extract Genesys ID from filename
+                    genesys_id = extract_genesys_id_from_filename(filename)
                 
-                # Create call object
-                call_obj = {
-                    'filename': filename,
-                    's3_key': key,
-                    'bucket': bucket_name,
-                    'genesys_id': genesys_id,
-                    'file_size': obj['Size'],
-                    'last_modified': obj['LastModified'].isoformat()
-                }
+                    # Create call object
+                    call_obj = {
+                        'filename': filename,
+                        's3_key': key,
+                        'bucket': bucket_name,
+                        'genesys_id': genesys_id,
+                        'batch_id': batch_id,
+                        'checkpoint_key': item_key,
+                        'file_size': obj['Size'],
+                        'last_modified': obj['LastModified'].isoformat()
+                    }
                 
-                calls.append(call_obj)
-                print(f"📄 Added: {filename} -> {genesys_id}")
+                    calls.append(call_obj)
+                    debug('📄 Added', filename=filename, genesys_id=genesys_id)
             
-            # Break outer loop if max reached
-            if len(calls) >= max_files:
-                break
+                # Break outer loop if max reached
+                if len(calls) >= max_files:
+                    break
+        
+        add_count('files_listed', len(calls) + skipped_files)
+        add_count('skipped_from_checkpoint', skipped_files)
+        
+        # Pre-flight: reject unusable audio before any Transcribe job is submitted
+        with stage('preflight'):
+            calls, rejected = preflight_calls(s3, calls)
+        with stage('checkpoint_write'):
+            for rejection in rejected:
+                mark_checkpoint(checkpoints_table, batch_id, rejection['checkpoint_key'], REJECTED)
+        add_count('rejected_files', len(rejected))
+        total_audio_seconds = sum(call['duration_seconds'] for call in calls)
+        
+        info('🩺 Pre-flight', accepted=len(calls), rejected=len(rejected), audio_minutes=round(total_audio_seconds / 60, 1))
+        
+        # Reference data for the whole manifest in bulk, so completion does no per-call lookups
+        with stage('reference_join'):
+            referenced = attach_references(s3, calls)
+        
+        # Register the batch so processing progress can be tracked without scanning calls
+        batches_table = get_table(os.environ.get('BATCHES_TABLE', 'anycompany-batches-prod'))
+        with stage('batch_start'):
+            # Rejected files count toward the total and as finished, on the first run and on resume alike
+            start_batch(batches_table, batch_id, len(calls) + len(rejected) + skipped_files, batch_folder, resumed,
+                        total_audio_seconds, rejected_calls=len(rejected) + previously_rejected)
         
         # Prepare response
         response = {
             'statusCode': 200,
             'batch_info': {
+                'batch_id': batch_id,
                 'batch_folder': batch_folder,
                 'total_files_found': len(calls),
+                'resumed': resumed,
+                'skipped_from_checkpoint': skipped_files,
+                'rejected_files': len(rejected),
+                'rejected_samples': rejected[:50],
+                'calls_with_reference': referenced,
+                'total_audio_seconds': round(total_audio_seconds, 1),
+                'estimated_transcribe_cost_usd': round(total_audio_seconds / 60 * TRANSCRIBE_PRICE_PER_MINUTE, 2),
                 'processing_timestamp': datetime.utcnow().isoformat(),
                 'max_files_limit': max_files
             },
             'calls': calls
         }
         
-        print(f"✅ Batch preparation complete: {len(calls)} files ready for processing")
+        info('✅ Batch preparation complete', ready=len(calls), skipped_from_checkpoint=skipped_files)
+        add_count('calls_accepted', len(calls))
+        add_bytes('manifest_bytes', len(json.dumps(response)))
         return response
         
     except Exception as e:
-        print(f"❌ Error in batch preparation: {str(e)}")
+        error('❌ Error in batch preparation', error=str(e))
         return {
             'statusCode': 500,
             'error': str(e),
             'batch_folder': event.get('batch_folder', 'unknown')
         }
+    finally:
+        flush_metrics()
+
+def preflight_calls(s3, calls):
+    """
+    Read each WAV header with a ranged GET (concurrently across the manifest)
+    and split the manifest into accepted calls and rejected files.
+    Accepted calls gain duration_seconds, channels and sample_rate.
+    """
+    def inspect(call):
+        try:
+            info = read_wav_header(s3, call['bucket'], call['s3_key'], call['file_size'])
+        except WavHeaderError as e:
+            return call, False, str(e), {}, None
+        except Exception as e:
+            return call, False, f'header read failed: {str(e)}', {}, None
+        accepted, reason, hints = assess_wav(info)
+        return call, accepted, reason, hints, info
+    
+    accepted_calls = []
+    rejected = []
+    with ThreadPoolExecutor(max_workers=PREFLIGHT_WORKERS) as executor:
+        for call, accepted, reason, hints, info in executor.map(inspect, calls):
+            if not accepted:
+                rejected.append({'s3_key': call['s3_key'], 'checkpoint_key': call['checkpoint_key'], 'reason': reason})
+                continue
+            call['duration_seconds'] = info['duration_seconds']
+            call['channels'] = info['channels']
+            call['sample_rate'] = info['sample_rate']
+            call.update(hints)
+            accepted_calls.append(call)
+    
+    return accepted_calls, rejected
+
+def attach_references(s3, calls):
+    """
+    Add each call's compact reference record as call['reference'] ({} when the
+    store has none). One pass over the manifest: batch_get_item requests with a
+    reference table, else one read of the reference files. On a lookup error
+    calls go without, and completion looks them up itself as before.
+    Returns the number of calls with a reference record.
+    """
+    genesys_call_ids = {call['genesys_id'] for call in calls if call.get('genesys_id')}
+    if not genesys_call_ids:
+        return 0
+    try:
+        table_name = reference_table_name()
+        if table_name:
+            references = get_references(get_resource('dynamodb'), table_name, genesys_call_ids)
+        else:
+            references = load_reference_index(s3, os.environ.get('INPUT_BUCKET_NAME', 'anycompany-input-prod-164543933824'))
+    except Exception as e:
+        warning('⚠️ Reference join failed, completion will look calls up', error=str(e))
+        add_count('reference_join_errors')
+        return 0
+    
+    referenced = 0
+    for call in calls:
+        record = references.get(call.get('genesys_id'))
+        call['reference'] = compact_reference(record) if record else {}
+        referenced += bool(record)
+    add_count('calls_with_reference', referenced)
+    return referenced
 
 def extract_genesys_id_from_filename(filename):
     """Extract Genesys Call ID from various filename patterns"""
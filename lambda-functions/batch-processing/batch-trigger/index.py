@@ -1,7 +1,14 @@
 import json
-import boto3
-import uuid
+import os
 from datetime import datetime
+from decimal import Decimal
+
+from shared.aws_clients import get_client, get_table
+from shared.batch_progress import track_batch_event
+from shared.call_log import bind, debug, error, info, start_call_log
+from shared.checkpoints import TRIGGERED, mark_checkpoint
+from shared.idempotency import derive_call_id, normalize_etag
+from shared.metrics import add_bytes, flush_metrics, set_properties, stage, start_metrics
 
 def lambda_handler(event, context):
     """
@@ -10,59 +17,95 @@ def lambda_handler(event, context):
     Output: Triggers existing SQS → Lambda flow without breaking anything
     """
     
+    start_metrics('batch-trigger', filename=event.get('filename'), batch_id=event.get('batch_id'))
+    start_call_log('batch-trigger', filename=event.get('filename'), batch_id=event.get('batch_id'), genesys_id=event.get('genesys_id'))
     try:
         # Extract call information from Step Functions
         filename = event.get('filename')
         s3_key = event.get('s3_key')
         bucket = event.get('bucket')
         genesys_id = event.get('genesys_id')
-        
-        print(f"🔄 Processing batch call: {filename} -> {genesys_id}")
+        batch_id = event.get('batch_id')
+        item_key = event.get('checkpoint_key')
         
         # Initialize AWS clients
-        s3 = boto3.client('s3')
-        dynamodb = boto3.resource('dynamodb')
-        calls_table = dynamodb.Table('anycompany-calls-prod')
+        s3 = get_client('s3')
+        calls_table = get_table('anycompany-calls-prod')
+        batches_table = get_table(os.environ.get('BATCHES_TABLE', 'anycompany-batches-prod'))
+        checkpoints_table = get_table(os.environ.get('CHECKPOINTS_TABLE', 'anycompany-batch-checkpoints-prod'))
         
-        # Generate unique call_id for this batch processing
-        call_id = str(uuid.uuid4())
+        # Copy file to the bulk lane prefix to trigger the existing flow
+        # without queueing ahead of interactive UI uploads in audio/
+        audio_key = f"audio-batch/{filename}"
         
-        print(f"📝 Generated call_id: {call_id}")
+        copy_source = {
+            'Bucket': bucket,
+            'Key': s3_key
+        }
         
-        # Create DynamoDB record (same as existing processor Lambda)
-        calls_table.put_item(
-            Item={
-                'call_id': call_id,
-                'filename': filename,
-                'genesys_call_id': genesys_id,
-                'processing_status': 'transcribing',
-                'upload_type': 'batch_stepfunctions',
-                'batch_processing': True,
-                'created_at': datetime.utcnow().isoformat(),
-                's3_bucket': bucket,
-                's3_key': s3_key
-            }
-        )
+        with stage('copy'):
+            copy_response = s3.copy_object(
+                CopySource=copy_source,
+                Bucket=bucket,
+                Key=audio_key
+            )
+        etag = copy_response['CopyObjectResult']['ETag']
+        add_bytes('audio_bytes', event.get('file_size'))
         
-        print(f"✅ Created DynamoDB record for batch call")
+        debug('📁 Copied to the bulk lane prefix', s3_key=s3_key, audio_key=audio_key)
         
-        # Copy file to audio/ folder to trigger existing flow
-        # This mimics the UI upload process
-        audio_key = f"audio/{filename}"
+        # Derive the same call_id the processor computes for the copied object,
+        # so retries of this task and the processor share one DynamoDB record
+        call_id = derive_call_id(bucket, audio_key, etag)
+        set_properties(call_id=call_id)
+        bind(call_id=call_id)
         
-        copy_source = {
-            'Bucket': bucket,
-            'Key': s3_key
+        update_expression = ('SET filename = :filename, genesys_call_id = :genesys_id, upload_type = :upload_type, '
+                             'batch_processing = :batch_processing, batch_id = :batch_id, checkpoint_key = :checkpoint_key, s3_bucket = :bucket, s3_key = :s3_key, s3_etag = :etag, '
+                             'audio_duration_seconds = :duration, audio_channels = :channels, '
+                             'processing_status = if_not_exists(processing_status, :processing_status), '
+                             'created_at = if_not_exists(created_at, :created_at)')
+        values = {
+            ':filename': filename,
+            ':genesys_id': genesys_id,
+            ':upload_type': 'batch_stepfunctions',
+            ':batch_processing': True,
+            ':batch_id': batch_id,
+            ':checkpoint_key': item_key,
+            ':bucket': bucket,
+            ':s3_key': s3_key,
+            ':etag': normalize_etag(etag),
+            ':duration': Decimal(str(event.get('duration_seconds', 0))),
+            ':channels': event.get('channels', 1),
+            ':processing_status': 'transcribing',
+            ':created_at': datetime.utcnow().isoformat()
         }
+        # Reference data joined by batch prep ({} = none on file): completion reads it from the record
+        if 'reference' in event:
+            update_expression += ', reference_data = :reference'
+            values[':reference'] = json.loads(json.dumps(event['reference']), parse_float=Decimal)
         
-        s3.copy_object(
-            CopySource=copy_source,
-            Bucket=bucket,
-            Key=audio_key
-        )
+        # Upsert batch metadata - the processor may already have claimed the record
+        with stage('metadata_update'):
+            update_response = calls_table.update_item(
+                Key={'call_id': call_id},
+                UpdateExpression=update_expression,
+                ExpressionAttributeValues=values,
+                ReturnValues='ALL_OLD'
+            )
+        previous = update_response.get('Attributes', {})
         
-        print(f"📁 Copied {s3_key} -> {audio_key}")
-        print(f"🚀 Triggered existing processing flow via S3 upload")
+        info('✅ Recorded batch metadata, processing triggered')
+        
+        with stage('progress'):
+            mark_checkpoint(checkpoints_table, batch_id, item_key, TRIGGERED, call_id)
+            
+            # Count each call once: a Step Functions retry finds batch_id already set
+            if previous.get('batch_id') != batch_id:
+                track_batch_event(batches_table, batch_id, 'submitted')
+                # Processor claimed the job before batch metadata arrived - it could not attribute it
+                if previous.get('transcription_job_name'):
+                    track_batch_event(batches_table, batch_id, 'transcribing')
         
         # Return success response for Step Functions
         return {
@@ -70,16 +113,19 @@ def lambda_handler(event, context):
             'call_id': call_id,
             'filename': filename,
             'genesys_id': genesys_id,
+            'batch_id': batch_id,
             'processing_status': 'triggered',
             'audio_key': audio_key,
             'timestamp': datetime.utcnow().isoformat()
         }
         
     except Exception as e:
-        print(f"❌ Error processing batch call: {str(e)}")
+        error('❌ Error processing batch call', error=str(e))
         return {
             'statusCode': 500,
             'error': str(e),
             'filename': event.get('filename', 'unknown'),
             'genesys_id': event.get('genesys_id', 'unknown')
-        }
\ No newline at end of file
+        }
+    finally:
+        flush_metrics()
\ No newline at end of file
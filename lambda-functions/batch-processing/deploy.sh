@@ -0,0 +1,21 @@
+#!/bin/bash
+
+echo "🏭 Deploying Batch Processing Functions..."
+
+for function in batch-prep batch-trigger rescore reference-loader; do
+  # Create deployment package
+  (cd $function && zip -r ../$function.zip index.py)
+
+  # Bundle shared helpers at the package root
+  (cd .. && zip -r batch-processing/$function.zip shared -x "*/__pycache__/*")
+
+  # Update Lambda function
+  aws lambda update-function-code \
+    --function-name anycompany-$function-prod \
+    --zip-file fileb://$function.zip
+
+  # Clean up
+  rm $function.zip
+done
+
+echo "✅ Batch processing functions deployed successfully!"
@@ -0,0 +1,204 @@
+import codecs
+import csv
+import json
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from decimal import Decimal
+from urllib.parse import unquote_plus
+
+from shared.aws_clients import get_client, get_thread_resource
+from shared.call_log import error, info, start_call_log, warning
+from shared.dynamodb_batch import batch_write_items
+from shared.metrics import add_count, flush_metrics, set_properties, stage, start_metrics
+from shared.reference_data import REFERENCE_KEY, reference_record
+from shared.suppression import (
+    SUPPRESSION_PREFIX,
+    build_index,
+    current_generation,
+    identifier_keys,
+    list_name_of,
+    normalize_account,
+    normalize_phone,
+    prune_generations
+)
+
+# Parallel batch_write_item writers
+LOADER_WRITERS = int(os.environ.get('LOADER_WRITERS', '16'))
+
+# Items handed to a writer at a time (20 batch_write_item requests of 25)
+LOADER_CHUNK_ITEMS = int(os.environ.get('LOADER_CHUNK_ITEMS', '500'))
+
+UPLOAD_SUFFIXES = ('.csv', '.jsonl', '.json')
+
+def lambda_handler(event, context):
+    """
+    Load reference uploads into the reference table, and rebuild the suppression
+    index of a list when a file under suppression/<list>/ is uploaded
+    Input: S3 ObjectCreated records (uploads under reference/ or suppression/), or {"key": ..., "bucket": ...}
+    Output: records read, written and failed per file; identifiers per rebuilt list
+    """
+
+    start_metrics('reference-loader')
+    start_call_log('reference-loader')
+    try:
+        table_name = os.environ['REFERENCE_TABLE']
+        if event.get('Records'):
+            objects = [(record['s3']['bucket']['name'], unquote_plus(record['s3']['object']['key'])) for record in event['Records']]
+        else:
+            objects = [(event.get('bucket') or os.environ['INPUT_BUCKET_NAME'], event['key'])]
+
+        s3 = get_client('s3')
+        files = []
+        lists = {}
+        for bucket, key in objects:
+            if key.startswith(SUPPRESSION_PREFIX):
+                list_name = list_name_of(key)
+                if not list_name:
+                    warning('⚠️ Unknown suppression list, skipping', key=key)
+                elif (bucket, list_name) not in lists:
+                    # Several files of one list in the same event: rebuild once
+                    lists[(bucket, list_name)] = rebuild_suppression_list(s3, bucket, list_name)
+                continue
+            if not key.lower().endswith(UPLOAD_SUFFIXES):
+                info('⏭️ Not a reference upload, skipping', key=key)
+                continue
+            files.append(dict(load_reference_file(s3, table_name, bucket, key), key=key))
+
+        failed = sum(result['failed'] for result in files)
+        return {
+            'statusCode': 500 if failed else 200,
+            'files': files,
+            'suppression_lists': [dict(result, list=list_name) for (_, list_name), result in lists.items()],
+            'processing_timestamp': datetime.utcnow().isoformat()
+        }
+
+    except Exception as e:
+        error('❌ Error loading reference data', error=str(e))
+        return {'statusCode': 500, 'error': str(e)}
+    finally:
+        flush_metrics()
+
+def load_reference_file(s3, table_name, bucket, key):
+    """
+    Stream one upload into the table. Chunks go to a pool of writers as they are
+    parsed, with a bounded number in flight, so a file of millions of rows never
+    sits in memory at once.
+    """
+    set_properties(source_key=key)
+    info('📥 Loading reference upload', bucket=bucket, key=key)
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    loaded_at = datetime.utcnow().isoformat()
+
+    counts = Counter()
+    with stage('reference_load'), ThreadPoolExecutor(max_workers=LOADER_WRITERS) as executor:
+        in_flight = set()
+
+        def collect(done):
+            for future in done:
+                written, failed = future.result()
+                counts['written'] += written
+                counts['failed'] += failed
+
+        chunk = []
+        for genesys_call_id, fields in read_upload(key, body):
+            if not genesys_call_id:
+                counts['skipped'] += 1
+                continue
+            item = reference_record(fields)
+            item.update({REFERENCE_KEY: str(genesys_call_id), 'source_key': key, 'loaded_at': loaded_at})
+            chunk.append(item)
+            counts['records'] += 1
+            if len(chunk) >= LOADER_CHUNK_ITEMS:
+                if len(in_flight) >= LOADER_WRITERS * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(write_chunk, table_name, chunk))
+                chunk = []
+        if chunk:
+            in_flight.add(executor.submit(write_chunk, table_name, chunk))
+        collect(in_flight)
+
+    for name in ('records', 'written', 'failed', 'skipped'):
+        add_count(f'reference_{name}', counts[name])
+    if counts['failed']:
+        warning('⚠️ Reference records not written', key=key, failed=counts['failed'])
+    info('✅ Reference upload loaded', key=key, **dict(counts))
+    return {name: counts[name] for name in ('records', 'written', 'failed', 'skipped')}
+
+def write_chunk(table_name, chunk):
+    """(written, failed) for one chunk; a key repeated in the chunk keeps its last row"""
+    items = list({item[REFERENCE_KEY]: item for item in chunk}.values())
+    unwritten = batch_write_items(get_thread_resource('dynamodb'), table_name, items)
+    return len(items) - len(unwritten), len(unwritten)
+
+def read_upload(key, body):
+    """
+    (genesys_call_id, fields) for every record of an upload:
+    - .csv: a header row with a genesys_call_id column
+    - .jsonl: one object per line with a genesys_call_id field
+    - .json: {"calls": {id: {...}}} (master_reference.json), {"voicemails": {id: {...}}}
+      or a list of objects with a genesys_call_id field
+    """
+    name = key.lower()
+    if name.endswith('.json'):
+        # A JSON document has to be parsed whole; use CSV or JSON Lines for large lists
+        document = json.loads(body.read(), parse_float=Decimal)
+        if isinstance(document, list):
+            for fields in document:
+                yield fields.get(REFERENCE_KEY), fields
+            return
+        for section in ('calls', 'voicemails'):
+            for genesys_call_id, fields in (document.get(section) or {}).items():
+                yield genesys_call_id, fields
+        return
+
+    lines = codecs.getreader('utf-8-sig')(body)
+    if name.endswith('.csv'):
+        for row in csv.DictReader(lines):
+            fields = {column.strip(): value.strip() for column, value in row.items() if column and value is not None}
+            yield fields.get(REFERENCE_KEY), fields
+    else:
+        for line in lines:
+            if line.strip():
+                fields = json.loads(line, parse_float=Decimal)
+                yield fields.get(REFERENCE_KEY), fields
+
+def rebuild_suppression_list(s3, bucket, list_name):
+    """Re-read every file of a list and write a new generation of its index"""
+    prefix = f'{SUPPRESSION_PREFIX}{list_name}/'
+    identifiers = set()
+    files = 0
+    with stage('suppression_read'):
+        for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+            for entry in page.get('Contents', []):
+                body = s3.get_object(Bucket=bucket, Key=entry['Key'])['Body']
+                identifiers.update(read_identifiers(entry['Key'], body))
+                files += 1
+    with stage('suppression_build'):
+        previous = current_generation(s3, bucket, list_name)
+        bloom = build_index(s3, bucket, list_name, identifiers)
+        prune_generations(s3, bucket, list_name, {bloom.generation, previous})
+    add_count('suppression_identifiers', len(identifiers))
+    info('🚫 Suppression index rebuilt', list=list_name, files=files, identifiers=len(identifiers),
+         filter_bytes=len(bloom.bits), hashes=bloom.hashes)
+    return {'files': files, 'identifiers': len(identifiers), 'filter_bytes': len(bloom.bits)}
+
+def read_identifiers(key, body):
+    """
+    Normalized identifiers of a suppression file: CSV with phone_number and/or
+    account_id columns, otherwise one phone number or account ID per line
+    """
+    lines = codecs.getreader('utf-8-sig')(body)
+    if key.lower().endswith('.csv'):
+        for row in csv.DictReader(lines):
+            yield from identifier_keys({(column or '').strip().lower(): value for column, value in row.items()})
+        return
+    for line in lines:
+        value = line.strip()
+        if value:
+            # Phone numbers are digits and punctuation; anything with a letter is an account
+            key = normalize_account(value) if any(char.isalpha() for char in value) else normalize_phone(value)
+            if key:
+                yield key
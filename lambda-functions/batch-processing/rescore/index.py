@@ -0,0 +1,257 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+from shared.aws_clients import get_client, get_table, get_thread_resource, get_thread_table
+from shared.call_log import error, info, start_call_log, warning
+from shared.entity_plan import required_entity_types
+from shared.metrics import add_count, flush_metrics, set_properties, stage, start_metrics
+from shared.reference_data import get_references, load_reference_index, reference_table_name
+from shared.rule_dsl import AGENT_SCOPE, CallContext, RuleSyntaxError, compile_rule, violation_record
+from shared.suppression import suppressed_flags, suppression_index
+
+# Parallel scan segments, one worker thread each
+RESCORE_SEGMENTS = int(os.environ.get('RESCORE_SEGMENTS', '8'))
+
+# Apply suppression list membership as the completion handler does (SUPPRESSION_INDEX)
+SUPPRESSION_INDEX = os.environ.get('SUPPRESSION_INDEX', 'false').lower() == 'true'
+
+# Stop taking new scan pages when this much of the Lambda timeout is left
+TIME_RESERVE_SECONDS = 60
+
+# Only what re-scoring reads; the entity and transcript attributes are the large ones
+CALL_PROJECTION = 'call_id, transcript, agent_transcript, entities, violations, genesys_call_id'
+
+def convert_floats_to_decimals(obj):
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    elif isinstance(obj, dict):
+        return {k: convert_floats_to_decimals(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_floats_to_decimals(v) for v in obj]
+    return obj
+
+def lambda_handler(event, context):
+    """
+    Re-score stored calls after rules change - no Transcribe or Comprehend calls
+    Input: {"rule_ids": [...]} (omit to re-run every rule), optional "segments",
+           "dry_run" and "resume" (from a previous partial run)
+    Output: counts, plus "next_event" to invoke again with while "complete" is false
+    """
+
+    start_metrics('rescore')
+    start_call_log('rescore')
+    try:
+        rule_ids = event.get('rule_ids')
+        total_segments = int(event.get('segments', RESCORE_SEGMENTS))
+        dry_run = event.get('dry_run', False)
+        # Segment -> LastEvaluatedKey; segments missing from a resumed run are finished
+        resume = event.get('resume')
+        segments = sorted(int(segment) for segment in resume) if resume else list(range(total_segments))
+
+        set_properties(rule_ids=rule_ids, segments=total_segments, resumed=bool(resume), dry_run=dry_run)
+        info('🔁 Re-scoring stored calls', rule_ids=rule_ids, segments=len(segments), dry_run=dry_run)
+
+        # Rules and reference data are loaded once and shared by every worker
+        with stage('rules_scan'):
+            plan = load_rescore_plan(get_table(os.environ['RULES_TABLE']), rule_ids)
+        s3 = get_client('s3', max_pool_connections=total_segments)
+        references = None
+        if not reference_table_name():
+            with stage('reference_fetch'):
+                references = load_reference_index(s3, os.environ.get('INPUT_BUCKET_NAME', 'anycompany-input-prod-164543933824'))
+
+        deadline = None
+        if context is not None:
+            deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - TIME_RESERVE_SECONDS
+
+        with stage('rescore'):
+            with ThreadPoolExecutor(max_workers=len(segments) or 1) as executor:
+                futures = {
+                    segment: executor.submit(
+                        rescore_segment, segment, total_segments, (resume or {}).get(str(segment)),
+                        plan, references, s3, dry_run, deadline
+                    )
+                    for segment in segments
+                }
+                totals = Counter()
+                unfinished = {}
+                for segment, future in futures.items():
+                    counts, last_key = future.result()
+                    totals.update(counts)
+                    if last_key:
+                        unfinished[str(segment)] = last_key
+
+        for name, value in totals.items():
+            add_count(name, value)
+
+        response = {
+            'statusCode': 200,
+            'complete': not unfinished,
+            'rule_ids': sorted(plan['rule_ids']),
+            'dry_run': dry_run,
+            'counts': dict(totals),
+            'processing_timestamp': datetime.utcnow().isoformat()
+        }
+        if unfinished:
+            response['next_event'] = dict(event, segments=total_segments, resume=unfinished)
+
+        info('✅ Re-scoring pass complete' if not unfinished else '⏸️ Re-scoring paused before timeout',
+             unfinished_segments=len(unfinished), **dict(totals))
+        return response
+
+    except RuleSyntaxError as e:
+        # A rule that does not compile must not wipe existing violations
+        error('❌ Rule does not compile', error=str(e))
+        return {'statusCode': 400, 'error': str(e)}
+    except Exception as e:
+        error('❌ Error re-scoring calls', error=str(e))
+        return {'statusCode': 500, 'error': str(e)}
+    finally:
+        flush_metrics()
+
+def load_rescore_plan(rules_table, rule_ids=None):
+    """
+    Compiled active rules to re-run. Every requested rule is replaced in each
+    call's violations, so a deactivated or deleted rule's violations are removed.
+    """
+    rules = []
+    scan_kwargs = {}
+    while True:
+        response = rules_table.scan(**scan_kwargs)
+        rules.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    requested = set(rule_ids) if rule_ids else {rule['rule_id'] for rule in rules}
+    selected = [rule for rule in rules if rule['rule_id'] in requested and rule.get('active')]
+    active = [compile_rule(rule) for rule in selected]
+    for compiled in active:
+        if compiled.rejected_patterns:
+            warning('⚠️ Rule runs without its rejected patterns', rule_id=compiled.rule_id,
+                    rejected=list(compiled.rejected_patterns))
+    return {'rule_ids': requested, 'rules': active, 'entity_types': required_entity_types(selected)}
+
+def rescore_segment(segment, total_segments, start_key, plan, references, s3, dry_run, deadline):
+    """Page through one parallel-scan segment; returns (counts, LastEvaluatedKey if stopped early)"""
+    calls_table = get_thread_table(os.environ['CALLS_TABLE'])
+    counts = Counter()
+    scan_kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'FilterExpression': '#status = :completed',
+        'ProjectionExpression': CALL_PROJECTION,
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {':completed': 'completed'}
+    }
+
+    while True:
+        if start_key:
+            scan_kwargs['ExclusiveStartKey'] = start_key
+        page = calls_table.scan(**scan_kwargs)
+        counts['calls_scanned'] += page.get('Count', 0)
+
+        page_references = references
+        if page_references is None:
+            # Reference table: one batch read for the page's calls
+            page_references = get_references(get_thread_resource('dynamodb'), reference_table_name(),
+                                             {call.get('genesys_call_id') for call in page.get('Items', [])})
+            counts['reference_reads'] += 1
+
+        for call in page.get('Items', []):
+            try:
+                rescore_call(calls_table, call, plan, page_references, s3, dry_run, counts)
+            except Exception as e:
+                counts['call_errors'] += 1
+                warning('⚠️ Could not re-score call', call_id=call.get('call_id'), error=str(e))
+
+        start_key = page.get('LastEvaluatedKey')
+        if not start_key:
+            return counts, None
+        if deadline is not None and time.monotonic() > deadline:
+            return counts, start_key
+
+def rescore_call(calls_table, call, plan, references, s3, dry_run, counts):
+    """Re-run the plan's rules on one stored call and merge the result into its violations"""
+    call_id = call['call_id']
+    transcript = call.get('transcript')
+    if transcript is None:
+        transcript = read_stored_transcript(s3, call)
+        if transcript is None:
+            counts['calls_without_transcript'] += 1
+            return
+
+    entities = call.get('entities') or {}
+    extracted = entities.get('extracted_types')
+    if extracted is not None and not plan['entity_types'].issubset(extracted):
+        # Extracted while no rule needed these lists; the rules see them empty
+        counts['calls_missing_entities'] += 1
+
+    ref_data = references.get(call.get('genesys_call_id')) or {}
+    if SUPPRESSION_INDEX and ref_data:
+        # Picks up suppression lists uploaded since the call was scored
+        flags = suppressed_flags(suppression_index(s3, os.environ.get('INPUT_BUCKET_NAME', 'anycompany-input-prod-164543933824')), ref_data)
+        if flags:
+            counts['calls_suppressed'] += 1
+            ref_data = dict(ref_data, suppression_lists=flags, **dict.fromkeys(flags, True))
+    context = CallContext(transcript, ref_data, entities)
+    # Calls analysed on agent speech only are re-scored the same way (no word timings are stored)
+    agent_context = CallContext(call['agent_transcript'], ref_data, entities) if call.get('agent_transcript') is not None else None
+    previous = call.get('violations') or []
+    fired = {
+        compiled.rule_id: compiled.rule for compiled in plan['rules']
+        if compiled.evaluate(agent_context if agent_context and compiled.scope == AGENT_SCOPE else context)
+    }
+
+    # Violations of rules outside the plan are left exactly as they are
+    merged = []
+    for violation in previous:
+        code = violation.get('code')
+        if code not in plan['rule_ids']:
+            merged.append(violation)
+        elif code in fired:
+            # Still violated: keep the original detection, refresh what the rule edit may have changed
+            rule = fired.pop(code)
+            merged.append(dict(violation, severity=rule.get('severity', 'minor'),
+                               comment=rule.get('description', 'Rule violation detected')))
+    for rule in fired.values():
+        merged.append(convert_floats_to_decimals(violation_record(rule, call_id)))
+
+    previous_codes = {violation.get('code') for violation in previous}
+    merged_codes = {violation.get('code') for violation in merged}
+    counts['violations_added'] += len(merged_codes - previous_codes)
+    counts['violations_removed'] += len(previous_codes - merged_codes)
+    if merged == previous:
+        return
+
+    counts['calls_changed'] += 1
+    if dry_run:
+        return
+    calls_table.update_item(
+        Key={'call_id': call_id},
+        UpdateExpression='SET violations = :violations, rescored_at = :rescored_at',
+        ConditionExpression='#status = :completed',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={
+            ':violations': merged,
+            ':rescored_at': datetime.utcnow().isoformat(),
+            ':completed': 'completed'
+        }
+    )
+
+def read_stored_transcript(s3, call):
+    """Plain-text transcript saved by the completion handler, for records without one"""
+    genesys_call_id = call.get('genesys_call_id')
+    if genesys_call_id and genesys_call_id != 'unknown':
+        key = f"transcripts/genesys-id/{genesys_call_id}.txt"
+    else:
+        key = f"transcripts/plain/{call['call_id']}.txt"
+    try:
+        response = s3.get_object(Bucket=os.environ['TRANSCRIBE_OUTPUT_BUCKET'], Key=key)
+    except Exception:
+        return None
+    return response['Body'].read().decode('utf-8')
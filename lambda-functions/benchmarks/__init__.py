@@ -0,0 +1,5 @@
+"""Offline benchmarks for the compliance Lambdas.
+
+Run from ``lambda-functions/`` with ``python -m benchmarks.<module>``; nothing
+here is bundled into a deployment package.
+"""
@@ -0,0 +1,146 @@
+"""
+Cold-start and client-overhead benchmark.
+
+  * init: import time of each handler module in a fresh interpreter (the part
+    of a cold start the code controls), median of --cold-runs
+  * construction: cost of boto3.client()/boto3.resource() per service, cold
+    (first, loads the service model) and repeat (what a per-invocation client
+    used to cost on a warm container). Needs real boto3; skipped otherwise
+  * clients per invocation: boto3 constructions counted by the fakes while the
+    pipeline benchmark runs, per stage
+
+    cd lambda-functions
+    python -m benchmarks.cold_start_benchmark
+    python -m benchmarks.cold_start_benchmark --cold-runs 10 --calls 500 --json
+
+Run it on an older checkout (with this benchmarks/ directory copied in) to get
+the before numbers.
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.fake_aws import FakeAWS, FaultProfile
+from benchmarks.pipeline_benchmark import HANDLERS, LAMBDA_ROOT, handler_environment, load_handler, run_benchmark
+
+SERVICES = ['s3', 'sqs', 'transcribe', 'comprehend', 'dynamodb']
+CONSTRUCTION_REPEATS = 20
+
+
+def real_boto3_available():
+    return importlib.util.find_spec('boto3') is not None
+
+
+def child_import(name):
+    """Runs in a fresh interpreter: time importing one handler module"""
+    os.environ.update(handler_environment(200))
+    sys.path.insert(0, LAMBDA_ROOT)
+    backend = contextlib.nullcontext() if real_boto3_available() else FakeAWS().installed()
+    with backend:
+        started = time.perf_counter()
+        load_handler(name, HANDLERS[name])
+        elapsed = time.perf_counter() - started
+    print(json.dumps({'handler': name, 'import_ms': round(elapsed * 1000, 2)}))
+
+
+def measure_init(cold_runs):
+    results = {}
+    for name in HANDLERS:
+        samples = []
+        for _ in range(cold_runs):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.cold_start_benchmark', '--child', name],
+                cwd=LAMBDA_ROOT, capture_output=True, text=True, check=True
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1])['import_ms'])
+        results[name] = {'median_ms': round(statistics.median(samples), 2), 'max_ms': max(samples)}
+    return results
+
+
+def measure_construction():
+    """ms per boto3 construction: first (model load) and repeat (per-invocation cost when not cached)"""
+    if not real_boto3_available():
+        return None
+    import boto3
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    results = {}
+    for service in SERVICES:
+        create = (lambda: boto3.resource(service)) if service == 'dynamodb' else (lambda: boto3.client(service))
+        started = time.perf_counter()
+        create()
+        first_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        for _ in range(CONSTRUCTION_REPEATS):
+            create()
+        repeat_ms = (time.perf_counter() - started) * 1000 / CONSTRUCTION_REPEATS
+        results['dynamodb.resource' if service == 'dynamodb' else service] = {
+            'first_ms': round(first_ms, 2), 'repeat_ms': round(repeat_ms, 2)
+        }
+    return results
+
+
+def measure_clients_per_invocation(calls):
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        report = run_benchmark(calls, FaultProfile())
+    return {
+        stage['stage']: {
+            'items': stage['items'],
+            'clients_created': stage['clients_created'],
+            'per_item': round(stage['clients_created'] / stage['items'], 3) if stage['items'] else None
+        }
+        for stage in report['stages']
+    }
+
+
+def print_report(report):
+    print(f"\n🧊 Handler import time ({report['backend']}, median of {report['cold_runs']} fresh interpreters)")
+    for name, result in report['init'].items():
+        print(f"   {name:<24} {result['median_ms']:>8.1f} ms  (max {result['max_ms']:.1f})")
+
+    print('\n🔧 boto3 construction cost')
+    if report['construction'] is None:
+        print('   skipped: boto3 is not installed here')
+    else:
+        for service, result in report['construction'].items():
+            print(f"   {service:<24} first {result['first_ms']:>8.2f} ms   repeat {result['repeat_ms']:>7.2f} ms")
+
+    print(f"\n📦 Client constructions during a {report['calls']}-call pipeline run")
+    for stage, result in report['clients_per_invocation'].items():
+        print(f"   {stage:<24} {result['clients_created']:>8} total  {result['per_item'] or 0:>8.3f} per item")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Handler init time and per-invocation client overhead')
+    parser.add_argument('--cold-runs', type=int, default=5)
+    parser.add_argument('--calls', type=int, default=200, help='pipeline calls for the construction count')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    if args.child:
+        child_import(args.child)
+        return
+
+    report = {
+        'backend': 'boto3' if real_boto3_available() else 'fake boto3',
+        'cold_runs': args.cold_runs,
+        'calls': args.calls,
+        'init': measure_init(args.cold_runs),
+        'construction': measure_construction(),
+        'clients_per_invocation': measure_clients_per_invocation(args.calls)
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,999 @@
+"""
+In-process stand-ins for the AWS services the Lambdas call (S3, DynamoDB, SQS,
+Transcribe, Comprehend), for measuring pipeline throughput without an account.
+
+Every API call is counted per service.operation and can be slowed down, throttled
+or failed through a FaultProfile. Response shapes follow the real APIs closely
+enough for the handlers to run unmodified; they are not a full emulation.
+"""
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types
+import zlib
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+
+THROTTLE_CODES = {
+    's3': 'SlowDown',
+    'dynamodb': 'ProvisionedThroughputExceededException',
+    'sqs': 'ThrottlingException',
+    'transcribe': 'LimitExceededException',
+    'comprehend': 'ThrottlingException'
+}
+
+ERROR_CODES = {
+    's3': 'InternalError',
+    'dynamodb': 'InternalServerError',
+    'sqs': 'ServiceUnavailable',
+    'transcribe': 'InternalFailureException',
+    'comprehend': 'InternalServerException'
+}
+
+# Comprehend synchronous APIs reject documents over 5000 UTF-8 bytes
+COMPREHEND_MAX_BYTES = 5000
+COMPREHEND_BATCH_SIZE = 25
+
+LIST_PAGE_SIZE = 1000
+# DynamoDB pages at 1 MB; approximated as a fixed item count
+SCAN_PAGE_ITEMS = 1000
+
+
+class FakeClientError(Exception):
+    """Shaped like botocore's ClientError so the repo's error handling sees the same .response"""
+
+    def __init__(self, code, operation, message=''):
+        super().__init__(f'An error occurred ({code}) when calling the {operation} operation: {message}')
+        self.response = {'Error': {'Code': code, 'Message': message}}
+        self.operation_name = operation
+
+
+class FakeConfig:
+    """Accepts botocore.config.Config arguments; connection pools do not apply in-process"""
+
+    def __init__(self, **kwargs):
+        self.options = kwargs
+
+
+class FaultProfile:
+    """
+    Per-service latency (ms), throttle rate and error rate. Each value is either a
+    number applied to every service or a {service: value} dict.
+    """
+
+    def __init__(self, latency_ms=0, throttle_rate=0.0, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _value(setting, service):
+        if isinstance(setting, dict):
+            return setting.get(service, setting.get('all', 0))
+        return setting
+
+    def apply(self, service, operation):
+        latency = self._value(self.latency_ms, service)
+        if latency:
+            time.sleep(latency / 1000.0)
+
+        with self._lock:
+            roll = self._random.random()
+        throttle_rate = self._value(self.throttle_rate, service)
+        if roll < throttle_rate:
+            raise FakeClientError(THROTTLE_CODES[service], operation, 'Rate exceeded')
+        if roll < throttle_rate + self._value(self.error_rate, service):
+            raise FakeClientError(ERROR_CODES[service], operation, 'Injected failure')
+
+
+class FakeAWS:
+    """Container for the fake services plus the API call counters"""
+
+    def __init__(self, faults=None, table_keys=None):
+        self.faults = faults or FaultProfile()
+        self.api_calls = Counter()
+        # boto3.client()/boto3.resource() constructions, by service
+        self.clients_created = Counter()
+        self._lock = threading.Lock()
+        self.s3 = FakeS3(self)
+        self.dynamodb = FakeDynamoDB(self, table_keys or {})
+        self.sqs = FakeSQS(self)
+        self.transcribe = FakeTranscribe(self)
+        self.comprehend = FakeComprehend(self)
+
+    def record(self, service, operation):
+        with self._lock:
+            self.api_calls[f'{service}.{operation}'] += 1
+        self.faults.apply(service, operation)
+
+    def client(self, service_name, *args, **kwargs):
+        clients = {
+            's3': self.s3,
+            'sqs': self.sqs,
+            'transcribe': self.transcribe,
+            'comprehend': self.comprehend,
+            'dynamodb': self.dynamodb
+        }
+        if service_name not in clients:
+            raise ValueError(f'No fake for service {service_name}')
+        with self._lock:
+            self.clients_created[service_name] += 1
+        return clients[service_name]
+
+    def resource(self, service_name, *args, **kwargs):
+        if service_name != 'dynamodb':
+            raise ValueError(f'No fake resource for service {service_name}')
+        with self._lock:
+            self.clients_created[f'{service_name}.resource'] += 1
+        return self.dynamodb
+
+    @contextmanager
+    def installed(self):
+        """Route boto3.client/boto3.resource (and botocore.config.Config) to these fakes"""
+        module_names = ('boto3', 'botocore', 'botocore.config')
+        saved = {name: sys.modules.get(name) for name in module_names}
+
+        boto3 = types.ModuleType('boto3')
+        boto3.client = self.client
+        boto3.resource = self.resource
+        botocore = types.ModuleType('botocore')
+        botocore_config = types.ModuleType('botocore.config')
+        botocore_config.Config = FakeConfig
+        botocore.config = botocore_config
+
+        sys.modules.update({'boto3': boto3, 'botocore': botocore, 'botocore.config': botocore_config})
+        # Clients cached by shared.aws_clients belong to whichever backend created them
+        _reset_client_registry()
+        try:
+            yield self
+        finally:
+            for name, module in saved.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+            _reset_client_registry()
+
+
+def _reset_client_registry():
+    registry = sys.modules.get('shared.aws_clients')
+    if registry is not None:
+        registry.reset_clients()
+
+
+# S3
+
+class FakeBody:
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def read(self, amount=None):
+        if amount is None:
+            chunk = self._data[self._position:]
+        else:
+            chunk = self._data[self._position:self._position + amount]
+        self._position += len(chunk)
+        return chunk
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class FakeObject:
+    """Stored bytes, or a generator so large synthetic batches do not sit in memory"""
+
+    def __init__(self, data=None, generator=None, size=None, etag=None, content_type=None):
+        self._data = data
+        self._generator = generator
+        self.size = len(data) if data is not None else size
+        self._etag = etag
+        self.content_type = content_type
+        self.last_modified = datetime.now(timezone.utc)
+
+    def data(self):
+        return self._data if self._data is not None else self._generator()
+
+    @property
+    def etag(self):
+        if self._etag is None:
+            self._etag = hashlib.md5(self.data()).hexdigest()
+        return self._etag
+
+
+class FakePaginator:
+    def __init__(self, method):
+        self._method = method
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self._method(**kwargs)
+            yield page
+            if not page.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = page['NextContinuationToken']
+
+
+class FakeS3:
+    def __init__(self, aws):
+        self._aws = aws
+        self._buckets = {}
+        self._notifications = []
+        self._lock = threading.Lock()
+
+    # Harness helpers (not counted as API calls)
+
+    def add_object(self, bucket, key, data=None, generator=None, size=None, etag=None):
+        self._buckets.setdefault(bucket, {})[key] = FakeObject(data, generator, size, etag)
+
+    def notify(self, bucket, prefix, suffix, callback):
+        """Deliver an S3 event record for new objects matching prefix/suffix"""
+        self._notifications.append((bucket, prefix, suffix, callback))
+
+    def write_service_output(self, bucket, key, data, content_type=None):
+        """An object written by another AWS service (Transcribe output): no faults, still notifies"""
+        self._store(bucket, key, FakeObject(data, content_type=content_type))
+
+    def peek(self, bucket, key):
+        stored = self._buckets.get(bucket, {}).get(key)
+        return stored.data() if stored else None
+
+    def _store(self, bucket, key, stored):
+        with self._lock:
+            self._buckets.setdefault(bucket, {})[key] = stored
+        record = {
+            'eventSource': 'aws:s3',
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': bucket},
+                'object': {'key': key, 'size': stored.size, 'eTag': stored.etag}
+            }
+        }
+        for notify_bucket, prefix, suffix, callback in self._notifications:
+            if notify_bucket == bucket and key.startswith(prefix) and key.endswith(suffix):
+                callback(record)
+
+    def _get(self, bucket, key, operation):
+        stored = self._buckets.get(bucket, {}).get(key)
+        if stored is None:
+            raise FakeClientError('NoSuchKey', operation, f'{key} does not exist')
+        return stored
+
+    # API
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self._aws.record('s3', 'get_object')
+        stored = self._get(Bucket, Key, 'GetObject')
+        data = stored.data()
+        if Range:
+            start, end = Range.replace('bytes=', '').split('-')
+            data = data[int(start):int(end) + 1 if end else None]
+        return {'Body': FakeBody(data), 'ContentLength': len(data), 'ETag': f'"{stored.etag}"'}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._aws.record('s3', 'head_object')
+        stored = self._get(Bucket, Key, 'HeadObject')
+        return {'ContentLength': stored.size, 'ETag': f'"{stored.etag}"', 'LastModified': stored.last_modified}
+
+    def put_object(self, Bucket, Key, Body=b'', ContentType=None, **kwargs):
+        self._aws.record('s3', 'put_object')
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        stored = FakeObject(data, content_type=ContentType)
+        self._store(Bucket, Key, stored)
+        return {'ETag': f'"{stored.etag}"'}
+
+    def copy_object(self, CopySource, Bucket, Key, **kwargs):
+        self._aws.record('s3', 'copy_object')
+        source = self._get(CopySource['Bucket'], CopySource['Key'], 'CopyObject')
+        # Server-side copy: shares the source bytes/generator, same ETag
+        copied = FakeObject(source._data, source._generator, source.size, source.etag, source.content_type)
+        self._store(Bucket, Key, copied)
+        return {'CopyObjectResult': {'ETag': f'"{copied.etag}"', 'LastModified': copied.last_modified}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._aws.record('s3', 'delete_object')
+        with self._lock:
+            self._buckets.get(Bucket, {}).pop(Key, None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=LIST_PAGE_SIZE, **kwargs):
+        self._aws.record('s3', 'list_objects_v2')
+        keys = sorted(key for key in self._buckets.get(Bucket, {}) if key.startswith(Prefix))
+        start = int(ContinuationToken) if ContinuationToken else 0
+        page_keys = keys[start:start + MaxKeys]
+        page = {'KeyCount': len(page_keys), 'IsTruncated': start + MaxKeys < len(keys)}
+        if page_keys:
+            objects = self._buckets[Bucket]
+            page['Contents'] = [{
+                'Key': key,
+                'Size': objects[key].size,
+                'ETag': f'"{objects[key].etag}"',
+                'LastModified': objects[key].last_modified
+            } for key in page_keys]
+        if page['IsTruncated']:
+            page['NextContinuationToken'] = str(start + MaxKeys)
+        return page
+
+    def get_paginator(self, operation_name):
+        if operation_name != 'list_objects_v2':
+            raise ValueError(f'No fake paginator for {operation_name}')
+        return FakePaginator(self.list_objects_v2)
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        # Signed locally by boto3 - no request, not counted
+        params = Params or {}
+        return f"https://{params.get('Bucket')}.s3.local/{params.get('Key')}?expires={ExpiresIn}"
+
+
+# DynamoDB
+
+def _split_top_level(expression, separator):
+    """Split on a separator (regex) outside parentheses"""
+    parts, depth, start = [], 0, 0
+    pattern = re.compile(separator, re.IGNORECASE)
+    i = 0
+    while i < len(expression):
+        char = expression[i]
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0:
+            match = pattern.match(expression, i)
+            if match:
+                parts.append(expression[start:i])
+                i = start = match.end()
+                continue
+        i += 1
+    parts.append(expression[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _strip_parens(expression):
+    """Drop parentheses that wrap the whole expression"""
+    expression = expression.strip()
+    while expression.startswith('('):
+        depth = 0
+        for i, char in enumerate(expression):
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        if i != len(expression) - 1:
+            return expression
+        expression = expression[1:-1].strip()
+    return expression
+
+
+def _normalize(value):
+    """What DynamoDB stores: numbers become Decimal, floats are rejected like boto3 does"""
+    if isinstance(value, bool) or value is None or isinstance(value, (str, bytes, Decimal)):
+        return value
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return {_normalize(item) for item in value}
+    raise TypeError(f'Unsupported type {type(value).__name__} for DynamoDB')
+
+
+def _clone(value):
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+class _Expression:
+    """Evaluates the subset of DynamoDB expression syntax the Lambdas use"""
+
+    def __init__(self, names=None, values=None):
+        self.names = names or {}
+        self.values = {key: _normalize(value) for key, value in (values or {}).items()}
+
+    def name(self, token):
+        token = token.strip()
+        return self.names.get(token, token)
+
+    def operand(self, token, item):
+        token = token.strip()
+        if token.startswith(':'):
+            return self.values[token]
+        return item.get(self.name(token))
+
+    def condition(self, expression, item):
+        expression = _strip_parens(expression)
+        disjuncts = _split_top_level(expression, r'\s+OR\s+')
+        if len(disjuncts) > 1:
+            return any(self.condition(part, item) for part in disjuncts)
+        conjuncts = _split_top_level(expression, r'\s+AND\s+')
+        if len(conjuncts) > 1:
+            return all(self.condition(part, item) for part in conjuncts)
+        if re.match(r'NOT\s+', expression, re.IGNORECASE):
+            return not self.condition(expression[3:], item)
+
+        function = re.match(r'(\w+)\s*\((.*)\)$', expression)
+        if function:
+            name, args = function.group(1).lower(), _split_top_level(function.group(2), ',')
+            if name == 'attribute_not_exists':
+                return self.name(args[0]) not in item
+            if name == 'attribute_exists':
+                return self.name(args[0]) in item
+            if name == 'begins_with':
+                value = self.operand(args[0], item)
+                return isinstance(value, str) and value.startswith(self.operand(args[1], item))
+            if name == 'contains':
+                value = self.operand(args[0], item)
+                return value is not None and self.operand(args[1], item) in value
+            raise ValueError(f'Unsupported condition function {name}')
+
+        comparison = re.match(r'(.+?)\s*(<>|<=|>=|=|<|>)\s*(.+)$', expression)
+        if not comparison:
+            raise ValueError(f'Unsupported condition {expression}')
+        left = self.operand(comparison.group(1), item)
+        right = self.operand(comparison.group(3), item)
+        if left is None or right is None:
+            return False
+        operator = comparison.group(2)
+        try:
+            return {
+                '=': left == right,
+                '<>': left != right,
+                '<': left < right,
+                '<=': left <= right,
+                '>': left > right,
+                '>=': left >= right
+            }[operator]
+        except TypeError:
+            return False
+
+    def set_value(self, expression, item):
+        expression = expression.strip()
+        function = re.match(r'(\w+)\s*\((.*)\)$', expression)
+        if function:
+            name, args = function.group(1).lower(), _split_top_level(function.group(2), ',')
+            if name == 'if_not_exists':
+                existing = item.get(self.name(args[0]))
+                return existing if existing is not None else self.set_value(args[1], item)
+            if name == 'list_append':
+                return list(self.set_value(args[0], item) or []) + list(self.set_value(args[1], item) or [])
+            raise ValueError(f'Unsupported update function {name}')
+        arithmetic = _split_top_level(expression, r'\s*[+-]\s*')
+        if len(arithmetic) == 2:
+            left, right = (self.set_value(part, item) for part in arithmetic)
+            return left + right if '+' in expression else left - right
+        return _clone(self.operand(expression, item))
+
+    def update(self, expression, item):
+        clauses = re.split(r'\b(SET|ADD|REMOVE|DELETE)\b', expression)
+        for keyword, body in zip(clauses[1::2], clauses[2::2]):
+            keyword = keyword.upper()
+            for action in _split_top_level(body, ','):
+                if keyword == 'SET':
+                    target, value = action.split('=', 1)
+                    item[self.name(target)] = self.set_value(value, item)
+                elif keyword == 'REMOVE':
+                    item.pop(self.name(action), None)
+                else:
+                    target, value_token = action.split(None, 1)
+                    name, value = self.name(target), self.values[value_token.strip()]
+                    if keyword == 'ADD':
+                        if isinstance(value, set):
+                            item[name] = set(item.get(name, set())) | value
+                        else:
+                            item[name] = item.get(name, Decimal(0)) + value
+                    else:
+                        remaining = set(item.get(name, set())) - value
+                        if remaining:
+                            item[name] = remaining
+                        else:
+                            item.pop(name, None)
+
+
+def _project(item, projection, names):
+    if not projection:
+        return _clone(item)
+    wanted = [names.get(token.strip(), token.strip()) for token in projection.split(',')]
+    return {key: _clone(item[key]) for key in wanted if key in item}
+
+
+class FakeBatchWriter:
+    def __init__(self, table):
+        self._table = table
+        self._pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._flush()
+
+    def _count(self):
+        self._pending += 1
+        if self._pending == 25:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._table._aws.record('dynamodb', 'batch_write_item')
+            self._pending = 0
+
+    def put_item(self, Item):
+        self._table._write(_normalize(Item))
+        self._count()
+
+    def delete_item(self, Key):
+        self._table._items.pop(self._table._key(Key), None)
+        self._count()
+
+
+class FakeTable:
+    def __init__(self, aws, name, hash_key, range_key=None):
+        self._aws = aws
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self._items = {}
+        self._lock = threading.RLock()
+
+    def _key(self, key):
+        if self.range_key:
+            return (key[self.hash_key], key[self.range_key])
+        return key[self.hash_key]
+
+    def _write(self, item):
+        with self._lock:
+            self._items[self._key(item)] = _clone(item)
+
+    # Harness helpers (not counted as API calls)
+
+    def peek(self, key):
+        item = self._items.get(self._key(key))
+        return _clone(item) if item is not None else None
+
+    def all_items(self):
+        return [_clone(item) for item in self._items.values()]
+
+    # API
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self._aws.record('dynamodb', 'get_item')
+        item = self._items.get(self._key(Key))
+        if item is None:
+            return {}
+        return {'Item': _project(item, ProjectionExpression, ExpressionAttributeNames or {})}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        self._aws.record('dynamodb', 'put_item')
+        item = _normalize(Item)
+        with self._lock:
+            existing = self._items.get(self._key(item), {})
+            if ConditionExpression:
+                expression = _Expression(ExpressionAttributeNames, ExpressionAttributeValues)
+                if not expression.condition(ConditionExpression, existing):
+                    raise FakeClientError('ConditionalCheckFailedException', 'PutItem', 'The conditional request failed')
+            self._write(item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        self._aws.record('dynamodb', 'update_item')
+        expression = _Expression(ExpressionAttributeNames, ExpressionAttributeValues)
+        with self._lock:
+            existing = self._items.get(self._key(Key))
+            if ConditionExpression and not expression.condition(ConditionExpression, existing or {}):
+                raise FakeClientError('ConditionalCheckFailedException', 'UpdateItem', 'The conditional request failed')
+            updated = _clone(existing) if existing is not None else _normalize(dict(Key))
+            expression.update(UpdateExpression, updated)
+            self._write(updated)
+
+        if ReturnValues in ('ALL_NEW', 'UPDATED_NEW'):
+            return {'Attributes': _clone(updated)}
+        if ReturnValues in ('ALL_OLD', 'UPDATED_OLD'):
+            return {'Attributes': _clone(existing)} if existing is not None else {}
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self._aws.record('dynamodb', 'delete_item')
+        with self._lock:
+            self._items.pop(self._key(Key), None)
+        return {}
+
+    def _page(self, items, operation, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None):
+        self._aws.record('dynamodb', operation)
+        start = 0
+        if ExclusiveStartKey:
+            keys = [self._key(item) for item in items]
+            start = keys.index(self._key(ExclusiveStartKey)) + 1
+        page_size = min(Limit or SCAN_PAGE_ITEMS, SCAN_PAGE_ITEMS)
+        page = items[start:start + page_size]
+
+        expression = _Expression(ExpressionAttributeNames, ExpressionAttributeValues)
+        names = ExpressionAttributeNames or {}
+        if FilterExpression:
+            matched = [item for item in page if expression.condition(FilterExpression, item)]
+        else:
+            matched = page
+        response = {
+            'Items': [_project(item, ProjectionExpression, names) for item in matched],
+            'Count': len(matched),
+            'ScannedCount': len(page)
+        }
+        if start + page_size < len(items):
+            last = page[-1]
+            response['LastEvaluatedKey'] = {key: last[key] for key in (self.hash_key, self.range_key) if key}
+        return response
+
+    def scan(self, Segment=None, TotalSegments=None, **kwargs):
+        with self._lock:
+            items = list(self._items.values())
+        if TotalSegments:
+            # Parallel scan: a stable hash of the key picks each item's segment
+            items = [item for item in items if zlib.crc32(repr(self._key(item)).encode('utf-8')) % TotalSegments == Segment]
+        return self._page(items, 'scan', **kwargs)
+
+    def query(self, KeyConditionExpression, **kwargs):
+        expression = _Expression(kwargs.get('ExpressionAttributeNames'), kwargs.get('ExpressionAttributeValues'))
+        with self._lock:
+            items = [item for item in self._items.values() if expression.condition(KeyConditionExpression, item)]
+        if self.range_key:
+            items.sort(key=lambda item: item[self.range_key], reverse=not kwargs.pop('ScanIndexForward', True))
+        return self._page(items, 'query', **kwargs)
+
+    def batch_writer(self, **kwargs):
+        return FakeBatchWriter(self)
+
+
+class FakeDynamoDB:
+    """Acts as both boto3.resource('dynamodb') and the low-level batch operations"""
+
+    def __init__(self, aws, table_keys):
+        self._aws = aws
+        self._table_keys = table_keys
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def Table(self, name):
+        with self._lock:
+            if name not in self._tables:
+                if name not in self._table_keys:
+                    raise FakeClientError('ResourceNotFoundException', 'DescribeTable', f'Table {name} not found')
+                self._tables[name] = FakeTable(self._aws, name, *self._table_keys[name])
+            return self._tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._aws.record('dynamodb', 'batch_get_item')
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            responses[name] = [
+                _project(table._items[table._key(key)], request.get('ProjectionExpression'), request.get('ExpressionAttributeNames') or {})
+                for key in request['Keys'] if table._key(key) in table._items
+            ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._aws.record('dynamodb', 'batch_write_item')
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    table._write(_normalize(request['PutRequest']['Item']))
+                elif 'DeleteRequest' in request:
+                    table._items.pop(table._key(request['DeleteRequest']['Key']), None)
+        return {'UnprocessedItems': {}}
+
+
+# SQS
+
+class FakeSQS:
+    def __init__(self, aws):
+        self._aws = aws
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, queue_url, body):
+        """Harness helper: deliver a message as S3 notifications do (not counted)"""
+        with self._lock:
+            self._queues.setdefault(queue_url, deque()).append(body)
+
+    def receive(self, queue_url, max_messages=10):
+        """Harness helper: take up to max_messages bodies, as the event source mapping does"""
+        with self._lock:
+            queue = self._queues.get(queue_url)
+            batch = []
+            while queue and len(batch) < max_messages:
+                batch.append(queue.popleft())
+            return batch
+
+    def depth(self, queue_url):
+        return len(self._queues.get(queue_url, ()))
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0, **kwargs):
+        # Delays are not simulated - the benchmark compresses wall time
+        self._aws.record('sqs', 'send_message')
+        self.enqueue(QueueUrl, MessageBody)
+        return {'MessageId': hashlib.md5(MessageBody.encode('utf-8')).hexdigest()}
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        self._aws.record('sqs', 'send_message_batch')
+        for entry in Entries:
+            self.enqueue(QueueUrl, entry['MessageBody'])
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+
+# Transcribe
+
+WORD_SECONDS = 0.4
+
+
+class FakeTranscribe:
+    """
+    Jobs complete when the harness calls complete_jobs(): the transcript JSON is
+    written to the output bucket, which fires the usual S3 notification.
+    transcript_resolver(job) supplies the canned text (or speaker turns) for a job.
+    """
+
+    def __init__(self, aws):
+        self._aws = aws
+        self._jobs = {}
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self.transcript_resolver = lambda job: ''
+
+    def start_transcription_job(self, TranscriptionJobName, Media, OutputBucketName=None, OutputKey=None, **kwargs):
+        self._aws.record('transcribe', 'start_transcription_job')
+        with self._lock:
+            if TranscriptionJobName in self._jobs:
+                raise FakeClientError('ConflictException', 'StartTranscriptionJob', 'The requested job name already exists')
+            job = dict(kwargs, TranscriptionJobName=TranscriptionJobName, Media=Media, OutputBucketName=OutputBucketName,
+                       OutputKey=OutputKey or f'{TranscriptionJobName}.json', TranscriptionJobStatus='IN_PROGRESS')
+            self._jobs[TranscriptionJobName] = job
+            self._pending.append(job)
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': 'IN_PROGRESS'}}
+
+    def get_transcription_job(self, TranscriptionJobName, **kwargs):
+        self._aws.record('transcribe', 'get_transcription_job')
+        job = self._jobs.get(TranscriptionJobName)
+        if job is None:
+            raise FakeClientError('BadRequestException', 'GetTranscriptionJob', 'The requested job could not be found')
+        return {'TranscriptionJob': {key: job[key] for key in ('TranscriptionJobName', 'TranscriptionJobStatus', 'Media')}}
+
+    def list_transcription_jobs(self, Status=None, JobNameContains=None, MaxResults=100, NextToken=None, **kwargs):
+        self._aws.record('transcribe', 'list_transcription_jobs')
+        with self._lock:
+            names = sorted(name for name, job in self._jobs.items()
+                           if (Status is None or job['TranscriptionJobStatus'] == Status)
+                           and (JobNameContains is None or JobNameContains in name))
+        start = int(NextToken or 0)
+        response = {'TranscriptionJobSummaries': [
+            {'TranscriptionJobName': name, 'TranscriptionJobStatus': self._jobs[name]['TranscriptionJobStatus']}
+            for name in names[start:start + MaxResults]
+        ]}
+        if start + MaxResults < len(names):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+    def pending_jobs(self):
+        return len(self._pending)
+
+    def fail_job(self, job_name, reason='The media format is not supported'):
+        """Fail a queued job (no output is written); returns its Job State Change event"""
+        with self._lock:
+            job = self._jobs[job_name]
+            self._pending.remove(job)
+            job['TranscriptionJobStatus'] = 'FAILED'
+        return {
+            'source': 'aws.transcribe',
+            'detail-type': 'Transcribe Job State Change',
+            'detail': {'TranscriptionJobName': job_name, 'TranscriptionJobStatus': 'FAILED', 'FailureReason': reason}
+        }
+
+    def complete_jobs(self, limit=None):
+        """Finish queued jobs in submission order; returns how many completed"""
+        completed = 0
+        while self._pending and (limit is None or completed < limit):
+            with self._lock:
+                job = self._pending.popleft()
+            text = self.transcript_resolver(job)
+            job['TranscriptionJobStatus'] = 'COMPLETED'
+            # Written by the service itself, so the caller's fault profile does not apply
+            self._aws.s3.write_service_output(
+                job['OutputBucketName'],
+                job['OutputKey'],
+                json.dumps(self.transcript_document(job['TranscriptionJobName'], text, job.get('Settings'))).encode('utf-8'),
+                'application/json'
+            )
+            completed += 1
+        return completed
+
+    @staticmethod
+    def transcript_document(job_name, text, settings=None):
+        """
+        Transcribe output layout: full transcript plus timed word items. `text` may
+        also be a list of (speaker, text) turns; with speaker label or channel
+        identification Settings the output labels them like the real service.
+        """
+        turns = [(None, text)] if isinstance(text, str) else text
+        speakers = {}
+        segments = []
+        items = []
+        clock = 0.0
+        for speaker, turn_text in turns:
+            number = speakers.setdefault(speaker, len(speakers))
+            turn_items = []
+            for token in re.findall(r"[\w'$.,-]+|[?!]", turn_text):
+                word = token.rstrip('.,?!')
+                if word:
+                    turn_items.append({
+                        'start_time': f'{clock:.2f}',
+                        'end_time': f'{clock + WORD_SECONDS:.2f}',
+                        'alternatives': [{'confidence': '0.98', 'content': word}],
+                        'type': 'pronunciation'
+                    })
+                    clock += WORD_SECONDS
+                if token[-1] in '.,?!':
+                    turn_items.append({'alternatives': [{'confidence': '0.0', 'content': token[-1]}], 'type': 'punctuation'})
+            items.extend(turn_items)
+            segments.append((number, turn_items))
+
+        results = {'transcripts': [{'transcript': ' '.join(turn_text for _, turn_text in turns)}], 'items': items}
+        settings = settings or {}
+        if settings.get('ShowSpeakerLabels'):
+            results['speaker_labels'] = {'speakers': len(speakers), 'segments': []}
+            for number, turn_items in segments:
+                words = [item for item in turn_items if item['type'] == 'pronunciation']
+                for item in words:
+                    item['speaker_label'] = f'spk_{number}'
+                if words:
+                    results['speaker_labels']['segments'].append({
+                        'start_time': words[0]['start_time'],
+                        'end_time': words[-1]['end_time'],
+                        'speaker_label': f'spk_{number}',
+                        'items': [{key: item[key] for key in ('start_time', 'end_time', 'speaker_label')} for item in words]
+                    })
+        elif settings.get('ChannelIdentification'):
+            channels = {}
+            for number, turn_items in segments:
+                channels.setdefault(number, []).extend(turn_items)
+            results['channel_labels'] = {
+                'number_of_channels': max(len(channels), 2),
+                'channels': [{'channel_label': f'ch_{number}', 'items': channel_items} for number, channel_items in sorted(channels.items())]
+            }
+        return {
+            'jobName': job_name,
+            'accountId': '000000000000',
+            'results': results,
+            'status': 'COMPLETED'
+        }
+
+
+# Comprehend
+
+PHONE_PATTERN = re.compile(r'\b(?:1-)?\d{3}-\d{3}-\d{4}\b')
+ACCOUNT_PATTERN = re.compile(r'\bending in (\d{4})\b', re.IGNORECASE)
+MONEY_PATTERN = re.compile(r'\$[\d,]+(?:\.\d{2})?')
+PHRASE_SPLIT = re.compile(r'[.,;:?!]')
+
+
+class FakeComprehend:
+    """
+    Canned detection built from known names (seed from voicemail_reference.json)
+    plus simple patterns. Responses carry offsets like the real APIs; note that
+    DetectPiiEntities returns offsets only, never the entity text.
+    """
+
+    def __init__(self, aws):
+        self._aws = aws
+        self.known_entities = {}
+
+    def add_known_entity(self, text, entity_type):
+        if text:
+            self.known_entities[text] = entity_type
+
+    def _check_size(self, text, operation):
+        if len(text.encode('utf-8')) > COMPREHEND_MAX_BYTES:
+            raise FakeClientError('TextSizeLimitExceededException', operation,
+                                  f'Input text size exceeds limit. Max length of request text allowed is {COMPREHEND_MAX_BYTES} bytes')
+
+    def _entities(self, text):
+        entities = []
+        for known, entity_type in self.known_entities.items():
+            start = text.find(known)
+            while start != -1:
+                entities.append({'Score': 0.99, 'Type': entity_type, 'Text': known,
+                                 'BeginOffset': start, 'EndOffset': start + len(known)})
+                start = text.find(known, start + 1)
+        for match in MONEY_PATTERN.finditer(text):
+            entities.append({'Score': 0.95, 'Type': 'QUANTITY', 'Text': match.group(),
+                             'BeginOffset': match.start(), 'EndOffset': match.end()})
+        return sorted(entities, key=lambda entity: entity['BeginOffset'])
+
+    def _key_phrases(self, text):
+        phrases = []
+        offset = 0
+        for clause in PHRASE_SPLIT.split(text):
+            stripped = clause.strip()
+            begin = text.find(stripped, offset) if stripped else -1
+            if begin != -1:
+                words = stripped.split()[:6]
+                phrase = ' '.join(words)
+                phrases.append({'Score': 0.9, 'Text': phrase, 'BeginOffset': begin, 'EndOffset': begin + len(phrase)})
+                offset = begin + len(stripped)
+        return phrases
+
+    def _pii(self, text):
+        pii = []
+        for known, entity_type in self.known_entities.items():
+            if entity_type == 'PERSON':
+                start = text.find(known)
+                if start != -1:
+                    pii.append({'Score': 0.99, 'Type': 'NAME', 'BeginOffset': start, 'EndOffset': start + len(known)})
+        for match in PHONE_PATTERN.finditer(text):
+            pii.append({'Score': 0.99, 'Type': 'PHONE', 'BeginOffset': match.start(), 'EndOffset': match.end()})
+        for match in ACCOUNT_PATTERN.finditer(text):
+            pii.append({'Score': 0.9, 'Type': 'BANK_ACCOUNT_NUMBER', 'BeginOffset': match.start(1), 'EndOffset': match.end(1)})
+        return sorted(pii, key=lambda entity: entity['BeginOffset'])
+
+    def detect_entities(self, Text, LanguageCode='en', **kwargs):
+        self._aws.record('comprehend', 'detect_entities')
+        self._check_size(Text, 'DetectEntities')
+        return {'Entities': self._entities(Text)}
+
+    def detect_key_phrases(self, Text, LanguageCode='en', **kwargs):
+        self._aws.record('comprehend', 'detect_key_phrases')
+        self._check_size(Text, 'DetectKeyPhrases')
+        return {'KeyPhrases': self._key_phrases(Text)}
+
+    def detect_pii_entities(self, Text, LanguageCode='en', **kwargs):
+        self._aws.record('comprehend', 'detect_pii_entities')
+        self._check_size(Text, 'DetectPiiEntities')
+        return {'Entities': self._pii(Text)}
+
+    def detect_sentiment(self, Text, LanguageCode='en', **kwargs):
+        self._aws.record('comprehend', 'detect_sentiment')
+        self._check_size(Text, 'DetectSentiment')
+        return {'Sentiment': 'NEUTRAL',
+                'SentimentScore': {'Positive': 0.1, 'Negative': 0.1, 'Neutral': 0.75, 'Mixed': 0.05}}
+
+    def _batch(self, TextList, operation, detect, result_key):
+        self._aws.record('comprehend', operation)
+        if len(TextList) > COMPREHEND_BATCH_SIZE:
+            raise FakeClientError('BatchSizeLimitExceededException', operation, f'At most {COMPREHEND_BATCH_SIZE} documents')
+        results, errors = [], []
+        for index, text in enumerate(TextList):
+            if len(text.encode('utf-8')) > COMPREHEND_MAX_BYTES:
+                errors.append({'Index': index, 'ErrorCode': 'TextSizeLimitExceededException', 'ErrorMessage': 'Document too large'})
+            else:
+                results.append({'Index': index, result_key: detect(text)})
+        return {'ResultList': results, 'ErrorList': errors}
+
+    def batch_detect_entities(self, TextList, LanguageCode='en', **kwargs):
+        return self._batch(TextList, 'batch_detect_entities', self._entities, 'Entities')
+
+    def batch_detect_key_phrases(self, TextList, LanguageCode='en', **kwargs):
+        return self._batch(TextList, 'batch_detect_key_phrases', self._key_phrases, 'KeyPhrases')
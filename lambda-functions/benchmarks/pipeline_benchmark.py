@@ -0,0 +1,410 @@
+"""
+End-to-end throughput benchmark: drives the real lambda_handler functions
+(batch prep, batch trigger, processor, transcription handler, API) over a
+synthetic batch against the in-process fakes in benchmarks.fake_aws.
+
+    cd lambda-functions
+    python -m benchmarks.pipeline_benchmark --calls 1000
+    python -m benchmarks.pipeline_benchmark --calls 100000 --latency s3=8,dynamodb=4,comprehend=40 --throttle 0.001
+    python -m benchmarks.pipeline_benchmark --calls 1000 --completion-batch 25
+    python -m benchmarks.pipeline_benchmark --calls 1000 --dialogue --speaker-separation speakers --agent-only
+
+Reports calls/sec per stage and end to end, API calls per call by operation,
+and peak memory. Canned transcripts come from voicemail_reference.json
+script_content (with --dialogue, interleaved with customer replies); rules
+are the seed rules from infrastructure.yaml.
+"""
+import argparse
+import ast
+import collections
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import re
+import resource
+import struct
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from decimal import Decimal
+
+from benchmarks.fake_aws import FakeAWS, FaultProfile
+
+LAMBDA_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(LAMBDA_ROOT)
+REFERENCE_PATH = os.path.join(REPO_ROOT, 'voicemail-calls', 'voicemail_reference.json')
+SEED_RULES_PATH = os.path.join(REPO_ROOT, 'infrastructure.yaml')
+
+INPUT_BUCKET = 'anycompany-input-benchmark'
+TRANSCRIBE_BUCKET = 'anycompany-transcribe-output-benchmark'
+COMPREHEND_BUCKET = 'anycompany-comprehend-output-benchmark'
+INTERACTIVE_QUEUE = 'https://sqs.local/anycompany-processing-queue'
+BULK_QUEUE = 'https://sqs.local/anycompany-bulk-processing-queue'
+BATCH_PREFIX = 'daily-batch/'
+
+# Table names as the handlers resolve them (batch trigger hardcodes the calls table)
+TABLE_KEYS = {
+    'anycompany-calls-prod': ('call_id',),
+    'anycompany-rules-prod': ('rule_id',),
+    'anycompany-batches-prod': ('batch_id',),
+    'anycompany-batch-checkpoints-prod': ('batch_id', 'item_key'),
+    'anycompany-audio-fingerprints-prod': ('fingerprint',),
+    'anycompany-reference-prod': ('genesys_call_id',)
+}
+
+HANDLERS = {
+    'batch_prep': 'batch-processing/batch-prep/index.py',
+    'batch_trigger': 'batch-processing/batch-trigger/index.py',
+    'processor': 'processor/index.py',
+    'transcription_handler': 'transcription-handler/index.py',
+    'api': 'api-function/index.py',
+    'reference_loader': 'batch-processing/reference-loader/index.py'
+}
+
+# SQS event source mapping batch size for the processor
+PROCESSOR_BATCH_SIZE = 10
+
+SYNTHETIC_SAMPLE_RATE = 8000
+
+# Customer turns interleaved with the agent's sentences by --dialogue
+CUSTOMER_REPLIES = (
+    'Hello? Who is this?',
+    'I already told the last person my lawyer is handling this.',
+    'Is this about the payment on my account?',
+    'I can not talk right now, I am at the hospital.',
+    'Can you send me an email instead?',
+    'Okay.'
+)
+
+
+def handler_environment(bulk_concurrency, speaker_separation='off', agent_only=False, reference_table=False):
+    return {
+        'CALLS_TABLE': 'anycompany-calls-prod',
+        'CALLS_TABLE_NAME': 'anycompany-calls-prod',
+        'RULES_TABLE': 'anycompany-rules-prod',
+        'RULES_TABLE_NAME': 'anycompany-rules-prod',
+        'BATCHES_TABLE': 'anycompany-batches-prod',
+        'BATCHES_TABLE_NAME': 'anycompany-batches-prod',
+        'CHECKPOINTS_TABLE': 'anycompany-batch-checkpoints-prod',
+        'FINGERPRINTS_TABLE': 'anycompany-audio-fingerprints-prod',
+        'INPUT_BUCKET_NAME': INPUT_BUCKET,
+        'TRANSCRIBE_OUTPUT_BUCKET': TRANSCRIBE_BUCKET,
+        'TRANSCRIBE_OUTPUT_BUCKET_NAME': TRANSCRIBE_BUCKET,
+        'COMPREHEND_OUTPUT_BUCKET': COMPREHEND_BUCKET,
+        'BULK_QUEUE_URL': BULK_QUEUE,
+        'BULK_TRANSCRIBE_CONCURRENCY': str(bulk_concurrency),
+        'SPEAKER_SEPARATION': speaker_separation,
+        'AGENT_ONLY_ANALYSIS': 'true' if agent_only else 'false',
+        # Empty: handlers read the reference files instead of the table
+        'REFERENCE_TABLE': 'anycompany-reference-prod' if reference_table else ''
+    }
+
+
+def load_seed_rules():
+    """The rule list seeded by infrastructure.yaml, so the benchmark evaluates the deployed rule set"""
+    with open(SEED_RULES_PATH) as f:
+        template = f.read()
+    start = template.index('rules = [', template.index('def seed_rules():')) + len('rules = ')
+    depth = 0
+    for end in range(start, len(template)):
+        depth += template[end] == '['
+        depth -= template[end] == ']'
+        if depth == 0:
+            break
+    return ast.literal_eval(template[start:end + 1])
+
+
+def load_handler(name, relative_path):
+    """Import a handler's index.py under its own module name"""
+    spec = importlib.util.spec_from_file_location(f'benchmark_{name}', os.path.join(LAMBDA_ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_wav(seed, seconds):
+    """16-bit mono PCM WAV with unique low-level noise per seed"""
+    data_bytes = int(seconds * SYNTHETIC_SAMPLE_RATE) * 2
+    pcm = random.Random(seed).getrandbits(data_bytes * 8).to_bytes(data_bytes, 'little')
+    header = b'RIFF' + struct.pack('<I', 36 + data_bytes) + b'WAVE'
+    header += b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, SYNTHETIC_SAMPLE_RATE, SYNTHETIC_SAMPLE_RATE * 2, 2, 16)
+    header += b'data' + struct.pack('<I', data_bytes)
+    return header + pcm
+
+
+def seed_fixtures(aws, calls, audio_seconds, duplicate_rate, seed):
+    """Reference data, rules, Comprehend entities and the synthetic batch folder"""
+    with open(REFERENCE_PATH) as f:
+        reference = json.load(f)
+    aws.s3.add_object(INPUT_BUCKET, 'voicemail-calls/voicemail_reference.json', json.dumps(reference).encode('utf-8'))
+
+    voicemails = reference['voicemails']
+    for details in voicemails.values():
+        aws.comprehend.add_known_entity(details.get('agent_name'), 'PERSON')
+        aws.comprehend.add_known_entity(details.get('customer_name'), 'PERSON')
+    aws.comprehend.add_known_entity('AnyCompany Servicing', 'ORGANIZATION')
+
+    rules_table = aws.dynamodb.Table('anycompany-rules-prod')
+    for rule in load_seed_rules():
+        rules_table._write(json.loads(json.dumps(rule), parse_float=Decimal))
+
+    reference_ids = sorted(voicemails)
+    audio_size = 44 + int(audio_seconds * SYNTHETIC_SAMPLE_RATE) * 2
+    chooser = random.Random(seed)
+    for index in range(calls):
+        year, number = reference_ids[index % len(reference_ids)].split('-')[1:]
+        content_seed = chooser.randrange(index) if index and chooser.random() < duplicate_rate else index
+        aws.s3.add_object(
+            INPUT_BUCKET,
+            f'{BATCH_PREFIX}voicemail_{index:06d}_VM_{year}_{number}.wav',
+            generator=lambda content_seed=content_seed: synthetic_wav(content_seed, audio_seconds),
+            size=audio_size,
+            etag=f'{content_seed:032x}'
+        )
+    return reference
+
+
+def dialogue_turns(script):
+    """The script as agent turns, one per sentence, each followed by a customer reply"""
+    turns = []
+    for number, sentence in enumerate(re.split(r'(?<=[.!?])\s+', script.strip())):
+        turns.append(('agent', sentence))
+        turns.append(('customer', CUSTOMER_REPLIES[number % len(CUSTOMER_REPLIES)]))
+    return turns
+
+
+def transcript_resolver(aws, reference, dialogue=False):
+    """Canned transcript for a job: the script of the voicemail its filename points at"""
+    calls_table = aws.dynamodb.Table('anycompany-calls-prod')
+    scripts = {vm_id: details['script_content'] for vm_id, details in reference['voicemails'].items()}
+    fallback = next(iter(scripts.values()))
+
+    def resolve(job):
+        call_id = '-'.join(job['TranscriptionJobName'].split('-')[1:-1])
+        call = calls_table.peek({'call_id': call_id}) or {}
+        match = re.search(r'VM_(\d{4})_(\d{6})', call.get('filename', ''))
+        script = scripts.get(f'VM-{match.group(1)}-{match.group(2)}', fallback) if match else fallback
+        return dialogue_turns(script) if dialogue else script
+    return resolve
+
+
+class StageTimer:
+    """Wall time and API call delta per pipeline stage"""
+
+    def __init__(self, aws):
+        self._aws = aws
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name, items):
+        before = Counter(self._aws.api_calls)
+        clients_before = Counter(self._aws.clients_created)
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        self.stages.append({
+            'stage': name,
+            'items': items,
+            'seconds': round(elapsed, 3),
+            'items_per_second': round(items / elapsed, 1) if elapsed else None,
+            'api_calls': sum((self._aws.api_calls - before).values()),
+            'clients_created': sum((self._aws.clients_created - clients_before).values())
+        })
+
+
+def drain_pipeline(aws, handlers, transcript_events, completion_batch=0):
+    """
+    Run the processor / Transcribe / completion loop until no work is left.
+    completion_batch > 0 delivers transcript notifications through the SQS
+    completion queue in batches of that size instead of one invocation each.
+    Returns (processor invocations, completion invocations, stalled).
+    """
+    processor_invocations = completion_invocations = 0
+    idle_rounds = 0
+    receives = collections.Counter()
+    while True:
+        for queue in (INTERACTIVE_QUEUE, BULK_QUEUE):
+            messages = aws.sqs.receive(queue, PROCESSOR_BATCH_SIZE)
+            if messages:
+                records = {}
+                for index, body in enumerate(messages):
+                    receives[body] += 1
+                    records[f'processor-{processor_invocations}-{index}'] = body
+                event = {'Records': [{'messageId': message_id, 'body': body, 'attributes': {'ApproximateReceiveCount': str(receives[body])}}
+                                     for message_id, body in records.items()]}
+                response = handlers['processor'].lambda_handler(event, None)
+                processor_invocations += 1
+                # SQS redelivers failed messages until maxReceiveCount (3), then dead-letters them
+                for failure in response.get('batchItemFailures', []):
+                    body = records[failure['itemIdentifier']]
+                    if receives[body] < 3:
+                        aws.sqs.enqueue(queue, body)
+
+        progressed = aws.transcribe.complete_jobs() > 0
+        while transcript_events:
+            if completion_batch:
+                batch, transcript_events[:completion_batch] = transcript_events[:completion_batch], []
+                messages = {f'completion-{completion_invocations}-{index}': record for index, record in enumerate(batch)}
+                event = {'Records': [{'messageId': message_id, 'body': json.dumps({'Records': [record]})}
+                                     for message_id, record in messages.items()]}
+                response = handlers['transcription_handler'].lambda_handler(event, None)
+                # SQS redelivers the messages reported back as failed
+                transcript_events.extend(messages[failure['itemIdentifier']] for failure in response.get('batchItemFailures', []))
+            else:
+                handlers['transcription_handler'].lambda_handler({'Records': [transcript_events.pop(0)]}, None)
+            completion_invocations += 1
+            progressed = True
+
+        if not aws.sqs.depth(INTERACTIVE_QUEUE) + aws.sqs.depth(BULK_QUEUE) + aws.transcribe.pending_jobs():
+            return processor_invocations, completion_invocations, False
+        # Deferred messages cycle forever if lane slots leak; stop instead of spinning
+        idle_rounds = 0 if progressed else idle_rounds + 1
+        if idle_rounds > 1000:
+            return processor_invocations, completion_invocations, True
+
+
+def run_benchmark(calls, faults, audio_seconds=2.0, duplicate_rate=0.0, bulk_concurrency=200,
+                  seed=7, verbose=False, trace_memory=False, completion_batch=0,
+                  dialogue=False, speaker_separation='off', agent_only=False, reference_table=False):
+    aws = FakeAWS(faults, TABLE_KEYS)
+    os.environ.update(handler_environment(bulk_concurrency, speaker_separation, agent_only, reference_table))
+    if LAMBDA_ROOT not in sys.path:
+        sys.path.insert(0, LAMBDA_ROOT)
+    if trace_memory:
+        tracemalloc.start()
+
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with aws.installed(), quiet:
+        handlers = {name: load_handler(name, path) for name, path in HANDLERS.items()}
+        reference = seed_fixtures(aws, calls, audio_seconds, duplicate_rate, seed)
+        aws.transcribe.transcript_resolver = transcript_resolver(aws, reference, dialogue)
+
+        # S3 notifications as configured in terraform/notifications.tf
+        transcript_events = []
+        aws.s3.notify(INPUT_BUCKET, 'audio/', '.wav', lambda record: aws.sqs.enqueue(INTERACTIVE_QUEUE, json.dumps({'Records': [record]})))
+        aws.s3.notify(INPUT_BUCKET, 'audio-batch/', '.wav', lambda record: aws.sqs.enqueue(BULK_QUEUE, json.dumps({'Records': [record]})))
+        aws.s3.notify(TRANSCRIBE_BUCKET, 'transcripts/', '.json', transcript_events.append)
+
+        timer = StageTimer(aws)
+        started = time.perf_counter()
+
+        if reference_table:
+            with timer.stage('reference_load', len(reference['voicemails'])):
+                loaded = handlers['reference_loader'].lambda_handler({'bucket': INPUT_BUCKET, 'key': 'voicemail-calls/voicemail_reference.json'}, None)
+            if loaded.get('statusCode') != 200:
+                raise RuntimeError(f"reference load failed: {loaded.get('error') or loaded.get('files')}")
+
+        with timer.stage('batch_prep', calls):
+            manifest = handlers['batch_prep'].lambda_handler({'batch_folder': f's3://{INPUT_BUCKET}/{BATCH_PREFIX}', 'max_files': calls}, None)
+        if manifest.get('statusCode') != 200:
+            raise RuntimeError(f"batch prep failed: {manifest.get('error')}")
+        batch_id = manifest['batch_info']['batch_id']
+
+        # Step Functions Map state: one batch trigger invocation per manifest item
+        with timer.stage('batch_trigger', len(manifest['calls'])):
+            for call in manifest['calls']:
+                handlers['batch_trigger'].lambda_handler(call, None)
+
+        with timer.stage('transcription_pipeline', len(manifest['calls'])):
+            processor_invocations, completion_invocations, stalled = drain_pipeline(aws, handlers, transcript_events, completion_batch)
+
+        with timer.stage('api', 4):
+            api_responses = {
+                path: handlers['api'].lambda_handler({'httpMethod': 'GET', 'path': path}, None)
+                for path in (f'/batches/{batch_id}', '/results', '/entity-metrics', '/rules')
+            }
+
+        elapsed = time.perf_counter() - started
+
+    progress = json.loads(api_responses[f'/batches/{batch_id}']['body'])
+    report = {
+        'calls': calls,
+        'batch_id': batch_id,
+        'completed': progress.get('counters', {}).get('completed'),
+        'failed': progress.get('counters', {}).get('failed'),
+        'rejected': manifest['batch_info']['rejected_files'],
+        'stalled': stalled,
+        'processor_invocations': processor_invocations,
+        'completion_invocations': completion_invocations,
+        'seconds': round(elapsed, 3),
+        'calls_per_second': round(calls / elapsed, 1) if elapsed else None,
+        'stages': timer.stages,
+        'api_calls_total': sum(aws.api_calls.values()),
+        'api_calls_per_call': {
+            operation: round(count / calls, 3) for operation, count in sorted(aws.api_calls.items())
+        },
+        # ru_maxrss is KB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+    if trace_memory:
+        report['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+    return report
+
+
+def parse_service_values(text, cast=float):
+    """'0.01' applies to all services; 's3=5,dynamodb=2' sets per service"""
+    if not text:
+        return 0
+    if '=' not in text:
+        return cast(text)
+    return {name.strip(): cast(value) for name, value in (pair.split('=') for pair in text.split(','))}
+
+
+def print_report(report):
+    print(f"\n📊 {report['calls']} calls in {report['seconds']}s -> {report['calls_per_second']} calls/sec")
+    print(f"   completed={report['completed']} failed={report['failed']} rejected={report['rejected']} stalled={report['stalled']}")
+    print(f"   processor invocations={report['processor_invocations']} completion invocations={report['completion_invocations']}")
+    print('\n⏱️ Stages')
+    for stage in report['stages']:
+        print(f"   {stage['stage']:<24} {stage['seconds']:>9.3f}s  {stage['items_per_second'] or 0:>10.1f}/s  {stage['api_calls']:>9} API calls"
+              f"  {stage['clients_created']:>6} clients created")
+    print(f"\n📞 API calls per call ({report['api_calls_total']} total)")
+    for operation, per_call in report['api_calls_per_call'].items():
+        print(f'   {operation:<40} {per_call:>8.3f}')
+    print(f"\n🧠 Peak RSS {report['peak_rss_mb']} MB" + (f", traced peak {report['peak_traced_mb']} MB" if 'peak_traced_mb' in report else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end pipeline throughput benchmark')
+    parser.add_argument('--calls', type=int, default=1000)
+    parser.add_argument('--audio-seconds', type=float, default=2.0, help='duration of each synthetic WAV')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='fraction of calls re-using earlier audio')
+    parser.add_argument('--bulk-concurrency', type=int, default=200)
+    parser.add_argument('--latency', default='', help="ms per API call: '5' or 's3=5,dynamodb=2,comprehend=40'")
+    parser.add_argument('--throttle', default='', help="throttle probability per call: '0.01' or 'comprehend=0.05'")
+    parser.add_argument('--errors', default='', help="error probability per call: '0.001' or 'transcribe=0.01'")
+    parser.add_argument('--completion-batch', type=int, default=0,
+                        help='deliver transcript events through the completion queue in batches of this size (0: one invocation each)')
+    parser.add_argument('--dialogue', action='store_true', help='two-party transcripts: customer replies between agent sentences')
+    parser.add_argument('--speaker-separation', default='off', choices=('off', 'channels', 'speakers', 'auto'),
+                        help='SPEAKER_SEPARATION for the processor')
+    parser.add_argument('--agent-only', action='store_true', help='AGENT_ONLY_ANALYSIS for the transcription handler')
+    parser.add_argument('--reference-table', action='store_true',
+                        help='load reference data into the reference table and look it up there instead of in S3')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--trace-memory', action='store_true', help='also report tracemalloc peak (slower)')
+    parser.add_argument('--verbose', action='store_true', help='show handler logs')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    faults = FaultProfile(
+        latency_ms=parse_service_values(args.latency),
+        throttle_rate=parse_service_values(args.throttle),
+        error_rate=parse_service_values(args.errors),
+        seed=args.seed
+    )
+    report = run_benchmark(args.calls, faults, args.audio_seconds, args.duplicate_rate, args.bulk_concurrency,
+                           args.seed, args.verbose, args.trace_memory, args.completion_batch,
+                           args.dialogue, args.speaker_separation, args.agent_only, args.reference_table)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
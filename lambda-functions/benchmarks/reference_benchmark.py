@@ -0,0 +1,201 @@
+"""
+Reference data benchmark: bulk loading and per-call lookups.
+
+Writes a synthetic CSV of reference accounts to the fake input bucket, loads
+it with the reference loader for each writer count, then times per-call
+lookups through the completion handler with the reference table and with the
+same records in one master_reference.json. Finally it uploads a Do Not Call
+list, lets the loader build its suppression index, and times membership checks
+of the reference records against it.
+
+    cd lambda-functions
+    python -m benchmarks.reference_benchmark
+    python -m benchmarks.reference_benchmark --records 200000 --writers 1,16 --latency dynamodb=5,s3=20 --json
+    python -m benchmarks.reference_benchmark --records 20000 --writers 16 --suppressed 1000000
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+
+from benchmarks.fake_aws import FakeAWS, FaultProfile
+from benchmarks.pipeline_benchmark import INPUT_BUCKET, LAMBDA_ROOT, TABLE_KEYS, handler_environment, load_handler, parse_service_values
+
+LOADER_HANDLER = 'batch-processing/reference-loader/index.py'
+COMPLETION_HANDLER = 'transcription-handler/index.py'
+UPLOAD_KEY = 'reference/accounts.csv'
+SUPPRESSION_KEY = 'suppression/do_not_call/dnc.csv'
+
+STATES = ('MA', 'MI', 'NH', 'AZ', 'TX', 'CA', 'NY', 'FL')
+FLAG_RATES = {'do_not_call': 0.02, 'attorney_retained': 0.01, 'bankruptcy_filed': 0.01, 'cease_desist': 0.005, 'third_party_risk': 0.05}
+
+
+def synthetic_rows(records, seed):
+    chooser = random.Random(seed)
+    for index in range(records):
+        row = {
+            'genesys_call_id': f'GEN-2024-{index:06d}',
+            'account_id': f'ACCT-{index:09d}',
+            'phone_number': f'(617) {index // 10000 % 1000:03d}-{index % 10000:04d}',
+            'agent_name': f'Agent {index % 97}',
+            'customer_name': f'Customer {index}',
+            'customer_state': chooser.choice(STATES),
+            'call_type': 'collections'
+        }
+        row.update((flag, 'true' if chooser.random() < rate else 'false') for flag, rate in FLAG_RATES.items())
+        yield row
+
+
+def seed_uploads(aws, records, seed):
+    """The CSV upload, and the same records as a monolithic master_reference.json"""
+    from shared.reference_data import reference_record
+    rows = list(synthetic_rows(records, seed))
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    aws.s3.add_object(INPUT_BUCKET, UPLOAD_KEY, text.getvalue().encode('utf-8'))
+    master = {'calls': {row['genesys_call_id']: reference_record(row) for row in rows}}
+    aws.s3.add_object(INPUT_BUCKET, 'reference/master_reference.json', json.dumps(master).encode('utf-8'))
+    return [row['genesys_call_id'] for row in rows]
+
+
+def seed_suppression_list(aws, rows, suppressed, seed):
+    """A Do Not Call list of `suppressed` numbers, 2% of them belonging to reference records"""
+    chooser = random.Random(seed)
+    listed = {row['phone_number'] for row in rows if chooser.random() < 0.02}
+    lines = ['phone_number'] + sorted(listed)
+    lines.extend(f'+1 212 {index // 10000 % 1000:03d} {index % 10000:04d}' for index in range(max(suppressed - len(listed), 0)))
+    aws.s3.add_object(INPUT_BUCKET, SUPPRESSION_KEY, '\n'.join(lines).encode('utf-8'))
+    return listed
+
+
+def run_suppression(aws, loader, records, suppressed, seed):
+    """Build the index through the loader, then check every reference record against it"""
+    from shared.suppression import SuppressionIndex, suppressed_flags
+    rows = list(synthetic_rows(records, seed))
+    listed = seed_suppression_list(aws, rows, suppressed, seed)
+    started = time.perf_counter()
+    built = loader.lambda_handler({'key': SUPPRESSION_KEY}, None)
+    build_seconds = time.perf_counter() - started
+    if built.get('statusCode') != 200:
+        raise RuntimeError(f"suppression build failed: {built.get('error')}")
+
+    index = SuppressionIndex(aws.s3, INPUT_BUCKET)
+    index.contains('do_not_call', [])  # Load the filter before timing
+    aws.api_calls.clear()
+    started = time.perf_counter()
+    flagged = [row['phone_number'] for row in rows if suppressed_flags(index, {'phone_number': row['phone_number']})]
+    check_seconds = time.perf_counter() - started
+    s3_reads = aws.api_calls['s3.get_object']
+
+    # Numbers on no list: the common case, answered by the filter alone
+    unlisted = [{'phone_number': f'(999) {index // 10000 % 1000:03d}-{index % 10000:04d}'} for index in range(len(rows))]
+    started = time.perf_counter()
+    for ref_data in unlisted:
+        suppressed_flags(index, ref_data)
+    unlisted_seconds = time.perf_counter() - started
+    return {
+        'list_size': built['suppression_lists'][0]['identifiers'],
+        'filter_bytes': built['suppression_lists'][0]['filter_bytes'],
+        'build_seconds': round(build_seconds, 3),
+        'check_us': round(check_seconds * 1e6 / len(rows), 2),
+        'unlisted_check_us': round(unlisted_seconds * 1e6 / len(unlisted), 2),
+        'flagged': len(flagged),
+        'exact_matches': len(listed),
+        'wrongly_flagged': len(set(flagged) - listed),
+        'filter_false_positives': index.false_positives,
+        's3_reads_while_checking': s3_reads
+    }
+
+
+def run(records, writers, lookups, faults, seed=7, suppressed=0):
+    aws = FakeAWS(faults, TABLE_KEYS)
+    os.environ.update(handler_environment(200, reference_table=True))
+    os.environ['LOADER_WRITERS'] = str(writers)
+    if LAMBDA_ROOT not in sys.path:
+        sys.path.insert(0, LAMBDA_ROOT)
+
+    with aws.installed(), contextlib.redirect_stdout(open(os.devnull, 'w')):
+        ids = seed_uploads(aws, records, seed)
+        loader = load_handler('reference_loader', LOADER_HANDLER)
+        started = time.perf_counter()
+        loaded = loader.lambda_handler({'key': UPLOAD_KEY}, None)
+        load_seconds = time.perf_counter() - started
+        if loaded.get('statusCode') != 200:
+            raise RuntimeError(f"reference load failed: {loaded.get('error') or loaded.get('files')}")
+
+        sample = random.Random(seed).sample(ids, min(lookups, len(ids)))
+        lookup_seconds = {}
+        found = {}
+        for mode, table in (('table', 'anycompany-reference-prod'), ('s3_file', '')):
+            os.environ['REFERENCE_TABLE'] = table
+            handler = load_handler('transcription_handler', COMPLETION_HANDLER)
+            started = time.perf_counter()
+            found[mode] = [handler.extract_reference_data_from_genesys_id(genesys_call_id) for genesys_call_id in sample]
+            lookup_seconds[mode] = time.perf_counter() - started
+
+        batch_write_requests = aws.api_calls['dynamodb.batch_write_item']
+        suppression = run_suppression(aws, loader, records, suppressed, seed) if suppressed else None
+
+    flags = ('do_not_call', 'attorney_retained', 'bankruptcy_filed', 'cease_desist', 'customer_state')
+    return {
+        'records': records,
+        'writers': writers,
+        'load_seconds': round(load_seconds, 3),
+        'records_per_second': round(records / load_seconds, 1) if load_seconds else None,
+        'batch_write_requests': batch_write_requests,
+        'lookup_ms': {mode: round(seconds * 1000 / len(sample), 3) for mode, seconds in lookup_seconds.items()},
+        'lookups_agree': sum(
+            all(table_record.get(flag) == file_record.get(flag) for flag in flags)
+            for table_record, file_record in zip(found['table'], found['s3_file'])
+        ),
+        'lookups': len(sample),
+        'suppression': suppression
+    }
+
+
+def print_report(results):
+    print(f"\n📇 Reference data, {results[0]['records']} records")
+    for result in results:
+        print(f"   writers={result['writers']:<4} load {result['load_seconds']:>8.3f}s {result['records_per_second']:>10.1f} records/s"
+              f"   {result['batch_write_requests']} batch_write_item requests")
+    last = results[-1]
+    print(f"\n🔎 Per-call lookup: table {last['lookup_ms']['table']} ms, master_reference.json {last['lookup_ms']['s3_file']} ms"
+          f"   ({last['lookups_agree']}/{last['lookups']} agree)")
+    suppression = last['suppression']
+    if suppression:
+        print(f"\n🚫 Do Not Call index: {suppression['list_size']} numbers, {suppression['filter_bytes'] / 1024 / 1024:.2f} MB filter,"
+              f" built in {suppression['build_seconds']}s")
+        print(f"   {suppression['unlisted_check_us']} µs per check of an unlisted number, {suppression['check_us']} µs per reference record")
+        print(f"   {suppression['flagged']} flagged ({suppression['exact_matches']} listed,"
+              f" {suppression['wrongly_flagged']} wrong), {suppression['filter_false_positives']} filter false positives,"
+              f" {suppression['s3_reads_while_checking']} S3 reads")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reference table bulk load and lookup benchmark')
+    parser.add_argument('--records', type=int, default=50000)
+    parser.add_argument('--writers', default='1,16', help='comma-separated LOADER_WRITERS values')
+    parser.add_argument('--lookups', type=int, default=50)
+    parser.add_argument('--suppressed', type=int, default=100000, help='Do Not Call list size (0 to skip)')
+    parser.add_argument('--latency', help="ms per API call, e.g. 'dynamodb=5,s3=20'")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    faults = FaultProfile(latency_ms=parse_service_values(args.latency), seed=args.seed)
+    results = [run(args.records, int(writers), args.lookups, faults, args.seed, args.suppressed) for writers in args.writers.split(',')]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
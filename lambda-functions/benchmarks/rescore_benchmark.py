@@ -0,0 +1,155 @@
+"""
+Re-scoring benchmark: stored calls re-evaluated after a rule edit.
+
+Seeds the fake calls table with completed, already-scored calls from the
+synthetic corpus, edits one rule, then runs the rescore Lambda for each worker
+count. Reports calls/sec, API calls (Transcribe and Comprehend must stay at
+zero) and whether the merged violations match scoring every call from scratch
+with the edited rules.
+
+    cd lambda-functions
+    python -m benchmarks.rescore_benchmark
+    python -m benchmarks.rescore_benchmark --calls 20000 --workers 1,8,32 --latency dynamodb=5 --json
+    python -m benchmarks.rescore_benchmark --reference-table
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from decimal import Decimal
+
+from benchmarks.fake_aws import FakeAWS, FaultProfile
+from benchmarks.pipeline_benchmark import (INPUT_BUCKET, LAMBDA_ROOT, TABLE_KEYS, handler_environment, load_handler,
+                                           load_seed_rules, parse_service_values)
+from benchmarks.transcript_corpus import CorpusGenerator
+
+RESCORE_HANDLER = 'batch-processing/rescore/index.py'
+LOADER_HANDLER = 'batch-processing/reference-loader/index.py'
+
+# The rule edit being rolled out: threats only count in the first two minutes
+EDITED_RULE_ID = 'LO1007.05'
+EDITED_LOGIC = {
+    'type': 'pattern_match',
+    'violation': {'terms': ['arrest', 'jail', 'prison', 'police', 'legal action', 'lawsuit'], 'window': 'first_120_seconds'},
+    'reason': 'threatening language early in the call'
+}
+
+
+def seed_calls(aws, rule_dsl, rules, calls, seed):
+    """Completed call records scored with the current rules, plus the matching reference file"""
+    from shared.reference_data import normalize_reference_data
+    compiled = [rule_dsl.compile_rule(rule) for rule in rules if rule.get('active')]
+    calls_table = aws.dynamodb.Table('anycompany-calls-prod')
+    voicemails = {}
+    for index, record in enumerate(CorpusGenerator(seed).generate(calls)):
+        genesys_call_id = f'GEN-2024-{index:06d}'
+        voicemails[genesys_call_id] = record['reference']
+        context = rule_dsl.CallContext(record['transcript'], normalize_reference_data(record['reference']))
+        violations = [
+            rule_dsl.violation_record(rule.rule, record['call_id']) for rule in compiled if rule.evaluate(context)
+        ]
+        calls_table._write(json.loads(json.dumps({
+            'call_id': record['call_id'],
+            'status': 'completed',
+            'genesys_call_id': genesys_call_id,
+            'transcript': record['transcript'],
+            'entities': {},
+            'violations': violations
+        }), parse_float=Decimal))
+    aws.s3.add_object(INPUT_BUCKET, 'voicemail-calls/voicemail_reference.json',
+                      json.dumps({'voicemails': voicemails}).encode('utf-8'))
+
+
+def expected_codes(aws, rule_dsl, rules):
+    """Violation codes per call when every call is scored from scratch with the edited rules"""
+    from shared.reference_data import load_reference_index
+    references = load_reference_index(aws.s3, INPUT_BUCKET)
+    compiled = [rule_dsl.compile_rule(rule) for rule in rules if rule.get('active')]
+    expected = {}
+    for call in aws.dynamodb.Table('anycompany-calls-prod').all_items():
+        context = rule_dsl.CallContext(call['transcript'], references.get(call['genesys_call_id']) or {})
+        expected[call['call_id']] = sorted(rule.rule_id for rule in compiled if rule.evaluate(context))
+    return expected
+
+
+def run_rescore(calls, workers, faults, seed=7, reference_table=False):
+    aws = FakeAWS(faults, TABLE_KEYS)
+    os.environ.update(handler_environment(200, reference_table=reference_table))
+    if LAMBDA_ROOT not in sys.path:
+        sys.path.insert(0, LAMBDA_ROOT)
+
+    with aws.installed(), contextlib.redirect_stdout(open(os.devnull, 'w')):
+        from shared import rule_dsl
+        handler = load_handler('rescore', RESCORE_HANDLER)
+        rules = [json.loads(json.dumps(rule), parse_float=Decimal) for rule in load_seed_rules()]
+        rules_table = aws.dynamodb.Table('anycompany-rules-prod')
+        for rule in rules:
+            rules_table._write(rule)
+        seed_calls(aws, rule_dsl, rules, calls, seed)
+        if reference_table:
+            load_handler('reference_loader', LOADER_HANDLER).lambda_handler({'key': 'voicemail-calls/voicemail_reference.json'}, None)
+
+        edited = next(rule for rule in rules if rule['rule_id'] == EDITED_RULE_ID)
+        edited['logic'] = EDITED_LOGIC
+        rules_table._write(edited)
+        expected = expected_codes(aws, rule_dsl, rules)
+
+        aws.api_calls.clear()
+        started = time.perf_counter()
+        result = handler.lambda_handler({'rule_ids': [EDITED_RULE_ID], 'segments': workers}, None)
+        elapsed = time.perf_counter() - started
+
+        stored = {
+            call['call_id']: sorted(violation['code'] for violation in call.get('violations') or [])
+            for call in aws.dynamodb.Table('anycompany-calls-prod').all_items()
+        }
+
+    if result.get('statusCode') != 200:
+        raise RuntimeError(f"rescore failed: {result.get('error')}")
+    return {
+        'calls': calls,
+        'workers': workers,
+        'seconds': round(elapsed, 3),
+        'calls_per_second': round(calls / elapsed, 1) if elapsed else None,
+        'counts': result['counts'],
+        'matches_full_rescore': sum(stored[call_id] == codes for call_id, codes in expected.items()),
+        'api_calls': dict(sorted(Counter(aws.api_calls).items()))
+    }
+
+
+def print_report(results):
+    print(f"\n🔁 Re-scoring {EDITED_RULE_ID} over {results[0]['calls']} stored calls")
+    for result in results:
+        counts = result['counts']
+        print(f"   workers={result['workers']:<4} {result['seconds']:>8.3f}s {result['calls_per_second']:>10.1f} calls/s"
+              f"   changed={counts.get('calls_changed', 0)} added={counts.get('violations_added', 0)}"
+              f" removed={counts.get('violations_removed', 0)}"
+              f"   match full rescore={result['matches_full_rescore']}/{result['calls']}")
+    print('\n📞 API calls (last run)')
+    for operation, count in results[-1]['api_calls'].items():
+        print(f"   {operation:<40} {count:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental re-scoring throughput over stored calls')
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--workers', default='1,8', help='comma-separated parallel scan segment counts')
+    parser.add_argument('--latency', help="ms per API call, e.g. 'dynamodb=5'")
+    parser.add_argument('--reference-table', action='store_true', help='read reference data from the reference table')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    faults = FaultProfile(latency_ms=parse_service_values(args.latency))
+    results = [run_rescore(args.calls, int(workers), faults, args.seed, args.reference_table) for workers in args.workers.split(',')]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
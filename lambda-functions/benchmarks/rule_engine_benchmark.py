@@ -0,0 +1,204 @@
+"""
+Rule-engine benchmark over the synthetic corpus: per-call evaluation time as a
+function of rule count and transcript length, plus detection parity against the
+corpus labels. Parity is scored over every labelled rule, and again without the
+rules whose engine semantics differ from their labels (transcript_corpus.ENGINE_GAPS,
+each reported with the reason).
+
+    cd lambda-functions
+    python -m benchmarks.rule_engine_benchmark
+    python -m benchmarks.rule_engine_benchmark --durations 30,600,3600 --rule-counts 43,200,800 --json
+
+Rules beyond the 43 seed rules are synthetic pattern_match rules whose phrases
+never occur, so larger counts measure scanning cost rather than match handling.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+from benchmarks.fake_aws import FakeAWS
+from benchmarks.pipeline_benchmark import LAMBDA_ROOT, load_handler, load_seed_rules
+from benchmarks.transcript_corpus import ENGINE_GAPS, LABELLED_RULES, CorpusGenerator
+
+PADDING_VOCABULARY = ['quartz', 'lantern', 'meridian', 'sapphire', 'orchard', 'glacier', 'tandem', 'velvet',
+                      'harbor', 'juniper', 'cobalt', 'falcon', 'prism', 'thistle', 'ember', 'zephyr']
+
+
+def padded_rules(seed_rules, count, seed=0):
+    """First `count` seed rules, topped up with never-matching synthetic pattern rules"""
+    rules = list(seed_rules[:count])
+    rng = random.Random(seed)
+    for index in range(len(rules), count):
+        rules.append({
+            'rule_id': f'SYN{index:04d}',
+            'description': 'Synthetic load-test rule',
+            'severity': 'minor',
+            'active': True,
+            'logic': {
+                'type': 'pattern_match',
+                'patterns': [' '.join(rng.sample(PADDING_VOCABULARY, 3)) for _ in range(rng.randint(2, 6))]
+            }
+        })
+    return rules
+
+
+def evaluate_call(handler, rules, record):
+    """The rule loop of process_with_rule_engine, minus the reference fetch"""
+    ref_data = handler.normalize_reference_data(record['reference'])
+    context = handler.CallContext(record['transcript'], ref_data)
+    violations = []
+    for rule in rules:
+        violation = handler.evaluate_rule_simple(rule, record['transcript'], record['call_id'], ref_data, context,
+                                                 handler.compile_rule(rule))
+        if violation:
+            violations.append(violation)
+    return violations
+
+
+def timing_matrix(handler, seed_rules, durations, rule_counts, transcripts_per_bucket, seed):
+    generator = CorpusGenerator(seed)
+    results = []
+    for duration in durations:
+        records = list(generator.generate(transcripts_per_bucket, start=duration * 1000, duration_seconds=duration))
+        mean_words = statistics.mean(record['word_count'] for record in records)
+        for rule_count in rule_counts:
+            rules = padded_rules(seed_rules, rule_count, seed)
+            samples = []
+            for record in records:
+                started = time.perf_counter()
+                evaluate_call(handler, rules, record)
+                samples.append((time.perf_counter() - started) * 1000)
+            samples.sort()
+            mean_ms = statistics.mean(samples)
+            results.append({
+                'duration_seconds': duration,
+                'words': round(mean_words),
+                'rules': rule_count,
+                'mean_ms': round(mean_ms, 3),
+                'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+                'us_per_rule_per_1k_words': round(mean_ms * 1000 / rule_count / (mean_words / 1000), 2)
+            })
+    return results
+
+
+def rule_rows(counts):
+    return {
+        rule_id: {
+            'tp': count['tp'], 'fp': count['fp'], 'fn': count['fn'],
+            'precision': round(count['tp'] / (count['tp'] + count['fp']), 3) if count['tp'] + count['fp'] else None,
+            'recall': round(count['tp'] / (count['tp'] + count['fn']), 3) if count['tp'] + count['fn'] else None
+        }
+        for rule_id, count in counts.items()
+    }
+
+
+def micro_scores(counts, rule_ids, exact, calls):
+    total = Counter()
+    for rule_id in rule_ids:
+        total.update(counts[rule_id])
+    precision = total['tp'] / (total['tp'] + total['fp']) if total['tp'] + total['fp'] else 0.0
+    recall = total['tp'] / (total['tp'] + total['fn']) if total['tp'] + total['fn'] else 0.0
+    return {
+        'rules': len(rule_ids),
+        'exact_match_rate': round(exact / calls, 3) if calls else None,
+        'micro_precision': round(precision, 3),
+        'micro_recall': round(recall, 3),
+        'micro_f1': round(2 * precision * recall / (precision + recall), 3) if precision + recall else 0.0
+    }
+
+
+def parity(handler, seed_rules, calls, seed):
+    """
+    Per-rule precision/recall of the engine against the corpus labels. Headline
+    numbers cover every labelled rule; 'engine_aligned' repeats them without the
+    ENGINE_GAPS rules, whose per-rule rows carry the reason labels and engine differ.
+    """
+    aligned = [rule_id for rule_id in LABELLED_RULES if rule_id not in ENGINE_GAPS]
+    counts = {rule_id: Counter() for rule_id in LABELLED_RULES}
+    exact = exact_aligned = 0
+    for record in CorpusGenerator(seed).generate(calls):
+        predicted = {violation['code'] for violation in evaluate_call(handler, seed_rules, record)} & set(LABELLED_RULES)
+        expected = set(record['expected_violations'])
+        exact += predicted == expected
+        exact_aligned += predicted & set(aligned) == expected & set(aligned)
+        for rule_id in LABELLED_RULES:
+            if rule_id in predicted and rule_id in expected:
+                counts[rule_id]['tp'] += 1
+            elif rule_id in predicted:
+                counts[rule_id]['fp'] += 1
+            elif rule_id in expected:
+                counts[rule_id]['fn'] += 1
+
+    per_rule = rule_rows(counts)
+    for rule_id, reason in ENGINE_GAPS.items():
+        per_rule[rule_id]['gap'] = reason
+    return dict(
+        micro_scores(counts, LABELLED_RULES, exact, calls),
+        calls=calls,
+        engine_aligned=micro_scores(counts, aligned, exact_aligned, calls),
+        gaps=sorted(ENGINE_GAPS),
+        per_rule=per_rule
+    )
+
+
+def print_report(report):
+    print('\n⏱️ Evaluation time per call')
+    print(f"   {'seconds':>8} {'words':>7} {'rules':>6} {'mean ms':>10} {'p95 ms':>10} {'us/rule/1k words':>17}")
+    for row in report['timing']:
+        print(f"   {row['duration_seconds']:>8} {row['words']:>7} {row['rules']:>6} {row['mean_ms']:>10.3f} "
+              f"{row['p95_ms']:>10.3f} {row['us_per_rule_per_1k_words']:>17.2f}")
+
+    result = report['parity']
+    aligned = result['engine_aligned']
+    print(f"\n🎯 Parity over {result['calls']} labelled calls, all {result['rules']} labelled rules: "
+          f"exact={result['exact_match_rate']} precision={result['micro_precision']} "
+          f"recall={result['micro_recall']} f1={result['micro_f1']}")
+    print(f"   without the {len(result['gaps'])} intent-vs-engine gaps ({aligned['rules']} rules): "
+          f"exact={aligned['exact_match_rate']} precision={aligned['micro_precision']} "
+          f"recall={aligned['micro_recall']} f1={aligned['micro_f1']}")
+    for rule_id, row in result['per_rule'].items():
+        print(f"   {rule_id:<10} tp={row['tp']:<5} fp={row['fp']:<5} fn={row['fn']:<5} "
+              f"precision={row['precision']} recall={row['recall']}" + (f"  gap: {row['gap']}" if 'gap' in row else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rule-engine timing and parity benchmark')
+    parser.add_argument('--durations', default='30,120,600,3600', help='transcript lengths in seconds')
+    parser.add_argument('--rule-counts', default='10,43,100,400')
+    parser.add_argument('--transcripts-per-bucket', type=int, default=20)
+    parser.add_argument('--parity-calls', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    if LAMBDA_ROOT not in sys.path:
+        sys.path.insert(0, LAMBDA_ROOT)
+    os.environ.setdefault('RULES_TABLE', 'anycompany-rules-prod')
+
+    # The handler module imports boto3 at load time; rule evaluation itself makes no AWS calls
+    with FakeAWS().installed():
+        handler = load_handler('transcription_handler', 'transcription-handler/index.py')
+    seed_rules = [rule for rule in load_seed_rules() if rule.get('active')]
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        report = {
+            'timing': timing_matrix(handler, seed_rules, [int(value) for value in args.durations.split(',')],
+                                    [int(value) for value in args.rule_counts.split(',')],
+                                    args.transcripts_per_bucket, args.seed),
+            'parity': parity(handler, seed_rules, args.parity_calls, args.seed)
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Synthetic transcript corpus for rule-engine load testing.
+
+Transcripts are assembled from the voicemail_reference.json scripts, generated
+names, states and reference flags, and optional violation phrases. Lengths run
+from a short voicemail to an hour-long call. Every record carries the
+violations a reviewer would expect (labels follow the rule descriptions in the
+infrastructure.yaml seed, not the current engine's behaviour).
+
+    cd lambda-functions
+    python -m benchmarks.transcript_corpus --count 1000 --output corpus.jsonl
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+
+LAMBDA_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERENCE_PATH = os.path.join(os.path.dirname(LAMBDA_ROOT), 'voicemail-calls', 'voicemail_reference.json')
+
+# Transcribe output runs at roughly 150 spoken words per minute
+WORDS_PER_SECOND = 2.5
+
+FIRST_NAMES = ['James', 'Maria', 'Robert', 'Linda', 'Michael', 'Patricia', 'David', 'Jennifer', 'William', 'Elizabeth',
+               'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Karen', 'Daniel', 'Nancy', 'Anthony', 'Lisa',
+               'Kevin', 'Angela', 'Brian', 'Melissa', 'Carlos', 'Aisha', 'Wei', 'Priya', 'Omar', 'Sofia']
+LAST_NAMES = ['Smith', 'Garcia', 'Johnson', 'Martinez', 'Brown', 'Davis', 'Miller', 'Wilson', 'Anderson', 'Taylor',
+              'Thomas', 'Moore', 'Jackson', 'Lee', 'Harris', 'Clark', 'Lewis', 'Walker', 'Young', 'King',
+              'Nguyen', 'Patel', 'Rivera', 'Campbell', 'Mitchell', 'Roberts', 'Chen', 'Okafor', 'Kowalski', 'Haddad']
+SUFFIXES = ['Jr.', 'Sr.', 'III']
+STATES = ['MA', 'MI', 'NH', 'AZ', 'TX', 'CA', 'NY', 'FL', 'MN', 'CT', 'NV', 'OH', 'GA', 'PA', 'IL', 'WA', 'VT', 'OR']
+# LO1001.10: states where the company name must be given
+COMPANY_ID_STATES = ['TX', 'HI', 'OR', 'AR', 'IA', 'ND', 'VT', 'WV']
+
+VIOLATION_PHRASES = {
+    'LO1007.05': [
+        'If this is not resolved we will have you arrested.',
+        'People who ignore this kind of debt can end up in jail.',
+        'We are prepared to garnish your wages starting next month.'
+    ],
+    'LO1007.06': [
+        'Ignoring us will destroy your credit.',
+        'This is going to ruin your credit forever.'
+    ],
+    'LO1006.04': [
+        'We will repossess the vehicle if we do not hear from you.',
+        'We can take your car back as soon as tomorrow.'
+    ],
+    'LO1006.03': [
+        'You must pay the full amount today.',
+        'You need to pay now to stop further action.'
+    ],
+    'LO1005.08': [
+        'I will also send you a text message with the details.',
+        'You should receive an SMS from us shortly.'
+    ],
+    'LO1005.14': [
+        'What the hell is going on with this account?',
+        'This is a damn mess and it needs to be fixed.'
+    ]
+}
+
+# Flag-driven rules: contacting the customer at all is the violation
+FLAG_RULES = {
+    'do_not_call': 'LO1005.11',
+    'cease_desist': 'LO1005.04',
+    'attorney_retained': 'LO1005.05',
+    'bankruptcy_filed': 'LO1005.06'
+}
+
+# Rules whose expected outcome the generator controls; parity is scored on these only
+LABELLED_RULES = sorted(set(VIOLATION_PHRASES) | set(FLAG_RULES.values()) |
+                        {'LO1001.03', 'LO1001.06', 'LO1001.08', 'LO1001.09', 'LO1001.10', 'LO1001.12'})
+
+# Labelled rules where the engine's documented semantics differ from the rule's
+# intent, so their labels measure the gap rather than the engine. Stored
+# `patterns` fire when a phrase IS said; `required`, `condition`, `context` and
+# `check` in the seed logic are not applied to them.
+ENGINE_GAPS = {
+    'LO1001.03': 'fires when "my name is"/"this is" is said; the label is the full name missing in MA',
+    'LO1001.06': 'fires when "my name is"/"this is" is said; the label is the agent name missing',
+    'LO1001.08': 'checked on live calls too; the label covers voicemails only',
+    'LO1001.09': 'checked on live calls too; the label covers voicemails only',
+    'LO1001.10': 'fires when "anycompany servicing" is said, in any state; the label is the name missing in listed states',
+    'LO1001.12': 'fires when "anycompany servicing" is said; the label is the name missing',
+    'LO1005.08': 'sms_consent is not checked; the label excludes consented customers',
+    'LO1006.03': 'cure_period_expired is not checked; the label is demands before the cure period ends',
+    'LO1006.04': 'cure_period_expired is not checked; the label is threats before the cure period ends'
+}
+
+NEUTRAL_FILLER = [
+    'I can see the last payment was received at the beginning of the month.',
+    'We have a few options available depending on your situation.',
+    'Let me pull up the details on my screen.',
+    'The due date can be adjusted once in a twelve month period.',
+    'I will note the account with what we discussed today.',
+    'Our office hours are Monday through Friday from eight to eight.',
+    'Could you confirm the best number to reach you?',
+    'I understand, thank you for explaining that.',
+    'We can set up a payment arrangement if that helps.',
+    'The online portal also shows your payment history.',
+    'Would a date later in the month work better for you?',
+    'I will stay on the line while you check.',
+    'That amount includes the late fee from last cycle.',
+    'Once the payment posts you will get a confirmation.',
+    'Is there anything else I can help with on the account?',
+    'Okay, I have updated the mailing address.',
+    'Let me read that back to make sure I have it right.',
+    'The vehicle details on file look correct.'
+]
+
+# Script sentences that would change a label are not reused as filler
+FILLER_EXCLUDE = re.compile(
+    r'this is|my name|speaking|anycompany|text|sms|email|jail|prison|arrest|garnish|sue|credit|repossess|'
+    r'take your car|legal action|pay now|must pay|payment due|hell|damn|shit|fuck|manager|medical|hospital|'
+    r'doctor|surgery|illness|health|sick|attempt to collect', re.IGNORECASE)
+
+MINI_MIRANDA = 'This is an attempt to collect a debt and any information obtained will be used for that purpose.'
+
+
+def script_filler(reference):
+    """Neutral sentences from the reference scripts, with their names removed"""
+    names = set()
+    for details in reference['voicemails'].values():
+        for field in ('agent_name', 'customer_name'):
+            names.update((details.get(field) or '').replace('.', '').split())
+    sentences = []
+    for details in reference['voicemails'].values():
+        for sentence in re.split(r'(?<=[.?!])\s+', details.get('script_content', '')):
+            if sentence and not FILLER_EXCLUDE.search(sentence) and not any(name in sentence for name in names):
+                sentences.append(sentence)
+    return sentences
+
+
+class CorpusGenerator:
+    """Deterministic for a given seed: record i is the same on every run"""
+
+    def __init__(self, seed=0, reference_path=REFERENCE_PATH, min_seconds=30, max_seconds=3600):
+        with open(reference_path) as f:
+            self.reference = json.load(f)
+        self.seed = seed
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.filler = NEUTRAL_FILLER + script_filler(self.reference)
+
+    def _name(self, rng, suffix_rate=0.0):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        return f'{name} {rng.choice(SUFFIXES)}' if rng.random() < suffix_rate else name
+
+    def _duration(self, rng):
+        # Log-uniform so short voicemails and hour-long calls are both well represented
+        return round(math.exp(rng.uniform(math.log(self.min_seconds), math.log(self.max_seconds))))
+
+    def record(self, index, duration_seconds=None):
+        rng = random.Random(f'{self.seed}:{index}')
+        duration = duration_seconds or self._duration(rng)
+        call_type = 'voicemail' if duration <= 120 or rng.random() < 0.2 else 'live_call'
+        voicemail = call_type == 'voicemail'
+
+        agent = self._name(rng)
+        customer = self._name(rng, suffix_rate=0.3)
+        state = rng.choice(STATES)
+        flags = {flag: rng.random() < 0.04 for flag in FLAG_RULES}
+        flags.update({
+            'voicemail_context': voicemail,
+            'third_party_risk': voicemail and rng.random() < 0.2,
+            'sms_consent': rng.random() < 0.3,
+            'cure_period_expired': rng.random() < 0.5
+        })
+
+        expected = set(FLAG_RULES[flag] for flag in FLAG_RULES if flags[flag])
+
+        # Opening: agent and company identification
+        identification = rng.random()
+        if identification < 0.65:
+            opening = [f'Hello, my name is {agent} with AnyCompany Servicing.']
+        elif identification < 0.8:
+            # First name only: not enough in Massachusetts
+            opening = [f'Hi, this is {agent.split()[0]} calling from AnyCompany Servicing.']
+            if state == 'MA':
+                expected.add('LO1001.03')
+        elif identification < 0.9:
+            opening = [f'Hello, my name is {agent}.']
+            expected.add('LO1001.12')
+            if state in COMPANY_ID_STATES:
+                expected.add('LO1001.10')
+        else:
+            opening = ['Hello, I am calling about an important business matter.']
+            expected.update(['LO1001.06', 'LO1001.12'])
+            if state == 'MA':
+                expected.add('LO1001.03')
+            if state in COMPANY_ID_STATES:
+                expected.add('LO1001.10')
+
+        # Customer name: full name (with any suffix), missing suffix/last name, or the wrong name
+        customer_parts = customer.split()
+        naming = rng.random()
+        if naming < 0.7:
+            addressed = customer
+        elif naming < 0.88:
+            addressed = ' '.join(customer_parts[:2]) if len(customer_parts) > 2 else customer_parts[0]
+            if voicemail:
+                expected.add('LO1001.08')
+        else:
+            wrong_last = rng.choice([name for name in LAST_NAMES if name != customer_parts[1]])
+            addressed = f'{customer_parts[0]} {wrong_last}'
+            expected.add('LO1001.09')
+            if voicemail:
+                expected.add('LO1001.08')
+        opening.append(f'I am calling for {addressed}.' if voicemail else f'Am I talking with {addressed}?')
+        if rng.random() < 0.9:
+            opening.append(MINI_MIRANDA)
+
+        # Violations injected at random points in the body
+        injected = []
+        for rule_id, phrases in VIOLATION_PHRASES.items():
+            if rng.random() < 0.06:
+                injected.append(rng.choice(phrases))
+                if rule_id == 'LO1005.14' and not voicemail:
+                    continue
+                if rule_id == 'LO1005.08' and flags['sms_consent']:
+                    continue
+                if rule_id in ('LO1006.03', 'LO1006.04') and flags['cure_period_expired']:
+                    continue
+                expected.add(rule_id)
+
+        amount = f'${rng.randint(150, 9000):,}.{rng.randint(0, 99):02d}'
+        body = [f'Your account is currently past due in the amount of {amount}.']
+        target_words = int(duration * WORDS_PER_SECOND)
+        words = sum(len(sentence.split()) for sentence in opening + body + injected) + 12
+        while words < target_words:
+            sentence = rng.choice(self.filler)
+            body.append(sentence)
+            words += len(sentence.split())
+        for phrase in injected:
+            body.insert(rng.randint(1, len(body)), phrase)
+
+        closing = ['Please call us back at 1-800-555-0123 at your earliest convenience. Thank you.']
+        transcript = ' '.join(opening + body + closing)
+
+        prefix = 'VM' if voicemail else 'GEN'
+        genesys_id = f'{prefix}-2025-{index % 1000000:06d}'
+        filename = (f'voicemail_{index:06d}_VM_2025_{index % 1000000:06d}.wav' if voicemail
+                    else f'agent_call_{index:06d}_GEN_2025_{index % 1000000:06d}.wav')
+        return {
+            'call_id': f'synthetic-{self.seed}-{index:07d}',
+            'filename': filename,
+            'genesys_id': genesys_id,
+            'duration_seconds': duration,
+            'word_count': len(transcript.split()),
+            # Same layout as voicemail_reference.json entries
+            'reference': {
+                'agent_name': agent,
+                'customer_name': customer,
+                'customer_state': state,
+                'call_type': call_type,
+                'flags': flags
+            },
+            'transcript': transcript,
+            'expected_violations': sorted(expected)
+        }
+
+    def generate(self, count, start=0, duration_seconds=None):
+        for index in range(start, start + count):
+            yield self.record(index, duration_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a labelled synthetic transcript corpus (JSONL)')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-seconds', type=int, default=30)
+    parser.add_argument('--max-seconds', type=int, default=3600)
+    parser.add_argument('--output', default='-', help="JSONL path, or '-' for stdout")
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(args.seed, min_seconds=args.min_seconds, max_seconds=args.max_seconds)
+    output = open(args.output, 'w') if args.output != '-' else None
+    try:
+        for record in generator.generate(args.count):
+            line = json.dumps(record)
+            if output:
+                output.write(line + '\n')
+            else:
+                print(line)
+    finally:
+        if output:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
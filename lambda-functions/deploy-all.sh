@@ -6,6 +6,8 @@ echo ""
 # Make scripts executable
 chmod +x transcription-handler/deploy.sh
 chmod +x api-function/deploy.sh
+chmod +x processor/deploy.sh
+chmod +x batch-processing/deploy.sh
 
 # Deploy transcription handler
 echo "1️⃣ Deploying Transcription Handler..."
@@ -21,11 +23,28 @@ cd api-function
 ./deploy.sh
 cd ..
 
+echo ""
+
+# Deploy processor function
+echo "3️⃣ Deploying Processor Function..."
+cd processor
+./deploy.sh
+cd ..
+
+echo ""
+
+# Deploy batch processing functions
+echo "4️⃣ Deploying Batch Processing Functions..."
+cd batch-processing
+./deploy.sh
+cd ..
+
 echo ""
 echo "✅ All Lambda functions deployed successfully!"
 echo ""
 echo "🎯 Updated Functions:"
 echo "   ✅ Transcription completion handler (S3 processing, Decimal handling)"
 echo "   ✅ API function (Decimal serialization, rules grouping)"
+echo "   ✅ Processor and batch functions (idempotent call IDs)"
 echo ""
 echo "🚀 Platform is ready for production use!"
\ No newline at end of file
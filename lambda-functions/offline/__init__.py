@@ -0,0 +1,5 @@
+"""Command-line tools that run the compliance logic without AWS.
+
+Run from ``lambda-functions/`` with ``python -m offline.<module>``; nothing
+here is bundled into a deployment package.
+"""
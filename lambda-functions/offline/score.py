@@ -0,0 +1,241 @@
+"""
+Score a folder of transcripts with the compliance rules, locally.
+
+Reads Transcribe output JSON (`results.transcripts[0].transcript`, with word
+timings from `results.items`) or plain `.txt` files. Each file goes through the
+completion handler's `extract_compliance_patterns` and the compiled rules, in a
+multiprocessing pool, and one JSON line per file is written. Reference data comes
+from a local `voicemail_reference.json`, matched on the Genesys ID in the file
+name. Comprehend entities are not available offline, so only the pattern-based
+entities are produced. No AWS service is called.
+
+    cd lambda-functions
+    python -m offline.score /data/transcripts --output results.jsonl
+    python -m offline.score --scripts --output bundled.jsonl     # the bundled voicemail scripts
+    python -m offline.score /data/transcripts --rules rules.json --workers 16 --output -
+
+`--rules` takes a JSON list of rule items (or a DynamoDB scan export with an
+`Items` list in plain JSON). By default the seed rules in infrastructure.yaml
+are used. Throughput goes to stderr.
+"""
+import argparse
+import ast
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+LAMBDA_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(LAMBDA_ROOT)
+HANDLER_PATH = os.path.join(LAMBDA_ROOT, 'transcription-handler', 'index.py')
+DEFAULT_REFERENCE_PATH = os.path.join(REPO_ROOT, 'voicemail-calls', 'voicemail_reference.json')
+SEED_RULES_PATH = os.path.join(REPO_ROOT, 'infrastructure.yaml')
+
+TRANSCRIPT_EXTENSIONS = ('.json', '.txt')
+
+# Per worker process, set up once by init_worker
+_worker = {}
+
+
+def load_seed_rules(path=SEED_RULES_PATH):
+    """The rule list seeded by infrastructure.yaml"""
+    with open(path) as f:
+        template = f.read()
+    start = template.index('rules = [', template.index('def seed_rules():')) + len('rules = ')
+    depth = 0
+    for end in range(start, len(template)):
+        depth += template[end] == '['
+        depth -= template[end] == ']'
+        if depth == 0:
+            break
+    return ast.literal_eval(template[start:end + 1])
+
+
+def load_rules(path=None):
+    if not path:
+        return load_seed_rules()
+    with open(path) as f:
+        rules = json.load(f)
+    return rules['Items'] if isinstance(rules, dict) else rules
+
+
+def load_references(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('voicemails', {})
+
+
+def list_transcripts(directory):
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(TRANSCRIPT_EXTENSIONS))
+    return sorted(paths)
+
+
+def load_handler():
+    """The completion handler module; importing it creates no AWS clients"""
+    if LAMBDA_ROOT not in sys.path:
+        sys.path.insert(0, LAMBDA_ROOT)
+    spec = importlib.util.spec_from_file_location('offline_transcription_handler', HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def init_worker(rules, references):
+    """Load the handler and compile the active rules once per process"""
+    handler = load_handler()
+    from shared.rule_dsl import compile_rule
+    _worker['handler'] = handler
+    _worker['rules'] = [compile_rule(rule) for rule in rules if rule.get('active', True)]
+    _worker['references'] = references
+
+
+def read_transcript(path):
+    """(text, Transcribe items or None, audio seconds or None)"""
+    with open(path, encoding='utf-8') as f:
+        if not path.lower().endswith('.json'):
+            return f.read(), None, None
+        results = json.load(f)['results']
+    items = results.get('items') or []
+    end_times = [float(item['end_time']) for item in items if item.get('end_time') is not None]
+    return results['transcripts'][0]['transcript'], items, (max(end_times) if end_times else None)
+
+
+def score_transcript(job):
+    """One JSON result line for (name, path, inline text); runs in a worker process"""
+    name, path, text = job
+    handler = _worker['handler']
+    started = time.perf_counter()
+    try:
+        items = audio_seconds = None
+        if text is None:
+            text, items, audio_seconds = read_transcript(path)
+
+        # The filename patterns expect the audio file name
+        genesys_call_id = handler.extract_genesys_id_from_filename(os.path.splitext(name)[0] + '.wav')
+        reference = _worker['references'].get(genesys_call_id)
+        ref_data = handler.normalize_reference_data(reference) if reference else {}
+
+        # Same chunking as the Comprehend calls, so first-chunk patterns match the Lambda
+        from shared.text_chunks import iter_chunks
+        entities = handler.new_entities()
+        chunks = iter_chunks(text, handler.COMPREHEND_CHUNK_BYTES, handler.COMPREHEND_OVERLAP_BYTES)
+        for index, (_, end, new_start) in enumerate(chunks):
+            handler.extract_compliance_patterns(text[new_start:end], entities, index == 0)
+
+        from shared.rule_dsl import CallContext
+        context = CallContext(text, ref_data, entities, items)
+        violations = []
+        for compiled in _worker['rules']:
+            reasons = compiled.evaluate(context)
+            if reasons:
+                violations.append({
+                    'code': compiled.rule_id,
+                    'severity': compiled.rule.get('severity', 'minor'),
+                    'comment': compiled.rule.get('description', 'Rule violation detected'),
+                    'reasons': reasons
+                })
+
+        result = {
+            'file': name,
+            'genesys_call_id': genesys_call_id,
+            'reference_found': reference is not None,
+            'words': len(text.split()),
+            'audio_seconds': audio_seconds,
+            'violations': violations,
+            'entities': {entity_type: [entity['text'] for entity in found] for entity_type, found in entities.items() if found}
+        }
+        if reference and reference.get('expected_violations') is not None:
+            result['expected_violations'] = reference['expected_violations']
+    except Exception as e:
+        result = {'file': name, 'error': str(e)}
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def build_jobs(args, references):
+    jobs = []
+    if args.scripts:
+        # The bundled voicemails have reference scripts but no transcripts
+        for genesys_call_id, details in sorted(references.items()):
+            if details.get('script_content'):
+                jobs.append((details.get('audio_file') or f'{genesys_call_id}.txt', None, details['script_content']))
+    if args.input:
+        jobs.extend((os.path.relpath(path, args.input), path, None) for path in list_transcripts(args.input))
+    return jobs
+
+
+def run(args):
+    references = load_references(args.reference)
+    rules = load_rules(args.rules)
+    jobs = build_jobs(args, references)
+    workers = args.workers or os.cpu_count() or 1
+
+    totals = {'files': 0, 'errors': 0, 'words': 0, 'audio_seconds': 0.0, 'violations': 0, 'expected_checked': 0, 'expected_matched': 0}
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    started = time.perf_counter()
+    try:
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(rules, references)) as pool:
+            for result in pool.imap(score_transcript, jobs, chunksize=args.chunksize):
+                output.write(json.dumps(result, ensure_ascii=False, default=str) + '\n')
+                totals['files'] += 1
+                if 'error' in result:
+                    totals['errors'] += 1
+                    continue
+                totals['words'] += result['words']
+                totals['audio_seconds'] += result['audio_seconds'] or 0.0
+                totals['violations'] += len(result['violations'])
+                if 'expected_violations' in result:
+                    totals['expected_checked'] += 1
+                    found = {violation['code'] for violation in result['violations']}
+                    totals['expected_matched'] += found == set(result['expected_violations'])
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    report = dict(totals, workers=workers, rules=len(rules), seconds=round(elapsed, 3),
+                  files_per_second=round(totals['files'] / elapsed, 1) if elapsed else None,
+                  words_per_second=round(totals['words'] / elapsed) if elapsed else None)
+    report['audio_seconds'] = round(report['audio_seconds'], 1)
+    return report
+
+
+def print_report(report, stream):
+    print(f"\n📊 {report['files']} transcripts in {report['seconds']}s (workers={report['workers']})"
+          f" -> {report['files_per_second']} files/sec, {report['words_per_second']} words/sec", file=stream)
+    if report['audio_seconds']:
+        print(f"   {report['audio_seconds'] / 3600:.2f} hours of audio"
+              f" ({report['audio_seconds'] / report['seconds']:.0f}x real time)", file=stream)
+    print(f"   rules={report['rules']} violations={report['violations']} errors={report['errors']}", file=stream)
+    if report['expected_checked']:
+        print(f"   matched reference expected_violations: {report['expected_matched']}/{report['expected_checked']}", file=stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score local transcripts with the compliance rules (no AWS)')
+    parser.add_argument('input', nargs='?', help='directory of Transcribe JSON and/or .txt transcripts')
+    parser.add_argument('--output', default='results.jsonl', help="JSONL results file, '-' for stdout")
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE_PATH, help='local voicemail_reference.json')
+    parser.add_argument('--rules', help='JSON rule list (default: infrastructure.yaml seed rules)')
+    parser.add_argument('--scripts', action='store_true', help='also score the script_content of every reference voicemail')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunksize', type=int, default=16, help='files handed to a worker at a time')
+    parser.add_argument('--json', action='store_true', help='print the throughput report as JSON')
+    args = parser.parse_args()
+    if not args.input and not args.scripts:
+        parser.error('give an input directory and/or --scripts')
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2), file=sys.stderr)
+    else:
+        print_report(report, sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+#!/bin/bash
+
+echo "🎙️ Deploying Processor Function..."
+
+# Create deployment package
+zip -r processor.zip index.py
+
+# Bundle shared helpers at the package root
+(cd .. && zip -r processor/processor.zip shared -x "*/__pycache__/*")
+
+# Update Lambda function
+aws lambda update-function-code \
+  --function-name anycompany-processor-prod \
+  --zip-file fileb://processor.zip
+
+# Clean up
+rm processor.zip
+
+echo "✅ Processor function deployed successfully!"
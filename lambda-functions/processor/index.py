@@ -1,64 +1,376 @@
 import json
-import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import uuid
+from decimal import Decimal
+
+from shared.audio_analysis import (
+    MAX_ANALYSIS_BYTES,
+    MIN_TRIM_SAVINGS_SECONDS,
+    analysis_available,
+    analyze_wav_bytes,
+    trim_wav_bytes
+)
+from shared.audio_fingerprint import audio_fingerprints, claim_or_find_duplicate, link_duplicate_call
+from shared.aws_clients import get_client, get_thread_table
+from shared.batch_progress import record_audio_savings, track_batch_event
+from shared.call_log import bind, error, info, start_call_log, warning
+from shared.checkpoints import COMPLETED, FAILED, mark_checkpoint
+from shared.idempotency import derive_call_id, normalize_etag, is_conditional_check_failure
+from shared.metrics import add_bytes, flush_metrics, set_properties, stage, start_metrics
+from shared.priority_lanes import (
+    DEFAULT_BULK_TRANSCRIBE_CONCURRENCY,
+    acquire_transcribe_slot,
+    defer_to_lane_queue,
+    lane_for_key,
+    release_transcribe_slot
+)
+from shared.wav_header import EXTENDED_HEADER_BYTES, WavHeaderError, parse_wav_header
+
+# Speaker separation requested from Transcribe, so the completion handler can analyse the
+# agent alone: 'off', 'channels' (channel identification), 'speakers' (speaker labels) or
+# 'auto' (channels for stereo recordings, speaker labels otherwise)
+SPEAKER_SEPARATION = os.environ.get('SPEAKER_SEPARATION', 'off').lower()
+MAX_SPEAKER_LABELS = int(os.environ.get('MAX_SPEAKER_LABELS', '2'))
+
+# Cut the greeting before a voicemail beep: 'voicemail' for calls whose batch reference data
+# sets voicemail_context, 'true' for every call, 'false' to trim silence only
+TRIM_BEFORE_BEEP = os.environ.get('TRIM_BEFORE_BEEP', 'voicemail').lower()
+
+# Messages of one SQS batch processed at once (claim, download, analysis, Transcribe submission)
+PROCESSOR_WORKERS = int(os.environ.get('PROCESSOR_WORKERS', '10'))
+
+# Receives before SQS moves a message to the dead-letter queue (maxReceiveCount in terraform/main.tf)
+MAX_RECEIVE_COUNT = int(os.environ.get('MAX_RECEIVE_COUNT', '3'))
+
+# Kept across warm invocations, so worker threads (and their DynamoDB tables) are reused
+_executor = ThreadPoolExecutor(max_workers=PROCESSOR_WORKERS)
 
 def lambda_handler(event, context):
-    s3 = boto3.client('s3')
-    transcribe = boto3.client('transcribe')
-    dynamodb = boto3.resource('dynamodb')
-    calls_table = dynamodb.Table(os.environ['CALLS_TABLE_NAME'])
-    
-    for record in event['Records']:
-        bucket = record['s3']['bucket']['name']
-        key = record['s3']['object']['key']
-        
-        if not key.startswith('audio/') or not key.endswith('.wav'):
+    """
+    Start Transcribe jobs for a batch of SQS messages, PROCESSOR_WORKERS at a time.
+    Returns batchItemFailures so only the failed messages go back to the queue.
+    """
+    bulk_limit = int(os.environ.get('BULK_TRANSCRIBE_CONCURRENCY', DEFAULT_BULK_TRANSCRIBE_CONCURRENCY))
+    failed = [message_id for message_id in _executor.map(lambda record: handle_record(record, bulk_limit), event['Records']) if message_id]
+    return {'statusCode': 200, 'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed]}
+
+def handle_record(record, bulk_limit):
+    """Process one message on a worker thread; returns its messageId if it should be retried"""
+    # Clients are thread-safe; tables are per thread
+    s3 = get_client('s3')
+    sqs = get_client('sqs')
+    transcribe = get_client('transcribe')
+    calls_table = get_thread_table(os.environ.get('CALLS_TABLE') or os.environ['CALLS_TABLE_NAME'])
+    batches_table = get_thread_table(os.environ.get('BATCHES_TABLE', 'anycompany-batches-prod'))
+    checkpoints_table = get_thread_table(os.environ.get('CHECKPOINTS_TABLE', 'anycompany-batch-checkpoints-prod'))
+    fingerprints_table = get_thread_table(os.environ.get('FINGERPRINTS_TABLE', 'anycompany-audio-fingerprints-prod'))
+    try:
+        process_message(s3, sqs, transcribe, calls_table, batches_table, checkpoints_table, fingerprints_table, record, bulk_limit)
+        return None
+    except Exception as e:
+        error('❌ Message failed, returning it to the queue', message_id=record.get('messageId'), error=str(e))
+        # A direct S3 event has no messageId and cannot be retried this way
+        return record.get('messageId')
+
+def is_final_attempt(record):
+    """Whether SQS will not deliver this message again after a failure"""
+    receives = int((record.get('attributes') or {}).get('ApproximateReceiveCount', MAX_RECEIVE_COUNT))
+    return receives >= MAX_RECEIVE_COUNT
+
+def process_message(s3, sqs, transcribe, calls_table, batches_table, checkpoints_table, fingerprints_table, record, bulk_limit):
+    """Start transcription for every .wav object in one SQS message; raises if the message should be retried"""
+    # Handle SQS messages containing S3 events
+    if 'body' in record:
+        message_body = json.loads(record['body'])
+        if 'Records' in message_body:
+            s3_records = message_body['Records']
+        else:
+            return
+    else:
+        # Direct S3 event (fallback)
+        s3_records = [record]
+
+    for s3_record in s3_records:
+        bucket = s3_record['s3']['bucket']['name']
+        key = s3_record['s3']['object']['key']
+
+        lane, filename = lane_for_key(key)
+        if not lane or not key.endswith('.wav'):
             continue
-        
-        filename = key.replace('audio/', '')
-        call_id = str(uuid.uuid4())
-        
+
+        start_metrics('processor', filename=filename, lane=lane)
+        start_call_log('processor', filename=filename, lane=lane)
         try:
-            # Create call record in DynamoDB
-            calls_table.put_item(
-                Item={
-                    'call_id': call_id,
-                    'filename': filename,
-                    'status': 'processing',
-                    'created_at': datetime.utcnow().isoformat(),
-                    'processing_status': 'transcribing'
-                }
+            # Bulk work waits while its share of Transcribe capacity is used up
+            with stage('slot_acquire'):
+                acquired = acquire_transcribe_slot(batches_table, lane, bulk_limit)
+            if not acquired:
+                info('⏳ Bulk lane at capacity, deferring', bulk_limit=bulk_limit)
+                defer_to_lane_queue(sqs, os.environ['BULK_QUEUE_URL'], s3_record)
+                set_properties(outcome='deferred')
+                continue
+
+            # The slot is held until the job completes; give it back if no job was started
+            started = False
+            try:
+                started = start_call_transcription(s3, transcribe, calls_table, batches_table, checkpoints_table, fingerprints_table,
+                                                   s3_record, lane, filename, is_final_attempt(record))
+            finally:
+                if not started:
+                    release_transcribe_slot(batches_table, lane)
+        finally:
+            flush_metrics()
+
+def start_call_transcription(s3, transcribe, calls_table, batches_table, checkpoints_table, fingerprints_table, s3_record, lane, filename,
+                             final_attempt=True):
+    """
+    Claim the call record and start its Transcribe job. Returns True if a job was
+    started, False if none is needed (duplicate, dead air); raises if the message
+    should be retried.
+    """
+    bucket = s3_record['s3']['bucket']['name']
+    key = s3_record['s3']['object']['key']
+
+    # Same object content always maps to the same call_id (redelivery safe)
+    etag = s3_record['s3']['object'].get('eTag')
+    if not etag:
+        etag = s3.head_object(Bucket=bucket, Key=key)['ETag']
+    call_id = derive_call_id(bucket, key, etag)
+    set_properties(call_id=call_id)
+    bind(call_id=call_id)
+    job_name = f"anycompany-{call_id}-{int(datetime.utcnow().timestamp() * 1000)}"
+
+    # Claim the call for transcription - only one delivery of this event wins
+    try:
+        with stage('claim'):
+            claim_response = calls_table.update_item(
+                Key={'call_id': call_id},
+                UpdateExpression='SET filename = :filename, audio_key = :audio_key, priority_lane = :lane, #status = :status, '
+                                 'processing_status = :processing_status, transcription_job_name = :job_name, s3_etag = :etag, '
+                                 'created_at = if_not_exists(created_at, :created_at)',
+                ConditionExpression='attribute_not_exists(transcription_job_name)',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':filename': filename,
+                    ':audio_key': key,
+                    ':lane': lane,
+                    ':status': 'processing',
+                    ':processing_status': 'transcribing',
+                    ':job_name': job_name,
+                    ':etag': normalize_etag(etag),
+                    ':created_at': datetime.utcnow().isoformat()
+                },
+                ReturnValues='ALL_NEW'
             )
-            
-            # Start transcription job
-            job_name = f"anycompany-{call_id}-{int(datetime.utcnow().timestamp() * 1000)}"
-            
+    except Exception as e:
+        if is_conditional_check_failure(e):
+            info('⏭️ Call already has a transcription job, skipping duplicate event')
+            set_properties(outcome='duplicate_event')
+            return False
+        error('❌ Error creating call record', error=str(e))
+        set_properties(outcome='claim_failed')
+        raise
+
+    # Batch calls already carry batch_id when the batch trigger wrote metadata first
+    claimed = claim_response.get('Attributes', {})
+    batch_id = claimed.get('batch_id')
+
+    object_size = s3_record['s3']['object'].get('size')
+    add_bytes('audio_bytes', object_size)
+    with stage('audio_download'):
+        wav_bytes = download_audio(s3, bucket, key, object_size)
+
+    # Same audio re-uploaded under another name reuses the existing transcript and results
+    if os.environ.get('DEDUP_AUDIO', 'true').lower() == 'true':
+        try:
+            with stage('fingerprint'):
+                fingerprints = audio_fingerprints(s3, bucket, key, object_size, wav_bytes)
+                canonical = claim_or_find_duplicate(fingerprints_table, calls_table, fingerprints, call_id)
+            if canonical:
+                info('🔗 Same audio as an existing call, skipping transcription', canonical_call_id=canonical['call_id'])
+                linked = link_duplicate_call(calls_table, canonical, call_id)
+                if linked.get('status') == 'completed':
+                    replay_transcript(s3, linked, job_name)
+                set_properties(outcome='duplicate_audio')
+                return False
+        except Exception as e:
+            warning('⚠️ Duplicate check failed, transcribing', error=str(e))
+
+    with stage('audio_analysis'):
+        media_key, analysis = prepare_media(s3, bucket, key, call_id, wav_bytes, claimed)
+    if analysis and analysis['dead_air']:
+        skip_dead_air_call(calls_table, batches_table, checkpoints_table, call_id, claimed, analysis, filename)
+        set_properties(outcome='dead_air')
+        return False
+
+    try:
+        if analysis:
+            save_audio_analysis(calls_table, call_id, media_key, analysis)
+
+        # Start transcription job
+        job_options = {}
+        settings = speaker_settings(wav_bytes)
+        if settings:
+            job_options['Settings'] = settings
+        with stage('transcribe_start'):
             transcribe.start_transcription_job(
                 TranscriptionJobName=job_name,
-                Media={'MediaFileUri': f's3://{bucket}/{key}'},
+                Media={'MediaFileUri': f's3://{bucket}/{media_key}'},
                 MediaFormat='wav',
                 LanguageCode='en-US',
-                OutputBucketName=os.environ['TRANSCRIBE_OUTPUT_BUCKET']
+                OutputBucketName=os.environ['TRANSCRIBE_OUTPUT_BUCKET'],
+                OutputKey=f"transcripts/{job_name}.json",
+                **job_options
             )
-            
-            print(f'Started transcription job {job_name} for {filename}')
-            
-        except Exception as e:
-            print(f'Error processing {filename}: {str(e)}')
-            # Mark as failed
+
+        info('🚀 Started transcription job', job_name=job_name)
+        set_properties(outcome='transcribing')
+        track_batch_event(batches_table, batch_id, 'transcribing')
+        if analysis and media_key != key:
+            record_audio_savings(batches_table, batch_id, analysis['seconds_saved'])
+        return True
+
+    except Exception as e:
+        error('❌ Error starting transcription', error=str(e))
+        set_properties(outcome='failed')
+        # Mark as failed and release the claim so the retried message can start a new job
+        try:
+            calls_table.update_item(
+                Key={'call_id': call_id},
+                UpdateExpression='SET #status = :status, #error = :error REMOVE transcription_job_name',
+                ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
+                ExpressionAttributeValues={
+                    ':status': 'failed',
+                    ':error': str(e)
+                }
+            )
+        except Exception as release_error:
+            warning('⚠️ Could not release the claim on the call', error=str(release_error))
+        # Batch progress counts the failure once, when SQS gives up on the message
+        if final_attempt:
+            track_batch_event(batches_table, batch_id, 'failed')
+            mark_checkpoint(checkpoints_table, batch_id, claimed.get('checkpoint_key'), FAILED, call_id)
+        raise
+
+def replay_transcript(s3, canonical, job_name):
+    """
+    The canonical call completed before this duplicate was linked, so its completion
+    did not score it. Its Transcribe output is copied under the duplicate's job name,
+    and the completion handler scores the duplicate against its own reference data.
+    """
+    output_bucket = os.environ['TRANSCRIBE_OUTPUT_BUCKET']
+    s3.copy_object(
+        CopySource={'Bucket': output_bucket, 'Key': f"transcripts/{canonical['transcription_job_name']}.json"},
+        Bucket=output_bucket,
+        Key=f"transcripts/{job_name}.json"
+    )
+
+def speaker_settings(wav_bytes):
+    """Transcribe Settings for SPEAKER_SEPARATION; None when it is off"""
+    mode = SPEAKER_SEPARATION
+    if mode not in ('channels', 'speakers', 'auto'):
+        return None
+    if mode == 'auto':
+        channels = None
+        if wav_bytes:
             try:
-                calls_table.update_item(
-                    Key={'call_id': call_id},
-                    UpdateExpression='SET #status = :status, #error = :error',
-                    ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
-                    ExpressionAttributeValues={
-                        ':status': 'failed',
-                        ':error': str(e)
-                    }
-                )
-            except:
+                channels = parse_wav_header(wav_bytes[:EXTENDED_HEADER_BYTES], len(wav_bytes))['channels']
+            except WavHeaderError:
                 pass
-    
-    return {'statusCode': 200}
\ No newline at end of file
+        mode = 'channels' if channels and channels > 1 else 'speakers'
+    set_properties(speaker_separation=mode)
+    # Transcribe accepts one or the other, not both
+    if mode == 'channels':
+        return {'ChannelIdentification': True}
+    return {'ShowSpeakerLabels': True, 'MaxSpeakerLabels': MAX_SPEAKER_LABELS}
+
+def download_audio(s3, bucket, key, object_size):
+    """Whole recording for analysis and fingerprinting; None when too large, not needed or on error"""
+    if os.environ.get('AUDIO_ANALYSIS', 'true').lower() != 'true' and os.environ.get('DEDUP_AUDIO', 'true').lower() != 'true':
+        return None
+    if object_size is not None and object_size > MAX_ANALYSIS_BYTES:
+        return None
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except Exception as e:
+        warning('⚠️ Could not download audio for analysis', key=key, error=str(e))
+        return None
+
+def prepare_media(s3, bucket, key, call_id, wav_bytes, claimed=None):
+    """
+    Analyse the audio for silence and a voicemail beep before it is billed by Transcribe.
+    Returns (media key to transcribe, analysis or None). Leading/trailing silence and
+    the greeting before a beep (see TRIM_BEFORE_BEEP) are trimmed into trimmed/{call_id}.wav
+    when worthwhile.
+    Any analysis problem falls back to transcribing the original object.
+    """
+    if os.environ.get('AUDIO_ANALYSIS', 'true').lower() != 'true' or not analysis_available() or wav_bytes is None:
+        return key, None
+
+    try:
+        analysis = analyze_wav_bytes(wav_bytes, trim_before_beep=trim_before_beep(claimed or {}))
+        if not analysis or analysis['dead_air'] or analysis['seconds_saved'] < MIN_TRIM_SAVINGS_SECONDS:
+            return key, analysis
+
+        trimmed_key = f'trimmed/{call_id}.wav'
+        s3.put_object(
+            Bucket=bucket,
+            Key=trimmed_key,
+            Body=trim_wav_bytes(wav_bytes, analysis['keep_start_seconds'], analysis['keep_end_seconds']),
+            ContentType='audio/wav'
+        )
+        info('✂️ Trimmed silence/greeting', key=key, seconds_saved=analysis['seconds_saved'])
+        return trimmed_key, analysis
+
+    except Exception as e:
+        warning('⚠️ Audio analysis failed, transcribing as-is', key=key, error=str(e))
+        return key, None
+
+def trim_before_beep(claimed):
+    """Whether to cut the greeting before a beep; a beep-like tone in a live call must not lose speech"""
+    if TRIM_BEFORE_BEEP == 'voicemail':
+        return bool((claimed.get('reference_data') or {}).get('voicemail_context'))
+    return TRIM_BEFORE_BEEP == 'true'
+
+def to_dynamodb_analysis(analysis):
+    return {name: Decimal(str(value)) if isinstance(value, float) else value for name, value in analysis.items()}
+
+def save_audio_analysis(calls_table, call_id, media_key, analysis):
+    """Keep the analysis and the trim offset so transcript timestamps can be mapped back to the original"""
+    calls_table.update_item(
+        Key={'call_id': call_id},
+        UpdateExpression='SET audio_analysis = :analysis, transcribe_media_key = :media_key, audio_offset_seconds = :offset',
+        ExpressionAttributeValues={
+            ':analysis': to_dynamodb_analysis(analysis),
+            ':media_key': media_key,
+            ':offset': Decimal(str(analysis['keep_start_seconds'] if media_key.startswith('trimmed/') else 0.0))
+        }
+    )
+
+def skip_dead_air_call(calls_table, batches_table, checkpoints_table, call_id, claimed, analysis, filename):
+    """Dead air never reaches Transcribe - the call completes with an empty transcript"""
+    info('🔇 Skipping dead-air call', voiced_seconds=analysis['voiced_seconds'], duration_seconds=analysis['duration_seconds'])
+    try:
+        calls_table.update_item(
+            Key={'call_id': call_id},
+            UpdateExpression='SET #status = :status, processing_status = :processing_status, skip_reason = :reason, '
+                             'transcript = :empty, violations = :none, audio_analysis = :analysis, processed_at = :now',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':status': 'completed',
+                ':processing_status': 'skipped',
+                ':reason': 'dead_air',
+                ':empty': '',
+                ':none': [],
+                ':analysis': to_dynamodb_analysis(analysis),
+                ':now': datetime.utcnow().isoformat()
+            }
+        )
+    except Exception as e:
+        error('❌ Error recording dead air', error=str(e))
+
+    batch_id = claimed.get('batch_id')
+    track_batch_event(batches_table, batch_id, 'completed')
+    record_audio_savings(batches_table, batch_id, analysis['seconds_saved'], dead_air=True)
+    mark_checkpoint(checkpoints_table, batch_id, claimed.get('checkpoint_key'), COMPLETED, call_id)
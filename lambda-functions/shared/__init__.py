@@ -0,0 +1,5 @@
+"""Helpers shared by the AnyCompany compliance Lambda functions.
+
+Bundled at the root of each function's deployment package by the deploy
+scripts, so handlers import them as ``from shared.<module> import ...``.
+"""
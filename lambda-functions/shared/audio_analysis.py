@@ -0,0 +1,182 @@
+import io
+import wave
+
+from shared.wav_header import WAVE_FORMAT_PCM, parse_wav_header
+
+# NumPy comes from a Lambda layer; without it analysis is skipped and audio is sent as-is.
+# It is imported on first use so handlers that never analyse audio don't pay for it at init.
+np = None
+_numpy_checked = False
+
+FRAME_SECONDS = 0.02
+SILENCE_DBFS = -45.0
+# Calls with less speech than this are dead air and never sent to Transcribe
+MIN_VOICED_SECONDS = 1.0
+# Speech kept on each side of a trim point
+PADDING_SECONDS = 0.25
+# Trimming costs an extra S3 PUT - only worth it past this saving
+MIN_TRIM_SAVINGS_SECONDS = 2.0
+# Skip analysis for recordings too large to hold in Lambda memory comfortably
+MAX_ANALYSIS_BYTES = 50 * 1024 * 1024
+
+# Voicemail beep: a near-pure tone in this band lasting at least BEEP_MIN_SECONDS
+BEEP_MIN_HZ = 400
+BEEP_MAX_HZ = 2500
+BEEP_MIN_SECONDS = 0.2
+BEEP_TONALITY = 0.6
+# Only a beep near the start marks the end of the greeting
+BEEP_SEARCH_SECONDS = 60.0
+
+
+def analysis_available():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np is not None
+
+
+def _frame_samples(samples, sample_rate):
+    frame_length = max(int(sample_rate * FRAME_SECONDS), 1)
+    frame_count = len(samples) // frame_length
+    return samples[:frame_count * frame_length].reshape(frame_count, frame_length), frame_length
+
+
+def _detect_beep_end(frames, voiced, sample_rate):
+    """End time (seconds) of the first sustained pure tone within the search window, or None"""
+    search_frames = min(len(frames), int(BEEP_SEARCH_SECONDS / FRAME_SECONDS))
+    if search_frames == 0:
+        return None
+
+    window = np.hanning(frames.shape[1])
+    spectrum = np.abs(np.fft.rfft(frames[:search_frames] * window, axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frames.shape[1], d=1.0 / sample_rate)
+
+    peak_bins = spectrum.argmax(axis=1)
+    total_power = spectrum.sum(axis=1) + 1e-12
+    # Power in the peak bin and its neighbours (Hann window spreads a tone over ~3 bins)
+    padded = np.pad(spectrum, ((0, 0), (1, 1)))
+    rows = np.arange(search_frames)
+    peak_power = padded[rows, peak_bins] + padded[rows, peak_bins + 1] + padded[rows, peak_bins + 2]
+
+    peak_freqs = freqs[peak_bins]
+    tonal = voiced[:search_frames] & (peak_power / total_power >= BEEP_TONALITY) & \
+        (peak_freqs >= BEEP_MIN_HZ) & (peak_freqs <= BEEP_MAX_HZ)
+
+    min_run = int(BEEP_MIN_SECONDS / FRAME_SECONDS)
+    run = 0
+    for i, is_tonal in enumerate(tonal):
+        run = run + 1 if is_tonal else 0
+        if run >= min_run and (i + 1 == len(tonal) or not tonal[i + 1]):
+            return (i + 1) * FRAME_SECONDS
+    return None
+
+
+def _dead_air_result(duration, voiced_seconds):
+    return {
+        'duration_seconds': round(duration, 2),
+        'voiced_seconds': round(voiced_seconds, 2),
+        'dead_air': True,
+        'leading_silence_seconds': round(duration, 2),
+        'trailing_silence_seconds': 0.0,
+        'beep_end_seconds': None,
+        'keep_start_seconds': 0.0,
+        'keep_end_seconds': 0.0,
+        'seconds_saved': round(duration, 2)
+    }
+
+
+def decode_pcm_samples(wav_bytes):
+    """Mono float samples in [-1, 1) and the sample rate of a 16-bit PCM WAV, or None"""
+    if not analysis_available():
+        return None
+
+    info = parse_wav_header(wav_bytes[:65536], len(wav_bytes))
+    if info['format_tag'] != WAVE_FORMAT_PCM or info['bits_per_sample'] != 16 or info['truncated'] or not info['block_align']:
+        return None
+
+    usable_bytes = info['data_bytes'] - info['data_bytes'] % info['block_align']
+    pcm = wav_bytes[info['data_offset']:info['data_offset'] + usable_bytes]
+    samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768.0
+    if info['channels'] > 1:
+        samples = samples.reshape(-1, info['channels']).mean(axis=1)
+    return samples, info['sample_rate']
+
+
+def voiced_frames(samples, sample_rate):
+    """20 ms frames and a per-frame flag for energy above the silence threshold"""
+    frames, _ = _frame_samples(samples, sample_rate)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1)) if len(frames) else np.zeros(0)
+    return frames, 20 * np.log10(rms + 1e-10) > SILENCE_DBFS
+
+
+def analyze_wav_bytes(wav_bytes, trim_before_beep=True):
+    """
+    Frame-energy analysis of a 16-bit PCM WAV.
+    Returns None when the audio cannot be analysed, otherwise timings (seconds)
+    for leading/trailing silence, voiced duration, an optional voicemail beep,
+    the [keep_start, keep_end] window worth transcribing and whether it is dead air.
+    """
+    decoded = decode_pcm_samples(wav_bytes)
+    if decoded is None:
+        return None
+    samples, sample_rate = decoded
+
+    duration = len(samples) / float(sample_rate)
+    frames, voiced = voiced_frames(samples, sample_rate)
+    if len(frames) == 0:
+        return _dead_air_result(duration, 0.0)
+
+    voiced_seconds = float(voiced.sum()) * FRAME_SECONDS
+
+    if voiced_seconds < MIN_VOICED_SECONDS:
+        return _dead_air_result(duration, voiced_seconds)
+
+    voiced_indexes = np.flatnonzero(voiced)
+    speech_start = voiced_indexes[0] * FRAME_SECONDS
+    speech_end = (voiced_indexes[-1] + 1) * FRAME_SECONDS
+
+    beep_end = _detect_beep_end(frames, voiced, sample_rate)
+    keep_start = speech_start
+    if trim_before_beep and beep_end is not None:
+        # Skip the greeting/ringback - keep from the first speech after the beep
+        after_beep = voiced_indexes[voiced_indexes * FRAME_SECONDS >= beep_end + FRAME_SECONDS]
+        if len(after_beep):
+            keep_start = after_beep[0] * FRAME_SECONDS
+
+    keep_start = max(keep_start - PADDING_SECONDS, 0.0)
+    keep_end = min(speech_end + PADDING_SECONDS, duration)
+
+    return {
+        'duration_seconds': round(duration, 2),
+        'voiced_seconds': round(voiced_seconds, 2),
+        'dead_air': False,
+        'leading_silence_seconds': round(speech_start, 2),
+        'trailing_silence_seconds': round(duration - speech_end, 2),
+        'beep_end_seconds': round(beep_end, 2) if beep_end is not None else None,
+        'keep_start_seconds': round(keep_start, 2),
+        'keep_end_seconds': round(keep_end, 2),
+        'seconds_saved': round(duration - (keep_end - keep_start), 2)
+    }
+
+
+def trim_wav_bytes(wav_bytes, start_seconds, end_seconds):
+    """New WAV containing only [start_seconds, end_seconds] of the original"""
+    with wave.open(io.BytesIO(wav_bytes), 'rb') as source:
+        params = source.getparams()
+        start_frame = int(start_seconds * params.framerate)
+        end_frame = min(int(end_seconds * params.framerate), params.nframes)
+        source.setpos(start_frame)
+        pcm = source.readframes(end_frame - start_frame)
+
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as trimmed:
+        trimmed.setnchannels(params.nchannels)
+        trimmed.setsampwidth(params.sampwidth)
+        trimmed.setframerate(params.framerate)
+        trimmed.writeframes(pcm)
+    return output.getvalue()
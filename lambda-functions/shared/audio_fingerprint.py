@@ -0,0 +1,233 @@
+import hashlib
+from datetime import datetime
+
+from shared.audio_analysis import FRAME_SECONDS, decode_pcm_samples, voiced_frames
+from shared.batch_progress import track_batch_event
+from shared.checkpoints import COMPLETED, FAILED, mark_checkpoint
+from shared.idempotency import is_conditional_check_failure
+from shared.wav_header import parse_wav_header, read_wav_header
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Coarse spectral fingerprint: band-energy difference bits over the whole recording,
+# first to last speech (calls that only share an opening IVR prompt get different keys)
+FINGERPRINT_WINDOW_SECONDS = 0.5
+FINGERPRINT_MIN_WINDOWS = 8
+# Windows transformed at once, to bound memory on hour-long recordings
+FINGERPRINT_BLOCK_WINDOWS = 600
+FINGERPRINT_BANDS = 8
+FINGERPRINT_MIN_HZ = 200
+FINGERPRINT_MAX_HZ = 3400
+
+
+def pcm_digest(wav_bytes):
+    """SHA-256 of the PCM payload only - identical audio with different headers/metadata matches"""
+    info = parse_wav_header(wav_bytes[:65536], len(wav_bytes))
+    return hashlib.sha256(wav_bytes[info['data_offset']:info['data_offset'] + info['data_bytes']]).hexdigest()
+
+
+def pcm_digest_from_s3(s3, bucket, key, object_size):
+    """Streaming variant for objects too large to hold in memory"""
+    info = read_wav_header(s3, bucket, key, object_size)
+    if info['data_bytes'] == 0:
+        return hashlib.sha256(b'').hexdigest()
+
+    digest = hashlib.sha256()
+    data_end = info['data_offset'] + info['data_bytes'] - 1
+    body = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={info['data_offset']}-{data_end}")['Body']
+    for chunk in body.iter_chunks(HASH_CHUNK_BYTES):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def spectral_fingerprint(wav_bytes):
+    """
+    Coarse fingerprint that survives re-encoding, gain changes and added silence:
+    sign bits of band-energy differences (across bands and time) in 0.5 s windows
+    from the first to the last speech. The bit count encodes the speech duration.
+    None without NumPy or with too little speech.
+    """
+    decoded = decode_pcm_samples(wav_bytes)
+    if decoded is None:
+        return None
+    samples, sample_rate = decoded
+    # Decoding succeeded, so NumPy is available
+    import numpy as np
+
+    _, voiced = voiced_frames(samples, sample_rate)
+    if not voiced.any():
+        return None
+    voiced_indexes = np.flatnonzero(voiced)
+    start = int(voiced_indexes[0] * FRAME_SECONDS * sample_rate)
+    end = int((voiced_indexes[-1] + 1) * FRAME_SECONDS * sample_rate)
+
+    window_length = int(sample_rate * FINGERPRINT_WINDOW_SECONDS)
+    window_count = (end - start) // window_length
+    if window_count < FINGERPRINT_MIN_WINDOWS:
+        return None
+
+    freqs = np.fft.rfftfreq(window_length, d=1.0 / sample_rate)
+    edges = np.geomspace(FINGERPRINT_MIN_HZ, FINGERPRINT_MAX_HZ, FINGERPRINT_BANDS + 1)
+    band_masks = [(freqs >= low) & (freqs < high) for low, high in zip(edges[:-1], edges[1:])]
+    taper = np.hanning(window_length)
+    band_slopes = []
+    for first in range(0, window_count, FINGERPRINT_BLOCK_WINDOWS):
+        count = min(FINGERPRINT_BLOCK_WINDOWS, window_count - first)
+        offset = start + first * window_length
+        windows = samples[offset:offset + count * window_length].reshape(count, window_length)
+        spectrum = np.abs(np.fft.rfft(windows * taper, axis=1)) ** 2
+        log_bands = np.log10(np.stack([spectrum[:, mask].sum(axis=1) for mask in band_masks], axis=1) + 1e-12)
+        band_slopes.append(log_bands[:, :-1] - log_bands[:, 1:])
+
+    band_slope = np.concatenate(band_slopes)
+    bits = (band_slope[1:] - band_slope[:-1]) > 0
+    return hashlib.sha1(np.packbits(bits).tobytes()).hexdigest()
+
+
+def audio_fingerprints(s3, bucket, key, object_size, wav_bytes=None):
+    """Index keys for a recording: exact PCM hash, plus the spectral fingerprint when available"""
+    if wav_bytes is None:
+        return [f'pcm#{pcm_digest_from_s3(s3, bucket, key, object_size)}']
+
+    fingerprints = [f'pcm#{pcm_digest(wav_bytes)}']
+    spectral = spectral_fingerprint(wav_bytes)
+    if spectral:
+        fingerprints.append(f'spec#{spectral}')
+    return fingerprints
+
+
+def _usable_canonical(calls_table, canonical_id):
+    """The root call a duplicate should link to, or None if it cannot provide results"""
+    canonical = calls_table.get_item(Key={'call_id': canonical_id}).get('Item')
+    if canonical and canonical.get('duplicate_of'):
+        canonical = calls_table.get_item(Key={'call_id': canonical['duplicate_of']}).get('Item')
+    # Dead air is skipped before Transcribe, so there is no transcript to share
+    if not canonical or canonical.get('status') == 'failed' or canonical.get('processing_status') == 'skipped':
+        return None
+    return canonical
+
+
+def claim_or_find_duplicate(fingerprints_table, calls_table, fingerprints, call_id):
+    """
+    Register the call's fingerprints; returns the canonical call record when the
+    same (or near-identical) audio already belongs to another call, else None.
+    A fingerprint owned by a failed call is taken over.
+    """
+    for fingerprint in fingerprints:
+        try:
+            fingerprints_table.put_item(
+                Item={'fingerprint': fingerprint, 'call_id': call_id, 'created_at': datetime.utcnow().isoformat()},
+                ConditionExpression='attribute_not_exists(fingerprint) OR call_id = :call_id',
+                ExpressionAttributeValues={':call_id': call_id}
+            )
+            continue
+        except Exception as e:
+            if not is_conditional_check_failure(e):
+                raise
+
+        owner = fingerprints_table.get_item(Key={'fingerprint': fingerprint}).get('Item', {}).get('call_id')
+        canonical = _usable_canonical(calls_table, owner) if owner else None
+        if canonical and canonical['call_id'] != call_id:
+            return canonical
+
+        fingerprints_table.put_item(
+            Item={'fingerprint': fingerprint, 'call_id': call_id, 'created_at': datetime.utcnow().isoformat()}
+        )
+    return None
+
+
+def copy_results_to_duplicate(calls_table, batches_table, checkpoints_table, source, duplicate_call_id, score):
+    """
+    Complete a duplicate call with the canonical call's transcript and entities.
+    score(duplicate, source) returns the duplicate's (entities, violations), checked
+    against its own call_id and reference data rather than the canonical call's.
+    """
+    duplicate = calls_table.get_item(Key={'call_id': duplicate_call_id}).get('Item')
+    if not duplicate or duplicate.get('status') == 'completed':
+        return
+    entities, violations = score(duplicate, source)
+
+    values = {
+        ':status': 'completed',
+        ':processing_status': 'deduplicated',
+        ':source': source['call_id'],
+        ':now': datetime.utcnow().isoformat(),
+        ':entities': entities,
+        ':violations': violations
+    }
+    update_expression = ('SET #status = :status, processing_status = :processing_status, duplicate_of = :source, '
+                         'processed_at = :now, entities = :entities, violations = :violations')
+    if 'transcript' in source:
+        update_expression += ', transcript = :transcript'
+        values[':transcript'] = source['transcript']
+
+    try:
+        response = calls_table.update_item(
+            Key={'call_id': duplicate_call_id},
+            UpdateExpression=update_expression,
+            ConditionExpression='#status <> :status',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW'
+        )
+    except Exception as e:
+        if is_conditional_check_failure(e):
+            return
+        raise
+
+    duplicate = response.get('Attributes', {})
+    if duplicate.get('batch_id'):
+        latency_seconds = None
+        if duplicate.get('created_at'):
+            latency_seconds = (datetime.utcnow() - datetime.fromisoformat(duplicate['created_at'])).total_seconds()
+        track_batch_event(batches_table, duplicate['batch_id'], 'completed', latency_seconds)
+        mark_checkpoint(checkpoints_table, duplicate['batch_id'], duplicate.get('checkpoint_key'), COMPLETED, duplicate_call_id)
+    print(f"🔗 Call {duplicate_call_id} completed from duplicate audio of {source['call_id']}")
+
+
+def link_duplicate_call(calls_table, canonical, call_id):
+    """
+    Link a call to the canonical call with the same audio instead of transcribing it.
+    Returns the canonical record as of the link. While it is still transcribing, its
+    completion scores the duplicate; if it had already completed, the caller must.
+    """
+    calls_table.update_item(
+        Key={'call_id': call_id},
+        UpdateExpression='SET processing_status = :processing_status, duplicate_of = :source',
+        ExpressionAttributeValues={':processing_status': 'awaiting_duplicate', ':source': canonical['call_id']}
+    )
+    response = calls_table.update_item(
+        Key={'call_id': canonical['call_id']},
+        UpdateExpression='ADD duplicate_call_ids :call_ids',
+        ExpressionAttributeValues={':call_ids': {call_id}},
+        ReturnValues='ALL_NEW'
+    )
+    return response.get('Attributes', {})
+
+
+def propagate_to_duplicates(calls_table, batches_table, checkpoints_table, canonical, score):
+    """Called once the canonical call has results: complete every linked duplicate"""
+    for duplicate_call_id in canonical.get('duplicate_call_ids', set()):
+        try:
+            copy_results_to_duplicate(calls_table, batches_table, checkpoints_table, canonical, duplicate_call_id, score)
+        except Exception as e:
+            print(f'⚠️ Failed to complete duplicate call {duplicate_call_id}: {str(e)}')
+
+
+def fail_duplicates(calls_table, batches_table, checkpoints_table, canonical, error):
+    """The canonical call failed: release its duplicates so a retry transcribes them itself"""
+    for duplicate_call_id in canonical.get('duplicate_call_ids', set()):
+        try:
+            response = calls_table.update_item(
+                Key={'call_id': duplicate_call_id},
+                UpdateExpression='SET #status = :status, #error = :error REMOVE transcription_job_name, duplicate_of',
+                ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
+                ExpressionAttributeValues={':status': 'failed', ':error': f"duplicate of failed call {canonical['call_id']}: {error}"},
+                ReturnValues='ALL_OLD'
+            )
+            previous = response.get('Attributes', {})
+            if previous.get('status') != 'failed':
+                track_batch_event(batches_table, previous.get('batch_id'), 'failed')
+                mark_checkpoint(checkpoints_table, previous.get('batch_id'), previous.get('checkpoint_key'), FAILED, duplicate_call_id)
+        except Exception as e:
+            print(f'⚠️ Failed to release duplicate call {duplicate_call_id}: {str(e)}')
@@ -0,0 +1,95 @@
+"""
+AWS clients shared by every invocation of a warm Lambda container.
+
+Clients and tables are created on first use and then reused, so a warm
+invocation pays no client construction (endpoint resolution and service-model
+loading cost several ms per client) and keeps its pooled, kept-alive
+connections. boto3 itself is imported on first use too.
+
+Clients are thread-safe and can be shared with worker pools. Resource objects
+such as tables are not guaranteed to be, so threads should use get_client() or
+get_thread_table().
+"""
+import os
+import threading
+
+# Covers the batch prep pre-flight pool and concurrent S3/DynamoDB workers
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '50'))
+CONNECT_TIMEOUT_SECONDS = 5
+READ_TIMEOUT_SECONDS = 60
+MAX_ATTEMPTS = 5
+
+_clients = {}
+_lock = threading.RLock()
+
+
+def client_config(max_pool_connections=None):
+    from botocore.config import Config
+
+    options = {
+        'max_pool_connections': max_pool_connections or MAX_POOL_CONNECTIONS,
+        'connect_timeout': CONNECT_TIMEOUT_SECONDS,
+        'read_timeout': READ_TIMEOUT_SECONDS,
+        'retries': {'max_attempts': MAX_ATTEMPTS, 'mode': 'standard'},
+        'tcp_keepalive': True
+    }
+    try:
+        return Config(**options)
+    except TypeError:
+        # botocore before 1.27.84 has no tcp_keepalive option
+        options.pop('tcp_keepalive')
+        return Config(**options)
+
+
+def _cached(key, create):
+    value = _clients.get(key)
+    if value is None:
+        # boto3's default session is not safe to build clients from concurrently
+        with _lock:
+            value = _clients.get(key)
+            if value is None:
+                value = _clients[key] = create()
+    return value
+
+
+def get_client(service_name, max_pool_connections=None):
+    """Shared client; asking for a larger pool than the default gets a separate client"""
+    pool_size = max(max_pool_connections or 0, MAX_POOL_CONNECTIONS)
+
+    def create():
+        import boto3
+        return boto3.client(service_name, config=client_config(pool_size))
+    return _cached(('client', service_name, pool_size), create)
+
+
+def get_resource(service_name='dynamodb'):
+    def create():
+        import boto3
+        return boto3.resource(service_name, config=client_config())
+    return _cached(('resource', service_name), create)
+
+
+def get_table(table_name):
+    return _cached(('table', table_name), lambda: get_resource('dynamodb').Table(table_name))
+
+
+def get_thread_resource(service_name='dynamodb'):
+    """Resource for a worker thread, e.g. for batch_write_items from a pool"""
+    thread_id = threading.get_ident()
+
+    def create():
+        import boto3
+        return boto3.resource(service_name, config=client_config())
+    return _cached(('resource', service_name, thread_id), create)
+
+
+def get_thread_table(table_name):
+    """Table for a worker thread: each thread gets its own DynamoDB resource"""
+    thread_id = threading.get_ident()
+    return _cached(('table', table_name, thread_id), lambda: get_thread_resource('dynamodb').Table(table_name))
+
+
+def reset_clients():
+    """Drop every cached client (benchmarks swap the AWS backend between runs)"""
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,165 @@
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+# Per-batch counters, updated atomically with DynamoDB ADD ('rejected' is set by batch prep)
+COUNTERS = ['submitted', 'transcribing', 'completed', 'failed', 'rejected']
+
+# End-to-end latency histogram bucket upper bounds (seconds); last bucket is open-ended
+LATENCY_BUCKETS = [15, 30, 60, 120, 180, 300, 600, 900, 1800, 3600, 7200]
+
+
+def new_batch_id():
+    """Sortable batch ID: batch-YYYYMMDD-HHMMSS-xxxxxxxx"""
+    return f"batch-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def latency_bucket_attribute(latency_seconds):
+    """Histogram attribute name for an end-to-end latency sample"""
+    for i, upper_bound in enumerate(LATENCY_BUCKETS):
+        if latency_seconds <= upper_bound:
+            return f'latency_b{i:02d}'
+    return f'latency_b{len(LATENCY_BUCKETS):02d}'
+
+
+def start_batch(batches_table, batch_id, total_calls, batch_folder, resumed=False, total_audio_seconds=None,
+                rejected_calls=0):
+    """
+    Create (or refresh on resume) the batch progress record. total_calls includes
+    the files pre-flight rejected; rejected_calls counts them as finished.
+    """
+    update_expression = ('SET total_calls = :total, rejected = :rejected, batch_folder = :folder, #status = :status, '
+                         'started_at = if_not_exists(started_at, :now), updated_at = :now')
+    values = {
+        ':total': total_calls,
+        ':rejected': rejected_calls,
+        ':folder': batch_folder,
+        ':status': 'running',
+        ':now': datetime.utcnow().isoformat()
+    }
+    if total_audio_seconds is not None:
+        # Pre-flight audio duration, for cost and ETA forecasting
+        update_expression += ', total_audio_seconds = :audio_seconds'
+        values[':audio_seconds'] = Decimal(str(round(total_audio_seconds, 1)))
+    if resumed:
+        # Failed items are retried by the resumed run and counted again
+        update_expression += ', failed = :zero'
+        values[':zero'] = 0
+
+    batches_table.update_item(
+        Key={'batch_id': batch_id},
+        UpdateExpression=update_expression,
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues=values
+    )
+
+
+def increment_batch_counter(batches_table, batch_id, counter, latency_seconds=None):
+    """Atomically bump one counter; completed/failed calls also record their latency"""
+    if counter not in COUNTERS:
+        raise ValueError(f'Unknown batch counter: {counter}')
+
+    update_expression = f'ADD {counter} :one'
+    values = {':one': 1, ':now': datetime.utcnow().isoformat()}
+
+    if latency_seconds is not None:
+        update_expression += f', {latency_bucket_attribute(latency_seconds)} :one, latency_total_seconds :latency'
+        values[':latency'] = Decimal(str(round(latency_seconds, 3)))
+
+    batches_table.update_item(
+        Key={'batch_id': batch_id},
+        UpdateExpression=update_expression + ' SET updated_at = :now',
+        ExpressionAttributeValues=values
+    )
+
+
+def track_batch_event(batches_table, batch_id, counter, latency_seconds=None):
+    """Best-effort wrapper - progress tracking must never fail call processing"""
+    if not batch_id:
+        return
+    try:
+        increment_batch_counter(batches_table, batch_id, counter, latency_seconds)
+    except Exception as e:
+        print(f'⚠️ Failed to update batch {batch_id} counter {counter}: {str(e)}')
+
+
+def record_audio_savings(batches_table, batch_id, seconds_saved, dead_air=False):
+    """Best-effort: add audio trimmed or skipped before Transcribe to the batch totals"""
+    if not batch_id or seconds_saved <= 0:
+        return
+    try:
+        batches_table.update_item(
+            Key={'batch_id': batch_id},
+            UpdateExpression='ADD audio_seconds_saved :saved, dead_air_calls :dead_air SET updated_at = :now',
+            ExpressionAttributeValues={
+                ':saved': Decimal(str(round(seconds_saved, 1))),
+                ':dead_air': 1 if dead_air else 0,
+                ':now': datetime.utcnow().isoformat()
+            }
+        )
+    except Exception as e:
+        print(f'⚠️ Failed to record audio savings for batch {batch_id}: {str(e)}')
+
+
+def latency_percentile(batch, percentile):
+    """Approximate latency percentile (seconds) from the histogram buckets"""
+    counts = [int(batch.get(f'latency_b{i:02d}', 0)) for i in range(len(LATENCY_BUCKETS) + 1)]
+    total = sum(counts)
+    if total == 0:
+        return None
+
+    target = total * percentile / 100.0
+    seen = 0
+    for i, count in enumerate(counts):
+        if count and seen + count >= target:
+            lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0
+            upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            # Linear interpolation inside the bucket
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS[-1])
+
+
+def summarize_batch(batch, now=None):
+    """Throughput, latency percentiles and ETA for a batch progress record"""
+    now = now or datetime.utcnow()
+    counters = {name: int(batch.get(name, 0)) for name in COUNTERS}
+    total = int(batch.get('total_calls', 0))
+    finished = counters['completed'] + counters['failed'] + counters['rejected']
+
+    elapsed_seconds = None
+    calls_per_minute = 0.0
+    if batch.get('started_at'):
+        elapsed_seconds = max((now - datetime.fromisoformat(batch['started_at'])).total_seconds(), 0.0)
+        if elapsed_seconds > 0:
+            calls_per_minute = finished / (elapsed_seconds / 60.0)
+
+    remaining = max(total - finished, 0)
+    eta_seconds = None
+    if remaining == 0:
+        eta_seconds = 0
+    elif calls_per_minute > 0:
+        eta_seconds = round(remaining / calls_per_minute * 60.0)
+
+    p50 = latency_percentile(batch, 50)
+    p95 = latency_percentile(batch, 95)
+
+    return {
+        'batch_id': batch.get('batch_id'),
+        'batch_folder': batch.get('batch_folder'),
+        'status': 'completed' if total and remaining == 0 else batch.get('status', 'running'),
+        'total_calls': total,
+        'total_audio_minutes': round(float(batch['total_audio_seconds']) / 60, 1) if batch.get('total_audio_seconds') is not None else None,
+        'audio_minutes_saved': round(float(batch.get('audio_seconds_saved', 0)) / 60, 1),
+        'dead_air_calls': int(batch.get('dead_air_calls', 0)),
+        'counters': counters,
+        'remaining': remaining,
+        'percent_complete': round(finished / total * 100, 1) if total else 0.0,
+        'started_at': batch.get('started_at'),
+        'updated_at': batch.get('updated_at'),
+        'elapsed_seconds': round(elapsed_seconds) if elapsed_seconds is not None else None,
+        'calls_per_minute': round(calls_per_minute, 2),
+        'latency_p50_seconds': round(p50, 1) if p50 is not None else None,
+        'latency_p95_seconds': round(p95, 1) if p95 is not None else None,
+        'eta_seconds': eta_seconds
+    }
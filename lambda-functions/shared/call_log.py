@@ -0,0 +1,126 @@
+"""
+Structured JSON logging for the per-call hot paths.
+
+Every line is one JSON object with level, function and the bound call fields,
+so Logs Insights can filter on them directly. Per-rule results are not logged
+as they happen; record_rule()/rule_reason() collect them and
+flush_call_log() writes one summary line per call.
+
+LOG_LEVEL (default INFO) sets the threshold. LOG_SAMPLE_RATE (default 0.01)
+selects a deterministic share of call IDs that log at DEBUG regardless, so a
+small sample of calls keeps the full per-rule trace.
+
+start_call_log() on a worker thread starts a context for that thread only, so a
+pool handling one call per thread keeps each call's fields apart; other worker
+threads log with the main thread's context.
+"""
+import json
+import os
+import threading
+import zlib
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+LOG_LEVEL = LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+
+# Rule reasons kept per violated rule in the summary line
+MAX_REASONS_PER_RULE = 3
+
+_context = {'function': None, 'fields': {}, 'level': LOG_LEVEL}
+_rules = {'evaluated': 0, 'violations': [], 'errors': {}, 'reasons': {}}
+
+# (context, rules) of a call started on a worker thread
+_thread = threading.local()
+
+
+def _state():
+    return getattr(_thread, 'state', None) or (_context, _rules)
+
+
+def is_sampled(call_id):
+    """Same answer for a call_id on every invocation and in every Lambda"""
+    return bool(call_id) and zlib.crc32(str(call_id).encode('utf-8')) / 0xFFFFFFFF < SAMPLE_RATE
+
+
+def start_call_log(function_name, **fields):
+    """Reset the call context and rule results; call at the start of each call/invocation"""
+    if threading.current_thread() is threading.main_thread():
+        context, rules = _context, _rules
+    else:
+        context, rules = _thread.state = ({}, {})
+    context.update(function=function_name, fields={}, level=LOG_LEVEL)
+    rules.update(evaluated=0, violations=[], errors={}, reasons={})
+    bind(**fields)
+
+
+def bind(**fields):
+    """Attach fields to every following line of this call (binding call_id applies sampling)"""
+    context = _state()[0]
+    context['fields'].update(fields)
+    if is_sampled(fields.get('call_id')):
+        context['level'] = LEVELS['DEBUG']
+
+
+def enabled(level):
+    """Check before building an expensive message"""
+    return LEVELS[level] >= _state()[0]['level']
+
+
+def log(level, message, **fields):
+    context = _state()[0]
+    if LEVELS[level] < context['level']:
+        return
+    line = {'level': level, 'function': context['function'], 'message': message}
+    line.update(context['fields'])
+    line.update(fields)
+    # One write per line, so lines from worker threads do not interleave
+    print(json.dumps(line, default=str, ensure_ascii=False) + '\n', end='')
+
+
+def debug(message, **fields):
+    log('DEBUG', message, **fields)
+
+
+def info(message, **fields):
+    log('INFO', message, **fields)
+
+
+def warning(message, **fields):
+    log('WARNING', message, **fields)
+
+
+def error(message, **fields):
+    log('ERROR', message, **fields)
+
+
+def record_rule(rule_id, violated, error_message=None):
+    """One rule's outcome for the current call"""
+    rules = _state()[1]
+    rules['evaluated'] += 1
+    if error_message:
+        rules['errors'][rule_id] = error_message
+    elif violated:
+        rules['violations'].append(rule_id)
+    debug('🔍 Rule evaluated', rule_id=rule_id, violated=violated, rule_error=error_message)
+
+
+def rule_reason(rule_id, reason):
+    """Why a rule fired; only the summary line carries it"""
+    reasons = _state()[1]['reasons'].setdefault(rule_id, [])
+    if len(reasons) < MAX_REASONS_PER_RULE:
+        reasons.append(reason)
+
+
+def flush_call_log(message, level='INFO', **fields):
+    """Write the per-call summary line, including the aggregated rule results"""
+    rules = _state()[1]
+    if rules['evaluated']:
+        fields.setdefault('rules_evaluated', rules['evaluated'])
+        fields.setdefault('violations', rules['violations'])
+        if rules['errors']:
+            fields.setdefault('rule_errors', rules['errors'])
+        reasons = {rule_id: rules['reasons'][rule_id] for rule_id in rules['violations'] if rule_id in rules['reasons']}
+        if reasons:
+            fields.setdefault('rule_reasons', reasons)
+    log(level, message, **fields)
+    rules.update(evaluated=0, violations=[], errors={}, reasons={})
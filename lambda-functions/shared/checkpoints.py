@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from shared.idempotency import normalize_etag
+
+# Checkpoint states; 'completed', 'rejected' (and in-flight 'triggered', unless asked) are skipped on resume
+TRIGGERED = 'triggered'
+COMPLETED = 'completed'
+FAILED = 'failed'
+REJECTED = 'rejected'
+
+
+def checkpoint_key(s3_key, etag):
+    """Range key for a batch item: the source object key plus its content ETag"""
+    return f'{s3_key}#{normalize_etag(etag)}'
+
+
+def load_checkpoints(checkpoints_table, batch_id):
+    """All checkpoint states for a batch as {item_key: status} (single paginated query)"""
+    checkpoints = {}
+    query_args = {
+        'KeyConditionExpression': 'batch_id = :batch_id',
+        'ExpressionAttributeValues': {':batch_id': batch_id},
+        'ProjectionExpression': 'item_key, #status',
+        'ExpressionAttributeNames': {'#status': 'status'}
+    }
+
+    while True:
+        response = checkpoints_table.query(**query_args)
+        for item in response.get('Items', []):
+            checkpoints[item['item_key']] = item.get('status')
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return checkpoints
+
+
+def should_skip(status, retry_in_flight=False):
+    """Resume policy: skip finished items, retry failures and never-started items"""
+    if status in (COMPLETED, REJECTED):
+        return True
+    if status == TRIGGERED:
+        return not retry_in_flight
+    return False
+
+
+def mark_checkpoint(checkpoints_table, batch_id, item_key, status, call_id=None):
+    """Record an item's state (best effort - must never fail call processing)"""
+    if not batch_id or not item_key:
+        return
+    try:
+        update_expression = 'SET #status = :status, updated_at = :now'
+        values = {':status': status, ':now': datetime.utcnow().isoformat()}
+        if call_id:
+            update_expression += ', call_id = :call_id'
+            values[':call_id'] = call_id
+
+        checkpoints_table.update_item(
+            Key={'batch_id': batch_id, 'item_key': item_key},
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues=values
+        )
+    except Exception as e:
+        print(f'⚠️ Failed to checkpoint {item_key} in batch {batch_id}: {str(e)}')
@@ -0,0 +1,69 @@
+"""
+Multi-item DynamoDB reads and writes through the resource's batch_get_item and
+batch_write_item, in request-sized chunks. DynamoDB may hand back part of a
+request unprocessed under throttling; those keys and items are retried with
+backoff and, if they still cannot be processed, returned to the caller.
+
+    records = batch_get_items(get_resource('dynamodb'), table_name, [{'call_id': c} for c in call_ids])
+    unwritten = batch_write_items(get_resource('dynamodb'), table_name, items)
+"""
+import random
+import time
+
+# DynamoDB request limits
+MAX_GET_KEYS = 100
+MAX_WRITE_ITEMS = 25
+
+MAX_ATTEMPTS = 5
+BASE_BACKOFF_SECONDS = 0.05
+
+
+def _backoff(attempt):
+    time.sleep(random.uniform(0, BASE_BACKOFF_SECONDS * (2 ** attempt)))
+
+
+def batch_get_items(dynamodb, table_name, keys, projection=None, attribute_names=None):
+    """Items for the given keys (missing keys are simply absent); duplicate keys are read once"""
+    unique = list({tuple(sorted(key.items())): key for key in keys}.values())
+    items = []
+    for start in range(0, len(unique), MAX_GET_KEYS):
+        request = {'Keys': unique[start:start + MAX_GET_KEYS]}
+        if projection:
+            request['ProjectionExpression'] = projection
+        if attribute_names:
+            request['ExpressionAttributeNames'] = attribute_names
+
+        pending = {table_name: request}
+        for attempt in range(MAX_ATTEMPTS):
+            response = dynamodb.batch_get_item(RequestItems=pending)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            pending = response.get('UnprocessedKeys') or {}
+            if not pending:
+                break
+            _backoff(attempt)
+        else:
+            raise RuntimeError(f"{len(pending[table_name]['Keys'])} keys still unprocessed in {table_name} after {MAX_ATTEMPTS} attempts")
+    return items
+
+
+def batch_write_items(dynamodb, table_name, items):
+    """Put every item; returns the items that could not be written after retries"""
+    failed = []
+    for start in range(0, len(items), MAX_WRITE_ITEMS):
+        pending = [{'PutRequest': {'Item': item}} for item in items[start:start + MAX_WRITE_ITEMS]]
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                response = dynamodb.batch_write_item(RequestItems={table_name: pending})
+            except Exception as e:
+                # The whole chunk is rejected (validation, or throttled past the client's own retries)
+                if attempt == MAX_ATTEMPTS - 1:
+                    print(f'⚠️ batch_write_item failed for {len(pending)} items in {table_name}: {str(e)}')
+                    break
+                _backoff(attempt)
+                continue
+            pending = (response.get('UnprocessedItems') or {}).get(table_name, [])
+            if not pending:
+                break
+            _backoff(attempt)
+        failed.extend(request['PutRequest']['Item'] for request in pending)
+    return failed
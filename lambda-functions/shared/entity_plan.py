@@ -0,0 +1,77 @@
+"""
+Which Comprehend operations and pattern extractors a call needs, worked out
+from the active rules instead of always running all of them.
+
+    plan = extraction_plan(rules, always=('persons', 'financial'))
+    if 'detect_pii_entities' in plan['operations']:
+        ...
+
+An entity list is needed when an active rule reads it:
+- an `entity` node in its compiled condition
+- its logic's `entity_types` (list names or Comprehend types such as PERSON)
+- a non-empty `pii_types`
+- a rule type whose evaluation is about entities (`pii_detection`)
+
+Lists read outside the rules, by the dashboard and by reference validation, are
+passed in as `always`. A Comprehend operation runs when it fills a needed list;
+the remaining lists it fills come along for free. A pattern family runs when
+its own list is needed.
+"""
+from shared.rule_dsl import RuleSyntaxError, compile_rule
+
+# Entity lists each Comprehend operation fills
+COMPREHEND_OUTPUTS = {
+    'detect_entities': ('persons', 'organizations'),
+    'detect_key_phrases': ('financial', 'medical', 'legal', 'communication', 'threatening', 'geographic', 'compliance_disclosures'),
+    'detect_pii_entities': ('pii_entities',)
+}
+
+# Pattern extractors in extract_compliance_patterns, named after the list each fills
+PATTERN_FAMILIES = ('agent_identification', 'threatening', 'geographic', 'compliance_disclosures', 'timing_sensitive')
+
+ENTITY_TYPES = frozenset(
+    [entity_type for outputs in COMPREHEND_OUTPUTS.values() for entity_type in outputs] + list(PATTERN_FAMILIES)
+)
+
+# Comprehend entity types a rule may list in `entity_types`
+COMPREHEND_TYPE_NAMES = {'PERSON': 'persons', 'ORGANIZATION': 'organizations'}
+
+RULE_TYPE_ENTITIES = {'pii_detection': ('pii_entities',)}
+
+
+def full_plan():
+    """Every operation and extractor, for callers without a rule set"""
+    return {
+        'entity_types': set(ENTITY_TYPES),
+        'operations': set(COMPREHEND_OUTPUTS),
+        'patterns': set(PATTERN_FAMILIES)
+    }
+
+
+def required_entity_types(rules, always=()):
+    """Entity lists some active rule (or `always`) reads"""
+    needed = set(always)
+    for rule in rules:
+        if not rule.get('active', True):
+            continue
+        logic = rule.get('logic') or {}
+        try:
+            needed.update(compile_rule(rule).entity_types)
+        except RuleSyntaxError:
+            pass  # Reported when the rule is evaluated
+        for name in logic.get('entity_types') or ():
+            needed.add(COMPREHEND_TYPE_NAMES.get(str(name).upper(), str(name)))
+        if logic.get('pii_types'):
+            needed.add('pii_entities')
+        needed.update(RULE_TYPE_ENTITIES.get(logic.get('type'), ()))
+    return needed & ENTITY_TYPES
+
+
+def extraction_plan(rules, always=()):
+    """{'entity_types', 'operations', 'patterns'}: what extract_compliance_entities should produce"""
+    needed = required_entity_types(rules, always)
+    return {
+        'entity_types': needed,
+        'operations': {operation for operation, outputs in COMPREHEND_OUTPUTS.items() if needed.intersection(outputs)},
+        'patterns': needed.intersection(PATTERN_FAMILIES)
+    }
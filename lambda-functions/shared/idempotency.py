@@ -0,0 +1,25 @@
+import uuid
+
+# Fixed namespace so every Lambda derives the same call_id for the same object
+CALL_ID_NAMESPACE = uuid.UUID('6f1c2a4e-8b0d-5e3f-9a71-2c4d8e6b0f13')
+
+
+def normalize_etag(etag):
+    """S3 returns ETags quoted in API responses but unquoted in event records"""
+    return (etag or '').strip('"')
+
+
+def derive_call_id(bucket, key, etag):
+    """
+    Deterministic call_id for an audio object.
+    The same bucket/key/content always maps to the same call_id, so S3 event
+    redelivery, SQS retries and Step Functions retries land on one record.
+    Stays in UUID format so job names keep the anycompany-{call_id}-{suffix} layout.
+    """
+    return str(uuid.uuid5(CALL_ID_NAMESPACE, f'{bucket}/{key}#{normalize_etag(etag)}'))
+
+
+def is_conditional_check_failure(error):
+    """True when a DynamoDB write was rejected by its ConditionExpression"""
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
@@ -0,0 +1,172 @@
+"""
+Per-stage timings, counts and payload sizes emitted as CloudWatch Embedded
+Metric Format (EMF): one JSON log line per call or invocation, which CloudWatch
+turns into metrics without any PutMetricData calls.
+
+    start_metrics('processor', filename=filename)
+    with stage('s3_get'):
+        body = s3.get_object(...)['Body'].read()
+    add_bytes('audio_bytes', len(body))
+    flush_metrics(call_id=call_id)
+
+Stage durations accumulate, so a stage entered once per chunk or per rule
+reports its total. start_metrics() on a worker thread collects for that thread
+only (a pool scoring one call per thread); other worker threads add to the
+main thread's metrics. Only the function name is a dimension; call IDs and other
+per-call detail go in as properties so they stay searchable in Logs Insights
+without creating custom metrics. STAGE_METRICS=false turns everything into no-ops.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'AnyCompany/Compliance')
+ENABLED = os.environ.get('STAGE_METRICS', 'true').lower() == 'true'
+
+# EMF limit per metric directive
+MAX_METRICS = 100
+
+_current = None
+
+# Metrics started on a worker thread
+_thread = threading.local()
+
+
+class StageMetrics:
+    """Accumulated metrics for one unit of work; safe to update from worker threads"""
+
+    def __init__(self, function_name, properties=None):
+        self.function_name = function_name
+        self.properties = dict(properties or {})
+        self.values = {}
+        self.stage_calls = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, value, unit='Count'):
+        with self._lock:
+            if name in self.values:
+                self.values[name][0] += value
+            else:
+                self.values[name] = [value, unit]
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def record_stage(self, name, elapsed_ms, failed=False):
+        with self._lock:
+            if name in self.stage_calls:
+                self.values[f'{name}_ms'][0] += elapsed_ms
+                self.stage_calls[name] += 1
+            else:
+                self.values[f'{name}_ms'] = [elapsed_ms, 'Milliseconds']
+                self.stage_calls[name] = 1
+        if failed:
+            self.add(f'{name}_errors', 1)
+
+    def to_emf(self, properties=None):
+        self.add('total_ms', (time.perf_counter() - self.started) * 1000, 'Milliseconds')
+        names = list(self.values)[:MAX_METRICS]
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Function']],
+                    'Metrics': [{'Name': name, 'Unit': self.values[name][1]} for name in names]
+                }]
+            },
+            'Function': self.function_name,
+            'stage_calls': self.stage_calls
+        }
+        record.update(self.properties)
+        record.update(properties or {})
+        for name in names:
+            value = self.values[name][0]
+            record[name] = round(value, 2) if isinstance(value, float) else value
+        return record
+
+
+class _StageTimer:
+    """Plain context manager (a generator-based one costs several times more per stage)"""
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record_stage(self.name, (time.perf_counter() - self.started) * 1000, exc_type is not None)
+        return False
+
+
+def _active():
+    return getattr(_thread, 'metrics', None) or _current
+
+
+def start_metrics(function_name, **properties):
+    """Begin collecting for a new call/invocation (any unflushed metrics are dropped)"""
+    global _current
+    metrics = StageMetrics(function_name, properties) if ENABLED else None
+    if threading.current_thread() is threading.main_thread():
+        _current = metrics
+    else:
+        _thread.metrics = metrics
+    return metrics
+
+
+def stage(name):
+    """Context manager timing a stage of the current call; a no-op before start_metrics"""
+    metrics = _active()
+    return metrics.stage(name) if metrics else nullcontext()
+
+
+def timed(name):
+    """Decorator form of stage()"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_count(name, value=1):
+    metrics = _active()
+    if metrics:
+        metrics.add(name, value)
+
+
+def add_bytes(name, num_bytes):
+    metrics = _active()
+    if metrics and num_bytes is not None:
+        metrics.add(name, num_bytes, 'Bytes')
+
+
+def set_properties(**properties):
+    metrics = _active()
+    if metrics:
+        metrics.properties.update(properties)
+
+
+def flush_metrics(**properties):
+    """Write the EMF log line for the current call and stop collecting (never raises)"""
+    global _current
+    if getattr(_thread, 'metrics', None) is not None:
+        metrics, _thread.metrics = _thread.metrics, None
+    else:
+        metrics, _current = _current, None
+    if not metrics:
+        return
+    try:
+        # One write per line, so lines from worker threads do not interleave
+        print(json.dumps(metrics.to_emf(properties), default=str) + '\n', end='')
+    except Exception as e:
+        print(f'⚠️ Failed to emit metrics: {str(e)}')
@@ -0,0 +1,107 @@
+"""
+Label Comprehend key phrases with an entity category in one pass.
+
+    classifier = phrase_classifier(rules)
+    category = classifier.classify('your account balance')    # 'financial'
+
+A phrase belongs to the first category, in CATEGORY_ORDER, with a term that
+occurs in it as a substring. All terms are compiled into a single regex
+alternation, in category order, inside a lookahead, so one scan finds the
+best-ranked term starting at every position. This replaces an `any(term in
+phrase ...)` chain per category.
+
+Rules can add terms with a `key_phrase_terms` map in their logic:
+
+    'logic': {'key_phrase_terms': {'medical': ['therapy', 'prescription']}, ...}
+
+The terms of all active rules are added to the built-in lists. A classifier is
+built once per distinct set of terms.
+"""
+import re
+
+from shared.rule_dsl import RuleSyntaxError
+
+# Priority order: a phrase matching several categories gets the first
+CATEGORY_ORDER = ('financial', 'medical', 'legal', 'communication', 'threatening', 'geographic', 'compliance_disclosures')
+
+DEFAULT_TERMS = {
+    'financial': ['dollar', 'payment', 'amount', 'balance', 'account'],
+    'medical': ['medical', 'hospital', 'doctor', 'surgery', 'illness', 'medication'],
+    'legal': ['attorney', 'lawyer', 'bankruptcy', 'legal action', 'garnish', 'repossess'],
+    'communication': ['text message', 'sms', 'email', 'voicemail'],
+    'threatening': ['arrest', 'jail', 'prison', 'seize', 'garnish', 'repossess', 'sheriff', 'warrant'],
+    'geographic': ['massachusetts', 'michigan', 'new hampshire', 'arizona', 'state of'],
+    'compliance_disclosures': ['mini miranda', 'debt collector', 'attempt to collect', 'validation notice']
+}
+
+# Classifiers kept per distinct term configuration
+MAX_CLASSIFIERS = 16
+
+_classifiers = {}
+
+
+class PhraseClassifier:
+    """Term lists by category compiled into one matcher"""
+
+    def __init__(self, terms_by_category):
+        self._rank = {}
+        for rank, category in enumerate(CATEGORY_ORDER):
+            for term in terms_by_category.get(category) or ():
+                # A term listed under several categories counts for the first
+                self._rank.setdefault(term, rank)
+        ordered = sorted(self._rank, key=self._rank.get)
+        self._finder = re.compile('(?=(' + '|'.join(re.escape(term) for term in ordered) + '))') if ordered else None
+
+    def classify(self, phrase):
+        """Category of a lowercased phrase, or None"""
+        if self._finder is None:
+            return None
+        best = None
+        for match in self._finder.finditer(phrase):
+            rank = self._rank[match.group(1)]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        return CATEGORY_ORDER[best] if best is not None else None
+
+
+def key_phrase_terms(rule):
+    """A rule's `key_phrase_terms` as {category: [lowercased terms]}; raises RuleSyntaxError"""
+    configured = (rule.get('logic') or {}).get('key_phrase_terms')
+    if not configured:
+        return {}
+    rule_id = rule.get('rule_id', '')
+    if not isinstance(configured, dict):
+        raise RuleSyntaxError(f'{rule_id}: key_phrase_terms must map categories to term lists')
+    terms = {}
+    for category, values in configured.items():
+        if category not in CATEGORY_ORDER:
+            raise RuleSyntaxError(f'{rule_id}: unknown key phrase category {category!r} (expected one of {", ".join(CATEGORY_ORDER)})')
+        if isinstance(values, str) or not isinstance(values, (list, tuple)):
+            raise RuleSyntaxError(f'{rule_id}: key_phrase_terms.{category} must be a list')
+        terms[category] = [str(value).strip().lower() for value in values if str(value).strip()]
+    return terms
+
+
+def phrase_classifier(rules=()):
+    """Classifier for the built-in terms plus those of the active rules"""
+    extra = {}
+    for rule in rules:
+        if not rule.get('active', True):
+            continue
+        try:
+            configured = key_phrase_terms(rule)
+        except RuleSyntaxError:
+            continue  # Rejected when the rule is saved
+        for category, terms in configured.items():
+            extra.setdefault(category, set()).update(terms)
+
+    key = tuple(sorted((category, tuple(sorted(terms))) for category, terms in extra.items()))
+    classifier = _classifiers.get(key)
+    if classifier is None:
+        if len(_classifiers) >= MAX_CLASSIFIERS:
+            _classifiers.clear()
+        merged = {category: DEFAULT_TERMS[category] + sorted(extra.get(category, ())) for category in CATEGORY_ORDER}
+        classifier = _classifiers[key] = PhraseClassifier(merged)
+    return classifier
@@ -0,0 +1,81 @@
+import json
+
+from shared.idempotency import is_conditional_check_failure
+
+# Upload prefix -> processing lane. UI uploads stay on audio/, Step Functions
+# batches are copied to audio-batch/ so each lane gets its own SQS queue.
+LANE_PREFIXES = {
+    'audio/': 'interactive',
+    'audio-batch/': 'bulk'
+}
+
+# Lane semaphores live in the batches table under reserved keys
+LANE_KEY_PREFIX = 'lane#'
+
+DEFAULT_BULK_TRANSCRIBE_CONCURRENCY = 200
+DEFAULT_BULK_RETRY_DELAY_SECONDS = 120
+
+
+def lane_for_key(key):
+    """Return (lane, filename) for an audio key, or (None, None) if it is not a lane prefix"""
+    for prefix, lane in LANE_PREFIXES.items():
+        if key.startswith(prefix):
+            return lane, key[len(prefix):]
+    return None, None
+
+
+def acquire_transcribe_slot(lanes_table, lane, limit):
+    """
+    Take one in-flight Transcribe slot for a lane.
+    Only the bulk lane is capped; the difference between the account's
+    Transcribe concurrency and the bulk limit stays reserved for interactive work.
+    """
+    if lane != 'bulk':
+        return True
+    try:
+        lanes_table.update_item(
+            Key={'batch_id': f'{LANE_KEY_PREFIX}{lane}'},
+            UpdateExpression='ADD in_flight :one',
+            ConditionExpression='attribute_not_exists(in_flight) OR in_flight < :limit',
+            ExpressionAttributeValues={':one': 1, ':limit': limit}
+        )
+        return True
+    except Exception as e:
+        if is_conditional_check_failure(e):
+            return False
+        raise
+
+
+def release_transcribe_slot(lanes_table, lane):
+    """Return a bulk-lane slot when its job completes, fails or is skipped (best effort)"""
+    if lane != 'bulk':
+        return
+    try:
+        lanes_table.update_item(
+            Key={'batch_id': f'{LANE_KEY_PREFIX}{lane}'},
+            UpdateExpression='ADD in_flight :minus_one',
+            ConditionExpression='in_flight > :zero',
+            ExpressionAttributeValues={':minus_one': -1, ':zero': 0}
+        )
+    except Exception as e:
+        print(f'⚠️ Failed to release {lane} lane slot: {str(e)}')
+
+
+def reset_transcribe_slots(lanes_table, lane, in_flight):
+    """Overwrite a lane's in-flight counter (reconciliation); returns the previous value"""
+    response = lanes_table.update_item(
+        Key={'batch_id': f'{LANE_KEY_PREFIX}{lane}'},
+        UpdateExpression='SET in_flight = :count',
+        ExpressionAttributeValues={':count': in_flight},
+        ReturnValues='UPDATED_OLD'
+    )
+    return int(response.get('Attributes', {}).get('in_flight', 0))
+
+
+def defer_to_lane_queue(sqs, queue_url, s3_record, delay_seconds=DEFAULT_BULK_RETRY_DELAY_SECONDS):
+    """Put a throttled bulk upload event back on its queue with a delay"""
+    sqs.send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps({'Records': [s3_record]}),
+        DelaySeconds=min(int(delay_seconds), 900)
+    )
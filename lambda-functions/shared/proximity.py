@@ -0,0 +1,137 @@
+"""
+Bounded-proximity phrase matching, the replacement for regex `.*` gaps.
+
+    spans = find_near(text_lower, [['arrest', 'jail'], ['you', 'your']], within=20)
+
+matches a phrase from the first group followed by one from the next group at
+most `within` words later (and so on for further groups). The text is split
+into words once; phrases are located through a word index and the groups are
+chained with pointers that only move forward, so a search costs time linear in
+the number of words however often the terms occur. A `.*` gap in `re` rescans
+to the end of the text from every occurrence of the first term instead.
+
+Terms are whole words or phrases; a trailing `*` matches a word prefix
+('collector*' also finds 'collectors').
+"""
+import re
+
+WORD = re.compile(r"[a-z0-9']+")
+
+# Gap allowed between consecutive groups when the caller does not give one
+DEFAULT_WITHIN_WORDS = 20
+
+
+class TokenizedText:
+    """Words of a lowercased text with their character offsets; phrase lookups are memoized"""
+
+    def __init__(self, text):
+        self.text = text
+        self._words = None
+        self._index = None
+        self._occurrences = {}
+
+    def _split(self):
+        # Deferred until a phrase lookup needs it; most texts fail the substring pre-check
+        if self._words is None:
+            spans = [match.span() for match in WORD.finditer(self.text)]
+            self._words = [self.text[start:end] for start, end in spans]
+            self._starts = [start for start, _ in spans]
+            self._ends = [end for _, end in spans]
+
+    @property
+    def words(self):
+        self._split()
+        return self._words
+
+    @property
+    def starts(self):
+        self._split()
+        return self._starts
+
+    @property
+    def ends(self):
+        self._split()
+        return self._ends
+
+    def _word_index(self):
+        if self._index is None:
+            index = {}
+            for position, word in enumerate(self.words):
+                index.setdefault(word, []).append(position)
+            self._index = index
+        return self._index
+
+    def occurrences(self, term):
+        """(first word, word after the last) for every occurrence of a term, in text order"""
+        found = self._occurrences.get(term)
+        if found is not None:
+            return found
+
+        prefix = term.endswith('*')
+        parts = WORD.findall(term.rstrip('*').lower())
+        size = len(parts)
+        if not parts:
+            found = []
+        elif size == 1:
+            if prefix:
+                # Scan the distinct words, not every word of the text
+                positions = [position for word, at in self._word_index().items() if word.startswith(parts[0]) for position in at]
+                found = [(position, position + 1) for position in sorted(positions)]
+            else:
+                found = [(position, position + 1) for position in self._word_index().get(parts[0], ())]
+        else:
+            # Multi-word phrase: anchor on its first word, compare the rest in place
+            middle, last = parts[1:-1], parts[-1]
+            found = []
+            for position in self._word_index().get(parts[0], ()):
+                tail = self.words[position + 1:position + size]
+                if len(tail) == size - 1 and tail[:-1] == middle and (
+                        tail[-1].startswith(last) if prefix else tail[-1] == last):
+                    found.append((position, position + size))
+        self._occurrences[term] = found
+        return found
+
+    def group(self, terms):
+        """Occurrences of any term of a group, in text order"""
+        if len(terms) == 1:
+            return self.occurrences(terms[0])
+        return sorted(occurrence for term in terms for occurrence in self.occurrences(term))
+
+
+def find_near(text, groups, within=DEFAULT_WITHIN_WORDS):
+    """
+    Character (start, end) spans where each group follows the previous one within
+    `within` words. Like re.finditer: leftmost first, non-overlapping; each later
+    group takes its nearest occurrence. `text` is a lowercased string or a TokenizedText.
+    """
+    raw = text.text if isinstance(text, TokenizedText) else text
+    # A substring test is far cheaper than splitting the text into words
+    if not all(any(term.rstrip('*') in raw for term in terms) for terms in groups):
+        return []
+    tokens = text if isinstance(text, TokenizedText) else TokenizedText(text)
+    occurrences = [tokens.group(terms) for terms in groups]
+    if not all(occurrences):
+        return []
+
+    pointers = [0] * len(groups)
+    spans = []
+    resume = 0
+    for first_word, end in occurrences[0]:
+        if first_word < resume:
+            continue
+        matched = True
+        for depth in range(1, len(groups)):
+            candidates = occurrences[depth]
+            pointer = pointers[depth]
+            # `end` never decreases between attempts, so skipped occurrences stay skipped
+            while pointer < len(candidates) and candidates[pointer][0] < end:
+                pointer += 1
+            pointers[depth] = pointer
+            if pointer == len(candidates) or candidates[pointer][0] - end > within:
+                matched = False
+                break
+            end = candidates[pointer][1]
+        if matched:
+            spans.append((tokens.starts[first_word], tokens.ends[end - 1]))
+            resume = end
+    return spans
@@ -0,0 +1,138 @@
+"""
+Call reference data (agent, customer, state and compliance flags), keyed by
+Genesys call ID.
+
+With REFERENCE_TABLE set, records live in a DynamoDB table that the reference
+loader fills from uploads under reference/, and a lookup is one get_item (or
+one batch_get_item per 100 calls). Without it, they come from the reference
+files in the input bucket.
+
+    record = get_reference(get_table(table_name), 'VM-2024-001001')
+    records = get_references(get_resource('dynamodb'), table_name, genesys_call_ids)
+
+Batch prep joins a whole listing against the reference data up front and
+embeds each call's compact_reference() in its manifest item, so batch calls
+reach the completion handler with their reference data on the call record.
+"""
+import json
+import os
+from decimal import Decimal
+
+from shared.dynamodb_batch import batch_get_items
+
+VOICEMAIL_REFERENCE_KEY = 'voicemail-calls/voicemail_reference.json'
+MASTER_REFERENCE_KEY = 'reference/master_reference.json'
+
+# Uploads under this prefix are loaded into the reference table
+REFERENCE_PREFIX = 'reference/'
+
+# Partition key of the reference table
+REFERENCE_KEY = 'genesys_call_id'
+
+# Written by the loader, not part of the record handed to rules
+LOAD_ATTRIBUTES = ('source_key', 'loaded_at')
+
+# Compliance flags, nested under 'flags' and copied to the top level
+REFERENCE_FLAGS = ('do_not_call', 'attorney_retained', 'bankruptcy_filed', 'cease_desist', 'third_party_risk', 'voicemail_context')
+
+# Longest text value carried in a batch manifest (scripts and notes stay in the reference store)
+MANIFEST_VALUE_CHARS = 256
+
+
+def reference_table_name():
+    """The reference table, or None to read the reference files"""
+    return os.environ.get('REFERENCE_TABLE') or None
+
+
+def normalize_reference_data(voicemail_data):
+    """Convert voicemail reference format to standard reference format"""
+    flags = voicemail_data.get('flags', {})
+    record = {
+        'agent_name': voicemail_data.get('agent_name'),
+        'customer_name': voicemail_data.get('customer_name'),
+        'customer_state': voicemail_data.get('customer_state'),
+        'call_type': voicemail_data.get('call_type'),
+        'flags': flags
+    }
+    # Extract compliance context from flags and data
+    record.update((flag, flags.get(flag, False)) for flag in REFERENCE_FLAGS)
+    return record
+
+
+def load_reference_index(s3, bucket_name):
+    """
+    Every reference record by Genesys ID, read once. Voicemail records win over
+    master records, matching the per-call lookup in the completion handler.
+    """
+    index = dict(_read_json(s3, bucket_name, MASTER_REFERENCE_KEY).get('calls') or {})
+    for genesys_call_id, call_data in (_read_json(s3, bucket_name, VOICEMAIL_REFERENCE_KEY).get('voicemails') or {}).items():
+        index[genesys_call_id] = normalize_reference_data(call_data)
+    return index
+
+
+def _read_json(s3, bucket_name, key):
+    try:
+        return json.loads(s3.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+    except Exception:
+        # Missing or unreadable reference files mean no reference data, as in the handler
+        return {}
+
+
+def reference_record(fields):
+    """
+    An uploaded row in the standard format. Flags may be nested under 'flags'
+    or given as columns ('true'/'yes'/'1'); other columns are kept as they are.
+    """
+    flags = dict(fields.get('flags') or {})
+    for flag in REFERENCE_FLAGS:
+        if flag in fields:
+            flags[flag] = parse_flag(fields[flag])
+    record = {name: value for name, value in fields.items()
+              if name not in REFERENCE_FLAGS and name not in ('flags', REFERENCE_KEY)}
+    record.update(normalize_reference_data(dict(fields, flags=flags)))
+    return {name: value for name, value in record.items() if value is not None and value != ''}
+
+
+def parse_flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 'yes', 'y', '1')
+    return bool(value)
+
+
+def get_reference(table, genesys_call_id):
+    """One call's record from the reference table; {} when there is none"""
+    item = table.get_item(Key={REFERENCE_KEY: genesys_call_id}).get('Item')
+    return _without_key(item) if item else {}
+
+
+def get_references(dynamodb, table_name, genesys_call_ids):
+    """{genesys_call_id: record} for the IDs found, in batch_get_item requests"""
+    keys = [{REFERENCE_KEY: genesys_call_id} for genesys_call_id in genesys_call_ids if genesys_call_id]
+    return {item[REFERENCE_KEY]: _without_key(item) for item in batch_get_items(dynamodb, table_name, keys)}
+
+
+def _without_key(item):
+    return {name: value for name, value in item.items() if name != REFERENCE_KEY and name not in LOAD_ATTRIBUTES}
+
+
+def compact_reference(record):
+    """
+    The part of a reference record rules read, small enough for a manifest item:
+    flags at the top level (only those set), and scalar values up to
+    MANIFEST_VALUE_CHARS. Numbers become plain JSON numbers.
+    """
+    compact = {}
+    for name, value in record.items():
+        if name in REFERENCE_FLAGS or name == 'flags' or name in LOAD_ATTRIBUTES:
+            continue
+        if isinstance(value, Decimal):
+            value = int(value) if value == value.to_integral_value() else float(value)
+        if isinstance(value, str):
+            if not value or len(value) > MANIFEST_VALUE_CHARS:
+                continue
+        elif not isinstance(value, (bool, int, float)):
+            continue
+        compact[name] = value
+    flags = record.get('flags') or {}
+    compact.update((flag, True) for flag in REFERENCE_FLAGS if record.get(flag) or flags.get(flag))
+    return compact
@@ -0,0 +1,697 @@
+"""
+Declarative compliance rules, compiled once and evaluated against a shared
+per-call context.
+
+A rule's `logic` map (as stored in the rules table) may carry a `violation`
+expression. Each node is a map with one operator key:
+
+    {'all': [node, ...]}            every child is true
+    {'any': [node, ...]}            at least one child is true
+    {'not': node}
+    {'terms': ['sue', 'jail']}      any phrase occurs (case-insensitive substring)
+    {'regex': ['\\bpast due\\b']}   any regular expression matches (case-insensitive)
+    {'near': [['arrest', 'jail'], ['you', 'your']], 'within': 20}
+                                    a phrase from each group follows the previous group
+                                    within `within` words (default 20); see shared/proximity.py
+    {'flag': 'do_not_call'}         reference flag is set
+    {'ref': 'customer_state', 'in': ['MA', 'NH']}
+    {'ref': 'customer_state', 'equals': 'MA'}
+    {'ref': 'agent_name'}           reference value is present
+    {'ref': 'agent_name', 'in_text': True}
+    {'ref': 'customer_name', 'min_words': 2}
+    {'ref': 'customer_name', 'word_in_text': 0}
+    {'entity': 'persons', 'min_count': 2}
+    {'entity': 'persons', 'contains_ref': 'customer_name'}
+    {'entity': 'threatening', 'contains': ['arrest']}
+
+`terms`, `regex`, `near` and the `in_text`/`word_in_text` reference checks take an
+optional `window`: 'first_60_seconds', 'last_30_seconds', 'first_150_words'.
+Seconds use Transcribe word timings when the context has them, otherwise
+WORDS_PER_SECOND. An optional `reason` is reported when the rule fires.
+
+When the completion handler analyses agent speech only (AGENT_ONLY_ANALYSIS),
+a rule is evaluated against the agent's words unless its logic says
+`'scope': 'call'`, which keeps the whole conversation.
+
+The legacy `patterns` list keeps its meaning: any match is a violation, OR-ed
+with the `violation` expression. Rules stored without a `violation`
+expression fall back to LEGACY_CONDITIONS, the reference-data checks the
+completion handler used to hard-code per rule_id. A stored pattern that fails
+the regex checks below is dropped (listed in `rejected_patterns`) rather than
+failing the whole rule, so its other patterns and condition keep firing;
+validate_rule() rejects it when a rule is saved.
+
+CallContext lowercases the transcript once and memoizes every term, regex,
+window and reference lookup, so rules sharing a phrase or pattern do not
+rescan the text and a call costs one pass per distinct check.
+
+Rule regexes are user input, so compiling one rejects anything whose matching
+time can grow faster than linearly with the transcript: unbounded repeats of
+something that matches both a space and a word character (`.*`, `[a-z\\s]+`
+- they run across words and rescan the rest of the text from every start),
+any repeat other than `?` of a group that itself repeats or alternates, bounded
+or not (`(a+)+`, `(\\w{1,200}\\s?){1,200}`, `(a|ab)*` - the bounds multiply),
+backreferences, repeat bounds above MAX_REGEX_REPEAT, and back-to-back repeats
+that can match the same characters when their spans multiply past
+MAX_REGEX_REPEAT (`.{0,200}.{0,200}`, `\\w*\\w*` - every split of the text between
+them is tried). Gaps between phrases are written with `near` or a single
+bounded `.{0,200}`.
+"""
+import bisect
+import re
+from datetime import datetime
+
+from shared.proximity import DEFAULT_WITHIN_WORDS, TokenizedText, find_near
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# Speech rate used for time windows when word timings are not available
+# (150 words for the first 60 seconds)
+WORDS_PER_SECOND = 2.5
+
+# Compiled rules kept per (rule_id, logic); rules are rescanned on every call
+MAX_COMPILED_RULES = 2048
+
+WINDOW_PATTERN = re.compile(r'^(first|last)_(\d+)_(seconds|words)$')
+REGEX_SYNTAX = re.compile(r'[\\.^$*+?{}\[\]|()]')
+
+# Limits on rule regexes: longest pattern, largest bounded repeat (a larger
+# one is treated as unbounded) and widest `near` gap in words
+MAX_REGEX_LENGTH = 500
+MAX_REGEX_REPEAT = 200
+MAX_NEAR_WORDS = 200
+
+# Characters a repeat must not match together: a space and a word character
+SPACE_PROBE = ' '
+WORD_PROBES = 'e0'
+# Characters tried when checking whether two repeats can match the same text
+OVERLAP_PROBES = ''.join(map(chr, range(32, 127))) + '\t\né'
+
+# What a rule's text checks read when speakers are separated
+AGENT_SCOPE = 'agent'
+CALL_SCOPE = 'call'
+RULE_SCOPES = (AGENT_SCOPE, CALL_SCOPE)
+
+LEGACY_CONDITIONS = {
+    'LO1001.04': {
+        'violation': {'all': [
+            {'ref': 'agent_name'},
+            {'not': {'all': [{'terms': ['this is', 'my name is']}, {'ref': 'agent_name', 'in_text': True}]}}
+        ]},
+        'reason': 'agent identification missing'
+    },
+    'LO1001.03': {
+        'violation': {'all': [
+            {'ref': 'customer_state', 'equals': 'MA'},
+            {'ref': 'agent_name'},
+            {'not': {'all': [{'terms': ['my name is']}, {'ref': 'agent_name', 'in_text': True}]}}
+        ]},
+        'reason': 'MA requirement: agent full name not stated'
+    },
+    'LO1001.08': {
+        'violation': {'all': [
+            {'ref': 'customer_name'},
+            {'not': {'ref': 'customer_name', 'in_text': True}}
+        ]},
+        'reason': 'customer full name not used in voicemail'
+    },
+    'LO1001.09': {
+        'violation': {'all': [
+            {'ref': 'customer_name'},
+            {'any': [
+                {'all': [
+                    {'ref': 'customer_name', 'min_words': 2},
+                    {'ref': 'customer_name', 'word_in_text': 0},
+                    {'not': {'ref': 'customer_name', 'word_in_text': 1}}
+                ]},
+                {'terms': ['jennifer johnson', 'robert williams', 'karen thompson']}
+            ]}
+        ]},
+        'reason': 'agent used incorrect customer name'
+    },
+    'LO1005.11': {'violation': {'flag': 'do_not_call'}, 'reason': 'customer is on Do Not Call list'},
+    'LO1005.05': {'violation': {'flag': 'attorney_retained'}, 'reason': 'customer has attorney representation'},
+    'LO1005.06': {'violation': {'flag': 'bankruptcy_filed'}, 'reason': 'customer has filed bankruptcy'},
+    'LO1005.04': {'violation': {'flag': 'cease_desist'}, 'reason': 'customer requested no contact'},
+    'LO1006.01': {
+        'violation': {'all': [
+            {'flag': 'third_party_risk'},
+            {'terms': ['debt', 'owe', 'balance', 'payment', 'past due', 'collection']}
+        ]},
+        'reason': 'debt information disclosed when third party might hear'
+    },
+    'LO1005.14': {
+        # Whole words, so 'hello' and 'shell' are not profanity; the other stems also cover 'damned', 'fucking'
+        'violation': {'all': [
+            {'regex': [r'\bhell\b', r'\b(?:damn|bullshit|shit|fuck)']},
+            {'flag': 'voicemail_context'}
+        ]},
+        'reason': 'profanity left on voicemail'
+    },
+    'LO1005.08': {
+        'violation': {'all': [
+            {'terms': ['text message', 'texting', 'sms', 'sending you a text']},
+            {'flag': 'voicemail_context'}
+        ]},
+        'reason': 'texting mentioned during voicemail without consent'
+    },
+    'LO1007.05': {
+        'violation': {'terms': ['arrest', 'jail', 'prison', 'police', 'legal action', 'sue', 'lawsuit']},
+        'reason': 'threatening language detected'
+    }
+}
+LEGACY_CONDITIONS['LO1001.06'] = LEGACY_CONDITIONS['LO1001.04']
+
+_compiled = {}
+
+
+class RuleSyntaxError(ValueError):
+    """A rule's logic cannot be compiled"""
+
+
+class CallContext:
+    """Everything rules look at for one call, computed at most once"""
+
+    def __init__(self, transcript, ref_data=None, entities=None, items=None, offset_seconds=0):
+        self.transcript = transcript or ''
+        self.ref_data = ref_data or {}
+        self.entities = entities or {}
+        self.items = items
+        # Audio the processor trimmed off the start: word times are shifted back by it,
+        # so seconds windows follow the original recording
+        self.offset_seconds = float(offset_seconds or 0)
+        self._windows = {None: self.transcript.lower()}
+        self._words = None
+        self._timings = None
+        self._hits = {}
+        self._entity_texts = {}
+        self._tokens = {}
+
+    def text(self, window=None):
+        """Lowercased transcript, or the part of it inside a window"""
+        if window not in self._windows:
+            self._windows[window] = self._window_text(*window)
+        return self._windows[window]
+
+    def _window_text(self, edge, size, unit):
+        if unit == 'seconds' and self.items:
+            words, starts = self._word_timings()
+            if edge == 'first':
+                selected = words[:bisect.bisect_left(starts, size)]
+            else:
+                selected = words[bisect.bisect_left(starts, starts[-1] - size):] if starts else []
+        else:
+            if self._words is None:
+                self._words = self._windows[None].split()
+            count = int(size * WORDS_PER_SECOND) if unit == 'seconds' else size
+            selected = self._words[:count] if edge == 'first' else self._words[-count:] if count else []
+        return ' '.join(selected)
+
+    def _word_timings(self):
+        if self._timings is None:
+            words, starts = [], []
+            for item in self.items:
+                if item.get('type') == 'pronunciation' and item.get('start_time') is not None:
+                    words.append(item['alternatives'][0]['content'].lower())
+                    starts.append(float(item['start_time']) + self.offset_seconds)
+            self._timings = (words, starts)
+        return self._timings
+
+    def contains(self, phrase, window=None):
+        key = ('terms', phrase, window)
+        hit = self._hits.get(key)
+        if hit is None:
+            hit = self._hits[key] = phrase in self.text(window)
+        return hit
+
+    def search(self, patterns, window=None):
+        """Whether any pattern from _compile_regex_list matches"""
+        for pattern in patterns:
+            if isinstance(pattern, str):
+                if self.contains(pattern, window):
+                    return True
+                continue
+            key = ('regex', pattern.pattern, window)
+            hit = self._hits.get(key)
+            if hit is None:
+                hit = self._hits[key] = pattern.search(self.text(window)) is not None
+            if hit:
+                return True
+        return False
+
+    def near(self, groups, within, window=None):
+        """Whether the groups occur in order, each within `within` words of the previous"""
+        key = ('near', groups, within, window)
+        hit = self._hits.get(key)
+        if hit is None:
+            tokens = self._tokens.get(window)
+            if tokens is None:
+                tokens = self._tokens[window] = TokenizedText(self.text(window))
+            hit = self._hits[key] = bool(find_near(tokens, groups, within))
+        return hit
+
+    def ref(self, field):
+        return self.ref_data.get(field)
+
+    def flag(self, name):
+        """Normalized reference data has flags at the top level; raw records keep them under `flags`"""
+        value = self.ref_data.get(name)
+        if value is None:
+            value = (self.ref_data.get('flags') or {}).get(name)
+        return bool(value)
+
+    def entity_texts(self, entity_type):
+        texts = self._entity_texts.get(entity_type)
+        if texts is None:
+            texts = self._entity_texts[entity_type] = [
+                str(entity.get('text', '')).lower() for entity in self.entities.get(entity_type) or []
+            ]
+        return texts
+
+
+class CompiledRule:
+    """A rule reduced to closures over a CallContext"""
+    __slots__ = ('rule_id', 'rule', 'patterns', 'condition', 'reason', 'entity_types', 'scope', 'rejected_patterns')
+
+    def __init__(self, rule_id, rule, patterns, condition, reason, entity_types=frozenset(), scope=AGENT_SCOPE,
+                 rejected_patterns=()):
+        self.rule_id = rule_id
+        self.rule = rule
+        self.patterns = patterns
+        self.condition = condition
+        self.reason = reason
+        # Entity lists the condition reads (see shared/entity_plan.py)
+        self.entity_types = entity_types
+        self.scope = scope
+        # Why legacy patterns were left out, one message each
+        self.rejected_patterns = rejected_patterns
+
+    def evaluate(self, context):
+        """Reasons the rule fired for this call; empty when it did not"""
+        reasons = []
+        if self.patterns is not None and context.search(self.patterns):
+            reasons.append('transcript pattern matched')
+        if self.condition is not None and self.condition(context):
+            reasons.append(self.reason or 'rule condition met')
+        return reasons
+
+
+def violation_record(rule, call_id, confidence=1.0, quality_score=1.0, low_confidence_entities=None,
+                     evidence=None, requires_manual_review=False):
+    """The violation entry stored in a call's `violations` list"""
+    rule_id = rule.get('rule_id', '')
+    return {
+        'date': datetime.now().strftime('%m/%d/%Y %I:%M:%S %p'),
+        'severity': rule.get('severity', 'minor'),
+        'code': rule_id,
+        'rule_code': rule_id,
+        'comment': rule.get('description', 'Rule violation detected'),
+        'call_id': call_id,
+        'ai_confidence': confidence,
+        'comprehend_quality': quality_score,
+        'low_confidence_entities': low_confidence_entities or [],
+        'evidence': evidence or [],
+        'requires_manual_review': requires_manual_review
+    }
+
+
+def compile_rule(rule):
+    """CompiledRule for a rules-table item, cached by rule_id and logic"""
+    rule_id = rule.get('rule_id', '')
+    logic = rule.get('logic') or {}
+    # repr is several times cheaper than a canonical JSON dump and stable for scanned items
+    key = (rule_id, repr(logic))
+    compiled = _compiled.get(key)
+    if compiled is None:
+        if len(_compiled) >= MAX_COMPILED_RULES:
+            _compiled.clear()
+        compiled = _compiled[key] = _compile(rule_id, rule, logic)
+    else:
+        # Same logic, but severity/description may have changed
+        compiled.rule = rule
+    return compiled
+
+
+def validate_rule(rule):
+    """Compile a rule about to be saved; raises RuleSyntaxError, including for patterns compile_rule would drop"""
+    compiled = compile_rule(rule)
+    if compiled.rejected_patterns:
+        raise RuleSyntaxError(compiled.rejected_patterns[0])
+    return compiled
+
+
+def _compile(rule_id, rule, logic):
+    scope = logic.get('scope') or AGENT_SCOPE
+    if scope not in RULE_SCOPES:
+        raise RuleSyntaxError(f'{rule_id}: scope must be one of {", ".join(RULE_SCOPES)}')
+    patterns = logic.get('patterns') or []
+    rejected = []
+    matchers = _compile_regex_list(patterns, rule_id, rejected) if patterns else None
+
+    if 'violation' in logic:
+        spec = {'violation': logic['violation'], 'reason': logic.get('reason')}
+    else:
+        spec = LEGACY_CONDITIONS.get(rule_id)
+
+    condition = compile_condition(spec['violation'], rule_id) if spec else None
+    entity_types = frozenset(_entity_types(spec['violation'])) if spec else frozenset()
+    return CompiledRule(rule_id, rule, matchers, condition, spec.get('reason') if spec else None, entity_types, scope,
+                        tuple(rejected))
+
+
+def _entity_types(node):
+    """Every `entity` named in an expression"""
+    if not isinstance(node, dict):
+        return
+    if 'entity' in node:
+        yield node['entity']
+    for key in ('all', 'any'):
+        for child in node.get(key) or ():
+            yield from _entity_types(child)
+    if 'not' in node:
+        yield from _entity_types(node['not'])
+
+
+def compile_condition(node, rule_id=''):
+    """Closure context -> bool for one expression node; raises RuleSyntaxError"""
+    if not isinstance(node, dict):
+        raise RuleSyntaxError(f'{rule_id}: expected a map, got {node!r}')
+
+    if 'all' in node:
+        children = [compile_condition(child, rule_id) for child in _as_list(node['all'], 'all', rule_id)]
+        return lambda context: all(child(context) for child in children)
+
+    if 'any' in node:
+        children = [compile_condition(child, rule_id) for child in _as_list(node['any'], 'any', rule_id)]
+        return lambda context: any(child(context) for child in children)
+
+    if 'not' in node:
+        child = compile_condition(node['not'], rule_id)
+        return lambda context: not child(context)
+
+    if 'terms' in node:
+        window = parse_window(node.get('window'), rule_id)
+        terms = [str(term).lower() for term in _as_list(node['terms'], 'terms', rule_id)]
+        return lambda context: any(context.contains(term, window) for term in terms)
+
+    if 'regex' in node:
+        window = parse_window(node.get('window'), rule_id)
+        patterns = _compile_regex_list(_as_list(node['regex'], 'regex', rule_id), rule_id)
+        return lambda context: context.search(patterns, window)
+
+    if 'near' in node:
+        return _compile_near(node, rule_id)
+
+    if 'flag' in node:
+        name = node['flag']
+        return lambda context: context.flag(name)
+
+    if 'ref' in node:
+        return _compile_ref(node, rule_id)
+
+    if 'entity' in node:
+        return _compile_entity(node, rule_id)
+
+    raise RuleSyntaxError(f'{rule_id}: unknown condition {sorted(node)}')
+
+
+def _compile_near(node, rule_id):
+    window = parse_window(node.get('window'), rule_id)
+    groups = tuple(
+        tuple(str(term).lower() for term in (_as_list(group, 'near group', rule_id) if not isinstance(group, str) else [group]))
+        for group in _as_list(node['near'], 'near', rule_id)
+    )
+    if len(groups) < 2 or not all(groups):
+        raise RuleSyntaxError(f'{rule_id}: near needs at least two non-empty groups')
+    within = _as_int(node.get('within', DEFAULT_WITHIN_WORDS), 'near within', rule_id)
+    if not 0 <= within <= MAX_NEAR_WORDS:
+        raise RuleSyntaxError(f'{rule_id}: near within must be 0-{MAX_NEAR_WORDS} words')
+    return lambda context: context.near(groups, within, window)
+
+
+def _compile_ref(node, rule_id):
+    field = node['ref']
+    window = parse_window(node.get('window'), rule_id)
+
+    if 'equals' in node:
+        expected = node['equals']
+        return lambda context: context.ref(field) == expected
+
+    if 'in' in node:
+        allowed = set(_as_list(node['in'], 'in', rule_id))
+        return lambda context: context.ref(field) in allowed
+
+    if node.get('in_text'):
+        def ref_in_text(context):
+            value = context.ref(field)
+            return bool(value) and context.contains(str(value).lower(), window)
+        return ref_in_text
+
+    if 'min_words' in node:
+        minimum = _as_int(node['min_words'], 'min_words', rule_id)
+        return lambda context: len(str(context.ref(field) or '').split()) >= minimum
+
+    if 'word_in_text' in node:
+        index = _as_int(node['word_in_text'], 'word_in_text', rule_id)
+
+        def word_in_text(context):
+            words = str(context.ref(field) or '').lower().split()
+            return len(words) > index and context.contains(words[index], window)
+        return word_in_text
+
+    return lambda context: bool(context.ref(field))
+
+
+def _compile_entity(node, rule_id):
+    entity_type = node['entity']
+
+    if 'contains_ref' in node:
+        field = node['contains_ref']
+
+        def contains_ref(context):
+            value = str(context.ref(field) or '').lower()
+            return bool(value) and any(value in text for text in context.entity_texts(entity_type))
+        return contains_ref
+
+    if 'contains' in node:
+        terms = [str(term).lower() for term in _as_list(node['contains'], 'contains', rule_id)]
+        return lambda context: any(term in text for text in context.entity_texts(entity_type) for term in terms)
+
+    minimum = _as_int(node.get('min_count', 1), 'min_count', rule_id)
+    return lambda context: len(context.entity_texts(entity_type)) >= minimum
+
+
+def _as_int(value, name, rule_id):
+    """A whole-number setting (int, Decimal or digit string); raises RuleSyntaxError"""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or isinstance(value, bool) or (number != value and str(number) != str(value).strip()):
+        raise RuleSyntaxError(f'{rule_id}: {name} must be a whole number, got {value!r}')
+    return number
+
+
+def parse_window(window, rule_id=''):
+    """'first_60_seconds' -> ('first', 60, 'seconds'); None for the whole transcript"""
+    if window in (None, 'full'):
+        return None
+    match = WINDOW_PATTERN.match(str(window))
+    if not match:
+        raise RuleSyntaxError(f'{rule_id}: unknown window {window!r}')
+    return match.group(1), int(match.group(2)), match.group(3)
+
+
+def _compile_regex_list(patterns, rule_id, rejected=None):
+    """Plain phrases become substring checks on the lowercased text (much cheaper than a
+    case-insensitive regex scan); anything with regex syntax is compiled. With a
+    `rejected` list, unsafe patterns are skipped and their errors added to it."""
+    matchers = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        if not REGEX_SYNTAX.search(pattern):
+            matchers.append(pattern.lower())
+            continue
+        try:
+            check_regex(pattern, rule_id)
+        except RuleSyntaxError as e:
+            if rejected is None:
+                raise
+            rejected.append(str(e))
+            continue
+        matchers.append(re.compile(pattern, re.IGNORECASE))
+    return tuple(matchers)
+
+
+def check_regex(pattern, rule_id=''):
+    """Raise RuleSyntaxError unless the regex compiles and matches in linear time (see module docstring)"""
+    if len(pattern) > MAX_REGEX_LENGTH:
+        raise RuleSyntaxError(f'{rule_id}: pattern longer than {MAX_REGEX_LENGTH} characters')
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except re.error as e:
+        raise RuleSyntaxError(f'{rule_id}: invalid pattern {pattern!r}: {e}')
+    problem = _regex_problem(list(parsed))
+    if problem:
+        raise RuleSyntaxError(f'{rule_id}: pattern {pattern!r} {problem}')
+
+
+def _regex_problem(items):
+    """Why a parsed (sub)pattern is unsafe, or None"""
+    if _has_ambiguous_repeats(items):
+        return ('has repeats that can match the same characters back to back; '
+                f'their bounds multiply past {MAX_REGEX_REPEAT} (merge them or put a distinct literal between)')
+    for op, av in items:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+            _, high, body = av
+            body = list(body)
+            # Even bounded, nested repeats backtrack through the product of their bounds
+            if high > 1 and _has_repeat_or_branch(body):
+                return 'nests repeats or alternatives inside a repeat'
+            if (high == sre_parse.MAXREPEAT or high > MAX_REGEX_REPEAT) and len(body) == 1 and _crosses_words(*body[0]):
+                return ('has an unbounded gap that can run across words; '
+                        f"use 'near' or a bounded repeat such as .{{0,{MAX_REGEX_REPEAT}}}")
+            problem = _regex_problem(body)
+        elif op in (sre_parse.GROUPREF, getattr(sre_parse, 'GROUPREF_EXISTS', None)):
+            return 'uses a backreference'
+        elif op is sre_parse.SUBPATTERN:
+            problem = _regex_problem(list(av[-1]))
+        elif op is sre_parse.BRANCH:
+            problem = next(filter(None, (_regex_problem(list(branch)) for branch in av[1])), None)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            problem = _regex_problem(list(av[1]))
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            problem = _regex_problem(list(av))
+        else:
+            problem = None
+        if problem:
+            return problem
+    return None
+
+
+def _has_ambiguous_repeats(items):
+    """
+    Whether a sequence has variable repeats that can split the same text between
+    them (`.{0,200}.{0,200}`, `\\w*x?\\w*`): the engine tries every split, so the
+    cost is the product of their spans. A repeat stays open while the items after
+    it are characters it could also have matched.
+    """
+    open_repeats = []  # (characters the repeat matches, product of spans so far)
+    for op, av in _flatten(items):
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+            low, high, body = av
+            chars = _sequence_chars(list(body))
+            if chars is None:
+                open_repeats = []
+                continue
+            overlapping = [cost for repeat_chars, cost in open_repeats if repeat_chars & chars]
+            open_repeats = [(repeat_chars, cost) for repeat_chars, cost in open_repeats if repeat_chars & chars]
+            span = float('inf') if high == sre_parse.MAXREPEAT else high - low
+            if span:
+                cost = max(overlapping, default=1) * span
+                if overlapping and cost > MAX_REGEX_REPEAT:
+                    return True
+                open_repeats.append((chars, cost))
+        elif op is sre_parse.AT:
+            continue
+        else:
+            chars = _item_chars(op, av)
+            # Anything else (alternatives, lookarounds) keeps the open repeats: stricter, never looser
+            if chars is not None:
+                open_repeats = [(repeat_chars, cost) for repeat_chars, cost in open_repeats if repeat_chars & chars]
+    return False
+
+
+def _flatten(items):
+    """Items of a sequence with plain groups expanded in place"""
+    for op, av in items:
+        if op is sre_parse.SUBPATTERN:
+            yield from _flatten(list(av[-1]))
+        else:
+            yield op, av
+
+
+def _item_chars(op, av):
+    """Probe characters a single-character item matches, or None if it is not one"""
+    if op not in (sre_parse.ANY, sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.IN):
+        return None
+    return frozenset(char for char in OVERLAP_PROBES if _matches_char(op, av, char))
+
+
+def _sequence_chars(items):
+    """Every probe character a repeat body can match, or None for bodies with alternatives"""
+    chars = frozenset()
+    for op, av in _flatten(items):
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+            inner = _sequence_chars(list(av[2]))
+        elif op is sre_parse.AT:
+            continue
+        else:
+            inner = _item_chars(op, av)
+        if inner is None:
+            return None
+        chars |= inner
+    return chars
+
+
+def _has_repeat_or_branch(items):
+    for op, av in items:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, sre_parse.BRANCH) or op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+            return True
+        if op is sre_parse.SUBPATTERN and _has_repeat_or_branch(list(av[-1])):
+            return True
+        if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT) and _has_repeat_or_branch(list(av[1])):
+            return True
+        if op is getattr(sre_parse, 'ATOMIC_GROUP', None) and _has_repeat_or_branch(list(av)):
+            return True
+    return False
+
+
+def _crosses_words(op, av):
+    """Whether a single-character item matches both a space and a word character"""
+    return _matches_char(op, av, SPACE_PROBE) and any(_matches_char(op, av, probe) for probe in WORD_PROBES)
+
+
+# Character categories as they appear inside parsed classes
+_CATEGORIES = {
+    'CATEGORY_DIGIT': str.isdigit,
+    'CATEGORY_NOT_DIGIT': lambda char: not char.isdigit(),
+    'CATEGORY_SPACE': str.isspace,
+    'CATEGORY_NOT_SPACE': lambda char: not char.isspace(),
+    'CATEGORY_WORD': lambda char: char.isalnum() or char == '_',
+    'CATEGORY_NOT_WORD': lambda char: not (char.isalnum() or char == '_')
+}
+
+
+def _matches_char(op, av, char):
+    code = ord(char)
+    if op is sre_parse.ANY:
+        return char != '\n'
+    if op is sre_parse.LITERAL:
+        return av == code
+    if op is sre_parse.NOT_LITERAL:
+        return av != code
+    if op is sre_parse.IN:
+        negate = bool(av) and av[0][0] is sre_parse.NEGATE
+        matched = False
+        for member_op, member_av in av[1:] if negate else av:
+            if member_op is sre_parse.LITERAL:
+                matched = member_av == code
+            elif member_op is sre_parse.RANGE:
+                matched = member_av[0] <= code <= member_av[1]
+            elif member_op is sre_parse.CATEGORY:
+                test = _CATEGORIES.get(getattr(member_av, 'name', None))
+                matched = bool(test and test(char))
+            if matched:
+                break
+        return matched != negate
+    return False
+
+
+def _as_list(value, operator, rule_id):
+    if not isinstance(value, (list, tuple, set)):
+        raise RuleSyntaxError(f'{rule_id}: {operator} expects a list')
+    return list(value)
@@ -0,0 +1,108 @@
+"""
+Per-speaker text from a Transcribe result, and which speaker is the agent.
+
+The processor asks Transcribe for channel identification (stereo recordings,
+one party per channel) or speaker labels (mono). The result then carries
+either:
+- `channel_labels.channels[].items`, with every item of each channel
+- `speaker_labels.segments[].items`, with the start time and speaker of every
+  word; newer output also puts `speaker_label` on each item in `items`
+
+    view = agent_view(transcript_data['results'], ref_data)
+    if view:
+        text, items = view['text'], view['items']    # agent speech, original timings
+
+Items keep their start times, so time windows on agent speech still refer to
+the call timeline. The agent is the speaker whose words best match the
+reference agent name and how agents open a call; on a tie, the one who spoke
+most. AGENT_LABEL pins it instead when the recording setup is fixed (for
+example the agent always on ch_0).
+"""
+
+# Phrases agents use and customers (or voicemail greetings) rarely do
+AGENT_CUES = ('my name is', 'calling from', 'calling on behalf', 'anycompany', 'debt collector', 'attempt to collect', 'please call')
+
+# Weight of the reference agent name over a single cue
+AGENT_NAME_WEIGHT = 5
+
+
+def split_speakers(results):
+    """{label: items in time order}, or None when the result has no channel or speaker labels"""
+    channels = (results.get('channel_labels') or {}).get('channels')
+    if channels:
+        return {channel['channel_label']: channel.get('items') or [] for channel in channels}
+
+    items = results.get('items') or []
+    if any('speaker_label' in item for item in items):
+        return _group(items, lambda item: item.get('speaker_label'))
+
+    segments = (results.get('speaker_labels') or {}).get('segments')
+    if segments:
+        speaker_at = {}
+        for segment in segments:
+            for word in segment.get('items') or ():
+                speaker_at[word.get('start_time')] = word.get('speaker_label') or segment.get('speaker_label')
+        return _group(items, lambda item: speaker_at.get(item.get('start_time')))
+    return None
+
+
+def _group(items, label_of):
+    """Items by speaker; punctuation (no timing or label) stays with the word before it"""
+    grouped = {}
+    current = None
+    for item in items:
+        label = label_of(item) if item.get('type') != 'punctuation' else None
+        if label is not None:
+            current = label
+        if current is not None:
+            grouped.setdefault(current, []).append(item)
+    return grouped
+
+
+def items_text(items):
+    """Transcript text of a run of items: words separated by spaces, punctuation attached"""
+    parts = []
+    for item in items:
+        content = item['alternatives'][0]['content']
+        if item.get('type') == 'punctuation' and parts:
+            parts[-1] += content
+        else:
+            parts.append(content)
+    return ' '.join(parts)
+
+
+def pick_agent(texts, agent_name=None):
+    """Label of the agent among {label: text}"""
+    name = (agent_name or '').lower()
+
+    def score(label):
+        text = texts[label].lower()
+        cues = sum(text.count(cue) for cue in AGENT_CUES)
+        if name and name in text:
+            cues += AGENT_NAME_WEIGHT
+        return cues, len(text)
+
+    return max(sorted(texts), key=score)
+
+
+def agent_view(results, ref_data=None, agent_label=None):
+    """
+    {'label', 'text', 'items', 'words', 'total_words'} for the agent's speech, or
+    None when the result has no speaker separation (analyse the whole transcript)
+    """
+    speakers = split_speakers(results)
+    if not speakers:
+        return None
+    texts = {label: items_text(items) for label, items in speakers.items()}
+    label = agent_label if agent_label in speakers else pick_agent(texts, (ref_data or {}).get('agent_name'))
+
+    def words(items):
+        return sum(1 for item in items if item.get('type') != 'punctuation')
+
+    return {
+        'label': label,
+        'text': texts[label],
+        'items': speakers[label],
+        'words': words(speakers[label]),
+        'total_words': sum(words(items) for items in speakers.values())
+    }
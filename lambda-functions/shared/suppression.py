@@ -0,0 +1,315 @@
+"""
+Membership index for the suppression lists behind the LO1005 rules: Do Not
+Call, cease-and-desist, attorney representation and bankruptcy.
+
+Lists are uploaded under suppression/<list>/ as CSV (phone_number and/or
+account_id columns) or text (one phone number or account ID per line). The
+reference loader then rebuilds that list's index under suppression-index/:
+
+- <list>.bloom: a Bloom filter over every identifier of the list
+- <list>/<generation>/<shard>.txt: the identifiers themselves, split into
+  SHARDS files by hash
+
+A warm container loads each filter once (re-checking its ETag every
+REFRESH_SECONDS). Most calls are on no list, and the filter answers those in
+memory in microseconds. A filter hit is confirmed against the exact shard, so a
+false positive never sets a flag. Only a missing filter means "no list": when
+S3 fails, a container keeps its last filter and retries after RETRY_SECONDS,
+and one that never loaded the filter (or cannot read a shard) flags the call:
+
+    index = suppression_index(s3, bucket)
+    flags = suppressed_flags(index, ref_data)    # e.g. ['do_not_call']
+"""
+import hashlib
+import math
+import os
+import re
+import struct
+import time
+import uuid
+
+SUPPRESSION_PREFIX = 'suppression/'
+INDEX_PREFIX = 'suppression-index/'
+
+# List name -> the reference flag it sets
+SUPPRESSION_LISTS = {
+    'do_not_call': 'do_not_call',
+    'cease_desist': 'cease_desist',
+    'attorney_retained': 'attorney_retained',
+    'bankruptcy_filed': 'bankruptcy_filed'
+}
+
+# Reference record fields holding a call's identifiers
+PHONE_FIELDS = ('phone_number', 'phone')
+ACCOUNT_FIELDS = ('account_id', 'account_number')
+
+FALSE_POSITIVE_RATE = float(os.environ.get('SUPPRESSION_FALSE_POSITIVE_RATE', '0.001'))
+SHARDS = 256
+REFRESH_SECONDS = int(os.environ.get('SUPPRESSION_REFRESH_SECONDS', '300'))
+
+# Wait before retrying a filter read that failed for a reason other than a missing key
+RETRY_SECONDS = 15
+
+# S3 error codes for a key that does not exist (GetObject, HeadObject)
+MISSING_KEY_CODES = ('NoSuchKey', 'NotFound', '404')
+
+# Exact shards kept per list after a filter hit
+MAX_CACHED_SHARDS = 32
+
+NON_DIGITS = re.compile(r'\D+')
+
+FILTER_MAGIC = b'BLM1'
+FILTER_HEADER = struct.Struct('<4sQIQ16s')
+
+
+def normalize_phone(value):
+    digits = NON_DIGITS.sub('', str(value))
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]  # US country code
+    return f'phone:{digits}' if digits else None
+
+
+def normalize_account(value):
+    account = str(value).strip().upper()
+    return f'account:{account}' if account else None
+
+
+def identifier_keys(record):
+    """Normalized identifiers of a reference record (or an uploaded row)"""
+    keys = []
+    for fields, normalize in ((PHONE_FIELDS, normalize_phone), (ACCOUNT_FIELDS, normalize_account)):
+        for field in fields:
+            if record.get(field):
+                key = normalize(record[field])
+                if key:
+                    keys.append(key)
+    return keys
+
+
+def _hashes(key):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    return struct.unpack('<QQ', digest)
+
+
+def shard_of(key):
+    return _hashes(key)[0] % SHARDS
+
+
+class BloomFilter:
+    """Bit array with `hashes` positions per key, from double hashing of one blake2b digest"""
+
+    def __init__(self, size_bits, hashes, count=0, bits=None, generation=''):
+        self.size_bits = max(size_bits, 8)
+        self.hashes = hashes
+        self.count = count
+        self.bits = bits if bits is not None else bytearray((self.size_bits + 7) // 8)
+        self.generation = generation
+
+    @classmethod
+    def for_capacity(cls, count, false_positive_rate=FALSE_POSITIVE_RATE, generation=''):
+        count = max(count, 1)
+        size_bits = math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2)
+        hashes = max(1, round(size_bits / count * math.log(2)))
+        return cls(size_bits, hashes, generation=generation)
+
+    def _positions(self, key):
+        first, second = _hashes(key)
+        second |= 1
+        size = self.size_bits
+        return [(first + i * second) % size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, key):
+        if not self.count:
+            return False
+        # Positions one at a time: most absent keys stop at the first clear bit
+        first, second = _hashes(key)
+        second |= 1
+        bits, size = self.bits, self.size_bits
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def to_bytes(self):
+        header = FILTER_HEADER.pack(FILTER_MAGIC, self.size_bits, self.hashes, self.count, self.generation.encode('ascii')[:16])
+        return header + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, size_bits, hashes, count, generation = FILTER_HEADER.unpack_from(data)
+        if magic != FILTER_MAGIC:
+            raise ValueError('not a suppression filter')
+        return cls(size_bits, hashes, count, bytearray(data[FILTER_HEADER.size:]), generation.rstrip(b'\0').decode('ascii'))
+
+
+def is_missing_key(error):
+    """True when an S3 read failed because the object does not exist"""
+    response = getattr(error, 'response', None) or {}
+    return str(response.get('Error', {}).get('Code')) in MISSING_KEY_CODES
+
+
+def list_name_of(key):
+    """The list an upload key belongs to, or None"""
+    if not key.startswith(SUPPRESSION_PREFIX):
+        return None
+    name = key[len(SUPPRESSION_PREFIX):].split('/', 1)[0]
+    return name if name in SUPPRESSION_LISTS else None
+
+
+def filter_key(list_name):
+    return f'{INDEX_PREFIX}{list_name}.bloom'
+
+
+def shard_key(list_name, generation, shard):
+    return f'{INDEX_PREFIX}{list_name}/{generation}/{shard:03d}.txt'
+
+
+def build_index(s3, bucket, list_name, identifiers, false_positive_rate=FALSE_POSITIVE_RATE):
+    """
+    Write a new generation of a list's index from its identifiers: exact
+    shards first, then the filter that points at them, so readers never see a
+    filter without its shards. Returns the filter.
+    """
+    generation = uuid.uuid4().hex[:16]
+    bloom = BloomFilter.for_capacity(len(identifiers), false_positive_rate, generation)
+    shards = [[] for _ in range(SHARDS)]
+    for key in identifiers:
+        bloom.add(key)
+        shards[shard_of(key)].append(key)
+    for shard, keys in enumerate(shards):
+        if keys:
+            s3.put_object(Bucket=bucket, Key=shard_key(list_name, generation, shard),
+                          Body='\n'.join(sorted(keys)).encode('utf-8'), ContentType='text/plain')
+    s3.put_object(Bucket=bucket, Key=filter_key(list_name), Body=bloom.to_bytes(), ContentType='application/octet-stream')
+    return bloom
+
+
+def current_generation(s3, bucket, list_name):
+    """Generation of a list's published filter, read from its header; None before the first build"""
+    try:
+        header = s3.get_object(Bucket=bucket, Key=filter_key(list_name), Range=f'bytes=0-{FILTER_HEADER.size - 1}')['Body'].read()
+        return BloomFilter.from_bytes(header).generation
+    except Exception:
+        return None
+
+
+def prune_generations(s3, bucket, list_name, keep):
+    """
+    Delete exact shards of generations not in `keep`. Keep the one just replaced
+    too: containers still holding its filter read its shards until they refresh.
+    """
+    deleted = 0
+    prefix = f'{INDEX_PREFIX}{list_name}/'
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for entry in page.get('Contents', []):
+            if entry['Key'][len(prefix):].split('/', 1)[0] not in keep:
+                s3.delete_object(Bucket=bucket, Key=entry['Key'])
+                deleted += 1
+    return deleted
+
+
+# Filter state of a list whose filter could not be read and was never loaded
+UNAVAILABLE = object()
+
+
+class SuppressionIndex:
+    """Filters for every list, loaded on first use and refreshed every REFRESH_SECONDS"""
+
+    def __init__(self, s3, bucket):
+        self._s3 = s3
+        self._bucket = bucket
+        # list name -> (filter, None or UNAVAILABLE; ETag; checked at)
+        self._filters = {}
+        self._shards = {}
+        self.filter_hits = 0
+        self.false_positives = 0
+        self.read_errors = 0
+
+    def _filter(self, list_name):
+        bloom, etag, checked_at = self._filters.get(list_name, (None, None, None))
+        now = time.monotonic()
+        if checked_at is not None and now - checked_at < REFRESH_SECONDS:
+            return bloom
+        key = filter_key(list_name)
+        try:
+            if etag is not None and self._s3.head_object(Bucket=self._bucket, Key=key)['ETag'] == etag:
+                self._filters[list_name] = (bloom, etag, now)
+                return bloom
+            response = self._s3.get_object(Bucket=self._bucket, Key=key)
+            bloom, etag = BloomFilter.from_bytes(response['Body'].read()), response.get('ETag')
+        except Exception as e:
+            if is_missing_key(e):
+                # No index built for this list (or it was removed)
+                bloom, etag = None, None
+            else:
+                # Throttled or failing: keep the filter we have, or flag calls until one loads
+                self.read_errors += 1
+                if checked_at is None:
+                    bloom = UNAVAILABLE
+                self._filters[list_name] = (bloom, etag, now - REFRESH_SECONDS + RETRY_SECONDS)
+                return bloom
+        self._filters[list_name] = (bloom, etag, now)
+        return bloom
+
+    def _exact(self, list_name, bloom, key):
+        shard = shard_of(key)
+        cache_key = (list_name, bloom.generation, shard)
+        members = self._shards.get(cache_key)
+        if members is None:
+            try:
+                body = self._s3.get_object(Bucket=self._bucket, Key=shard_key(list_name, bloom.generation, shard))['Body'].read()
+            except Exception:
+                # Unconfirmed: a suppression list errs towards flagging the call
+                return True
+            members = set(body.decode('utf-8').split('\n'))
+            if len(self._shards) >= MAX_CACHED_SHARDS * len(SUPPRESSION_LISTS):
+                self._shards.clear()
+            self._shards[cache_key] = members
+        return key in members
+
+    def contains(self, list_name, keys):
+        """Whether any of the normalized identifiers is on the list"""
+        bloom = self._filter(list_name)
+        if bloom is None or not keys:
+            return False
+        if bloom is UNAVAILABLE:
+            # Unconfirmed, as for an unreadable shard: err towards flagging
+            return True
+        for key in keys:
+            if bloom.might_contain(key):
+                self.filter_hits += 1
+                if self._exact(list_name, bloom, key):
+                    return True
+                self.false_positives += 1
+        return False
+
+
+_indexes = {}
+
+
+def suppression_index(s3, bucket):
+    """The container's index for a bucket"""
+    index = _indexes.get(bucket)
+    if index is None:
+        index = _indexes[bucket] = SuppressionIndex(s3, bucket)
+    return index
+
+
+def suppressed_flags(index, ref_data):
+    """Reference flags a call's identifiers put it under that its record does not already set"""
+    keys = identifier_keys(ref_data)
+    if not keys:
+        return []
+    flags = []
+    for list_name, flag in SUPPRESSION_LISTS.items():
+        if ref_data.get(flag) or (ref_data.get('flags') or {}).get(flag):
+            continue
+        if index.contains(list_name, keys):
+            flags.append(flag)
+    return flags
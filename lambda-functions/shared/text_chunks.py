@@ -0,0 +1,118 @@
+"""
+Split a transcript into Comprehend-sized chunks in one pass.
+
+    for start, end, new_start in iter_chunks(transcript, max_bytes=5000, overlap_bytes=300):
+        chunk = transcript[start:end]
+
+Comprehend's synchronous limit is in UTF-8 bytes, so sizes are counted in bytes,
+not characters. Chunks break after a sentence where possible and are packed with
+as many sentences as fit, so a long transcript needs as few requests as
+possible. A sentence too long for one chunk is broken between words, and a
+single oversized word between characters.
+
+Chunks are (start, end) character spans into the original text, so entity
+offsets from a chunk map back to the transcript by adding `start`. With
+`overlap_bytes`, a chunk repeats up to that many bytes of trailing sentences
+from the previous one, so an entity cut by a boundary is still seen whole;
+`new_start` is where text not already in the previous chunk begins.
+"""
+import re
+
+# Comprehend DetectEntities / DetectKeyPhrases / DetectPiiEntities request limit
+COMPREHEND_MAX_BYTES = 5000
+
+# Sentence punctuation, optional closing quote or bracket, then whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def utf8_length(text):
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def iter_chunks(text, max_bytes=COMPREHEND_MAX_BYTES, overlap_bytes=0):
+    """(start, end, new_start) character spans, each at most max_bytes of UTF-8, whitespace trimmed"""
+    if overlap_bytes * 2 > max_bytes:
+        raise ValueError(f'overlap_bytes ({overlap_bytes}) must be at most half of max_bytes ({max_bytes})')
+
+    covered = 0
+    current = []
+    size = 0
+    for segment in _segments(text, max_bytes):
+        if current and size + segment[2] > max_bytes:
+            span = _trim(text, current[0][0], current[-1][1])
+            if span:
+                yield span[0], span[1], max(span[0], covered)
+                covered = span[1]
+            current = _overlap(current, min(overlap_bytes, max_bytes - segment[2]))
+            size = sum(piece[2] for piece in current)
+        current.append(segment)
+        size += segment[2]
+
+    if current:
+        span = _trim(text, current[0][0], current[-1][1])
+        if span:
+            yield span[0], span[1], max(span[0], covered)
+
+
+def _segments(text, max_bytes):
+    """(start, end, bytes) sentences, or smaller pieces of sentences over max_bytes"""
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        yield from _fit(text, start, match.end(), max_bytes)
+        start = match.end()
+    if start < len(text):
+        yield from _fit(text, start, len(text), max_bytes)
+
+
+def _fit(text, start, end, max_bytes):
+    size = utf8_length(text[start:end])
+    if size <= max_bytes:
+        yield start, end, size
+        return
+
+    # Too long for a chunk: break between words
+    word_start = start
+    for match in WHITESPACE.finditer(text, start, end):
+        yield from _split_word(text, word_start, match.end(), max_bytes)
+        word_start = match.end()
+    if word_start < end:
+        yield from _split_word(text, word_start, end, max_bytes)
+
+
+def _split_word(text, start, end, max_bytes):
+    size = utf8_length(text[start:end])
+    if size <= max_bytes:
+        yield start, end, size
+        return
+
+    # One word over the limit: cut between characters, never inside a multi-byte one
+    piece_start, piece_size = start, 0
+    for position in range(start, end):
+        char_size = utf8_length(text[position])
+        if piece_size + char_size > max_bytes:
+            yield piece_start, position, piece_size
+            piece_start, piece_size = position, 0
+        piece_size += char_size
+    yield piece_start, end, piece_size
+
+
+def _overlap(segments, overlap_bytes):
+    """Trailing segments of the emitted chunk that fit in overlap_bytes"""
+    carried = []
+    size = 0
+    for segment in reversed(segments):
+        if size + segment[2] > overlap_bytes:
+            break
+        carried.append(segment)
+        size += segment[2]
+    carried.reverse()
+    return carried
+
+
+def _trim(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if start < end else None
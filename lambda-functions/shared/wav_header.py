@@ -0,0 +1,114 @@
+import struct
+
+# Ranged GET size for pre-flight; enough for RIFF + fmt + typical LIST chunks
+HEADER_BYTES = 4096
+# Fallback when the data chunk starts beyond the first read (large metadata chunks)
+EXTENDED_HEADER_BYTES = 65536
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Transcribe accepts 8 kHz - 48 kHz audio
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+MIN_DURATION_SECONDS = 1.0
+
+
+class WavHeaderError(Exception):
+    """Raised when the bytes are not a parseable RIFF/WAVE header"""
+
+
+class IncompleteHeaderError(WavHeaderError):
+    """Raised when the data chunk starts beyond the bytes read so far"""
+
+
+def parse_wav_header(header, object_size):
+    """
+    Parse a RIFF/WAVE header from the first bytes of an object.
+    Returns format details plus duration, using the bytes actually present in
+    the object when the declared data chunk is longer (truncated upload).
+    """
+    if len(header) < 12 or header[0:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise WavHeaderError('Not a RIFF/WAVE file')
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id = header[offset:offset + 4]
+        chunk_size = struct.unpack('<I', header[offset + 4:offset + 8])[0]
+        body_offset = offset + 8
+
+        if chunk_id == b'fmt ':
+            if body_offset + 16 > len(header):
+                raise IncompleteHeaderError('fmt chunk extends past header bytes')
+            format_tag, channels, sample_rate, byte_rate, block_align, bits_per_sample = struct.unpack(
+                '<HHIIHH', header[body_offset:body_offset + 16]
+            )
+            fmt = {
+                'format_tag': format_tag,
+                'channels': channels,
+                'sample_rate': sample_rate,
+                'byte_rate': byte_rate,
+                'block_align': block_align,
+                'bits_per_sample': bits_per_sample
+            }
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise WavHeaderError('data chunk before fmt chunk')
+            available = max(object_size - body_offset, 0)
+            data_bytes = min(chunk_size, available)
+            duration = data_bytes / fmt['byte_rate'] if fmt['byte_rate'] else 0.0
+            return dict(fmt, **{
+                'data_offset': body_offset,
+                'declared_data_bytes': chunk_size,
+                'data_bytes': data_bytes,
+                'truncated': chunk_size > available,
+                'duration_seconds': round(duration, 2)
+            })
+
+        # Chunks are word aligned
+        offset = body_offset + chunk_size + (chunk_size & 1)
+
+    if offset >= object_size:
+        raise WavHeaderError('no data chunk in file')
+    raise IncompleteHeaderError('data chunk not found in header bytes')
+
+
+def assess_wav(info):
+    """
+    Pre-flight verdict for a parsed header: (accepted, reason, routing hints).
+    Stereo recordings are accepted but routed to channel identification.
+    """
+    if info['format_tag'] not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE):
+        return False, f"unsupported WAV encoding 0x{info['format_tag']:04x}", {}
+    if not MIN_SAMPLE_RATE <= info['sample_rate'] <= MAX_SAMPLE_RATE:
+        return False, f"sample rate {info['sample_rate']} Hz outside {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz", {}
+    if info['channels'] not in (1, 2):
+        return False, f"{info['channels']} channels not supported", {}
+    if info['data_bytes'] == 0:
+        return False, 'no audio data', {}
+    if info['truncated']:
+        # Incomplete upload - a complete re-upload gets a new ETag and is picked up then
+        return False, f"truncated ({info['data_bytes']} of {info['declared_data_bytes']} data bytes)", {}
+    if info['duration_seconds'] < MIN_DURATION_SECONDS:
+        return False, f"too short ({info['duration_seconds']}s)", {}
+
+    hints = {}
+    if info['channels'] == 2:
+        hints['channel_identification'] = True
+    return True, None, hints
+
+
+def read_wav_header(s3, bucket, key, object_size):
+    """Fetch just the header with ranged GETs and parse it"""
+    if object_size == 0:
+        raise WavHeaderError('zero-length object')
+
+    for read_size in (HEADER_BYTES, EXTENDED_HEADER_BYTES):
+        response = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{min(read_size, object_size) - 1}')
+        header = response['Body'].read()
+        try:
+            return parse_wav_header(header, object_size)
+        except IncompleteHeaderError:
+            if read_size >= object_size or read_size == EXTENDED_HEADER_BYTES:
+                raise
@@ -0,0 +1,46 @@
+"""Batch progress: files rejected by pre-flight count as finished, on the first run and on resume"""
+import pytest
+
+from benchmarks.fake_aws import FakeAWS, FaultProfile
+from benchmarks.pipeline_benchmark import HANDLERS, TABLE_KEYS, handler_environment, load_handler, synthetic_wav
+from shared.batch_progress import increment_batch_counter, summarize_batch
+
+BUCKET = 'batch-input'
+BATCHES_TABLE = 'anycompany-batches-prod'
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    for name, value in handler_environment(bulk_concurrency=10).items():
+        monkeypatch.setenv(name, value)
+    aws = FakeAWS(FaultProfile(), TABLE_KEYS)
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def batch_prep(aws):
+    return load_handler('batch_prep_under_test', HANDLERS['batch_prep'])
+
+
+def test_resumed_batch_with_rejected_files_completes(aws, batch_prep):
+    aws.s3.add_object(BUCKET, 'daily/call_1.wav', synthetic_wav(1, 2.0))
+    aws.s3.add_object(BUCKET, 'daily/call_2.wav', synthetic_wav(2, 2.0))
+    aws.s3.add_object(BUCKET, 'daily/broken.wav', b'not a wav file at all')
+    batches_table = aws.dynamodb.Table(BATCHES_TABLE)
+
+    first = batch_prep.lambda_handler({'batch_folder': f's3://{BUCKET}/daily/'}, None)
+    batch_id = first['batch_info']['batch_id']
+    summary = summarize_batch(batches_table.get_item(Key={'batch_id': batch_id})['Item'])
+    assert (first['batch_info']['rejected_files'], summary['total_calls'], summary['remaining']) == (1, 3, 2)
+
+    for call in first['calls']:
+        increment_batch_counter(batches_table, batch_id, 'completed')
+        aws.dynamodb.Table('anycompany-batch-checkpoints-prod').put_item(
+            Item={'batch_id': batch_id, 'item_key': call['checkpoint_key'], 'status': 'completed'})
+
+    resumed = batch_prep.lambda_handler({'batch_folder': f's3://{BUCKET}/daily/', 'batch_id': batch_id}, None)
+    summary = summarize_batch(batches_table.get_item(Key={'batch_id': batch_id})['Item'])
+    assert resumed['calls'] == [] and resumed['batch_info']['skipped_from_checkpoint'] == 3
+    assert (summary['total_calls'], summary['counters']['rejected'], summary['remaining']) == (3, 1, 0)
+    assert summary['status'] == 'completed'
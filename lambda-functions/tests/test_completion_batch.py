@@ -0,0 +1,61 @@
+"""Completion batch flush: only the completion fields are written"""
+import importlib.util
+import os
+
+import pytest
+
+from benchmarks.fake_aws import FakeAWS, FaultProfile
+
+CALLS_TABLE = 'anycompany-calls-prod'
+HANDLER_PATH = os.path.join(os.path.dirname(__file__), '..', 'transcription-handler', 'index.py')
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('CALLS_TABLE', CALLS_TABLE)
+    aws = FakeAWS(FaultProfile(), {CALLS_TABLE: ('call_id',)})
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def handler(aws, monkeypatch):
+    spec = importlib.util.spec_from_file_location('completion_handler_under_test', HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    finished = {}
+    monkeypatch.setattr(module, 'finish_completed_call',
+                        lambda calls_table, batches_table, checkpoints_table, call_record, completed: finished.update({completed['call_id']: completed}))
+    module.finished = finished
+    return module
+
+
+def test_flush_keeps_attributes_written_after_the_record_was_read(aws, handler):
+    calls_table = aws.dynamodb.Table(CALLS_TABLE)
+    calls_table.put_item(Item={'call_id': 'c1', 'filename': 'a.wav', 'status': 'processing', 'batch_id': 'b1'})
+    call_record = calls_table.get_item(Key={'call_id': 'c1'})['Item']
+    # Written by the processor and the batch trigger while the batch was being scored
+    calls_table.update_item(Key={'call_id': 'c1'}, UpdateExpression='SET duplicate_call_ids = :ids, checkpoint_key = :checkpoint',
+                            ExpressionAttributeValues={':ids': ['c2'], ':checkpoint': 'k1'})
+
+    results = {'transcript': 'hello', 'violations': [], 'status': 'completed'}
+    batch = {'writes': {'c1': ('transcripts/job-c1.json', results, call_record)}}
+    unwritten = handler.flush_completion_batch(calls_table, None, None, CALLS_TABLE, batch)
+
+    assert unwritten == []
+    stored = calls_table.get_item(Key={'call_id': 'c1'})['Item']
+    assert stored['duplicate_call_ids'] == ['c2'] and stored['checkpoint_key'] == 'k1'
+    assert stored['status'] == 'completed' and stored['transcript'] == 'hello' and stored['batch_id'] == 'b1'
+    assert handler.finished['c1']['duplicate_call_ids'] == ['c2']
+
+
+def test_flush_returns_keys_of_calls_it_could_not_write(aws, handler, monkeypatch):
+    calls_table = aws.dynamodb.Table(CALLS_TABLE)
+
+    def failing_store(table, call_id, results):
+        raise RuntimeError('throttled')
+    monkeypatch.setattr(handler, 'store_completion', failing_store)
+
+    batch = {'writes': {'c1': ('transcripts/job-c1.json', {'status': 'completed'}, {'call_id': 'c1'})}}
+    assert handler.flush_completion_batch(calls_table, None, None, CALLS_TABLE, batch) == ['transcripts/job-c1.json']
+    assert handler.finished == {}
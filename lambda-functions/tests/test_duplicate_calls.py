@@ -0,0 +1,72 @@
+"""Duplicate audio: a linked call reuses the transcript and entities but is scored on its own"""
+import importlib.util
+import os
+
+import pytest
+
+from benchmarks.fake_aws import FakeAWS, FaultProfile
+from shared.audio_fingerprint import link_duplicate_call, propagate_to_duplicates
+
+CALLS_TABLE = 'anycompany-calls-prod'
+HANDLER_PATH = os.path.join(os.path.dirname(__file__), '..', 'transcription-handler', 'index.py')
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('CALLS_TABLE', CALLS_TABLE)
+    aws = FakeAWS(FaultProfile(), {CALLS_TABLE: ('call_id',)})
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def handler(aws, monkeypatch):
+    spec = importlib.util.spec_from_file_location('duplicate_handler_under_test', HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    scored = []
+
+    def rule_engine(transcript, call_id, filename, ref_data=None, entities=None, items=None, rules=None, agent=None):
+        scored.append((call_id, ref_data))
+        return [{'code': 'LO1005.04', 'call_id': call_id}] if ref_data.get('do_not_call') else []
+    monkeypatch.setattr(module, 'process_with_rule_engine', rule_engine)
+    module.scored = scored
+    return module
+
+
+def test_duplicate_is_scored_against_its_own_reference_data(aws, handler):
+    calls_table = aws.dynamodb.Table(CALLS_TABLE)
+    calls_table.put_item(Item={'call_id': 'dup', 'filename': 'b.wav', 'status': 'processing',
+                               'reference_data': {'customer_name': 'Ann Lee', 'do_not_call': True}})
+    calls_table.put_item(Item={
+        'call_id': 'canon', 'filename': 'a.wav', 'status': 'processing',
+        'reference_data': {'customer_name': 'Bob Ray'}
+    })
+    link_duplicate_call(calls_table, calls_table.get_item(Key={'call_id': 'canon'})['Item'], 'dup')
+    calls_table.update_item(Key={'call_id': 'canon'}, UpdateExpression='SET #status = :completed, transcript = :transcript, '
+                            'entities = :entities, violations = :violations',
+                            ExpressionAttributeNames={'#status': 'status'},
+                            ExpressionAttributeValues={':completed': 'completed', ':transcript': 'hi ann lee',
+                                                       ':entities': {'persons': [{'text': 'Ann Lee'}]},
+                                                       ':violations': [{'code': 'LO1007.01', 'call_id': 'canon'}]})
+    canonical = calls_table.get_item(Key={'call_id': 'canon'})['Item']
+
+    propagate_to_duplicates(calls_table, None, None, canonical, lambda duplicate, source: handler.score_duplicate(duplicate, source, []))
+
+    stored = calls_table.get_item(Key={'call_id': 'dup'})['Item']
+    assert stored['status'] == 'completed' and stored['duplicate_of'] == 'canon'
+    assert stored['transcript'] == 'hi ann lee'
+    assert stored['violations'] == [{'code': 'LO1005.04', 'call_id': 'dup'}]
+    assert stored['entities']['validation_results']['customer_name_correct'] is True
+    assert handler.scored == [('dup', {'customer_name': 'Ann Lee', 'do_not_call': True})]
+
+
+def test_link_reports_a_canonical_call_that_already_completed(aws):
+    calls_table = aws.dynamodb.Table(CALLS_TABLE)
+    calls_table.put_item(Item={'call_id': 'canon', 'status': 'completed', 'transcription_job_name': 'anycompany-canon-1'})
+    calls_table.put_item(Item={'call_id': 'dup', 'status': 'processing'})
+
+    linked = link_duplicate_call(calls_table, {'call_id': 'canon'}, 'dup')
+
+    assert linked['status'] == 'completed' and linked['duplicate_call_ids'] == {'dup'}
+    assert calls_table.get_item(Key={'call_id': 'dup'})['Item']['processing_status'] == 'awaiting_duplicate'
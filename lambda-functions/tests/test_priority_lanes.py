@@ -0,0 +1,90 @@
+"""Bulk lane slots: failed Transcribe jobs give theirs back and the counter is reconciled"""
+import importlib.util
+import os
+
+import pytest
+
+from benchmarks.fake_aws import FakeAWS, FaultProfile
+from shared.priority_lanes import acquire_transcribe_slot
+
+CALLS_TABLE = 'anycompany-calls-prod'
+BATCHES_TABLE = 'anycompany-batches-prod'
+CHECKPOINTS_TABLE = 'anycompany-batch-checkpoints-prod'
+HANDLER_PATH = os.path.join(os.path.dirname(__file__), '..', 'transcription-handler', 'index.py')
+LANE_KEY = {'batch_id': 'lane#bulk'}
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('CALLS_TABLE', CALLS_TABLE)
+    aws = FakeAWS(FaultProfile(), {
+        CALLS_TABLE: ('call_id',),
+        BATCHES_TABLE: ('batch_id',),
+        CHECKPOINTS_TABLE: ('batch_id', 'file_key')
+    })
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def handler(aws):
+    spec = importlib.util.spec_from_file_location('lane_handler_under_test', HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_bulk_call(aws, call_id, lane='bulk'):
+    """What the processor leaves behind: a slot, a started job and a claimed call"""
+    batches_table = aws.dynamodb.Table(BATCHES_TABLE)
+    assert acquire_transcribe_slot(batches_table, lane, 10)
+    job_name = f'anycompany-{call_id}-1700000000000'
+    aws.transcribe.start_transcription_job(TranscriptionJobName=job_name, Media={'MediaFileUri': f's3://in/{call_id}.wav'},
+                                           OutputBucketName='out', OutputKey=f'transcripts/{job_name}.json')
+    aws.dynamodb.Table(CALLS_TABLE).put_item(Item={
+        'call_id': call_id, 'filename': f'{call_id}.wav', 'status': 'transcribing',
+        'priority_lane': lane, 'transcription_job_name': job_name
+    })
+    return job_name
+
+
+def in_flight(aws):
+    return aws.dynamodb.Table(BATCHES_TABLE).get_item(Key=LANE_KEY).get('Item', {}).get('in_flight')
+
+
+def test_failed_job_fails_its_call_and_releases_its_slot_once(aws, handler):
+    job_name = start_bulk_call(aws, 'c1')
+    event = aws.transcribe.fail_job(job_name)
+
+    handler.lambda_handler(event, None)
+    handler.lambda_handler(event, None)
+
+    stored = aws.dynamodb.Table(CALLS_TABLE).get_item(Key={'call_id': 'c1'})['Item']
+    assert stored['status'] == 'failed' and 'transcription_job_name' not in stored
+    assert stored['error'] == 'The media format is not supported'
+    assert in_flight(aws) == 0
+
+
+def test_failure_of_an_older_job_leaves_a_retried_call_alone(aws, handler):
+    old_job = start_bulk_call(aws, 'c1')
+    aws.dynamodb.Table(CALLS_TABLE).update_item(Key={'call_id': 'c1'}, UpdateExpression='SET transcription_job_name = :job',
+                                                ExpressionAttributeValues={':job': 'anycompany-c1-1700000000999'})
+
+    handler.lambda_handler(aws.transcribe.fail_job(old_job), None)
+
+    assert aws.dynamodb.Table(CALLS_TABLE).get_item(Key={'call_id': 'c1'})['Item']['status'] == 'transcribing'
+    assert in_flight(aws) == 1
+
+
+def test_schedule_resets_the_counter_to_running_bulk_jobs(aws, handler):
+    start_bulk_call(aws, 'c1')
+    start_bulk_call(aws, 'c2')
+    start_bulk_call(aws, 'c3', lane='interactive')
+    # Slots leaked by invocations that timed out before starting their job
+    aws.dynamodb.Table(BATCHES_TABLE).update_item(Key=LANE_KEY, UpdateExpression='ADD in_flight :leaked',
+                                                  ExpressionAttributeValues={':leaked': 5})
+    aws.transcribe.complete_jobs(limit=1)
+
+    handler.lambda_handler({'source': 'aws.events', 'detail-type': 'Scheduled Event'}, None)
+
+    assert in_flight(aws) == 1
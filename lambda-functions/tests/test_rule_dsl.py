@@ -0,0 +1,82 @@
+"""
+Rule regex validation. Run from lambda-functions:
+
+    python -m pytest tests
+"""
+import pytest
+
+from shared.rule_dsl import CallContext, RuleSyntaxError, check_regex, compile_rule, validate_rule
+
+
+@pytest.mark.parametrize('pattern', [
+    r'(\w{1,200}\s?){1,200}x',
+    r'(.{0,200}){0,200}x',
+    r'(a{0,50}b?){0,50}c',
+    r'(a+)+b',
+    r'(a|ab)*c',
+    r'(?:(?=a+)b){2,9}',
+    r'pay.*now',
+    r'(\w+) \1',
+    r'pay.{0,200}.{0,200}.{0,200}zzz',
+    r'pay.{0,200}x.{0,200}zzz',
+    r'\w*\w*\w*\w*x',
+    r'\w+x?\w+y',
+])
+def test_rejects_super_linear_patterns(pattern):
+    with pytest.raises(RuleSyntaxError):
+        check_regex(pattern, 'TEST')
+
+
+@pytest.mark.parametrize('pattern', [
+    r'pay.{0,200}now',
+    r'(?:mr|mrs)?\s?smith',
+    r'(?:\w+\s)?debt',
+    r'\d{3}-\d{4}',
+    r'attempt to collect a debt',
+    r'\d{1,3}\s?\d{1,3}',
+    r'\w+ (?:yes|no) \w+',
+])
+def test_accepts_linear_patterns(pattern):
+    check_regex(pattern, 'TEST')
+
+
+def test_stored_rule_keeps_legacy_condition_when_a_pattern_is_rejected():
+    rule = {'rule_id': 'LO1005.11', 'logic': {'patterns': ['call.*again', 'stop calling']}}
+    compiled = compile_rule(rule)
+    assert len(compiled.rejected_patterns) == 1
+    assert compiled.evaluate(CallContext('hello there', {'do_not_call': True}))
+    assert compiled.evaluate(CallContext('please stop calling me', {}))
+    with pytest.raises(RuleSyntaxError):
+        validate_rule(rule)
+
+
+@pytest.mark.parametrize('condition', [
+    {'near': ['debt', 'collect'], 'within': 'ten'},
+    {'near': ['debt', 'collect'], 'within': 2.5},
+    {'entity': 'persons', 'min_count': 'many'},
+    {'ref': 'customer_name', 'min_words': None},
+])
+def test_non_integer_settings_are_syntax_errors(condition):
+    with pytest.raises(RuleSyntaxError):
+        validate_rule({'rule_id': 'TEST', 'logic': {'violation': condition}})
+
+
+@pytest.mark.parametrize('transcript, violated', [
+    ('Hello, my name is Maria with AnyCompany Servicing.', False),
+    ('Check the shell company on file.', False),
+    ('What the hell is going on with this account?', True),
+    ('This is a damned mess.', True),
+])
+def test_profanity_matches_whole_words_on_voicemail(transcript, violated):
+    compiled = compile_rule({'rule_id': 'LO1005.14', 'logic': {}})
+    assert bool(compiled.evaluate(CallContext(transcript, {'voicemail_context': True}))) == violated
+    assert not compiled.evaluate(CallContext(transcript, {'voicemail_context': False}))
+
+
+def test_seconds_windows_follow_the_untrimmed_recording():
+    # Transcribe saw audio with its first 50 s trimmed off: "debt" is at 55 s in the original
+    items = [{'type': 'pronunciation', 'start_time': str(start), 'alternatives': [{'content': word}]}
+             for start, word in [(1.0, 'hello'), (5.0, 'debt'), (20.0, 'goodbye')]]
+    window = ('first', 60, 'seconds')
+    assert CallContext('hello debt goodbye', items=items).text(window) == 'hello debt goodbye'
+    assert CallContext('hello debt goodbye', items=items, offset_seconds=50).text(window) == 'hello debt'
@@ -0,0 +1,14 @@
+"""Every rule seeded by infrastructure.yaml must pass the checks the engine applies"""
+import pytest
+
+from benchmarks.pipeline_benchmark import load_seed_rules
+from shared.phrase_classifier import key_phrase_terms
+from shared.rule_dsl import validate_rule
+
+SEED_RULES = load_seed_rules()
+
+
+@pytest.mark.parametrize('rule', SEED_RULES, ids=[rule['rule_id'] for rule in SEED_RULES])
+def test_seed_rule_compiles(rule):
+    validate_rule(rule)
+    key_phrase_terms(rule)
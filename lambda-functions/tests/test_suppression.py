@@ -0,0 +1,54 @@
+"""Suppression index behaviour when S3 reads fail"""
+import pytest
+
+from benchmarks.fake_aws import FakeAWS, FakeClientError, FaultProfile
+from shared import suppression
+
+LISTED = {'phone_number': '617-555-0100'}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    s3 = FakeAWS(FaultProfile(), {}).s3
+    suppression.build_index(s3, 'bucket', 'do_not_call', {suppression.normalize_phone(LISTED['phone_number'])})
+    s3.failing = False
+    for name in ('get_object', 'head_object'):
+        read = getattr(s3, name)
+
+        def failing_read(*args, _read=read, **kwargs):
+            if s3.failing:
+                raise FakeClientError('SlowDown', 'GetObject', 'throttled')
+            return _read(*args, **kwargs)
+        monkeypatch.setattr(s3, name, failing_read)
+    return s3
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(suppression.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_failed_refresh_keeps_the_loaded_filter(s3, clock):
+    index = suppression.SuppressionIndex(s3, 'bucket')
+    assert suppression.suppressed_flags(index, LISTED) == ['do_not_call']
+    clock[0] += suppression.REFRESH_SECONDS + 1
+    s3.failing = True
+    assert suppression.suppressed_flags(index, LISTED) == ['do_not_call']
+    s3.failing = False
+    clock[0] += suppression.RETRY_SECONDS + 1
+    assert suppression.suppressed_flags(index, LISTED) == ['do_not_call']
+
+
+def test_unreadable_filter_flags_until_it_loads(s3, clock):
+    index = suppression.SuppressionIndex(s3, 'bucket')
+    s3.failing = True
+    assert 'do_not_call' in suppression.suppressed_flags(index, {'phone_number': '212-555-0199'})
+    s3.failing = False
+    clock[0] += suppression.RETRY_SECONDS + 1
+    assert suppression.suppressed_flags(index, {'phone_number': '212-555-0199'}) == []
+
+
+def test_missing_filter_means_no_list(s3):
+    assert not suppression.SuppressionIndex(s3, 'bucket').contains('cease_desist', ['phone:2125550199'])
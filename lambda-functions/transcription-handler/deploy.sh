@@ -5,6 +5,9 @@ echo "📝 Deploying Transcription Completion Handler..."
 # Create deployment package
 zip -r transcription-handler.zip index.py
 
+# Bundle shared helpers at the package root
+(cd .. && zip -r transcription-handler/transcription-handler.zip shared -x "*/__pycache__/*")
+
 # Update Lambda function
 aws lambda update-function-code \
   --function-name anycompany-transcription-complete-prod \
@@ -1,11 +1,37 @@
 import json
-import boto3
 import os
 import time
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 
+from shared.audio_fingerprint import copy_results_to_duplicate, fail_duplicates, propagate_to_duplicates
+from shared.aws_clients import get_client, get_resource, get_table, get_thread_table
+from shared.batch_progress import track_batch_event
+from shared.call_log import bind, debug, error, flush_call_log, info, record_rule, rule_reason, start_call_log, warning
+from shared.checkpoints import COMPLETED, FAILED, mark_checkpoint
+from shared.dynamodb_batch import batch_get_items
+from shared.entity_plan import PATTERN_FAMILIES, extraction_plan, full_plan
+from shared.idempotency import derive_call_id, is_conditional_check_failure
+from shared.metrics import add_bytes, add_count, flush_metrics, set_properties, stage, start_metrics, timed
+from shared.phrase_classifier import phrase_classifier
+from shared.priority_lanes import release_transcribe_slot, reset_transcribe_slots
+from shared.proximity import DEFAULT_WITHIN_WORDS, TokenizedText, find_near
+from shared.reference_data import (
+    MASTER_REFERENCE_KEY,
+    VOICEMAIL_REFERENCE_KEY,
+    get_reference,
+    get_references,
+    load_reference_index,
+    normalize_reference_data,
+    reference_table_name
+)
+from shared.rule_dsl import AGENT_SCOPE, CallContext, compile_rule, violation_record
+from shared.speakers import agent_view
+from shared.suppression import suppressed_flags, suppression_index
+from shared.text_chunks import COMPREHEND_MAX_BYTES, iter_chunks
+
 def convert_floats_to_decimals(obj):
     if isinstance(obj, float):
         return Decimal(str(obj))
@@ -15,73 +41,199 @@ def convert_floats_to_decimals(obj):
         return [convert_floats_to_decimals(v) for v in obj]
     return obj
 
+# Transcripts read at once when a batch of completion events arrives through SQS
+TRANSCRIPT_READ_WORKERS = int(os.environ.get('TRANSCRIPT_READ_WORKERS', '8'))
+
+# Completed calls of a batch written at once (one update_item each)
+COMPLETION_WRITE_WORKERS = int(os.environ.get('COMPLETION_WRITE_WORKERS', '8'))
+
+# Words allowed between the phrases of a pattern (replaces unbounded `.*` gaps)
+PROXIMITY_WORDS = DEFAULT_WITHIN_WORDS
+
+# Comprehend chunk size in UTF-8 bytes, and how much of the previous chunk each one repeats
+# so an entity cut by a chunk boundary is still detected (entities in the overlap are reported once)
+COMPREHEND_CHUNK_BYTES = int(os.environ.get('COMPREHEND_CHUNK_BYTES', str(COMPREHEND_MAX_BYTES)))
+COMPREHEND_OVERLAP_BYTES = int(os.environ.get('COMPREHEND_OVERLAP_BYTES', '0'))
+
+# Entity lists produced even when no active rule reads them: /entity-metrics reads persons and
+# financial, reference validation reads persons and agent_identification
+ALWAYS_EXTRACT_ENTITIES = [name.strip() for name in os.environ.get(
+    'ALWAYS_EXTRACT_ENTITIES', 'persons,financial,agent_identification').split(',') if name.strip()]
+
+# Analyse only the agent's speech when the Transcribe job separated speakers (SPEAKER_SEPARATION
+# in the processor); AGENT_LABEL pins the agent's channel/speaker label instead of detecting it
+AGENT_ONLY_ANALYSIS = os.environ.get('AGENT_ONLY_ANALYSIS', 'false').lower() == 'true'
+AGENT_LABEL = os.environ.get('AGENT_LABEL') or None
+
+# Check the call's phone number and account against the suppression list index (shared/suppression.py)
+SUPPRESSION_INDEX = os.environ.get('SUPPRESSION_INDEX', 'false').lower() == 'true'
+
+# A rule slower than this on one call is counted and logged (after the fact; rule_dsl's
+# compile-time regex checks are what bound the matching time)
+RULE_TIME_BUDGET_MS = float(os.environ.get('RULE_TIME_BUDGET_MS', '50'))
+
+# Rules already logged for stored patterns the compiler dropped (once per container)
+_rules_with_rejected_patterns = set()
+
 def lambda_handler(event, context):
-    s3 = boto3.client('s3')
-    dynamodb = boto3.resource('dynamodb')
-    calls_table = dynamodb.Table(os.environ['CALLS_TABLE'])
+    s3 = get_client('s3')
+    calls_table = get_table(os.environ['CALLS_TABLE'])
+    batches_table = get_table(os.environ.get('BATCHES_TABLE', 'anycompany-batches-prod'))
+    checkpoints_table = get_table(os.environ.get('CHECKPOINTS_TABLE', 'anycompany-batch-checkpoints-prod'))
+    
+    # EventBridge: failed Transcribe jobs, and the schedule that re-counts the bulk lane's slots
+    if event.get('source') == 'aws.transcribe':
+        process_job_state_change(calls_table, batches_table, checkpoints_table, event.get('detail', {}))
+        return {'statusCode': 200}
+    if event.get('source') == 'aws.events':
+        reconcile_lane_slots(get_client('transcribe'), batches_table, os.environ['CALLS_TABLE'])
+        return {'statusCode': 200}
+    
+    # SQS-buffered completion events: the whole batch shares setup and one write flush
+    if any('body' in record for record in event['Records']):
+        return process_completion_batch(s3, calls_table, batches_table, checkpoints_table, event['Records'])
     
     for record in event['Records']:
-        bucket = record['s3']['bucket']['name']
         key = record['s3']['object']['key']
+        job_name = completion_job_name(key)
+        if job_name:
+            process_completion(s3, calls_table, batches_table, checkpoints_table,
+                               record['s3']['bucket']['name'], key, job_name, record['s3']['object'].get('eTag'))
+    
+    return {'statusCode': 200}
+
+def completion_job_name(key):
+    """Transcribe job name for a transcript output key; None for other objects"""
+    if not key.startswith('transcripts/') or not key.endswith('.json'):
+        return None
+    
+    # Our own copies under transcripts/genesys-id/ fire the same notification
+    if key.startswith('transcripts/genesys-id/'):
+        return None
+    
+    # Extract job name from key
+    return key.replace('transcripts/', '').replace('.json', '')
+
+# Transcribe jobs started by the processor are named anycompany-{call_id}-{timestamp}
+JOB_NAME_PREFIX = 'anycompany-'
+
+def call_id_from_job_name(job_name):
+    """call_id from a job name of the form anycompany-{call_id}-{timestamp}, else None"""
+    job_parts = job_name.split('-')
+    if len(job_parts) >= 3:
+        return '-'.join(job_parts[1:-1])  # Handle UUIDs with dashes
+    return None
+
+def process_completion(s3, calls_table, batches_table, checkpoints_table, bucket, key, job_name, etag, batch=None):
+    """
+    Score one Transcribe output object and store the results on its call.
+    With a batch (SQS path), rules, reference data, the transcript and the call
+    record come from the batch, and the completed record is queued for its flush.
+    """
+    start_metrics('transcription-handler', job_name=job_name)
+    start_call_log('transcription-handler', job_name=job_name)
+    outcome = None
+    try:
+        debug('🔍 Processing transcription completion')
         
-        if not key.startswith('transcripts/') or not key.endswith('.json'):
-            continue
-        
-        # Extract job name from key
-        job_name = key.replace('transcripts/', '').replace('.json', '')
-        
+        # Process transcription file directly from S3 (job may already be deleted)
         try:
-            print(f'🔍 Processing transcription completion for job: {job_name}')
+            # Get transcript from S3
+            with stage('transcript_get'):
+                if batch:
+                    transcript_body = batch['transcripts'][key]
+                    if isinstance(transcript_body, Exception):
+                        raise transcript_body
+                else:
+                    transcript_obj = s3.get_object(Bucket=bucket, Key=key)
+                    transcript_body = transcript_obj['Body'].read()
+                    etag = etag or transcript_obj.get('ETag')
+            transcript_data = json.loads(transcript_body)
+            transcript_text = transcript_data['results']['transcripts'][0]['transcript']
+            transcript_items = transcript_data['results'].get('items')
+            add_bytes('transcript_json_bytes', len(transcript_body))
+            add_bytes('transcript_text_bytes', len(transcript_text.encode('utf-8')))
             
-            # Process transcription file directly from S3 (job may already be deleted)
-            try:
-                # Get transcript from S3
-                transcript_obj = s3.get_object(Bucket=bucket, Key=key)
-                transcript_data = json.loads(transcript_obj['Body'].read())
-                transcript_text = transcript_data['results']['transcripts'][0]['transcript']
-                
-                print(f'📝 Retrieved transcript: {transcript_text[:100]}...')
+            debug('📝 Retrieved transcript', transcript_chars=len(transcript_text))
+            
+            # Extract call_id from job name (format: anycompany-{call_id}-{timestamp})
+            call_id = call_id_from_job_name(job_name)
+            if not call_id:
+                # Unrecognised job name - derive a stable ID from the transcript object
+                call_id = derive_call_id(bucket, key, etag)
+            
+            set_properties(call_id=call_id)
+            bind(call_id=call_id)
+            
+            # Find the call record
+            with stage('call_lookup'):
+                if batch and call_id in batch['call_records']:
+                    call_record = batch['call_records'][call_id]
+                else:
+                    call_record = calls_table.get_item(Key={'call_id': call_id}).get('Item')
+            
+            if call_record and call_record.get('status') == 'completed':
+                # Redelivered completion event - results are already stored
+                outcome = '⏭️ Call already completed, skipping duplicate event'
+                return
+            
+            # Rules decide which Comprehend operations and pattern extractors are worth running
+            if batch:
+                rules = batch['rules']
+            else:
+                with stage('rules_scan'):
+                    rules = load_active_rules()
+            
+            if call_record and call_record.get('duplicate_of'):
+                # Transcript replayed by the processor for a duplicate of an already completed call:
+                # reuse that call's transcript and entities, no Comprehend
+                with stage('duplicates'):
+                    canonical = calls_table.get_item(Key={'call_id': call_record['duplicate_of']}).get('Item')
+                    copy_results_to_duplicate(calls_table, batches_table, checkpoints_table, canonical, call_id,
+                                              lambda duplicate, source: score_duplicate(duplicate, source, rules))
+                outcome = '🔗 Completed from duplicate audio'
+                return
+            plan = extraction_plan(rules, ALWAYS_EXTRACT_ENTITIES)
+            classifier = phrase_classifier(rules)
+            if call_record:
+                # Path 1: Existing UI upload flow
+                filename = call_record['filename']
                 
-                # Extract call_id from job name (format: anycompany-{call_id}-{timestamp})
-                job_parts = job_name.split('-')
-                if len(job_parts) >= 3:
-                    call_id = '-'.join(job_parts[1:-1])  # Handle UUIDs with dashes
+                # Get reference data for validation
+                genesys_call_id = extract_genesys_id_from_filename(filename)
+                if 'reference_data' in call_record:
+                    # Joined by batch prep and stored by batch trigger: no lookup
+                    ref_data = call_record['reference_data'] or {}
+                    add_count('reference_from_record')
+                elif batch:
+                    ref_data = batch['references'].get(genesys_call_id) or {}
                 else:
-                    call_id = 'unknown'
+                    ref_data = extract_reference_data_from_genesys_id(genesys_call_id)
                 
-                # Find the call record
-                response = calls_table.scan(
-                    FilterExpression='call_id = :call_id',
-                    ExpressionAttributeValues={':call_id': call_id}
-                )
+                # Agent speech only, when configured and the job separated speakers
+                agent = speaker_view(transcript_data, ref_data)
                 
-                if response['Items']:
-                    # Path 1: Existing UI upload flow
-                    call_record = response['Items'][0]
-                    filename = call_record['filename']
-                    
-                    # Get reference data for validation
-                    genesys_call_id = extract_genesys_id_from_filename(filename)
-                    ref_data = extract_reference_data_from_genesys_id(genesys_call_id)
-                    
-                    # Extract entities using Comprehend with Genesys ID context
-                    extract_compliance_entities._current_genesys_id = genesys_call_id
-                    entities = extract_compliance_entities(transcript_text)
-                    
-                    # Validate entities against reference data
+                # Extract entities using Comprehend with Genesys ID context
+                extract_compliance_entities._current_genesys_id = genesys_call_id
+                entities = extract_compliance_entities(agent['text'] if agent else transcript_text, plan, classifier)
+                
+                # Validate entities against reference data
+                with stage('entity_validation'):
                     validation_results = validate_entities_against_reference(entities, ref_data, transcript_text)
-                    entities['validation_results'] = validation_results
-                    
-                    # Process with rule engine
-                    print(f'🔧 Processing rules for call {call_id} with transcript length: {len(transcript_text)}')
-                    violations = process_with_rule_engine(transcript_text, call_id, filename)
-                    print(f'⚠️ Found {len(violations)} violations for call {call_id}')
-                    
-                    # Convert floats to Decimals for DynamoDB
-                    entities_clean = convert_floats_to_decimals(entities)
-                    violations_clean = convert_floats_to_decimals(violations)
-                    
-                    # Save transcripts organized by Genesys ID
+                entities['validation_results'] = validation_results
+                
+                # Process with rule engine
+                bind(filename=filename, genesys_id=genesys_call_id)
+                violations = process_with_rule_engine(transcript_text, call_id, filename, ref_data, entities, transcript_items, rules, agent,
+                                                      call_record.get('audio_offset_seconds', 0))
+                add_count('violations', len(violations))
+                
+                # Convert floats to Decimals for DynamoDB
+                entities_clean = convert_floats_to_decimals(entities)
+                violations_clean = convert_floats_to_decimals(violations)
+                
+                # Save transcripts organized by Genesys ID
+                with stage('transcript_save'):
                     if genesys_call_id:
                         # Plain text transcript
                         plain_text_key = f"transcripts/genesys-id/{genesys_call_id}.txt"
@@ -91,7 +243,7 @@ def lambda_handler(event, context):
                             Body=transcript_text,
                             ContentType='text/plain'
                         )
-                        
+                    
                         # Copy original AWS Transcribe JSON to Genesys ID location
                         copy_source = {'Bucket': bucket, 'Key': key}
                         genesys_json_key = f"transcripts/genesys-id/{genesys_call_id}.json"
@@ -100,8 +252,8 @@ def lambda_handler(event, context):
                             Bucket=os.environ['TRANSCRIBE_OUTPUT_BUCKET'],
                             Key=genesys_json_key
                         )
-                        
-                        print(f"📁 Saved transcripts: {genesys_call_id}.txt and {genesys_call_id}.json")
+                    
+                        debug('📁 Saved transcripts by Genesys ID')
                     else:
                         # Fallback to old method if Genesys ID not found
                         plain_text_key = f"transcripts/plain/{call_id}.txt"
@@ -111,89 +263,386 @@ def lambda_handler(event, context):
                             Body=transcript_text,
                             ContentType='text/plain'
                         )
-                    
-                    # Update call record
-                    calls_table.update_item(
-                        Key={'call_id': call_id},
-                        UpdateExpression='SET transcript = :transcript, entities = :entities, violations = :violations, #status = :status, processed_at = :processed_at, genesys_call_id = :genesys_id',
-                        ExpressionAttributeNames={'#status': 'status'},
-                        ExpressionAttributeValues={
-                            ':transcript': transcript_text,
-                            ':entities': entities_clean,
-                            ':violations': violations_clean,
-                            ':status': 'completed',
-                            ':processed_at': datetime.utcnow().isoformat(),
-                            ':genesys_id': genesys_call_id or 'unknown'
-                        }
-                    )
-                    
-                    print(f'✅ Successfully processed transcription for {filename}')
-                else:
-                    # Path 2: Bulk S3 upload flow - create call record on-the-fly
-                    print(f'📁 No existing call record found - creating for bulk upload: {call_id}')
-                    filename = f'bulk-upload-{job_name}.wav'
-                    
-                    # Extract entities using Comprehend
-                    entities = extract_compliance_entities(transcript_text)
-                    
-                    # Process with rule engine
-                    print(f'🔧 Processing rules for bulk upload {call_id} with transcript length: {len(transcript_text)}')
-                    violations = process_with_rule_engine(transcript_text, call_id, filename)
-                    print(f'⚠️ Found {len(violations)} violations for bulk upload {call_id}')
-                    
-                    # Convert floats to Decimals for DynamoDB
-                    entities_clean = convert_floats_to_decimals(entities)
-                    violations_clean = convert_floats_to_decimals(violations)
-                    
-                    # Create new call record for bulk upload
-                    calls_table.put_item(
-                        Item={
-                            'call_id': call_id,
-                            'filename': filename,
-                            'transcript': transcript_text,
-                            'entities': entities_clean,
-                            'violations': violations_clean,
-                            'status': 'completed',
-                            'upload_type': 'bulk_s3',
-                            'created_at': datetime.utcnow().isoformat(),
-                            'processed_at': datetime.utcnow().isoformat()
-                        }
-                    )
-                    
-                    print(f'✅ Successfully processed bulk upload transcription for {filename}')
-            
-            except Exception as transcript_error:
-                print(f'❌ Error processing transcript file {key}: {str(transcript_error)}')
                 
-                # Try to extract call_id and mark as failed
-                job_parts = job_name.split('-')
-                if len(job_parts) >= 3:
-                    call_id = '-'.join(job_parts[1:-1])
-                    try:
-                        calls_table.update_item(
-                            Key={'call_id': call_id},
-                            UpdateExpression='SET transcript = :transcript, #status = :status, #error = :error, processed_at = :processed_at',
-                            ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
-                            ExpressionAttributeValues={
-                                ':transcript': 'TRANSCRIPTION_FAILED',
-                                ':status': 'failed',
-                                ':error': str(transcript_error),
-                                ':processed_at': datetime.utcnow().isoformat()
-                            }
+                results = {
+                    'transcript': transcript_text,
+                    'entities': entities_clean,
+                    'violations': violations_clean,
+                    'status': 'completed',
+                    'processed_at': datetime.utcnow().isoformat(),
+                    'genesys_call_id': genesys_call_id or 'unknown'
+                }
+                results.update(speaker_fields(agent))
+                if batch:
+                    # Written by the batch flush, which then runs the follow-up steps
+                    batch['writes'][call_id] = (key, results, call_record)
+                    outcome = '✅ Processed transcription, queued for batch write'
+                    return
+                
+                # Update call record
+                with stage('call_update'):
+                    completed = store_completion(calls_table, call_id, results)
+                
+                outcome = '✅ Processed transcription'
+                finish_completed_call(calls_table, batches_table, checkpoints_table, call_record, completed)
+            else:
+                # Path 2: Bulk S3 upload flow - create call record on-the-fly
+                filename = f'bulk-upload-{job_name}.wav'
+                bind(filename=filename, upload_type='bulk_s3')
+                info('📁 No existing call record found - creating for bulk upload')
+                
+                # Extract entities using Comprehend
+                agent = speaker_view(transcript_data)
+                entities = extract_compliance_entities(agent['text'] if agent else transcript_text, plan, classifier)
+                
+                # Process with rule engine
+                violations = process_with_rule_engine(transcript_text, call_id, filename, entities=entities, items=transcript_items, rules=rules, agent=agent)
+                add_count('violations', len(violations))
+                
+                # Convert floats to Decimals for DynamoDB
+                entities_clean = convert_floats_to_decimals(entities)
+                violations_clean = convert_floats_to_decimals(violations)
+                
+                # Create new call record for bulk upload (first writer wins on redelivery)
+                try:
+                    with stage('call_update'):
+                        calls_table.put_item(
+                            Item={
+                                'call_id': call_id,
+                                'filename': filename,
+                                'transcript': transcript_text,
+                                'entities': entities_clean,
+                                'violations': violations_clean,
+                                'status': 'completed',
+                                'upload_type': 'bulk_s3',
+                                'created_at': datetime.utcnow().isoformat(),
+                                'processed_at': datetime.utcnow().isoformat(),
+                                **speaker_fields(agent)
+                            },
+                            ConditionExpression='attribute_not_exists(call_id)'
                         )
-                    except Exception as db_error:
-                        print(f'❌ Failed to update DB for failed transcription: {str(db_error)}')
+                except Exception as put_error:
+                    if not is_conditional_check_failure(put_error):
+                        raise
+                    outcome = '⏭️ Bulk upload record already exists, skipping duplicate event'
+                    return
+                
+                outcome = '✅ Processed bulk upload transcription'
+        
+        except Exception as transcript_error:
+            error('❌ Error processing transcript file', key=key, error=str(transcript_error))
+            
+            # Try to extract call_id and mark as failed
+            call_id = call_id_from_job_name(job_name)
+            if call_id:
+                try:
+                    fail_call(calls_table, batches_table, checkpoints_table, call_id, transcript_error)
+                except Exception as db_error:
+                    error('❌ Failed to update DB for failed transcription', error=str(db_error))
+    
+    except Exception as e:
+        error('Error processing transcription completion', error=str(e))
+    finally:
+        if outcome:
+            flush_call_log(outcome)
+        flush_metrics()
+
+def fail_call(calls_table, batches_table, checkpoints_table, call_id, reason, job_name=None):
+    """
+    Mark a call failed and release what its transcription held (lane slot, batch
+    progress, checkpoint, linked duplicates). With a job name, only the call still
+    waiting on that job is failed; returns False when nothing changed.
+    """
+    update = {
+        'Key': {'call_id': call_id},
+        # Dropping the job name lets a resumed batch run claim and retry this call
+        'UpdateExpression': 'SET transcript = :transcript, #status = :status, #error = :error, processed_at = :processed_at REMOVE transcription_job_name',
+        'ExpressionAttributeNames': {'#status': 'status', '#error': 'error'},
+        'ExpressionAttributeValues': {
+            ':transcript': 'TRANSCRIPTION_FAILED',
+            ':status': 'failed',
+            ':error': str(reason),
+            ':processed_at': datetime.utcnow().isoformat()
+        },
+        'ReturnValues': 'ALL_OLD'
+    }
+    if job_name:
+        update['ConditionExpression'] = 'transcription_job_name = :job_name'
+        update['ExpressionAttributeValues'][':job_name'] = job_name
+    try:
+        previous = calls_table.update_item(**update).get('Attributes', {})
+    except Exception as e:
+        if job_name and is_conditional_check_failure(e):
+            return False
+        raise
+    if previous.get('status') == 'failed':
+        return False
+    release_transcribe_slot(batches_table, previous.get('priority_lane'))
+    track_batch_event(batches_table, previous.get('batch_id'), 'failed')
+    mark_checkpoint(checkpoints_table, previous.get('batch_id'), previous.get('checkpoint_key'), FAILED, call_id)
+    fail_duplicates(calls_table, batches_table, checkpoints_table, dict(previous, call_id=call_id), reason)
+    return True
+
+def process_job_state_change(calls_table, batches_table, checkpoints_table, detail):
+    """
+    Transcribe Job State Change event (EventBridge). A failed job writes no output,
+    so no completion notification arrives: fail its call here and free its slot.
+    """
+    job_name = detail.get('TranscriptionJobName', '')
+    start_metrics('transcription-handler', job_name=job_name)
+    start_call_log('transcription-handler', job_name=job_name)
+    outcome = None
+    try:
+        call_id = call_id_from_job_name(job_name) if job_name.startswith(JOB_NAME_PREFIX) else None
+        if detail.get('TranscriptionJobStatus') != 'FAILED' or not call_id:
+            return
+        set_properties(call_id=call_id)
+        bind(call_id=call_id)
+        reason = detail.get('FailureReason') or 'Transcription job failed'
+        if fail_call(calls_table, batches_table, checkpoints_table, call_id, reason, job_name=job_name):
+            add_count('transcribe_jobs_failed')
+            outcome = '❌ Transcription job failed'
+        else:
+            outcome = '⏭️ Failed job no longer owns its call, skipping'
+    except Exception as e:
+        error('Error processing transcription job state change', error=str(e))
+    finally:
+        if outcome:
+            flush_call_log(outcome)
+        flush_metrics()
+
+def reconcile_lane_slots(transcribe, batches_table, calls_table_name, lane='bulk'):
+    """
+    Reset the lane's in-flight counter to the Transcribe jobs actually queued or
+    running for it, so slots leaked by a timeout between acquire and start (or a
+    lost failure event) come back. A slot taken for a job not started yet when the
+    jobs are listed is missed until the next run.
+    """
+    call_ids = []
+    for status in ('QUEUED', 'IN_PROGRESS'):
+        request = {'Status': status, 'JobNameContains': JOB_NAME_PREFIX, 'MaxResults': 100}
+        while True:
+            response = transcribe.list_transcription_jobs(**request)
+            for job in response.get('TranscriptionJobSummaries', []):
+                call_id = call_id_from_job_name(job['TranscriptionJobName'])
+                if call_id:
+                    call_ids.append(call_id)
+            if not response.get('NextToken'):
+                break
+            request['NextToken'] = response['NextToken']
+    
+    records = batch_get_items(get_resource(), calls_table_name, [{'call_id': call_id} for call_id in call_ids],
+                              projection='call_id, priority_lane') if call_ids else []
+    in_flight = sum(1 for record in records if record.get('priority_lane') == lane)
+    previous = reset_transcribe_slots(batches_table, lane, in_flight)
+    if previous != in_flight:
+        print(f'🔧 Reset {lane} lane slots from {previous} to {in_flight}')
+    return in_flight
+
+def store_completion(calls_table, call_id, results):
+    """
+    Write only the completion fields, so attributes other writers set meanwhile
+    (linked duplicates, batch metadata) are kept; returns the stored record
+    """
+    names = {}
+    values = {}
+    assignments = []
+    for i, (field, value) in enumerate(results.items()):
+        names[f'#f{i}'] = field
+        values[f':v{i}'] = value
+        assignments.append(f'#f{i} = :v{i}')
+    response = calls_table.update_item(
+        Key={'call_id': call_id},
+        UpdateExpression='SET ' + ', '.join(assignments),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        ReturnValues='ALL_NEW'
+    )
+    return response.get('Attributes', {})
+
+def finish_completed_call(calls_table, batches_table, checkpoints_table, call_record, completed):
+    """Follow-up once a call's results are stored: linked duplicates, Transcribe slot, batch progress"""
+    # Re-uploads of the same audio were linked to this call instead of transcribed
+    with stage('duplicates'):
+        propagate_to_duplicates(calls_table, batches_table, checkpoints_table, completed, score_duplicate)
+    
+    # Free the bulk lane's Transcribe slot for the next queued batch call
+    release_transcribe_slot(batches_table, call_record.get('priority_lane'))
+    
+    # Batch progress: end-to-end latency from call record creation to results
+    if call_record.get('batch_id'):
+        latency_seconds = None
+        if call_record.get('created_at'):
+            latency_seconds = (datetime.utcnow() - datetime.fromisoformat(call_record['created_at'])).total_seconds()
+        track_batch_event(batches_table, call_record['batch_id'], 'completed', latency_seconds)
+        mark_checkpoint(checkpoints_table, call_record['batch_id'], call_record.get('checkpoint_key'), COMPLETED, call_record['call_id'])
+
+def score_duplicate(duplicate, source, rules=None):
+    """
+    (entities, violations) for a duplicate call from the canonical call's transcript
+    and entities, validated and scored against the duplicate's own reference data
+    """
+    filename = duplicate.get('filename', '')
+    genesys_call_id = extract_genesys_id_from_filename(filename)
+    if 'reference_data' in duplicate:
+        ref_data = duplicate['reference_data'] or {}
+    else:
+        ref_data = extract_reference_data_from_genesys_id(genesys_call_id)
+    
+    transcript = source.get('transcript', '')
+    entities = dict(source.get('entities') or {})
+    entities['validation_results'] = validate_entities_against_reference(entities, ref_data, transcript)
+    if rules is None:
+        rules = load_active_rules()
+    violations = process_with_rule_engine(transcript, duplicate['call_id'], filename, ref_data, entities, rules=rules)
+    return convert_floats_to_decimals(entities), convert_floats_to_decimals(violations)
+
+def process_completion_batch(s3, calls_table, batches_table, checkpoints_table, records):
+    """
+    Score a batch of SQS-buffered completion events in one invocation: rules,
+    reference data and call records are read once, transcripts concurrently,
+    and completed calls are written concurrently in one flush.
+    Returns batchItemFailures so only messages whose call was not stored are retried.
+    """
+    failed = set()
+    work = {}
+    for record in records:
+        try:
+            s3_records = json.loads(record['body']).get('Records', [])
+        except ValueError as e:
+            error('❌ Unreadable completion message', message_id=record.get('messageId'), error=str(e))
+            failed.add(record.get('messageId'))
+            continue
+        for s3_record in s3_records:
+            key = s3_record['s3']['object']['key']
+            job_name = completion_job_name(key)
+            if not job_name:
+                continue
+            # The same notification can arrive twice; each transcript is scored once
+            entry = work.setdefault(key, {
+                'bucket': s3_record['s3']['bucket']['name'],
+                'job_name': job_name,
+                'etag': s3_record['s3']['object'].get('eTag'),
+                'message_ids': []
+            })
+            entry['message_ids'].append(record.get('messageId'))
+    
+    if work:
+        calls_table_name = os.environ['CALLS_TABLE']
+        start_metrics('transcription-handler-batch', transcripts=len(work), messages=len(records))
+        try:
+            batch = prepare_completion_batch(s3, calls_table_name, work)
+        except Exception as e:
+            error('❌ Could not prepare completion batch', transcripts=len(work), error=str(e))
+            flush_metrics()
+            failed.update(message_id for entry in work.values() for message_id in entry['message_ids'])
+            return batch_response(failed)
+        flush_metrics()
+        
+        for key, entry in work.items():
+            process_completion(s3, calls_table, batches_table, checkpoints_table,
+                               entry['bucket'], key, entry['job_name'], entry['etag'], batch)
         
+        start_metrics('transcription-handler-batch', transcripts=len(work), writes=len(batch['writes']))
+        try:
+            unwritten = flush_completion_batch(calls_table, batches_table, checkpoints_table, calls_table_name, batch)
         except Exception as e:
-            print(f'Error processing transcription completion: {str(e)}')
+            error('❌ Completion batch flush failed, returning its messages to the queue', error=str(e))
+            unwritten = [key for key, _, _ in batch['writes'].values()]
+        finally:
+            flush_metrics()
+        for key in unwritten:
+            failed.update(work[key]['message_ids'])
     
-    return {'statusCode': 200}
+    return batch_response(failed)
+
+def batch_response(failed):
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed if message_id]}
 
-def extract_compliance_entities(transcript):
-    comprehend = boto3.client('comprehend')
-    s3 = boto3.client('s3')
+def prepare_completion_batch(s3, calls_table_name, work):
+    """Everything the calls of a batch share, plus their transcripts and call records"""
+    with stage('rules_scan'):
+        rules = load_active_rules()
+    with stage('transcript_get'):
+        transcripts = read_transcripts(s3, [(entry['bucket'], key) for key, entry in work.items()])
     
-    entities = {
+    call_ids = [call_id for call_id in (call_id_from_job_name(entry['job_name']) for entry in work.values()) if call_id]
+    with stage('call_lookup'):
+        found = batch_get_items(get_resource('dynamodb'), calls_table_name, [{'call_id': call_id} for call_id in call_ids])
+    call_records = dict.fromkeys(call_ids)
+    call_records.update((record['call_id'], record) for record in found)
+    
+    # Batch calls carry their reference data on the record; look up only the rest
+    unreferenced = [record for record in found if 'reference_data' not in record]
+    with stage('reference_fetch'):
+        table_name = reference_table_name()
+        if not unreferenced:
+            references = {}
+        elif table_name:
+            # Only the records of this batch's calls
+            genesys_call_ids = {extract_genesys_id_from_filename(record['filename']) for record in unreferenced if record.get('filename')}
+            references = get_references(get_resource('dynamodb'), table_name, genesys_call_ids)
+        else:
+            references = load_reference_index(s3, os.environ.get('INPUT_BUCKET_NAME', 'anycompany-input-prod-164543933824'))
+    
+    add_count('rules_loaded', len(rules))
+    add_count('transcript_read_errors', sum(isinstance(body, Exception) for body in transcripts.values()))
+    return {
+        'rules': rules,
+        'references': references,
+        'transcripts': transcripts,
+        'call_records': call_records,
+        # call_id -> (transcript key, completion fields, record as read)
+        'writes': {}
+    }
+
+def read_transcripts(s3, objects):
+    """Transcript JSON bytes by key, read concurrently; a failed read maps to its exception"""
+    def read(bucket_key):
+        bucket, key = bucket_key
+        try:
+            return key, s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+        except Exception as e:
+            return key, e
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(TRANSCRIPT_READ_WORKERS, len(objects)))) as executor:
+        return dict(executor.map(read, objects))
+
+def flush_completion_batch(calls_table, batches_table, checkpoints_table, calls_table_name, batch):
+    """Write the batch's completed calls and run their follow-up steps; returns the keys not stored"""
+    writes = batch['writes']
+    if not writes:
+        return []
+    
+    def write(call_id):
+        results = writes[call_id][1]
+        try:
+            return call_id, store_completion(get_thread_table(calls_table_name), call_id, results)
+        except Exception as e:
+            return call_id, e
+    
+    with stage('call_update'):
+        with ThreadPoolExecutor(max_workers=max(1, min(COMPLETION_WRITE_WORKERS, len(writes)))) as executor:
+            stored = dict(executor.map(write, list(writes)))
+    unwritten_ids = {call_id for call_id, completed in stored.items() if isinstance(completed, Exception)}
+    add_count('calls_written', len(writes) - len(unwritten_ids))
+    add_count('calls_unwritten', len(unwritten_ids))
+    if unwritten_ids:
+        error('❌ Completed calls not written, returning their messages to the queue', call_ids=sorted(unwritten_ids),
+              error=str(stored[min(unwritten_ids)]))
+    
+    for call_id, (key, _, call_record) in writes.items():
+        if call_id in unwritten_ids:
+            continue
+        try:
+            finish_completed_call(calls_table, batches_table, checkpoints_table, call_record, stored[call_id])
+        except Exception as e:
+            warning('⚠️ Follow-up steps failed for completed call', call_id=call_id, error=str(e))
+    return [key for call_id, (key, _, _) in writes.items() if call_id in unwritten_ids]
+
+def new_entities():
+    """Empty entity lists by type, as stored on the call record"""
+    return {
         'persons': [],
         'organizations': [],
         'financial': [],
@@ -207,27 +656,53 @@ def extract_compliance_entities(transcript):
         'compliance_disclosures': [],
         'timing_sensitive': []
     }
+
+def extract_compliance_entities(transcript, plan=None, classifier=None):
+    """
+    Entity lists for a transcript; `plan` (shared/entity_plan.py) limits the Comprehend calls and
+    pattern extractors, `classifier` (shared/phrase_classifier.py) labels the key phrases
+    """
+    comprehend = get_client('comprehend')
+    s3 = get_client('s3')
+    
+    entities = new_entities()
+    plan = plan or full_plan()
+    classifier = classifier or phrase_classifier()
+    operations = plan['operations']
+    no_results = {'Entities': [], 'KeyPhrases': []}
     
     try:
-        # Handle long transcripts by chunking
-        chunks = chunk_text(transcript, 4500)  # Leave buffer for 5000 char limit
-        
-        for i, chunk in enumerate(chunks):
+        # Handle long transcripts by chunking; offsets are relative to the chunk start
+        seen = set()
+        chunks = iter_chunks(transcript, COMPREHEND_CHUNK_BYTES, COMPREHEND_OVERLAP_BYTES)
+        for i, (offset, end, new_start) in enumerate(chunks):
+            chunk = transcript[offset:end]
+            add_count('comprehend_chunks')
             try:
                 # Add delay between API calls to avoid rate limiting
-                if i > 0:
+                if i > 0 and operations:
                     time.sleep(0.1)
                 
-                # Batch Comprehend calls
-                entities_response = comprehend.detect_entities(Text=chunk, LanguageCode='en')
-                phrases_response = comprehend.detect_key_phrases(Text=chunk, LanguageCode='en')
-                pii_response = comprehend.detect_pii_entities(Text=chunk, LanguageCode='en')
+                # Only the Comprehend calls some rule or dashboard needs
+                entities_response = phrases_response = pii_response = no_results
+                if 'detect_entities' in operations:
+                    with stage('comprehend_entities'):
+                        entities_response = comprehend.detect_entities(Text=chunk, LanguageCode='en')
+                if 'detect_key_phrases' in operations:
+                    with stage('comprehend_key_phrases'):
+                        phrases_response = comprehend.detect_key_phrases(Text=chunk, LanguageCode='en')
+                if 'detect_pii_entities' in operations:
+                    with stage('comprehend_pii'):
+                        pii_response = comprehend.detect_pii_entities(Text=chunk, LanguageCode='en')
+                add_count('comprehend_requests', len(operations))
+                add_count('comprehend_requests_skipped', 3 - len(operations))
+                add_bytes('comprehend_bytes', len(operations) * len(chunk.encode('utf-8')))
                 
                 # Process entities
                 for entity in entities_response['Entities']:
-                    if entity['Score'] > 0.7:
+                    if entity['Score'] > 0.7 and first_sighting(seen, 'entity', entity, offset):
                         entity_type = entity['Type']
-                        entity_text = entity['Text']
+                        entity_text = entity_span_text(chunk, entity)
                         
                         if entity_type == 'PERSON':
                             entities['persons'].append({
@@ -240,91 +715,68 @@ def extract_compliance_entities(transcript):
                                 'confidence': entity['Score']
                             })
                 
-                # Process key phrases
+                # Process key phrases: one classifier pass labels each phrase
                 for phrase_data in phrases_response['KeyPhrases']:
-                    if phrase_data['Score'] > 0.7:
-                        phrase = phrase_data['Text'].lower()
-                        
-                        if any(term in phrase for term in ['dollar', 'payment', 'amount', 'balance', 'account']):
-                            entities['financial'].append({
-                                'text': phrase,
-                                'confidence': phrase_data['Score']
-                            })
-                        elif any(term in phrase for term in ['medical', 'hospital', 'doctor', 'surgery', 'illness', 'medication']):
-                            entities['medical'].append({
-                                'text': phrase,
-                                'confidence': phrase_data['Score']
-                            })
-                        elif any(term in phrase for term in ['attorney', 'lawyer', 'bankruptcy', 'legal action', 'garnish', 'repossess']):
-                            entities['legal'].append({
-                                'text': phrase,
-                                'confidence': phrase_data['Score']
-                            })
-                        elif any(term in phrase for term in ['text message', 'sms', 'email', 'voicemail']):
-                            entities['communication'].append({
-                                'text': phrase,
-                                'confidence': phrase_data['Score']
-                            })
-                        elif any(term in phrase for term in ['arrest', 'jail', 'prison', 'seize', 'garnish', 'repossess', 'sheriff', 'warrant']):
-                            entities['threatening'].append({
-                                'text': phrase,
-                                'confidence': phrase_data['Score']
-                            })
-                        elif any(term in phrase for term in ['massachusetts', 'michigan', 'new hampshire', 'arizona', 'state of']):
-                            entities['geographic'].append({
-                                'text': phrase,
-                                'confidence': phrase_data['Score']
-                            })
-                        elif any(term in phrase for term in ['mini miranda', 'debt collector', 'attempt to collect', 'validation notice']):
-                            entities['compliance_disclosures'].append({
+                    if phrase_data['Score'] > 0.7 and first_sighting(seen, 'phrase', phrase_data, offset):
+                        phrase = entity_span_text(chunk, phrase_data).lower()
+                        category = classifier.classify(phrase)
+                        if category:
+                            entities[category].append({
                                 'text': phrase,
                                 'confidence': phrase_data['Score']
                             })
                 
                 # Process PII entities
                 for pii_entity in pii_response['Entities']:
-                    if pii_entity['Score'] > 0.8:  # Higher threshold for PII
+                    if pii_entity['Score'] > 0.8 and first_sighting(seen, 'pii', pii_entity, offset):  # Higher threshold for PII
                         entities['pii_entities'].append({
-                            'text': pii_entity['Text'],
+                            # DetectPiiEntities returns offsets only, no Text
+                            'text': entity_span_text(chunk, pii_entity),
                             'type': pii_entity['Type'],
                             'confidence': pii_entity['Score']
                         })
                 
-                # Extract compliance-specific patterns
-                extract_compliance_patterns(chunk, entities, i == 0)  # Pass first_chunk flag
+                # Extract compliance-specific patterns from the text this chunk adds
+                with stage('pattern_extraction'):
+                    extract_compliance_patterns(transcript[new_start:end], entities, i == 0, plan['patterns'])  # Pass first_chunk flag
             
             except Exception as chunk_error:
-                print(f'Error processing chunk {i}: {str(chunk_error)}')
+                warning('Error processing Comprehend chunk', chunk=i, error=str(chunk_error))
                 continue
         
+        # Lets a later rescore tell an empty list from one that was never extracted
+        entities['extracted_types'] = sorted(plan['entity_types'])
+        
         # Save entities to Comprehend output bucket
         try:
-            entities_json = json.dumps(entities, indent=2)
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            s3.put_object(
-                Bucket=os.environ['COMPREHEND_OUTPUT_BUCKET'],
-                Key=f"entities/{timestamp}_entities.json",
-                Body=entities_json,
-                ContentType='application/json'
-            )
-            
-            # Also save organized by Genesys ID if available
-            if hasattr(extract_compliance_entities, '_current_genesys_id') and extract_compliance_entities._current_genesys_id:
-                genesys_entities_key = f"entities/genesys-id/{extract_compliance_entities._current_genesys_id}_entities.json"
+            with stage('entities_save'):
+                entities_json = json.dumps(entities, indent=2)
+                add_bytes('entities_bytes', len(entities_json))
+                timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
                 s3.put_object(
                     Bucket=os.environ['COMPREHEND_OUTPUT_BUCKET'],
-                    Key=genesys_entities_key,
+                    Key=f"entities/{timestamp}_entities.json",
                     Body=entities_json,
                     ContentType='application/json'
                 )
-                print(f"📁 Saved entities: {extract_compliance_entities._current_genesys_id}_entities.json")
+            
+                # Also save organized by Genesys ID if available
+                if hasattr(extract_compliance_entities, '_current_genesys_id') and extract_compliance_entities._current_genesys_id:
+                    genesys_entities_key = f"entities/genesys-id/{extract_compliance_entities._current_genesys_id}_entities.json"
+                    s3.put_object(
+                        Bucket=os.environ['COMPREHEND_OUTPUT_BUCKET'],
+                        Key=genesys_entities_key,
+                        Body=entities_json,
+                        ContentType='application/json'
+                    )
+                    debug('📁 Saved entities by Genesys ID')
         except Exception as s3_error:
-            print(f'Failed to save entities to S3: {str(s3_error)}')
+            warning('Failed to save entities to S3', error=str(s3_error))
         
         return entities
         
     except Exception as e:
-        print(f'Entity extraction error: {str(e)}')
+        error('Entity extraction error', error=str(e))
         # Return fallback entities on error
         return {
             'persons': [],
@@ -337,9 +789,60 @@ def extract_compliance_entities(transcript):
             'error': str(e)
         }
 
-def extract_compliance_patterns(text, entities, is_first_chunk=False):
-    """Extract compliance-specific patterns not covered by Comprehend"""
+def speaker_view(transcript_data, ref_data=None):
+    """The agent's speech (shared/speakers.py) when AGENT_ONLY_ANALYSIS is on and the job separated speakers"""
+    if not AGENT_ONLY_ANALYSIS:
+        return None
+    agent = agent_view(transcript_data['results'], ref_data, AGENT_LABEL)
+    if not agent:
+        add_count('speaker_labels_missing')
+        return None
+    add_bytes('agent_text_bytes', len(agent['text'].encode('utf-8')))
+    set_properties(agent_label=agent['label'], agent_words=agent['words'], total_words=agent['total_words'])
+    return agent
+
+def speaker_fields(agent):
+    """Call record attributes describing an agent-only analysis"""
+    if not agent:
+        return {}
+    return {
+        'agent_transcript': agent['text'],
+        'speaker_analysis': {
+            'scope': AGENT_SCOPE,
+            'agent_label': agent['label'],
+            'agent_words': agent['words'],
+            'total_words': agent['total_words']
+        }
+    }
+
+def first_sighting(seen, kind, entity, offset):
+    """False for an entity already reported from the overlap with the previous chunk"""
+    if 'BeginOffset' not in entity:
+        return True
+    key = (kind, entity.get('Type'), offset + entity['BeginOffset'], offset + entity['EndOffset'])
+    if key in seen:
+        return False
+    seen.add(key)
+    return True
+
+def entity_span_text(chunk, entity):
+    """An entity's text, taken from its offsets when Comprehend does not return it"""
+    if entity.get('Text') is not None:
+        return entity['Text']
+    return chunk[entity['BeginOffset']:entity['EndOffset']]
+
+def pattern_spans(pattern, text_lower, tokens):
+    """(start, end) spans of a regex, or of a proximity spec: phrase groups that must follow each other"""
+    if isinstance(pattern, str):
+        return [match.span() for match in re.finditer(pattern, text_lower)]
+    return find_near(tokens, pattern, PROXIMITY_WORDS)
+
+def extract_compliance_patterns(text, entities, is_first_chunk=False, families=None):
+    """Extract compliance-specific patterns not covered by Comprehend; `families` limits which entity lists are filled"""
     text_lower = text.lower()
+    tokens = TokenizedText(text_lower)
+    if families is None:
+        families = PATTERN_FAMILIES
     
     # Agent identification patterns
     agent_patterns = [
@@ -347,7 +850,7 @@ def extract_compliance_patterns(text, entities, is_first_chunk=False):
         r'my name is ([a-z\s]+)',
         r'i am ([a-z\s]+)',
         r'speaking with ([a-z\s]+)'
-    ]
+    ] if 'agent_identification' in families else []
     
     for pattern in agent_patterns:
         matches = re.finditer(pattern, text_lower)
@@ -359,19 +862,18 @@ def extract_compliance_patterns(text, entities, is_first_chunk=False):
                 'first_60_seconds': is_first_chunk
             })
     
-    # Threatening language patterns
+    # Threatening language patterns (word groups within PROXIMITY_WORDS of each other)
     threat_patterns = [
-        r'\b(arrest|jail|prison)\b.*\b(you|your)\b',
-        r'\b(seize|garnish|repossess)\b.*\b(property|wages|assets)\b',
-        r'\b(sheriff|warrant|court)\b.*\b(action|order)\b',
+        [['arrest', 'jail', 'prison'], ['you', 'your']],
+        [['seize', 'garnish', 'repossess'], ['property', 'wages', 'assets']],
+        [['sheriff', 'warrant', 'court'], ['action', 'order']],
         r'\b(sue|lawsuit|legal action)\b'
-    ]
+    ] if 'threatening' in families else []
     
     for pattern in threat_patterns:
-        matches = re.finditer(pattern, text_lower)
-        for match in matches:
+        for start, end in pattern_spans(pattern, text_lower, tokens):
             entities['threatening'].append({
-                'text': match.group(0),
+                'text': text_lower[start:end],
                 'confidence': 0.90,
                 'threat_type': 'legal_action'
             })
@@ -382,7 +884,7 @@ def extract_compliance_patterns(text, entities, is_first_chunk=False):
         r'\b(michigan|mi)\b', 
         r'\b(new hampshire|nh)\b',
         r'\b(arizona|az)\b'
-    ]
+    ] if 'geographic' in families else []
     
     for pattern in state_patterns:
         matches = re.finditer(pattern, text_lower)
@@ -395,101 +897,100 @@ def extract_compliance_patterns(text, entities, is_first_chunk=False):
     
     # Compliance disclosure patterns
     disclosure_patterns = [
-        r'this is an attempt to collect.*debt',
+        [['this is an attempt to collect'], ['debt*']],
         r'mini.miranda',
-        r'validation.*notice',
-        r'debt.*collector',
-        r'information.*obtained.*used.*purpose'
-    ]
+        [['validation*'], ['notice*']],
+        [['debt*'], ['collector*']],
+        [['information'], ['obtained'], ['used'], ['purpose*']]
+    ] if 'compliance_disclosures' in families else []
     
     for pattern in disclosure_patterns:
-        matches = re.finditer(pattern, text_lower)
-        for match in matches:
+        for start, end in pattern_spans(pattern, text_lower, tokens):
+            matched = text_lower[start:end]
             entities['compliance_disclosures'].append({
-                'text': match.group(0),
+                'text': matched,
                 'confidence': 0.92,
-                'disclosure_type': 'mini_miranda' if 'miranda' in match.group(0) else 'debt_collection'
+                'disclosure_type': 'mini_miranda' if 'miranda' in matched else 'debt_collection'
             })
     
     # Timing-sensitive content (first 60 seconds)
-    if is_first_chunk:
+    if is_first_chunk and 'timing_sensitive' in families:
         timing_patterns = [
-            r'\b(callback|call.*back)\b',
-            r'\b(cease.*desist|do not call)\b',
-            r'\b(attorney|lawyer)\b.*\b(represent)\b'
+            r'\bcallback\b',
+            [['call*'], ['back']],
+            [['cease'], ['desist']],
+            r'\bdo not call\b',
+            [['attorney', 'lawyer'], ['represent']]
         ]
         
         for pattern in timing_patterns:
-            matches = re.finditer(pattern, text_lower)
-            for match in matches:
+            for start, end in pattern_spans(pattern, text_lower, tokens):
                 entities['timing_sensitive'].append({
-                    'text': match.group(0),
+                    'text': text_lower[start:end],
                     'confidence': 0.88,
                     'timing': 'first_60_seconds'
                 })
 
-def chunk_text(text, max_length):
-    """Split text into chunks that fit Comprehend limits"""
-    if len(text) <= max_length:
-        return [text]
-    
-    chunks = []
-    words = text.split()
-    current_chunk = []
-    current_length = 0
-    
-    for word in words:
-        word_length = len(word) + 1  # +1 for space
-        if current_length + word_length > max_length:
-            if current_chunk:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [word]
-                current_length = len(word)
-            else:
-                # Single word longer than max_length, truncate it
-                chunks.append(word[:max_length])
-        else:
-            current_chunk.append(word)
-            current_length += word_length
-    
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    return chunks
+def load_active_rules():
+    """Active rules from DynamoDB"""
+    rules_table = get_table(os.environ['RULES_TABLE'])
+    response = rules_table.scan(
+        FilterExpression='active = :active',
+        ExpressionAttributeValues={':active': True}
+    )
+    return response.get('Items', [])
 
-def process_with_rule_engine(transcript, call_id, filename):
-    dynamodb = boto3.resource('dynamodb')
-    rules_table = dynamodb.Table(os.environ['RULES_TABLE'])
-    
+def process_with_rule_engine(transcript, call_id, filename, ref_data=None, entities=None, items=None, rules=None, agent=None,
+                            offset_seconds=0):
     violations = []
-    transcript_lower = transcript.lower()
     
     try:
-        # Get active rules from DynamoDB
-        response = rules_table.scan(
-            FilterExpression='active = :active',
-            ExpressionAttributeValues={':active': True}
-        )
-        rules = response.get('Items', [])
-        print(f'📜 Loaded {len(rules)} active rules from database')
+        # Get active rules from DynamoDB, unless a batch of calls already loaded them
+        if rules is None:
+            with stage('rules_scan'):
+                rules = load_active_rules()
+        debug('📜 Loaded active rules', rule_count=len(rules))
+        add_count('rules_evaluated', len(rules))
+        
+        # Reference data is the same for every rule, so fetch it once per call
+        if ref_data is None:
+            ref_data = extract_reference_data_from_genesys_id(extract_genesys_id_from_filename(filename))
+        ref_data = with_suppression_flags(ref_data)
+        # Word times are relative to the trimmed audio Transcribe received; the offset maps them back
+        context = CallContext(transcript, ref_data, entities, items, offset_seconds)
+        # Agent-scoped rules read only the agent's words when speakers were separated
+        agent_context = CallContext(agent['text'], ref_data, entities, agent['items'], offset_seconds) if agent else None
         
-        # Process each rule with complete logic
+        # Process each rule with complete logic, timing each against its budget
+        slowest_rule, slowest_ms = None, 0.0
         for rule in rules:
+            rule_id = rule.get('rule_id', 'unknown')
+            started = time.perf_counter()
             try:
-                # Extract reference data using Genesys Call ID from filename
-                genesys_call_id = extract_genesys_id_from_filename(filename)
-                ref_data = extract_reference_data_from_genesys_id(genesys_call_id)
-                violation = evaluate_rule_simple(rule, transcript, call_id, ref_data)
+                with stage('rule_evaluation'):
+                    compiled = compile_rule(rule)
+                    if compiled.rejected_patterns and rule_id not in _rules_with_rejected_patterns:
+                        _rules_with_rejected_patterns.add(rule_id)
+                        warning('⚠️ Rule runs without its rejected patterns', rule_id=rule_id,
+                                rejected=list(compiled.rejected_patterns))
+                    rule_context = agent_context if agent_context and compiled.scope == AGENT_SCOPE else context
+                    violation = evaluate_rule_simple(rule, transcript, call_id, ref_data, rule_context, compiled)
                 if violation:
                     violations.append(violation)
-                    print(f'⚠️ Violation: {rule.get("rule_id")} - {rule.get("description")}')
             except Exception as rule_error:
-                print(f'Error evaluating rule {rule.get("rule_id", "unknown")}: {str(rule_error)}')
-        
-        print(f'✅ Rule processing complete: {len(violations)} violations found')
+                record_rule(rule_id, False, str(rule_error))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms > slowest_ms:
+                slowest_rule, slowest_ms = rule_id, elapsed_ms
+            if elapsed_ms > RULE_TIME_BUDGET_MS:
+                add_count('rules_over_budget')
+                warning('⏱️ Rule exceeded its time budget', rule_id=rule_id,
+                        elapsed_ms=round(elapsed_ms, 2), budget_ms=RULE_TIME_BUDGET_MS)
+        if slowest_rule:
+            set_properties(slowest_rule=slowest_rule, slowest_rule_ms=round(slowest_ms, 2))
         
     except Exception as e:
-        print(f'Rule engine error: {str(e)}')
+        error('Rule engine error', error=str(e))
         # No fallback rules - return empty violations on error
     
     return violations
@@ -533,9 +1034,18 @@ def extract_genesys_id_from_filename(filename):
     prefix = 'VM' if 'voicemail' in filename.lower() else 'GEN'
     return f'{prefix}-2024-{file_hash.upper()}'
 
+@timed('reference_fetch')
 def extract_reference_data_from_genesys_id(genesys_call_id):
-    """Extract comprehensive call metadata from S3 using Genesys Call ID"""
-    s3 = boto3.client('s3')
+    """Extract comprehensive call metadata using Genesys Call ID: one get_item with a reference table, else the S3 files"""
+    table_name = reference_table_name()
+    if table_name:
+        try:
+            return get_reference(get_table(table_name), genesys_call_id)
+        except Exception as e:
+            warning('⚠️ Reference data not available', error=str(e))
+            return {}
+    
+    s3 = get_client('s3')
     
     try:
         bucket_name = os.environ.get('INPUT_BUCKET_NAME', 'anycompany-input-prod-164543933824')
@@ -544,13 +1054,13 @@ def extract_reference_data_from_genesys_id(genesys_call_id):
         try:
             response = s3.get_object(
                 Bucket=bucket_name,
-                Key='voicemail-calls/voicemail_reference.json'
+                Key=VOICEMAIL_REFERENCE_KEY
             )
             voicemail_data = json.loads(response['Body'].read())
             
             if genesys_call_id in voicemail_data.get('voicemails', {}):
                 call_data = voicemail_data['voicemails'][genesys_call_id]
-                print(f"📋 Found voicemail metadata for {genesys_call_id}: Agent={call_data.get('agent_name')}, Customer={call_data.get('customer_name')}, State={call_data.get('customer_state')}")
+                debug('📋 Found voicemail metadata', genesys_id=genesys_call_id, customer_state=call_data.get('customer_state'))
                 return normalize_reference_data(call_data)
         except Exception:
             pass
@@ -559,39 +1069,38 @@ def extract_reference_data_from_genesys_id(genesys_call_id):
         try:
             response = s3.get_object(
                 Bucket=bucket_name,
-                Key='reference/master_reference.json'
+                Key=MASTER_REFERENCE_KEY
             )
             reference_data = json.loads(response['Body'].read())
             
             if genesys_call_id in reference_data.get('calls', {}):
                 call_data = reference_data['calls'][genesys_call_id]
-                print(f"📋 Found master metadata for {genesys_call_id}: Agent={call_data.get('agent_name')}, State={call_data.get('customer_state')}")
+                debug('📋 Found master metadata', genesys_id=genesys_call_id, customer_state=call_data.get('customer_state'))
                 return call_data
         except Exception:
             pass
         
     except Exception as e:
-        print(f"⚠️ Reference data not available: {str(e)}")
+        warning('⚠️ Reference data not available', error=str(e))
     
     # Return empty metadata
     return {}
 
-def normalize_reference_data(voicemail_data):
-    """Convert voicemail reference format to standard reference format"""
-    return {
-        'agent_name': voicemail_data.get('agent_name'),
-        'customer_name': voicemail_data.get('customer_name'),
-        'customer_state': voicemail_data.get('customer_state'),
-        'call_type': voicemail_data.get('call_type'),
-        'flags': voicemail_data.get('flags', {}),
-        # Extract compliance context from flags and data
-        'do_not_call': voicemail_data.get('flags', {}).get('do_not_call', False),
-        'attorney_retained': voicemail_data.get('flags', {}).get('attorney_retained', False),
-        'bankruptcy_filed': voicemail_data.get('flags', {}).get('bankruptcy_filed', False),
-        'cease_desist': voicemail_data.get('flags', {}).get('cease_desist', False),
-        'third_party_risk': voicemail_data.get('flags', {}).get('third_party_risk', False),
-        'voicemail_context': voicemail_data.get('flags', {}).get('voicemail_context', False)
-    }
+def with_suppression_flags(ref_data):
+    """ref_data plus the flags of suppression lists holding the call's phone number or account"""
+    if not SUPPRESSION_INDEX or not ref_data:
+        return ref_data
+    index = suppression_index(get_client('s3'), os.environ.get('INPUT_BUCKET_NAME', 'anycompany-input-prod-164543933824'))
+    with stage('suppression_check'):
+        flags = suppressed_flags(index, ref_data)
+    if not flags:
+        return ref_data
+    add_count('suppression_matches', len(flags))
+    debug('🚫 Call is on suppression lists', lists=flags)
+    # A copy: batch reference records are shared between calls
+    suppressed = dict(ref_data, suppression_lists=flags)
+    suppressed.update(dict.fromkeys(flags, True))
+    return suppressed
 
 def validate_entities_against_reference(entities, ref_data, transcript):
     """Validate extracted entities against reference ground truth data"""
@@ -655,7 +1164,7 @@ def validate_entities_against_reference(entities, ref_data, transcript):
                 for person in found_persons:
                     if expected_first in person and expected_last not in person:
                         validation['customer_name_accuracy_issue'] = True
-                        print(f"🔍 Customer name accuracy issue detected: Expected '{ref_data['customer_name']}', found '{person}'")
+                        debug('🔍 Customer name accuracy issue detected')
                         break
     
     # Calculate extraction quality score
@@ -678,11 +1187,13 @@ def validate_entities_against_reference(entities, ref_data, transcript):
     
     validation['extraction_quality'] = passed_checks / total_checks if total_checks > 0 else 1.0
     
-    print(f"📊 Entity validation: Agent extracted={validation['agent_name_extracted']}, correct={validation['agent_name_correct']}, Customer extracted={validation['customer_name_extracted']}, correct={validation['customer_name_correct']}, Quality={validation['extraction_quality']:.2f}")
+    debug('📊 Entity validation', agent_name_extracted=validation['agent_name_extracted'], agent_name_correct=validation['agent_name_correct'],
+          customer_name_extracted=validation['customer_name_extracted'], customer_name_correct=validation['customer_name_correct'],
+          extraction_quality=round(validation['extraction_quality'], 2))
     
     return validation
 
-def evaluate_rule_simple(rule, transcript, call_id, ref_data=None):
+def evaluate_rule_simple(rule, transcript, call_id, ref_data=None, context=None, compiled=None):
     """AI-powered rule evaluation using Comprehend entities with confidence scoring"""
     logic = rule.get('logic', {})
     rule_type = logic.get('type', 'pattern_match')
@@ -696,7 +1207,7 @@ def evaluate_rule_simple(rule, transcript, call_id, ref_data=None):
     
     try:
         # Evaluate rule based on transcript + Comprehend + reference metadata
-        violation_detected = evaluate_rule_with_metadata(rule, transcript, ref_data, rule_id)
+        violation_detected = evaluate_rule_with_metadata(rule, transcript, ref_data, rule_id, context, compiled)
         
         violation_result = {
             'violation_detected': violation_detected,
@@ -707,26 +1218,21 @@ def evaluate_rule_simple(rule, transcript, call_id, ref_data=None):
             'requires_manual_review': False
         }
         
-        print(f'🔍 Rule {rule_id}: Violation={violation_detected}')
+        record_rule(rule_id, violation_detected)
             
     except Exception as e:
-        print(f'Error evaluating rule {rule_id}: {str(e)}')
+        record_rule(rule_id, False, str(e))
         return None
     
     if violation_result and violation_result['violation_detected']:
-        return {
-            'date': datetime.now().strftime('%m/%d/%Y %I:%M:%S %p'),
-            'severity': rule.get('severity', 'minor'),
-            'code': rule_id,
-            'rule_code': rule_id,
-            'comment': rule.get('description', 'Rule violation detected'),
-            'call_id': call_id,
-            'ai_confidence': violation_result.get('confidence', 0.0),
-            'comprehend_quality': violation_result.get('quality_score', 0.0),
-            'low_confidence_entities': violation_result.get('low_confidence_entities', []),
-            'evidence': violation_result.get('evidence', []),
-            'requires_manual_review': violation_result.get('requires_manual_review', False)
-        }
+        return violation_record(
+            rule, call_id,
+            confidence=violation_result.get('confidence', 0.0),
+            quality_score=violation_result.get('quality_score', 0.0),
+            low_confidence_entities=violation_result.get('low_confidence_entities', []),
+            evidence=violation_result.get('evidence', []),
+            requires_manual_review=violation_result.get('requires_manual_review', False)
+        )
     
     return None
 
@@ -743,7 +1249,7 @@ def evaluate_ai_pattern_rule(logic, transcript, entities, ref_data=None, rule_id
     # Simple pattern matching - if ANY pattern found, it's a violation
     violation_detected = any(re.search(pattern, search_text, re.IGNORECASE) for pattern in patterns)
     
-    print(f'🔍 Rule {rule_id}: Patterns={patterns}, Found={violation_detected}')
+    debug('🔍 Pattern rule evaluated', rule_id=rule_id, patterns=patterns, found=violation_detected)
     
     return {
         'violation_detected': violation_detected,
@@ -792,131 +1298,17 @@ def evaluate_sentiment_rule(logic, transcript):
         'requires_manual_review': False
     }
 
-def evaluate_rule_with_metadata(rule, transcript, ref_data, rule_id):
+def evaluate_rule_with_metadata(rule, transcript, ref_data, rule_id, context=None, compiled=None):
     """Evaluate compliance rule using transcript + reference ground truth data"""
-    logic = rule.get('logic', {})
-    patterns = logic.get('patterns', [])
+    if context is None:
+        context = CallContext(transcript, ref_data)
     
-    # 1. Check transcript patterns first
-    pattern_match = any(re.search(pattern, transcript, re.IGNORECASE) for pattern in patterns) if patterns else False
-    
-    # 2. Context-based compliance validation using reference data
-    context_violation = False
-    
-    # Agent identification rules
-    if rule_id in ['LO1001.04', 'LO1001.06']:  # Agent must identify themselves
-        if ref_data.get('agent_name'):
-            expected_agent = ref_data['agent_name'].lower()
-            agent_identified = any(pattern in transcript.lower() for pattern in ['this is', 'my name is']) and expected_agent in transcript.lower()
-            if not agent_identified:
-                context_violation = True
-                print(f"🔍 Agent identification missing: Expected '{ref_data['agent_name']}' to identify themselves")
-    
-    # Massachusetts specific agent name requirement
-    elif rule_id == 'LO1001.03' and ref_data.get('customer_state') == 'MA':
-        if ref_data.get('agent_name'):
-            ma_name_stated = 'my name is' in transcript.lower() and ref_data['agent_name'].lower() in transcript.lower()
-            if not ma_name_stated:
-                context_violation = True
-                print(f"🔍 MA requirement: Agent must state full name, expected '{ref_data['agent_name']}'")
-    
-    # Customer name accuracy in voicemail
-    elif rule_id in ['LO1001.08', 'LO1001.09'] and ref_data.get('customer_name'):
-        expected_customer = ref_data['customer_name']
-        
-        # LO1001.08: Full name including suffix requirement
-        if rule_id == 'LO1001.08':
-            # Check if full customer name (including suffix) is used correctly
-            customer_mentioned_correctly = expected_customer.lower() in transcript.lower()
-            if not customer_mentioned_correctly:
-                context_violation = True
-                print(f"🔍 Customer name accuracy: Expected full name '{expected_customer}' in voicemail")
-        
-        # LO1001.09: Incorrect customer name usage
-        elif rule_id == 'LO1001.09':
-            # Extract customer names from transcript and compare with expected
-            expected_parts = expected_customer.lower().split()
-            transcript_lower = transcript.lower()
-            
-            # Check if wrong name is used (different last name)
-            wrong_name_patterns = [
-                'jennifer johnson',  # Wrong: should be Martinez
-                'robert williams',   # Without Jr. suffix
-                'karen thompson'     # Without Sr. suffix
-            ]
-            
-            # Generic check: if expected customer name parts don't match transcript
-            name_mismatch = False
-            if len(expected_parts) >= 2:
-                expected_first = expected_parts[0]
-                expected_last = expected_parts[1]
-                
-                # Check if first name is there but wrong last name
-                if expected_first in transcript_lower:
-                    # First name found, check if correct last name is missing
-                    if expected_last not in transcript_lower:
-                        name_mismatch = True
-                        print(f"🔍 Wrong customer name: Expected '{expected_customer}', found first name but wrong/missing last name")
-            
-            # Also check specific wrong name patterns
-            wrong_name_used = any(pattern in transcript_lower for pattern in wrong_name_patterns)
-            
-            if name_mismatch or wrong_name_used:
-                context_violation = True
-                print(f"🔍 Customer name violation: Agent used incorrect customer name")
-    
-    # Do Not Call violations
-    elif rule_id == 'LO1005.11' and ref_data.get('do_not_call'):
-        context_violation = True
-        print(f"🔍 DNC violation: Customer is on Do Not Call list")
-    
-    # Attorney representation violations
-    elif rule_id == 'LO1005.05' and ref_data.get('attorney_retained'):
-        context_violation = True
-        print(f"🔍 Attorney violation: Customer has attorney representation")
-    
-    # Bankruptcy violations
-    elif rule_id == 'LO1005.06' and ref_data.get('bankruptcy_filed'):
-        context_violation = True
-        print(f"🔍 Bankruptcy violation: Customer has filed bankruptcy")
-    
-    # Cease and desist violations
-    elif rule_id == 'LO1005.04' and ref_data.get('cease_desist'):
-        context_violation = True
-        print(f"🔍 Cease & desist violation: Customer requested no contact")
-    
-    # Third-party disclosure in voicemail
-    elif rule_id == 'LO1006.01' and ref_data.get('third_party_risk'):
-        debt_terms = ['debt', 'owe', 'balance', 'payment', 'past due', 'collection']
-        debt_disclosed = any(term in transcript.lower() for term in debt_terms)
-        if debt_disclosed:
-            context_violation = True
-            print(f"🔍 Third-party disclosure: Debt information disclosed when third party might hear")
-    
-    # Profanity detection
-    elif rule_id == 'LO1005.14':
-        profanity_words = ['damn', 'hell', 'bullshit', 'shit', 'fuck']
-        profanity_found = any(word in transcript.lower() for word in profanity_words)
-        if profanity_found:
-            context_violation = True
-            found_words = [word for word in profanity_words if word in transcript.lower()]
-            print(f"🔍 Profanity detected: {found_words}")
-    
-    # SMS during voicemail without consent
-    elif rule_id == 'LO1005.08':
-        sms_terms = ['text message', 'texting', 'sms', 'sending you a text']
-        sms_mentioned = any(term in transcript.lower() for term in sms_terms)
-        if sms_mentioned and ref_data.get('voicemail_context'):
-            context_violation = True
-            print(f"🔍 SMS violation: Mentioned texting during voicemail without consent")
-    
-    # Threatening language
-    elif rule_id == 'LO1007.05':
-        threat_terms = ['arrest', 'jail', 'prison', 'police', 'legal action', 'sue', 'lawsuit']
-        threats_found = any(term in transcript.lower() for term in threat_terms)
-        if threats_found:
-            context_violation = True
-            found_threats = [term for term in threat_terms if term in transcript.lower()]
-            print(f"🔍 Threatening language detected: {found_threats}")
-    
-    return pattern_match or context_violation
\ No newline at end of file
+    # Transcript patterns plus the rule's compiled condition (see shared/rule_dsl.py); the rule
+    # engine passes the CompiledRule it already looked up, so the cache key is built once per rule
+    if compiled is None:
+        compiled = compile_rule(rule)
+    reasons = compiled.evaluate(context)
+    for reason in reasons:
+        rule_reason(rule_id, reason)
+    
+    return bool(reasons)
@@ -12,6 +12,14 @@ data "archive_file" "batch_prep_zip" {
     })
     filename = "index.py"
   }
+
+  dynamic "source" {
+    for_each = fileset("${path.module}/../lambda-functions/shared", "*.py")
+    content {
+      content  = file("${path.module}/../lambda-functions/shared/${source.value}")
+      filename = "shared/${source.value}"
+    }
+  }
 }
 
 # Create ZIP file for batch trigger Lambda  
@@ -25,6 +33,14 @@ data "archive_file" "batch_trigger_zip" {
     })
     filename = "index.py"
   }
+
+  dynamic "source" {
+    for_each = fileset("${path.module}/../lambda-functions/shared", "*.py")
+    content {
+      content  = file("${path.module}/../lambda-functions/shared/${source.value}")
+      filename = "shared/${source.value}"
+    }
+  }
 }
 
 # Update Lambda function dependencies
@@ -1,9 +1,10 @@
 import json
 import boto3
 import re
-import uuid
 from datetime import datetime
 
+from shared.idempotency import derive_call_id
+
 def batch_prep_handler(event, context):
     """
     Batch Preparation Lambda - Production Version
@@ -122,28 +123,6 @@ def batch_trigger_handler(event, context):
         dynamodb = boto3.resource('dynamodb')
         calls_table = dynamodb.Table('anycompany-calls-prod')
         
-        # Generate unique call_id for this batch processing
-        call_id = str(uuid.uuid4())
-        
-        print(f"📝 Generated call_id: {call_id}")
-        
-        # Create DynamoDB record (same as existing processor Lambda)
-        calls_table.put_item(
-            Item={
-                'call_id': call_id,
-                'filename': filename,
-                'genesys_call_id': genesys_id,
-                'processing_status': 'transcribing',
-                'upload_type': 'batch_stepfunctions',
-                'batch_processing': True,
-                'created_at': datetime.utcnow().isoformat(),
-                's3_bucket': bucket,
-                's3_key': s3_key
-            }
-        )
-        
-        print(f"✅ Created DynamoDB record for batch call")
-        
         # Copy file to audio/ folder to trigger existing flow
         # This mimics the UI upload process
         audio_key = f"audio/{filename}"
@@ -153,12 +132,39 @@ def batch_trigger_handler(event, context):
             'Key': s3_key
         }
         
-        s3.copy_object(
+        copy_response = s3.copy_object(
             CopySource=copy_source,
             Bucket=bucket,
             Key=audio_key
         )
         
+        # Same call_id the processor derives from the copied object, so Step Functions
+        # retries and the processor's claim all land on one record
+        call_id = derive_call_id(bucket, audio_key, copy_response['CopyObjectResult']['ETag'])
+        
+        print(f"📝 Derived call_id: {call_id}")
+        
+        # Only the batch fields are written; the processor may already have claimed the call
+        calls_table.update_item(
+            Key={'call_id': call_id},
+            UpdateExpression='SET filename = :filename, genesys_call_id = :genesys_id, '
+                             'processing_status = if_not_exists(processing_status, :processing_status), '
+                             'upload_type = :upload_type, batch_processing = :batch_processing, '
+                             'created_at = if_not_exists(created_at, :created_at), s3_bucket = :bucket, s3_key = :s3_key',
+            ExpressionAttributeValues={
+                ':filename': filename,
+                ':genesys_id': genesys_id,
+                ':processing_status': 'transcribing',
+                ':upload_type': 'batch_stepfunctions',
+                ':batch_processing': True,
+                ':created_at': datetime.utcnow().isoformat(),
+                ':bucket': bucket,
+                ':s3_key': s3_key
+            }
+        )
+        
+        print(f"✅ Created DynamoDB record for batch call")
+        
         print(f"📁 Copied {s3_key} -> {audio_key}")
         print(f"🚀 Triggered existing processing flow via S3 upload")
         
@@ -56,11 +56,17 @@ resource "aws_iam_role_policy" "anycompany_compliance_policy" {
           "dynamodb:PutItem",
           "dynamodb:Scan",
           "dynamodb:Query",
-          "dynamodb:UpdateItem"
+          "dynamodb:UpdateItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem"
         ]
         Resource = [
           aws_dynamodb_table.anycompany_calls_table.arn,
-          aws_dynamodb_table.anycompany_rules_table.arn
+          aws_dynamodb_table.anycompany_rules_table.arn,
+          aws_dynamodb_table.anycompany_batches_table.arn,
+          aws_dynamodb_table.anycompany_batch_checkpoints_table.arn,
+          aws_dynamodb_table.anycompany_audio_fingerprints_table.arn,
+          aws_dynamodb_table.anycompany_reference_table.arn
         ]
       },
       {
@@ -105,7 +111,11 @@ resource "aws_iam_role_policy" "anycompany_compliance_policy" {
         ]
         Resource = [
           aws_sqs_queue.anycompany_processing_queue.arn,
-          aws_sqs_queue.anycompany_processing_dlq.arn
+          aws_sqs_queue.anycompany_processing_dlq.arn,
+          aws_sqs_queue.anycompany_bulk_processing_queue.arn,
+          aws_sqs_queue.anycompany_bulk_processing_dlq.arn,
+          aws_sqs_queue.anycompany_completion_queue.arn,
+          aws_sqs_queue.anycompany_completion_dlq.arn
         ]
       }
     ]
@@ -126,6 +136,7 @@ resource "aws_lambda_function" "anycompany_api_function" {
       CALLS_TABLE_NAME = aws_dynamodb_table.anycompany_calls_table.name
       INPUT_BUCKET_NAME = aws_s3_bucket.anycompany_input_bucket.id
       RULES_TABLE_NAME = aws_dynamodb_table.anycompany_rules_table.name
+      BATCHES_TABLE_NAME = aws_dynamodb_table.anycompany_batches_table.name
       TRANSCRIBE_OUTPUT_BUCKET_NAME = aws_s3_bucket.anycompany_transcribe_output_bucket.id
     }
   }
@@ -141,15 +152,25 @@ resource "aws_lambda_function" "anycompany_processor_function" {
   handler                       = "index.lambda_handler"
   runtime                       = "python3.9"
   timeout                       = 900
+  memory_size                   = 1024
   reserved_concurrent_executions = 10
+  layers                        = var.numpy_layer_arn != "" ? [var.numpy_layer_arn] : []
 
   environment {
     variables = {
       CALLS_TABLE = aws_dynamodb_table.anycompany_calls_table.name
       RULES_TABLE = aws_dynamodb_table.anycompany_rules_table.name
+      BATCHES_TABLE = aws_dynamodb_table.anycompany_batches_table.name
+      CHECKPOINTS_TABLE = aws_dynamodb_table.anycompany_batch_checkpoints_table.name
       INPUT_BUCKET_NAME = aws_s3_bucket.anycompany_input_bucket.id
       TRANSCRIBE_OUTPUT_BUCKET = aws_s3_bucket.anycompany_transcribe_output_bucket.id
       COMPREHEND_OUTPUT_BUCKET = aws_s3_bucket.anycompany_comprehend_output_bucket.id
+      BULK_QUEUE_URL = aws_sqs_queue.anycompany_bulk_processing_queue.url
+      BULK_TRANSCRIBE_CONCURRENCY = var.bulk_transcribe_concurrency
+      AUDIO_ANALYSIS = var.numpy_layer_arn != "" ? "true" : "false"
+      FINGERPRINTS_TABLE = aws_dynamodb_table.anycompany_audio_fingerprints_table.name
+      MAX_CONCURRENT_SUBMISSIONS = "10"
+      SPEAKER_SEPARATION = "off"
     }
   }
 
@@ -163,27 +184,150 @@ resource "aws_lambda_function" "anycompany_transcription_complete_function" {
   role         = aws_iam_role.anycompany_lambda_role.arn
   handler      = "index.lambda_handler"
   runtime      = "python3.9"
-  timeout      = 300
+  timeout      = 900
 
   environment {
     variables = {
       CALLS_TABLE = aws_dynamodb_table.anycompany_calls_table.name
       RULES_TABLE = aws_dynamodb_table.anycompany_rules_table.name
+      BATCHES_TABLE = aws_dynamodb_table.anycompany_batches_table.name
+      CHECKPOINTS_TABLE = aws_dynamodb_table.anycompany_batch_checkpoints_table.name
       INPUT_BUCKET_NAME = aws_s3_bucket.anycompany_input_bucket.id
       TRANSCRIBE_OUTPUT_BUCKET = aws_s3_bucket.anycompany_transcribe_output_bucket.id
       COMPREHEND_OUTPUT_BUCKET = aws_s3_bucket.anycompany_comprehend_output_bucket.id
+      TRANSCRIPT_READ_WORKERS = "8"
+      ALWAYS_EXTRACT_ENTITIES = "persons,financial,agent_identification"
+      AGENT_ONLY_ANALYSIS = "false"
+      REFERENCE_TABLE = aws_dynamodb_table.anycompany_reference_table.name
+      SUPPRESSION_INDEX = "true"
     }
   }
 
   depends_on = [data.archive_file.transcription_complete_function_zip]
 }
 
-# SQS Event Source Mapping
+# Rescore Lambda Function - re-runs changed rules over stored calls (invoked on demand)
+resource "aws_lambda_function" "anycompany_rescore_function" {
+  filename      = "rescore_function.zip"
+  function_name = "anycompany-rescore-${var.environment}"
+  role         = aws_iam_role.anycompany_lambda_role.arn
+  handler      = "index.lambda_handler"
+  runtime      = "python3.9"
+  timeout      = 900
+  memory_size  = 1024
+
+  environment {
+    variables = {
+      CALLS_TABLE = aws_dynamodb_table.anycompany_calls_table.name
+      RULES_TABLE = aws_dynamodb_table.anycompany_rules_table.name
+      INPUT_BUCKET_NAME = aws_s3_bucket.anycompany_input_bucket.id
+      TRANSCRIBE_OUTPUT_BUCKET = aws_s3_bucket.anycompany_transcribe_output_bucket.id
+      RESCORE_SEGMENTS = "8"
+      REFERENCE_TABLE = aws_dynamodb_table.anycompany_reference_table.name
+      SUPPRESSION_INDEX = "true"
+    }
+  }
+
+  depends_on = [data.archive_file.rescore_function_zip]
+}
+
+# Reference Loader Lambda Function - loads CSV/JSON uploads under reference/ into the reference table
+# and rebuilds suppression list indexes on uploads under suppression/ (whole lists are held in memory)
+resource "aws_lambda_function" "anycompany_reference_loader_function" {
+  filename      = "reference_loader_function.zip"
+  function_name = "anycompany-reference-loader-${var.environment}"
+  role         = aws_iam_role.anycompany_lambda_role.arn
+  handler      = "index.lambda_handler"
+  runtime      = "python3.9"
+  timeout      = 900
+  memory_size  = 2048
+
+  environment {
+    variables = {
+      REFERENCE_TABLE = aws_dynamodb_table.anycompany_reference_table.name
+      INPUT_BUCKET_NAME = aws_s3_bucket.anycompany_input_bucket.id
+      LOADER_WRITERS = "16"
+    }
+  }
+
+  depends_on = [data.archive_file.reference_loader_function_zip]
+}
+
+resource "aws_lambda_permission" "anycompany_reference_loader_s3_permission" {
+  statement_id  = "AllowExecutionFromInputBucket"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.anycompany_reference_loader_function.function_name
+  principal     = "s3.amazonaws.com"
+  source_arn    = aws_s3_bucket.anycompany_input_bucket.arn
+}
+
+# SQS Event Source Mappings
+# Interactive lane: small batches, no batching window, so a UI upload starts transcribing immediately
 resource "aws_lambda_event_source_mapping" "anycompany_processor_event_source_mapping" {
   event_source_arn                   = aws_sqs_queue.anycompany_processing_queue.arn
   function_name                      = aws_lambda_function.anycompany_processor_function.arn
+  batch_size                         = 10
+  function_response_types            = ["ReportBatchItemFailures"]
+  maximum_batching_window_in_seconds = 0
+}
+
+# Bulk lane: large batches, capped pollers so bulk work cannot take all processor concurrency
+resource "aws_lambda_event_source_mapping" "anycompany_processor_bulk_event_source_mapping" {
+  event_source_arn                   = aws_sqs_queue.anycompany_bulk_processing_queue.arn
+  function_name                      = aws_lambda_function.anycompany_processor_function.arn
   batch_size                         = 50
+  function_response_types            = ["ReportBatchItemFailures"]
   maximum_batching_window_in_seconds = 10
+
+  scaling_config {
+    maximum_concurrency = 5
+  }
+}
+
+# Completion lane: a batching window collects finished transcripts so one invocation
+# shares rule/reference loading across them, then flushes them with concurrent
+# update_item calls (COMPLETION_WRITE_WORKERS) that write only the completion fields
+resource "aws_lambda_event_source_mapping" "anycompany_completion_event_source_mapping" {
+  event_source_arn                   = aws_sqs_queue.anycompany_completion_queue.arn
+  function_name                      = aws_lambda_function.anycompany_transcription_complete_function.arn
+  batch_size                         = var.completion_batch_size
+  maximum_batching_window_in_seconds = var.completion_batch_window_seconds
+  function_response_types            = ["ReportBatchItemFailures"]
+}
+
+# Transcribe writes no output for a failed job, so no completion event arrives: its
+# state change event is what fails the call and gives back its bulk lane slot
+resource "aws_cloudwatch_event_rule" "transcribe_job_failed" {
+  name        = "anycompany-transcribe-job-failed-${var.environment}"
+  description = "Failed Transcribe jobs, to fail their calls and release their lane slots"
+
+  event_pattern = jsonencode({
+    source        = ["aws.transcribe"]
+    "detail-type" = ["Transcribe Job State Change"]
+    detail = {
+      TranscriptionJobStatus = ["FAILED"]
+    }
+  })
+}
+
+resource "aws_cloudwatch_event_target" "transcribe_job_failed_target" {
+  rule      = aws_cloudwatch_event_rule.transcribe_job_failed.name
+  target_id = "TranscriptionCompleteFunction"
+  arn       = aws_lambda_function.anycompany_transcription_complete_function.arn
+}
+
+# Re-counts the bulk lane's in-flight slots from the Transcribe jobs actually running,
+# recovering slots leaked by invocations that timed out between acquire and start
+resource "aws_cloudwatch_event_rule" "lane_slot_reconcile" {
+  name                = "anycompany-lane-slot-reconcile-${var.environment}"
+  description         = "Reconcile the bulk lane Transcribe slot counter"
+  schedule_expression = "rate(15 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "lane_slot_reconcile_target" {
+  rule      = aws_cloudwatch_event_rule.lane_slot_reconcile.name
+  target_id = "TranscriptionCompleteFunction"
+  arn       = aws_lambda_function.anycompany_transcription_complete_function.arn
 }
 
 # Lambda Permissions
@@ -195,12 +339,20 @@ resource "aws_lambda_permission" "api_gateway_invoke" {
   source_arn    = "${aws_api_gateway_rest_api.anycompany_rest_api.execution_arn}/*/*"
 }
 
-resource "aws_lambda_permission" "s3_invoke_transcription_complete" {
-  statement_id  = "AllowExecutionFromS3"
+resource "aws_lambda_permission" "transcribe_job_failed_invoke" {
+  statement_id  = "AllowExecutionFromTranscribeJobFailedRule"
   action        = "lambda:InvokeFunction"
   function_name = aws_lambda_function.anycompany_transcription_complete_function.function_name
-  principal     = "s3.amazonaws.com"
-  source_arn    = aws_s3_bucket.anycompany_transcribe_output_bucket.arn
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.transcribe_job_failed.arn
+}
+
+resource "aws_lambda_permission" "lane_slot_reconcile_invoke" {
+  statement_id  = "AllowExecutionFromLaneSlotReconcileRule"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.anycompany_transcription_complete_function.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.lane_slot_reconcile.arn
 }
 
 # Archive files for Lambda functions
@@ -220,6 +372,13 @@ data "archive_file" "processor_function_zip" {
     content  = file("${path.module}/processor_function_code.py")
     filename = "index.py"
   }
+  dynamic "source" {
+    for_each = fileset("${path.module}/../lambda-functions/shared", "*.py")
+    content {
+      content  = file("${path.module}/../lambda-functions/shared/${source.value}")
+      filename = "shared/${source.value}"
+    }
+  }
 }
 
 data "archive_file" "transcription_complete_function_zip" {
@@ -229,4 +388,45 @@ data "archive_file" "transcription_complete_function_zip" {
     content  = file("${path.module}/transcription_complete_function_code.py")
     filename = "index.py"
   }
-}
\ No newline at end of file
+  dynamic "source" {
+    for_each = fileset("${path.module}/../lambda-functions/shared", "*.py")
+    content {
+      content  = file("${path.module}/../lambda-functions/shared/${source.value}")
+      filename = "shared/${source.value}"
+    }
+  }
+}
+
+data "archive_file" "reference_loader_function_zip" {
+  type        = "zip"
+  output_path = "reference_loader_function.zip"
+  source {
+    content  = file("${path.module}/../lambda-functions/batch-processing/reference-loader/index.py")
+    filename = "index.py"
+  }
+
+  dynamic "source" {
+    for_each = fileset("${path.module}/../lambda-functions/shared", "*.py")
+    content {
+      content  = file("${path.module}/../lambda-functions/shared/${source.value}")
+      filename = "shared/${source.value}"
+    }
+  }
+}
+
+data "archive_file" "rescore_function_zip" {
+  type        = "zip"
+  output_path = "rescore_function.zip"
+  source {
+    content  = file("${path.module}/../lambda-functions/batch-processing/rescore/index.py")
+    filename = "index.py"
+  }
+
+  dynamic "source" {
+    for_each = fileset("${path.module}/../lambda-functions/shared", "*.py")
+    content {
+      content  = file("${path.module}/../lambda-functions/shared/${source.value}")
+      filename = "shared/${source.value}"
+    }
+  }
+}
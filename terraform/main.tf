@@ -37,6 +37,30 @@ variable "deploy_ecs" {
   default     = true
 }
 
+variable "bulk_transcribe_concurrency" {
+  description = "Max in-flight Transcribe jobs for batch uploads; the rest of the account quota stays reserved for UI uploads"
+  type        = number
+  default     = 200
+}
+
+variable "completion_batch_size" {
+  description = "Completed transcripts scored per transcription complete invocation"
+  type        = number
+  default     = 25
+}
+
+variable "completion_batch_window_seconds" {
+  description = "Longest wait for a completion batch to fill; bounds the added latency per call"
+  type        = number
+  default     = 10
+}
+
+variable "numpy_layer_arn" {
+  description = "Lambda layer providing NumPy for silence/beep detection in the processor; empty disables audio analysis"
+  type        = string
+  default     = ""
+}
+
 # Data sources
 data "aws_availability_zones" "available" {
   state = "available"
@@ -149,6 +173,42 @@ resource "aws_sqs_queue" "anycompany_processing_queue" {
   })
 }
 
+# Bulk lane: Step Functions batch uploads (audio-batch/) queue separately from UI uploads
+resource "aws_sqs_queue" "anycompany_bulk_processing_dlq" {
+  name                      = "anycompany-bulk-processing-dlq-${var.environment}"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "anycompany_bulk_processing_queue" {
+  name                       = "anycompany-bulk-processing-queue-${var.environment}"
+  visibility_timeout_seconds = 960
+  message_retention_seconds  = 1209600
+  receive_wait_time_seconds  = 20
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.anycompany_bulk_processing_dlq.arn
+    maxReceiveCount     = 3
+  })
+}
+
+# Completion lane: Transcribe output notifications, scored in batches by the transcription complete function
+resource "aws_sqs_queue" "anycompany_completion_dlq" {
+  name                      = "anycompany-completion-dlq-${var.environment}"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "anycompany_completion_queue" {
+  name                       = "anycompany-completion-queue-${var.environment}"
+  visibility_timeout_seconds = 960
+  message_retention_seconds  = 1209600
+  receive_wait_time_seconds  = 20
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.anycompany_completion_dlq.arn
+    maxReceiveCount     = 3
+  })
+}
+
 # S3 Buckets
 resource "aws_s3_bucket" "anycompany_input_bucket" {
   bucket        = "anycompany-input-${var.environment}-${data.aws_caller_identity.current.account_id}"
@@ -331,6 +391,92 @@ resource "aws_dynamodb_table" "anycompany_rules_table" {
   }
 }
 
+resource "aws_dynamodb_table" "anycompany_batches_table" {
+  name           = "anycompany-batches-${var.environment}"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "batch_id"
+
+  attribute {
+    name = "batch_id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "anycompany-batches-${var.environment}"
+    Environment = var.environment
+  }
+}
+
+resource "aws_dynamodb_table" "anycompany_batch_checkpoints_table" {
+  name           = "anycompany-batch-checkpoints-${var.environment}"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "batch_id"
+  range_key      = "item_key"
+
+  attribute {
+    name = "batch_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "item_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "anycompany-batch-checkpoints-${var.environment}"
+    Environment = var.environment
+  }
+}
+
+# Audio fingerprint index: PCM hash / spectral fingerprint -> first call with that audio
+resource "aws_dynamodb_table" "anycompany_audio_fingerprints_table" {
+  name           = "anycompany-audio-fingerprints-${var.environment}"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "fingerprint"
+
+  attribute {
+    name = "fingerprint"
+    type = "S"
+  }
+
+  tags = {
+    Name        = "anycompany-audio-fingerprints-${var.environment}"
+    Environment = var.environment
+  }
+}
+
+# Call reference data by Genesys ID, filled by the reference loader from reference/ uploads
+resource "aws_dynamodb_table" "anycompany_reference_table" {
+  name           = "anycompany-reference-${var.environment}"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "genesys_call_id"
+
+  attribute {
+    name = "genesys_call_id"
+    type = "S"
+  }
+
+  point_in_time_recovery {
+    enabled = true
+  }
+
+  tags = {
+    Name        = "anycompany-reference-${var.environment}"
+    Environment = var.environment
+  }
+}
+
 # Security Groups
 resource "aws_security_group" "anycompany_alb_sg" {
   name_prefix = "anycompany-alb-sg-"
@@ -22,6 +22,29 @@ resource "aws_sqs_queue_policy" "anycompany_queue_policy" {
   })
 }
 
+resource "aws_sqs_queue_policy" "anycompany_bulk_queue_policy" {
+  queue_url = aws_sqs_queue.anycompany_bulk_processing_queue.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Principal = {
+          Service = "s3.amazonaws.com"
+        }
+        Action   = "sqs:SendMessage"
+        Resource = aws_sqs_queue.anycompany_bulk_processing_queue.arn
+        Condition = {
+          ArnEquals = {
+            "aws:SourceArn" = aws_s3_bucket.anycompany_input_bucket.arn
+          }
+        }
+      }
+    ]
+  })
+}
+
 # S3 Bucket Notification for Input Bucket
 resource "aws_s3_bucket_notification" "anycompany_input_bucket_notification" {
   bucket = aws_s3_bucket.anycompany_input_bucket.id
@@ -34,22 +57,72 @@ resource "aws_s3_bucket_notification" "anycompany_input_bucket_notification" {
     filter_suffix = ".wav"
   }
 
-  depends_on = [aws_sqs_queue_policy.anycompany_queue_policy]
+  queue {
+    queue_arn = aws_sqs_queue.anycompany_bulk_processing_queue.arn
+    events    = ["s3:ObjectCreated:*"]
+
+    filter_prefix = "audio-batch/"
+    filter_suffix = ".wav"
+  }
+
+  lambda_function {
+    lambda_function_arn = aws_lambda_function.anycompany_reference_loader_function.arn
+    events              = ["s3:ObjectCreated:*"]
+
+    filter_prefix = "reference/"
+  }
+
+  lambda_function {
+    lambda_function_arn = aws_lambda_function.anycompany_reference_loader_function.arn
+    events              = ["s3:ObjectCreated:*"]
+
+    filter_prefix = "suppression/"
+  }
+
+  depends_on = [
+    aws_sqs_queue_policy.anycompany_queue_policy,
+    aws_sqs_queue_policy.anycompany_bulk_queue_policy,
+    aws_lambda_permission.anycompany_reference_loader_s3_permission
+  ]
+}
+
+resource "aws_sqs_queue_policy" "anycompany_completion_queue_policy" {
+  queue_url = aws_sqs_queue.anycompany_completion_queue.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Principal = {
+          Service = "s3.amazonaws.com"
+        }
+        Action   = "sqs:SendMessage"
+        Resource = aws_sqs_queue.anycompany_completion_queue.arn
+        Condition = {
+          ArnEquals = {
+            "aws:SourceArn" = aws_s3_bucket.anycompany_transcribe_output_bucket.arn
+          }
+        }
+      }
+    ]
+  })
 }
 
 # S3 Bucket Notification for Transcribe Output Bucket
+# Transcripts queue up so the completion function scores them in batches
 resource "aws_s3_bucket_notification" "anycompany_transcribe_output_bucket_notification" {
   bucket = aws_s3_bucket.anycompany_transcribe_output_bucket.id
 
-  lambda_function {
-    lambda_function_arn = aws_lambda_function.anycompany_transcription_complete_function.arn
-    events              = ["s3:ObjectCreated:*"]
+  queue {
+    queue_arn = aws_sqs_queue.anycompany_completion_queue.arn
+    events    = ["s3:ObjectCreated:*"]
 
     filter_prefix = "transcripts/"
     filter_suffix = ".json"
   }
 
-  depends_on = [aws_lambda_permission.s3_invoke_transcription_complete]
+  depends_on = [aws_sqs_queue_policy.anycompany_completion_queue_policy]
 }
 
 # WAF Web ACL
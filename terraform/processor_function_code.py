@@ -1,71 +1,197 @@
 import json
 import boto3
-import uuid
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from botocore.config import Config
+
+from shared.idempotency import derive_call_id, is_conditional_check_failure, normalize_etag
+from shared.priority_lanes import (
+    DEFAULT_BULK_TRANSCRIBE_CONCURRENCY,
+    acquire_transcribe_slot,
+    defer_to_lane_queue,
+    lane_for_key,
+    release_transcribe_slot
+)
+
+# Transcribe jobs submitted at once within one SQS batch
+MAX_CONCURRENT_SUBMISSIONS = int(os.environ.get('MAX_CONCURRENT_SUBMISSIONS', '10'))
+
+# Created once per container; boto3 clients are safe to share between threads
+client_config = Config(max_pool_connections=MAX_CONCURRENT_SUBMISSIONS, retries={'max_attempts': 5, 'mode': 'standard'})
+s3 = boto3.client('s3', config=client_config)
+dynamodb = boto3.client('dynamodb', config=client_config)
+transcribe = boto3.client('transcribe', config=client_config)
+sqs = boto3.client('sqs', config=client_config)
+# Lane slots are counted in the batches table (resource API, as shared/priority_lanes expects)
+lanes_table = boto3.resource('dynamodb', config=client_config).Table(os.environ.get('BATCHES_TABLE', 'anycompany-batches-prod'))
 
 def lambda_handler(event, context):
-    s3 = boto3.client('s3')
-    dynamodb = boto3.resource('dynamodb')
-    calls_table = dynamodb.Table(os.environ['CALLS_TABLE'])
-    
+    """
+    Start Transcribe jobs for a batch of SQS messages, several at a time.
+    Returns batchItemFailures so only the failed messages go back to the queue.
+    """
+    work = []
+    failed = set()
     for record in event['Records']:
+        message_id = record.get('messageId')
         # Handle SQS messages containing S3 events
         if 'body' in record:
-            message_body = json.loads(record['body'])
+            try:
+                message_body = json.loads(record['body'])
+            except ValueError as e:
+                print(f"Unreadable message {message_id}: {str(e)}")
+                failed.add(message_id)
+                continue
             if 'Records' in message_body:
                 s3_records = message_body['Records']
             else:
                 continue
         else:
             s3_records = [record]
-        
+
         for s3_record in s3_records:
-            bucket = s3_record['s3']['bucket']['name']
-            key = s3_record['s3']['object']['key']
-            
-            if not key.endswith('.wav'):
-                continue
-            
-            call_id = str(uuid.uuid4())
-            filename = key.split('/')[-1]
-            
-            # Start async transcription
-            try:
-                job_name = start_transcription_async(bucket, key, call_id, filename)
-                
-                calls_table.put_item(Item={
-                    'call_id': call_id,
-                    'filename': filename,
-                    'transcript': 'PROCESSING',
-                    'violations': [],
-                    'processed_at': datetime.utcnow().isoformat(),
-                    'status': 'transcribing',
-                    'transcription_job_name': job_name
-                })
-                
-            except Exception as e:
-                print(f"Failed to start transcription for {filename}: {str(e)}")
-                calls_table.put_item(Item={
-                    'call_id': call_id,
-                    'filename': filename,
-                    'transcript': 'PROCESSING ERROR',
-                    'violations': [],
-                    'processed_at': datetime.utcnow().isoformat(),
-                    'error': str(e)
-                })
-    
-    return {'statusCode': 200}
-
-def start_transcription_async(bucket, key, call_id, filename):
-    transcribe = boto3.client('transcribe')
-    
-    timestamp = int(time.time() * 1000)
-    job_name = f"anycompany-{call_id}-{timestamp}"
-    
+            if s3_record['s3']['object']['key'].endswith('.wav'):
+                work.append((message_id, s3_record))
+
+    if work:
+        bulk_limit = int(os.environ.get('BULK_TRANSCRIBE_CONCURRENCY', DEFAULT_BULK_TRANSCRIBE_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_SUBMISSIONS, len(work))) as executor:
+            results = executor.map(lambda item: submit_in_lane(item[1], bulk_limit), work)
+            for (message_id, _), ok in zip(work, results):
+                if not ok:
+                    failed.add(message_id)
+
+    if failed:
+        print(f"{len(failed)} of {len(event['Records'])} messages failed and will be retried")
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed if message_id]
+    }
+
+def submit_in_lane(s3_record, bulk_limit):
+    """
+    Hold a Transcribe slot of the upload's lane while submitting it.
+    Bulk uploads over the lane's cap go back on the bulk queue with a delay;
+    the completion handler frees the slot once the job finishes.
+    """
+    key = s3_record['s3']['object']['key']
+    # Keys outside the lane prefixes (direct uploads) are interactive work
+    lane = lane_for_key(key)[0] or 'interactive'
+    try:
+        if not acquire_transcribe_slot(lanes_table, lane, bulk_limit):
+            print(f"Bulk lane at capacity ({bulk_limit} jobs), deferring {key}")
+            defer_to_lane_queue(sqs, os.environ['BULK_QUEUE_URL'], s3_record)
+            return True
+    except Exception as e:
+        print(f"Failed to take a {lane} lane slot for {key}: {str(e)}")
+        return False
+
+    started = False
+    try:
+        started, ok = submit_call(s3_record, lane)
+        return ok
+    finally:
+        if not started:
+            release_transcribe_slot(lanes_table, lane)
+
+def submit_call(s3_record, lane):
+    """
+    Claim the call record and start its Transcribe job.
+    Returns (started, ok): whether a job was started, and False for ok if the message should be retried.
+    """
+    bucket = s3_record['s3']['bucket']['name']
+    key = s3_record['s3']['object']['key']
+    filename = key.split('/')[-1]
+
+    try:
+        etag = s3_record['s3']['object'].get('eTag')
+        if not etag:
+            etag = s3.head_object(Bucket=bucket, Key=key)['ETag']
+        # Same object content always maps to the same call_id, so a retried message reuses its record
+        call_id = derive_call_id(bucket, key, etag)
+        job_name = f"anycompany-{call_id}-{int(time.time() * 1000)}"
+
+        if not claim_call(call_id, filename, job_name, normalize_etag(etag), lane):
+            print(f"Skipping duplicate event for {filename}: call {call_id} already has a transcription job")
+            return False, True
+    except Exception as e:
+        print(f"Failed to claim call for {filename}: {str(e)}")
+        return False, False
+
+    try:
+        start_transcription_async(bucket, key, job_name, filename)
+    except Exception as e:
+        print(f"Failed to start transcription for {filename}: {str(e)}")
+        release_claim(call_id, job_name, e)
+        return False, False
+
+    try:
+        dynamodb.update_item(
+            TableName=os.environ['CALLS_TABLE'],
+            Key={'call_id': {'S': call_id}},
+            UpdateExpression='SET #status = :status',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':status': {'S': 'transcribing'}}
+        )
+    except Exception as e:
+        # The job is running; its completion event still finds the record by call_id
+        print(f"Started {job_name} but could not update call {call_id}: {str(e)}")
+    return True, True
+
+def claim_call(call_id, filename, job_name, etag, lane):
+    """
+    Record the job name on the call unless another delivery already did.
+    Only the claim fields are written, so attributes the batch trigger stored
+    first (batch_id, checkpoint_key) are kept.
+    """
+    try:
+        dynamodb.update_item(
+            TableName=os.environ['CALLS_TABLE'],
+            Key={'call_id': {'S': call_id}},
+            UpdateExpression='SET filename = :filename, transcript = if_not_exists(transcript, :transcript), '
+                             'violations = if_not_exists(violations, :violations), processed_at = :processed_at, '
+                             '#status = :status, transcription_job_name = :job_name, s3_etag = :etag, priority_lane = :lane',
+            ConditionExpression='attribute_not_exists(transcription_job_name)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':filename': {'S': filename},
+                ':transcript': {'S': 'PROCESSING'},
+                ':violations': {'L': []},
+                ':processed_at': {'S': datetime.utcnow().isoformat()},
+                ':status': {'S': 'submitting'},
+                ':job_name': {'S': job_name},
+                ':etag': {'S': etag},
+                ':lane': {'S': lane}
+            }
+        )
+        return True
+    except Exception as e:
+        if is_conditional_check_failure(e):
+            return False
+        raise
+
+def release_claim(call_id, job_name, error):
+    """Mark the call failed and drop its job name so the retried message can claim it again"""
+    try:
+        dynamodb.update_item(
+            TableName=os.environ['CALLS_TABLE'],
+            Key={'call_id': {'S': call_id}},
+            UpdateExpression='SET #status = :status, #error = :error REMOVE transcription_job_name',
+            ConditionExpression='transcription_job_name = :job_name',
+            ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
+            ExpressionAttributeValues={
+                ':status': {'S': 'failed'},
+                ':error': {'S': str(error)},
+                ':job_name': {'S': job_name}
+            }
+        )
+    except Exception as e:
+        print(f"Could not release the claim on call {call_id}: {str(e)}")
+
+def start_transcription_async(bucket, key, job_name, filename):
     media_uri = f"s3://{bucket}/{key}"
-    
+
     transcribe.start_transcription_job(
         TranscriptionJobName=job_name,
         Media={'MediaFileUri': media_uri},
@@ -74,6 +200,6 @@ def start_transcription_async(bucket, key, call_id, filename):
         OutputBucketName=os.environ['TRANSCRIBE_OUTPUT_BUCKET'],
         OutputKey=f"transcripts/{job_name}.json"
     )
-    
+
     print(f'Started transcription job {job_name} for {filename}')
-    return job_name
\ No newline at end of file
+    return job_name
@@ -58,6 +58,10 @@ resource "aws_lambda_function" "batch_prep" {
 
   environment {
     variables = {
+      BATCHES_TABLE = aws_dynamodb_table.anycompany_batches_table.name
+      CHECKPOINTS_TABLE = aws_dynamodb_table.anycompany_batch_checkpoints_table.name
+      INPUT_BUCKET_NAME = aws_s3_bucket.anycompany_input_bucket.id
+      REFERENCE_TABLE = aws_dynamodb_table.anycompany_reference_table.name
       ENVIRONMENT = var.environment
     }
   }
@@ -81,6 +85,8 @@ resource "aws_lambda_function" "batch_trigger" {
   environment {
     variables = {
       CALLS_TABLE = aws_dynamodb_table.calls.name
+      BATCHES_TABLE = aws_dynamodb_table.anycompany_batches_table.name
+      CHECKPOINTS_TABLE = aws_dynamodb_table.anycompany_batch_checkpoints_table.name
       ENVIRONMENT = var.environment
     }
   }
@@ -196,14 +202,15 @@ resource "aws_sfn_state_machine" "batch_processor" {
         Type = "Pass"
         Parameters = {
           batch_summary = {
-            status                         = "completed"
+            status                         = "triggered"
+            "batch_id.$"                   = "$.batch_result.batch_info.batch_id"
             "total_files.$"                = "$.batch_result.batch_info.total_files_found"
             "files_triggered.$"            = "States.ArrayLength($.processing_results)"
             "batch_folder.$"               = "$.batch_result.batch_info.batch_folder"
             "processing_timestamp.$"       = "$.batch_result.batch_info.processing_timestamp"
             max_concurrency                = 100
             tolerated_failure_percentage   = 5
-            note                          = "Production batch processing completed - check DynamoDB for individual call status"
+            note                          = "All files triggered - poll GET /batches/{batch_id} for live progress, throughput and ETA"
           }
         }
         OutputPath = "$.batch_summary"
@@ -6,6 +6,9 @@ import re
 from datetime import datetime
 from decimal import Decimal
 
+from shared.idempotency import is_conditional_check_failure
+from shared.priority_lanes import release_transcribe_slot
+
 def convert_floats_to_decimals(obj):
     if isinstance(obj, float):
         return Decimal(str(obj))
@@ -19,8 +22,17 @@ def lambda_handler(event, context):
     s3 = boto3.client('s3')
     dynamodb = boto3.resource('dynamodb')
     calls_table = dynamodb.Table(os.environ['CALLS_TABLE'])
+    batches_table = dynamodb.Table(os.environ.get('BATCHES_TABLE', 'anycompany-batches-prod'))
     
-    for record in event['Records']:
+    # EventBridge: a failed Transcribe job writes no transcript, so its call is failed here.
+    # The scheduled lane slot reconciliation runs in the full handler (deploy-all.sh)
+    if event.get('source') == 'aws.transcribe':
+        fail_transcription_job(calls_table, batches_table, event.get('detail', {}))
+        return {'statusCode': 200}
+    if event.get('source') == 'aws.events':
+        return {'statusCode': 200}
+    
+    for record in s3_event_records(event):
         bucket = record['s3']['bucket']['name']
         key = record['s3']['object']['key']
         
@@ -58,7 +70,7 @@ def lambda_handler(event, context):
             )
             
             if response['Items']:
-                calls_table.update_item(
+                update_response = calls_table.update_item(
                     Key={'call_id': call_id},
                     UpdateExpression='SET transcript = :transcript, entities = :entities, violations = :violations, #status = :status, processed_at = :processed_at',
                     ExpressionAttributeNames={'#status': 'status'},
@@ -68,8 +80,13 @@ def lambda_handler(event, context):
                         ':violations': violations_clean,
                         ':status': 'completed',
                         ':processed_at': datetime.utcnow().isoformat()
-                    }
+                    },
+                    ReturnValues='ALL_OLD'
                 )
+                # Free the bulk lane's Transcribe slot once, even if this event is delivered again
+                previous = update_response.get('Attributes', {})
+                if previous.get('status') != 'completed':
+                    release_transcribe_slot(batches_table, previous.get('priority_lane'))
             else:
                 calls_table.put_item(
                     Item={
@@ -89,6 +106,46 @@ def lambda_handler(event, context):
     
     return {'statusCode': 200}
 
+def fail_transcription_job(calls_table, batches_table, detail):
+    """Mark the call of a FAILED job failed and free its lane slot, unless a newer job owns it"""
+    job_name = detail.get('TranscriptionJobName', '')
+    job_parts = job_name.split('-')
+    if detail.get('TranscriptionJobStatus') != 'FAILED' or len(job_parts) < 3:
+        return
+    call_id = '-'.join(job_parts[1:-1])
+    try:
+        response = calls_table.update_item(
+            Key={'call_id': call_id},
+            UpdateExpression='SET transcript = :transcript, #status = :status, #error = :error, processed_at = :processed_at REMOVE transcription_job_name',
+            ConditionExpression='transcription_job_name = :job_name',
+            ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
+            ExpressionAttributeValues={
+                ':transcript': 'TRANSCRIPTION_FAILED',
+                ':status': 'failed',
+                ':error': detail.get('FailureReason') or 'Transcription job failed',
+                ':processed_at': datetime.utcnow().isoformat(),
+                ':job_name': job_name
+            },
+            ReturnValues='ALL_OLD'
+        )
+    except Exception as e:
+        if is_conditional_check_failure(e):
+            return
+        raise
+    previous = response.get('Attributes', {})
+    if previous.get('status') != 'failed':
+        release_transcribe_slot(batches_table, previous.get('priority_lane'))
+
+def s3_event_records(event):
+    """S3 records from a direct notification or from SQS messages on the completion queue"""
+    records = []
+    for record in event['Records']:
+        if 'body' in record:
+            records.extend(json.loads(record['body']).get('Records', []))
+        else:
+            records.append(record)
+    return records
+
 def extract_compliance_entities(transcript):
     comprehend = boto3.client('comprehend')
     entities = {'persons': [], 'organizations': [], 'financial': [], 'medical': [], 'legal': [], 'communication': [], 'pii_entities': []}